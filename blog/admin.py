@@ -15,6 +15,7 @@ class BlogCommentAdmin(admin.ModelAdmin):
         "get_blog_post",
         "truncated_content",
         "status_badge",
+        "spam_score",
         "created_at",
         "is_reply",
         "replies_count",
@@ -45,6 +46,8 @@ class BlogCommentAdmin(admin.ModelAdmin):
         "user_agent",
         "moderated_at",
         "moderated_by",
+        "spam_score",
+        "spam_scored_at",
         "is_edited",
         "edited_at",
     ]
@@ -56,7 +59,14 @@ class BlogCommentAdmin(admin.ModelAdmin):
         (
             "Moderation",
             {
-                "fields": ("status", "moderation_note", "moderated_at", "moderated_by"),
+                "fields": (
+                    "status",
+                    "moderation_note",
+                    "moderated_at",
+                    "moderated_by",
+                    "spam_score",
+                    "spam_scored_at",
+                ),
                 "classes": ("collapse",),
             },
         ),
@@ -0,0 +1,171 @@
+"""
+Fragment cache for rendered comment threads.
+
+The rendered comment list for a post is cached per viewer variant and tagged
+with a per-post comment version. The version is bumped by blog.signals whenever
+a comment is saved or deleted (including approve/reject/spam) and whenever
+votes change, so a cached fragment is never served after the thread changes.
+
+Variants:
+    anonymous: logged-out visitors
+    member:    signed-in, non-staff users. Per-user state (vote highlights,
+               delete buttons on the user's own comments) is applied client-side
+               from a small JSON overlay, so all members share one fragment.
+
+Staff always get a fresh render because they see moderation controls.
+
+The version and the fragment are read with a single get_many() round trip.
+The CSRF token is rendered as a placeholder and swapped for the requesting
+user's token on the way out.
+"""
+
+import logging
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from blog.models import BlogComment, CommentVote
+
+logger = logging.getLogger(__name__)
+
+COMMENT_FRAGMENT_TIMEOUT = 60 * 60 * 24 * 7  # 1 week; invalidation is version based
+CSRF_PLACEHOLDER = "__comment_thread_csrf_token__"
+COMMENT_LIST_TEMPLATE = "components/comment_list.html"
+
+
+class MemberViewer:
+    """
+    Stand-in user for the shared signed-in fragment.
+
+    Renders as authenticated (so anonymous-only inputs are hidden) but never
+    matches a comment author and is not staff.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+    is_staff = False
+    pk = None
+    id = None
+
+    def __eq__(self, other):
+        return False
+
+    __hash__ = object.__hash__
+
+
+def _version_key(template_name, category):
+    return f"blog:comments:version:{category}:{template_name}"
+
+
+def _fragment_key(template_name, category, variant):
+    return f"blog:comments:fragment:{category}:{template_name}:{variant}"
+
+
+def bump_comment_version(template_name, category):
+    """
+    Invalidate cached comment fragments for a post.
+
+    If the counter has been evicted it restarts from the current time in
+    nanoseconds, so it can never fall back to a value an old fragment was
+    tagged with.
+    """
+    key = _version_key(template_name, category)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def _viewer_variant(user):
+    if not user.is_authenticated:
+        return "anonymous"
+    if user.is_staff:
+        return None
+    return "member"
+
+
+def _render_thread(comments, viewer, request=None):
+    context = {"comments": comments, "user": viewer}
+    if request is None:
+        # Shared fragments get a placeholder that is swapped per request
+        context["csrf_token"] = CSRF_PLACEHOLDER
+    return render_to_string(COMMENT_LIST_TEMPLATE, context, request=request)
+
+
+def get_comment_thread(request, template_name, category):
+    """
+    Return the rendered comment thread and its metadata for a blog page.
+
+    Returns:
+        Dict with:
+            comments_html: Rendered comment list
+            comment_count: Number of top-level comments
+            comments: Comment tree when it was loaded, None on a cache hit
+            comment_overlay: Per-user vote/ownership data for the member variant
+    """
+    user = request.user
+    variant = _viewer_variant(user)
+
+    if variant is None:
+        comments = BlogComment.get_comment_tree(template_name, category, user=user)
+        return {
+            "comments": comments,
+            "comments_html": _render_thread(comments, user, request=request),
+            "comment_count": len(comments),
+            "comment_overlay": None,
+        }
+
+    version_key = _version_key(template_name, category)
+    fragment_key = _fragment_key(template_name, category, variant)
+    cached = cache.get_many([version_key, fragment_key])
+    version = cached.get(version_key)
+    fragment = cached.get(fragment_key)
+
+    comments = None
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(version_key, version, None):
+            version = cache.get(version_key, version)
+
+    if fragment is None or fragment["version"] != version:
+        comments = BlogComment.get_comment_tree(template_name, category)
+        viewer = AnonymousUser() if variant == "anonymous" else MemberViewer()
+        fragment = {
+            "version": version,
+            "html": _render_thread(comments, viewer),
+            "count": len(comments),
+            "ids": [comment.id for comment in _walk(comments)],
+        }
+        cache.set(fragment_key, fragment, COMMENT_FRAGMENT_TIMEOUT)
+
+    overlay = None
+    if variant == "member":
+        votes = {}
+        if fragment["ids"]:
+            votes = dict(
+                CommentVote.objects.filter(user=user, comment_id__in=fragment["ids"]).values_list(
+                    "comment_id", "vote_type"
+                )
+            )
+        overlay = {"user_id": user.pk, "votes": votes}
+
+    # The fragment was rendered (and escaped) by the template engine; only the token is substituted
+    html = mark_safe(fragment["html"].replace(CSRF_PLACEHOLDER, get_token(request)))  # nosec B703 B308
+
+    return {
+        "comments": comments,
+        "comments_html": html,
+        "comment_count": fragment["count"],
+        "comment_overlay": overlay,
+    }
+
+
+def _walk(comments):
+    """Yield every comment in a tree loaded by get_comment_tree(), depth first."""
+    for comment in comments:
+        yield comment
+        yield from _walk(comment.get_replies())
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 20:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_delete_searchablecontent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogcomment',
+            name='spam_score',
+            field=models.FloatField(blank=True, help_text='Spam probability from the background scoring pipeline (0 = ham, 1 = spam)', null=True),
+        ),
+        migrations.AddField(
+            model_name='blogcomment',
+            name='spam_scored_at',
+            field=models.DateTimeField(blank=True, help_text='When the comment was picked up by the spam scoring pipeline', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='blogcomment',
+            index=models.Index(fields=['status', 'spam_scored_at'], name='blog_blogco_status_45bb21_idx'),
+        ),
+    ]
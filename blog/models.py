@@ -57,6 +57,16 @@ class BlogComment(models.Model):
         related_name="moderated_comments",
     )
     moderation_note = models.TextField(blank=True, help_text="Internal note about moderation decision")
+    spam_score = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Spam probability from the background scoring pipeline (0 = ham, 1 = spam)",
+    )
+    spam_scored_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the comment was picked up by the spam scoring pipeline",
+    )
 
     ip_address = models.GenericIPAddressField(
         null=True, blank=True, help_text="IP address of commenter for spam detection"
@@ -78,6 +88,7 @@ class BlogComment(models.Model):
             models.Index(fields=["created_at"]),
             models.Index(fields=["author"]),
             models.Index(fields=["status"]),
+            models.Index(fields=["status", "spam_scored_at"]),
         ]
         verbose_name = "Blog Comment"
         verbose_name_plural = "Blog Comments"
@@ -130,7 +141,12 @@ class BlogComment(models.Model):
         """
         Get approved replies with optimized prefetching for nested structure.
         Includes author data and nested replies for performance.
+
+        Comments loaded through get_comment_tree() already carry their replies,
+        so no query is issued for them.
         """
+        if hasattr(self, "_thread_replies"):
+            return self._thread_replies
         return (
             self.replies.filter(status="approved")
             .select_related("author")
@@ -198,6 +214,79 @@ class BlogComment(models.Model):
 
         return queryset
 
+    @classmethod
+    def get_comment_tree(cls, template_name, category=None, user=None):
+        """
+        Load the whole approved comment thread for a blog post in at most two queries.
+
+        A recursive CTE walks the reply tree from the top-level comments down to
+        any depth (a reply is only included if all of its ancestors are approved),
+        and the viewer's votes for every comment in the thread are fetched with a
+        single IN query. The nested structure is assembled in Python in one pass,
+        so each comment's get_replies() returns its children without touching the
+        database.
+
+        Args:
+            template_name: The blog template name
+            category: Optional blog category
+            user: Optional viewer; when authenticated, each comment gets a
+                ``user_vote`` attribute ("upvote", "downvote" or None)
+
+        Returns:
+            List of top-level approved comments, newest first. Replies are
+            ordered oldest first, matching get_replies().
+        """
+        from django.db.models.expressions import RawSQL
+
+        table = cls._meta.db_table
+        params = [template_name]
+        category_filter = ""
+        if category:
+            category_filter = "AND blog_category = %s"
+            params.append(category)
+
+        thread_sql = f"""
+            WITH RECURSIVE thread AS (
+                SELECT id FROM {table}
+                WHERE blog_template_name = %s {category_filter}
+                    AND status = 'approved' AND parent_id IS NULL
+                UNION ALL
+                SELECT child.id FROM {table} child
+                INNER JOIN thread ON child.parent_id = thread.id
+                WHERE child.status = 'approved'
+            )
+            SELECT id FROM thread
+        """  # nosec B608 - table name comes from model meta, values are parameterized
+
+        comments = list(
+            cls.objects.filter(id__in=RawSQL(thread_sql, params)).select_related("author").order_by("created_at", "id")
+        )
+
+        votes = {}
+        if comments and user is not None and user.is_authenticated:
+            votes = dict(
+                CommentVote.objects.filter(user=user, comment_id__in=[comment.id for comment in comments]).values_list(
+                    "comment_id", "vote_type"
+                )
+            )
+
+        by_id = {comment.id: comment for comment in comments}
+        top_level = []
+        for comment in comments:
+            comment._thread_replies = []
+            comment.user_vote = votes.get(comment.id)
+
+        for comment in comments:
+            parent = by_id.get(comment.parent_id)
+            if parent is None:
+                top_level.append(comment)
+            else:
+                comment.parent = parent
+                parent._thread_replies.append(comment)
+
+        top_level.reverse()
+        return top_level
+
     @classmethod
     def get_pending_count(cls):
         """Get the count of pending comments for admin notification badge."""
@@ -0,0 +1,32 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from blog.comment_cache import bump_comment_version
+from blog.models import BlogComment, CommentVote
+
+logger = logging.getLogger(__name__)
+
+# Sent by blog.voting after vote counts change outside of model save()/delete().
+# Arguments: template_name, category
+comment_votes_changed = Signal()
+
+
+@receiver(post_save, sender=BlogComment)
+@receiver(post_delete, sender=BlogComment)
+def blog_comment_changed(sender, instance, **kwargs):
+    """Covers new comments, edits, approve/reject/spam and deletes."""
+    bump_comment_version(instance.blog_template_name, instance.blog_category)
+
+
+@receiver(post_save, sender=CommentVote)
+@receiver(post_delete, sender=CommentVote)
+def comment_vote_saved(sender, instance, **kwargs):
+    comment = instance.comment
+    bump_comment_version(comment.blog_template_name, comment.blog_category)
+
+
+@receiver(comment_votes_changed)
+def comment_votes_applied(sender, template_name, category, **kwargs):
+    bump_comment_version(template_name, category)
@@ -5,6 +5,10 @@ from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
 
+SPAM_SCORING_DEBOUNCE_KEY = "blog:spam_scoring:scheduled"
+SPAM_SCORING_DEBOUNCE_SECONDS = 30
+SPAM_SCORING_MAX_BATCHES = 20
+
 
 @shared_task(
     bind=True,
@@ -58,3 +62,72 @@ def generate_knowledge_graph_screenshot(self):
     except Exception as e:
         logger.error(f"Error generating knowledge graph screenshot: {e}")
         raise
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=3,
+)
+def reconcile_comment_vote_counts(self):
+    """
+    Recompute cached comment vote counts from the CommentVote table.
+
+    Votes are applied as deltas by blog.voting, so this periodically repairs
+    any drift from votes changed outside the voting engine.
+    """
+    from blog.voting import reconcile_vote_counts
+
+    try:
+        corrected = reconcile_vote_counts()
+        logger.info(f"Comment vote count reconciliation complete: {corrected} comments corrected")
+        return corrected
+    except Exception as e:
+        logger.error(f"Error reconciling comment vote counts: {e}")
+        raise
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    max_retries=3,
+)
+def score_pending_comments(self, use_llm=True):
+    """
+    Score pending comments for spam in batches and apply confident decisions.
+
+    Runs periodically and shortly after new comments arrive (debounced by
+    schedule_spam_scoring), so the comment POST never waits on scoring.
+    """
+    from blog.moderation import score_pending_comments as score_batch
+
+    totals = {"scored": 0, "spam": 0, "approved": 0, "needs_review": 0}
+    try:
+        for _ in range(SPAM_SCORING_MAX_BATCHES):
+            stats = score_batch(use_llm=use_llm)
+            if not stats["scored"]:
+                break
+            for key, value in stats.items():
+                totals[key] += value
+        return totals
+    except Exception as e:
+        logger.error(f"Error scoring pending comments: {e}")
+        raise
+
+
+def schedule_spam_scoring():
+    """
+    Queue a spam scoring run for newly submitted comments.
+
+    Comments arriving within the debounce window share one run, so a burst of
+    submissions is scored as a single batch. Never raises: if the broker is
+    unavailable the periodic run picks the comments up instead.
+    """
+    try:
+        if cache.add(SPAM_SCORING_DEBOUNCE_KEY, 1, timeout=SPAM_SCORING_DEBOUNCE_SECONDS):
+            score_pending_comments.apply_async(countdown=SPAM_SCORING_DEBOUNCE_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not schedule spam scoring: {e}")
@@ -32,6 +32,7 @@ class BlogCommentAdminTest(TestCase):
             "get_blog_post",
             "truncated_content",
             "status_badge",
+            "spam_score",
             "created_at",
             "is_reply",
             "replies_count",
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from accounts.tests.factories import UserFactory
+from blog.comment_cache import CSRF_PLACEHOLDER, get_comment_thread
+from blog.tests.factories import BlogCommentFactory
+from blog.voting import apply_vote
+
+
+class CommentFragmentCacheTest(TestCase):
+    """Test the cached comment thread fragment and its invalidation."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = UserFactory.create_user()
+        self.staff_user = UserFactory.create_staff_user()
+        self.comment = BlogCommentFactory.create_approved_comment(content="Cached comment", author=self.user)
+
+    def _thread(self, user=None):
+        request = self.factory.get("/b/tech/0001_test_post/")
+        request.user = user or AnonymousUser()
+        return get_comment_thread(request, "0001_test_post", "tech")
+
+    def test_anonymous_hit_needs_no_queries(self):
+        first = self._thread()
+        self.assertIsNotNone(first["comments"])
+
+        with self.assertNumQueries(0):
+            second = self._thread()
+
+        self.assertIsNone(second["comments"])
+        self.assertEqual(second["comment_count"], 1)
+        self.assertIn("Cached comment", second["comments_html"])
+        self.assertIn("csrfmiddlewaretoken", second["comments_html"])
+        self.assertNotIn(CSRF_PLACEHOLDER, second["comments_html"])
+
+    def test_moderation_invalidates_fragment(self):
+        pending = BlogCommentFactory.create_pending_comment(content="Awaiting review")
+        self.assertNotIn("Awaiting review", self._thread()["comments_html"])
+
+        pending.approve(user=self.staff_user)
+        thread = self._thread()
+        self.assertIn("Awaiting review", thread["comments_html"])
+        self.assertEqual(thread["comment_count"], 2)
+
+        pending.mark_as_spam(user=self.staff_user)
+        self.assertNotIn("Awaiting review", self._thread()["comments_html"])
+
+    def test_delete_invalidates_fragment(self):
+        self._thread()
+        self.comment.delete()
+        self.assertEqual(self._thread()["comment_count"], 0)
+
+    def test_vote_invalidates_fragment(self):
+        self._thread()
+        apply_vote(self.comment.id, self.staff_user.id, "upvote")
+
+        thread = self._thread()
+        self.assertIsNotNone(thread["comments"])
+        self.assertEqual(thread["comments"][0].score, 1)
+
+    def test_member_overlay(self):
+        other_user = UserFactory.create_user()
+        apply_vote(self.comment.id, self.user.id, "downvote")
+        self._thread(user=other_user)
+
+        # Fragment is shared between members; only the viewer's votes are queried
+        with self.assertNumQueries(1):
+            thread = self._thread(user=self.user)
+
+        self.assertEqual(thread["comment_overlay"], {"user_id": self.user.pk, "votes": {self.comment.id: "downvote"}})
+        self.assertIn(f'data-author-id="{self.user.pk}"', thread["comments_html"])
+        self.assertNotIn('name="author_email"', thread["comments_html"])
+
+    def test_staff_always_renders_fresh(self):
+        self._thread(user=self.staff_user)
+        thread = self._thread(user=self.staff_user)
+
+        self.assertIsNotNone(thread["comments"])
+        self.assertIsNone(thread["comment_overlay"])
+        self.assertIn("btn-delete", thread["comments_html"])
@@ -263,3 +263,72 @@ class CommentVoteModelTest(TestCase):
         )
 
         self.assertEqual(vote.ip_address, "192.168.1.1")
+
+
+class CommentTreeTest(TestCase):
+    """Test loading a whole comment thread with get_comment_tree()."""
+
+    def setUp(self):
+        self.user = UserFactory.create_user()
+        self.other_user = UserFactory.create_user()
+
+        self.first = BlogCommentFactory.create_approved_comment(content="First", author=self.user)
+        self.second = BlogCommentFactory.create_approved_comment(content="Second")
+        self.reply = BlogCommentFactory.create_approved_comment(content="Reply", parent=self.first)
+        self.nested = BlogCommentFactory.create_approved_comment(content="Nested", parent=self.reply)
+        self.deep = BlogCommentFactory.create_approved_comment(content="Deep", parent=self.nested)
+
+        # Pending replies (and anything under them) stay hidden
+        self.pending = BlogCommentFactory.create_pending_comment(content="Pending", parent=self.first)
+        BlogCommentFactory.create_approved_comment(content="Under pending", parent=self.pending)
+
+        # Other posts and categories are excluded
+        BlogCommentFactory.create_approved_comment(content="Other post", blog_template_name="0002_other")
+        BlogCommentFactory.create_approved_comment(content="Other category", blog_category="personal")
+
+    def test_loads_full_depth_in_one_query(self):
+        """Anonymous viewers need a single query for the whole thread, at any depth."""
+        with self.assertNumQueries(1):
+            comments = BlogComment.get_comment_tree("0001_test_post", "tech")
+            first = comments[1]
+            reply = first.get_replies()[0]
+            nested = reply.get_replies()[0]
+            deep = nested.get_replies()[0]
+            self.assertEqual(deep.get_replies(), [])
+            self.assertEqual(deep.get_depth(), 3)
+            self.assertEqual(first.author.username, self.user.username)
+
+        self.assertEqual([comment.content for comment in comments], ["Second", "First"])
+        self.assertEqual([reply.content for reply in first.get_replies()], ["Reply"])
+        self.assertEqual(deep.content, "Deep")
+        self.assertIsNone(first.user_vote)
+
+    def test_viewer_votes_in_one_extra_query(self):
+        """The viewer's votes for every comment in the thread come from one IN query."""
+        BlogCommentFactory.create_comment_vote(self.first, self.user, "upvote")
+        BlogCommentFactory.create_comment_vote(self.deep, self.user, "downvote")
+        BlogCommentFactory.create_comment_vote(self.second, self.other_user, "upvote")
+
+        with self.assertNumQueries(2):
+            comments = BlogComment.get_comment_tree("0001_test_post", "tech", user=self.user)
+            second, first = comments
+            deep = first.get_replies()[0].get_replies()[0].get_replies()[0]
+
+        self.assertEqual(first.user_vote, "upvote")
+        self.assertEqual(deep.user_vote, "downvote")
+        self.assertIsNone(second.user_vote)
+
+    def test_without_category(self):
+        comments = BlogComment.get_comment_tree("0001_test_post")
+        self.assertEqual(
+            {comment.content for comment in comments},
+            {"First", "Second", "Other category"},
+        )
+
+    def test_empty_thread(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(BlogComment.get_comment_tree("9999_missing", "tech", user=self.user), [])
+
+    def test_get_replies_still_queries_when_not_prefetched(self):
+        replies = BlogComment.objects.get(pk=self.first.pk).get_replies()
+        self.assertEqual(list(replies), [self.reply])
@@ -0,0 +1,204 @@
+import json
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from accounts.tests.factories import UserFactory
+from blog.models import BlogComment
+from blog.moderation import (
+    HAM_THRESHOLD,
+    SPAM_THRESHOLD,
+    _parse_llm_verdicts,
+    score_pending_comments,
+    spam_probability,
+    text_features,
+)
+from blog.tasks import schedule_spam_scoring
+from blog.tests.factories import BlogCommentFactory
+from utils.models import Ban, Fingerprint, IPAddress, TrackedRequest
+
+
+def llm_verdicts(mapping):
+    """Build a stubbed LLM response for the given {comment: "spam" | "ham"} mapping."""
+    return "```json\n" + json.dumps({str(comment.id): verdict for comment, verdict in mapping.items()}) + "\n```"
+
+
+class SpamFeatureTest(TestCase):
+    """Test text features and the local classifier."""
+
+    def test_text_features(self):
+        features = text_features("BUY NOW!!! Cheap casino bonus at https://spam.example and http://spam2.example")
+        self.assertEqual(features["url_count"], 2)
+        self.assertGreaterEqual(features["spam_terms"], 3)
+        self.assertEqual(features["exclamation_runs"], 1)
+        self.assertEqual(features["very_short"], 0.0)
+
+    def test_probability_ranges(self):
+        genuine = text_features("Thanks for the write-up, the section on query planning was really useful.")
+        genuine["authenticated"] = 1.0
+        self.assertLessEqual(spam_probability(genuine), HAM_THRESHOLD)
+
+        spammy = text_features("Cheap viagra, casino and payday loan offers: https://a.example https://b.example")
+        spammy["link_markup"] = 1.0
+        self.assertGreaterEqual(spam_probability(spammy), SPAM_THRESHOLD)
+
+    def test_parse_llm_verdicts(self):
+        self.assertEqual(_parse_llm_verdicts('{"1": "spam", "2": "HAM", "3": "unsure"}'), {"1": True, "2": False})
+        self.assertEqual(_parse_llm_verdicts("not json"), {})
+
+
+class ScorePendingCommentsTest(TestCase):
+    """Test the batched moderation pipeline with a stubbed LLM."""
+
+    def setUp(self):
+        cache.clear()
+        self.good_ip = IPAddress.objects.create(ip_address="203.0.113.10")
+        self.bad_ip = IPAddress.objects.create(ip_address="198.51.100.66")
+        fingerprint = Fingerprint.objects.create(hash="a" * 64)
+        for _ in range(3):
+            TrackedRequest.objects.create(
+                fingerprint_obj=fingerprint, ip_address=self.good_ip, method="GET", path="/b/tech/0001_test_post/"
+            )
+        TrackedRequest.objects.create(
+            fingerprint_obj=fingerprint, ip_address=self.bad_ip, method="POST", path="/wp-login.php", is_suspicious=True
+        )
+        self.user = UserFactory.create_user()
+        Ban.objects.create(ip_address=self.bad_ip, reason="Known spammer")
+
+    def _pending(self, content, ip_address, **kwargs):
+        return BlogCommentFactory.create_pending_comment(content=content, ip_address=ip_address, **kwargs)
+
+    @patch("blog.moderation.LLMService.chat")
+    def test_confident_decisions_skip_llm(self, mock_chat):
+        ham = self._pending("Great explanation of GIN indexes, thanks for sharing!", "203.0.113.10", author=self.user)
+        spam = self._pending("Check out my site", "198.51.100.66")
+
+        stats = score_pending_comments()
+
+        mock_chat.assert_not_called()
+        self.assertEqual(stats["approved"], 1)
+        self.assertEqual(stats["spam"], 1)
+
+        ham.refresh_from_db()
+        spam.refresh_from_db()
+        self.assertEqual(ham.status, "approved")
+        self.assertEqual(spam.status, "spam")
+        self.assertLess(ham.spam_score, spam.spam_score)
+        self.assertIsNotNone(ham.spam_scored_at)
+
+    def test_plain_anonymous_comment_is_not_approved_locally(self):
+        comment = self._pending("Thanks for the write-up, the section on query planning was useful.", "203.0.113.10")
+
+        stats = score_pending_comments(use_llm=False)
+
+        self.assertEqual(stats["approved"], 0)
+        self.assertEqual(stats["needs_review"], 1)
+        comment.refresh_from_db()
+        self.assertEqual(comment.status, "pending")
+        self.assertGreater(comment.spam_score, HAM_THRESHOLD)
+
+    @patch("blog.moderation.LLMService.chat")
+    def test_uncertain_comments_escalate_in_one_batch(self, mock_chat):
+        # Unseen IPs with a link are neither clearly ham nor clearly spam
+        first = self._pending("Related reading: https://example.com/post", "192.0.2.1")
+        second = self._pending("Nice post, see https://shop.example/deals", "192.0.2.2")
+        mock_chat.side_effect = lambda prompt, **kwargs: llm_verdicts({first: "ham", second: "spam"})
+
+        stats = score_pending_comments()
+
+        self.assertEqual(mock_chat.call_count, 1)
+        prompt_ids = {item["id"] for item in json.loads(mock_chat.call_args.kwargs["prompt"])}
+        self.assertEqual(prompt_ids, {str(first.id), str(second.id)})
+        self.assertEqual(stats, {"scored": 2, "spam": 1, "approved": 1, "needs_review": 0})
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, "approved")
+        self.assertEqual(second.status, "spam")
+
+    @patch("blog.moderation.LLMService.chat")
+    def test_llm_verdicts_are_cached_by_content(self, mock_chat):
+        first = self._pending("Related reading: https://example.com/post", "192.0.2.1")
+        mock_chat.return_value = llm_verdicts({first: "ham"})
+        score_pending_comments()
+
+        repost = self._pending("Related reading: https://example.com/post", "192.0.2.3")
+        mock_chat.reset_mock()
+        score_pending_comments()
+
+        mock_chat.assert_not_called()
+        repost.refresh_from_db()
+        self.assertEqual(repost.status, "approved")
+
+    @patch("blog.moderation.LLMService.chat")
+    def test_llm_failure_leaves_comment_pending(self, mock_chat):
+        mock_chat.side_effect = ValueError("OPENAI_KEY is not configured in settings")
+        comment = self._pending("Related reading: https://example.com/post", "192.0.2.1")
+
+        stats = score_pending_comments()
+
+        self.assertEqual(stats["needs_review"], 1)
+        comment.refresh_from_db()
+        self.assertEqual(comment.status, "pending")
+        self.assertIsNotNone(comment.spam_score)
+
+        # Already scored comments are not picked up again
+        self.assertEqual(score_pending_comments()["scored"], 0)
+
+    @patch("blog.moderation.LLMService.chat")
+    def test_moderator_decision_wins(self, mock_chat):
+        comment = self._pending("Related reading: https://example.com/post", "192.0.2.1")
+
+        def moderate_then_answer(prompt, **kwargs):
+            # A moderator marks the comment as spam while the batch is being scored
+            BlogComment.objects.get(pk=comment.pk).mark_as_spam(user=UserFactory.create_staff_user())
+            return llm_verdicts({comment: "ham"})
+
+        mock_chat.side_effect = moderate_then_answer
+        stats = score_pending_comments()
+
+        self.assertEqual(stats["approved"], 0)
+        comment.refresh_from_db()
+        self.assertEqual(comment.status, "spam")
+
+    def test_batch_queries_do_not_grow_with_batch_size(self):
+        def run(count):
+            for i in range(count):
+                self._pending(f"Comment number {i} about postgres internals", "203.0.113.10", author=self.user)
+            self._pending("Another comment", "198.51.100.66")
+            with CaptureQueriesContext(connection) as queries:
+                stats = score_pending_comments(use_llm=False)
+            self.assertEqual(stats["scored"], count + 1)
+            return len(queries)
+
+        self.assertEqual(run(1), run(10))
+
+    def test_only_pending_comments_are_scored(self):
+        approved = BlogCommentFactory.create_approved_comment(ip_address="198.51.100.66")
+
+        self.assertEqual(score_pending_comments(use_llm=False)["scored"], 0)
+        approved.refresh_from_db()
+        self.assertEqual(approved.status, "approved")
+        self.assertIsNone(approved.spam_score)
+
+
+class ScheduleSpamScoringTest(TestCase):
+    """Test debouncing of the post-submit scoring run."""
+
+    def setUp(self):
+        cache.clear()
+
+    @patch("blog.tasks.score_pending_comments.apply_async")
+    def test_burst_schedules_one_run(self, mock_apply_async):
+        for _ in range(5):
+            schedule_spam_scoring()
+
+        mock_apply_async.assert_called_once()
+
+    @patch("blog.tasks.score_pending_comments.apply_async")
+    def test_broker_errors_are_swallowed(self, mock_apply_async):
+        mock_apply_async.side_effect = ConnectionError("broker unavailable")
+        schedule_spam_scoring()
@@ -0,0 +1,126 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from accounts.tests.factories import UserFactory
+from blog import voting
+from blog.models import BlogComment, CommentVote
+from blog.tasks import reconcile_comment_vote_counts
+from blog.tests.factories import BlogCommentFactory
+from blog.voting import apply_vote, reconcile_vote_counts
+
+
+class ApplyVoteTest(TestCase):
+    """Test the atomic, delta-based voting engine."""
+
+    def setUp(self):
+        self.user = UserFactory.create_user()
+        self.other_user = UserFactory.create_user()
+        self.comment = BlogCommentFactory.create_approved_comment()
+
+    def assertCachedCounts(self, upvotes, downvotes):
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.upvotes, upvotes)
+        self.assertEqual(self.comment.downvotes, downvotes)
+        self.assertEqual(self.comment.score, upvotes - downvotes)
+
+    def test_add_vote(self):
+        result = apply_vote(self.comment.id, self.user.id, "upvote", ip_address="192.168.1.1")
+
+        self.assertEqual(result.action, "added")
+        self.assertEqual(result.user_vote, "upvote")
+        self.assertEqual((result.upvotes, result.downvotes, result.score), (1, 0, 1))
+        self.assertCachedCounts(1, 0)
+
+        vote = CommentVote.objects.get(comment=self.comment, user=self.user)
+        self.assertEqual(vote.vote_type, "upvote")
+        self.assertEqual(vote.ip_address, "192.168.1.1")
+
+    def test_toggle_vote_off(self):
+        apply_vote(self.comment.id, self.user.id, "downvote")
+        result = apply_vote(self.comment.id, self.user.id, "downvote")
+
+        self.assertEqual(result.action, "removed")
+        self.assertIsNone(result.user_vote)
+        self.assertEqual((result.upvotes, result.downvotes, result.score), (0, 0, 0))
+        self.assertFalse(CommentVote.objects.filter(comment=self.comment).exists())
+        self.assertCachedCounts(0, 0)
+
+    def test_change_vote(self):
+        apply_vote(self.comment.id, self.user.id, "upvote")
+        apply_vote(self.comment.id, self.other_user.id, "upvote")
+        result = apply_vote(self.comment.id, self.user.id, "downvote")
+
+        self.assertEqual(result.action, "changed")
+        self.assertEqual(result.user_vote, "downvote")
+        self.assertEqual((result.upvotes, result.downvotes, result.score), (1, 1, 0))
+        self.assertCachedCounts(1, 1)
+
+    def test_vote_uses_constant_number_of_queries(self):
+        """A new vote is one insert plus one counter update, regardless of how many votes exist."""
+        for _ in range(5):
+            apply_vote(self.comment.id, UserFactory.create_user().id, "upvote")
+
+        # SAVEPOINT, INSERT, UPDATE ... RETURNING, RELEASE SAVEPOINT
+        with self.assertNumQueries(4):
+            apply_vote(self.comment.id, self.user.id, "upvote")
+
+    def test_invalid_vote_type(self):
+        with self.assertRaises(ValueError):
+            apply_vote(self.comment.id, self.user.id, "sideways")
+
+    def test_vote_racing_two_concurrent_clicks(self):
+        """If the retried insert also loses a race, the vote is applied to the row that won it."""
+        calls = []
+
+        def lose_twice(cursor, comment_id, user_id, vote_type, ip_address):
+            calls.append(vote_type)
+            if len(calls) == 2:
+                # Another click from the same user committed an upvote in between
+                CommentVote.objects.create(comment=self.comment, user=self.user, vote_type="upvote")
+                BlogComment.objects.filter(pk=self.comment.pk).update(upvotes=1, score=1)
+            return False
+
+        with patch.object(voting, "_insert_vote", side_effect=lose_twice):
+            result = apply_vote(self.comment.id, self.user.id, "downvote")
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(result.action, "changed")
+        self.assertEqual((result.upvotes, result.downvotes, result.score), (0, 1, -1))
+        self.assertEqual(CommentVote.objects.get(comment=self.comment, user=self.user).vote_type, "downvote")
+        self.assertCachedCounts(0, 1)
+
+
+class ReconcileVoteCountsTest(TestCase):
+    """Test bulk reconciliation of cached vote counts."""
+
+    def setUp(self):
+        self.user = UserFactory.create_user()
+        self.other_user = UserFactory.create_user()
+        self.comment = BlogCommentFactory.create_approved_comment()
+        self.untouched = BlogCommentFactory.create_approved_comment()
+
+    def test_repairs_drifted_counts(self):
+        apply_vote(self.comment.id, self.user.id, "upvote")
+        apply_vote(self.comment.id, self.other_user.id, "downvote")
+
+        # Simulate drift from a write that bypassed the voting engine
+        BlogComment.objects.filter(pk=self.comment.pk).update(upvotes=10, downvotes=0, score=10)
+        BlogComment.objects.filter(pk=self.untouched.pk).update(upvotes=3, score=3)
+
+        with self.assertNumQueries(1):
+            corrected = reconcile_vote_counts()
+
+        self.assertEqual(corrected, 2)
+        self.comment.refresh_from_db()
+        self.untouched.refresh_from_db()
+        self.assertEqual((self.comment.upvotes, self.comment.downvotes, self.comment.score), (1, 1, 0))
+        self.assertEqual((self.untouched.upvotes, self.untouched.downvotes, self.untouched.score), (0, 0, 0))
+
+    def test_consistent_counts_are_not_rewritten(self):
+        apply_vote(self.comment.id, self.user.id, "upvote")
+        self.assertEqual(reconcile_vote_counts(), 0)
+
+    def test_reconcile_task(self):
+        BlogComment.objects.filter(pk=self.comment.pk).update(downvotes=4, score=-4)
+        self.assertEqual(reconcile_comment_vote_counts(), 1)
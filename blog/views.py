@@ -11,10 +11,14 @@ from django.template import TemplateDoesNotExist
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
+from blog.comment_cache import get_comment_thread
 from blog.forms import CommentForm, ReplyForm
 from blog.knowledge_graph import build_knowledge_graph, get_post_graph
-from blog.models import BlogComment, CommentVote, KnowledgeGraphScreenshot
+from blog.models import BlogComment, KnowledgeGraphScreenshot
+from blog.tasks import schedule_spam_scoring
 from blog.utils import get_blog_from_template_name
+from blog.voting import apply_vote
+from utils.semantic_search import get_related_posts
 
 logger = logging.getLogger(__name__)
 
@@ -40,19 +44,8 @@ def render_blog_template(request, category, template_name):
         views = TrackedRequest.objects.filter(path=page_path).count()
         blog_data["views"] = views
 
-        # Fetch approved comments with optimized queries
-        comments = BlogComment.get_approved_comments(template_name, category)
-
-        # Annotate comments with user's votes if authenticated
-        if request.user.is_authenticated:
-            for comment in comments:
-                comment.user_vote = comment.get_user_vote(request.user)
-                # Recursively add vote info to nested replies
-                for reply in comment.get_replies():
-                    reply.user_vote = reply.get_user_vote(request.user)
-
-        blog_data["comments"] = comments
-        blog_data["comment_count"] = comments.count()
+        # Rendered comment thread, served from the fragment cache for non-staff viewers
+        blog_data.update(get_comment_thread(request, template_name, category))
         blog_data["comment_form"] = CommentForm(user=request.user)
 
         # Show pending comment count to staff for moderation
@@ -63,6 +56,9 @@ def render_blog_template(request, category, template_name):
                 status="pending",
             ).count()
 
+        # Related posts come from the memory-mapped semantic index (no DB queries)
+        blog_data["related_posts"] = get_related_posts(template_name, category)
+
         # Add Open Graph meta tags for link previews
         og_description = f"{blog_data['blog_title']} - A blog post by Aaron Spindler"
         blog_data["page_og_title"] = blog_data["blog_title"]
@@ -236,6 +232,7 @@ def submit_comment(request, category, template_name):
         if comment.status == "approved":
             messages.success(request, "Your comment has been posted!")
         else:
+            schedule_spam_scoring()
             messages.info(
                 request,
                 "Your comment has been submitted for review and will appear after approval.",
@@ -260,9 +257,7 @@ def submit_comment(request, category, template_name):
         views = TrackedRequest.objects.filter(path=page_path).count()
         blog_data["views"] = views
 
-        comments = BlogComment.get_approved_comments(template_name, category)
-        blog_data["comments"] = comments
-        blog_data["comment_count"] = comments.count()
+        blog_data.update(get_comment_thread(request, template_name, category))
         blog_data["comment_form"] = form  # Include form with validation errors
 
         return render(request, "_blog_base.html", blog_data)
@@ -325,6 +320,7 @@ def reply_to_comment(request, comment_id):
         if reply.status == "approved":
             messages.success(request, "Your reply has been posted!")
         else:
+            schedule_spam_scoring()
             messages.info(request, "Your reply has been submitted for review.")
     else:
         messages.error(request, "There was an error with your reply. Please try again.")
@@ -409,7 +405,7 @@ def vote_comment(request, comment_id):
     2. Same vote -> Remove vote (toggle off)
     3. Different vote -> Change vote
 
-    Vote counts are cached on the comment model and updated automatically.
+    Vote counts are cached on the comment model and updated atomically by blog.voting.
     """
     if not request.user.is_authenticated:
         return JsonResponse({"error": "Authentication required"}, status=401)
@@ -423,44 +419,17 @@ def vote_comment(request, comment_id):
     if vote_type not in ["upvote", "downvote"]:
         return JsonResponse({"error": "Invalid vote type"}, status=400)
 
-    # Handle vote logic: toggle, change, or create
-    try:
-        existing_vote = CommentVote.objects.get(comment=comment, user=request.user)
-
-        if existing_vote.vote_type == vote_type:
-            # Toggle: Remove vote if clicking same button
-            existing_vote.delete()
-            action = "removed"
-            user_vote = None
-        else:
-            # Change: Switch from upvote to downvote or vice versa
-            existing_vote.vote_type = vote_type
-            existing_vote.save()
-            action = "changed"
-            user_vote = vote_type
-    except CommentVote.DoesNotExist:
-        # New vote
-        CommentVote.objects.create(
-            comment=comment,
-            user=request.user,
-            vote_type=vote_type,
-            ip_address=request.META.get("REMOTE_ADDR"),
-        )
-        action = "added"
-        user_vote = vote_type
-
-    # Refresh cached counts
-    comment.update_vote_counts()
-    comment.refresh_from_db()
+    # Apply the vote as an atomic delta (toggle, change, or create)
+    result = apply_vote(comment.id, request.user.id, vote_type, ip_address=request.META.get("REMOTE_ADDR"))
 
     return JsonResponse(
         {
             "status": "success",
-            "action": action,
-            "upvotes": comment.upvotes,
-            "downvotes": comment.downvotes,
-            "score": comment.score,
-            "user_vote": user_vote,
+            "action": result.action,
+            "upvotes": result.upvotes,
+            "downvotes": result.downvotes,
+            "score": result.score,
+            "user_vote": result.user_vote,
         }
     )
 
@@ -0,0 +1,176 @@
+"""
+Comment voting engine.
+
+Votes are applied as deltas instead of re-aggregating every vote for a
+comment. The CommentVote row is written with INSERT ... ON CONFLICT, the
+existing row (if any) is locked with SELECT ... FOR UPDATE, and the cached
+counters on BlogComment are moved with a single
+``UPDATE ... SET upvotes = upvotes + %s ... RETURNING``. Concurrent clicks on
+the same comment serialise on row locks rather than overwriting each other's
+totals.
+
+The cached counters can still drift if votes are changed outside this module
+(e.g. bulk deletes in the admin), so reconcile_vote_counts() recomputes every
+comment's counts with one grouped UPDATE ... FROM and is run periodically.
+"""
+
+import logging
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+
+from blog.models import BlogComment, CommentVote
+from blog.signals import comment_votes_changed
+
+logger = logging.getLogger(__name__)
+
+VOTE_DELTAS = {
+    "upvote": (1, 0),
+    "downvote": (0, 1),
+}
+
+
+@dataclass
+class VoteResult:
+    """Outcome of a vote click, with the comment's counts after it was applied."""
+
+    action: str  # "added", "changed" or "removed"
+    user_vote: str | None
+    upvotes: int
+    downvotes: int
+    score: int
+
+
+def _delta(vote_type, sign=1):
+    upvotes, downvotes = VOTE_DELTAS[vote_type]
+    return upvotes * sign, downvotes * sign
+
+
+def _insert_vote(cursor, comment_id, user_id, vote_type, ip_address):
+    """Insert a new vote, returning False if the user already voted on this comment."""
+    cursor.execute(
+        f"""
+        INSERT INTO {CommentVote._meta.db_table} (comment_id, user_id, vote_type, ip_address, created_at, updated_at)
+        VALUES (%s, %s, %s, %s, NOW(), NOW())
+        ON CONFLICT (comment_id, user_id) DO NOTHING
+        RETURNING id
+        """,  # nosec B608 - table name comes from model meta, values are parameterized
+        [comment_id, user_id, vote_type, ip_address],
+    )
+    return cursor.fetchone() is not None
+
+
+def apply_vote(comment_id, user_id, vote_type, ip_address=None):
+    """
+    Apply a vote click with toggle semantics and return the new counts.
+
+    - No existing vote: add it
+    - Same vote again: remove it (toggle off)
+    - Opposite vote: switch it
+
+    Args:
+        comment_id: ID of the comment being voted on
+        user_id: ID of the voting user
+        vote_type: "upvote" or "downvote"
+        ip_address: Optional IP address stored on new votes
+
+    Returns:
+        VoteResult
+    """
+    if vote_type not in VOTE_DELTAS:
+        raise ValueError(f"Invalid vote type: {vote_type}")
+
+    vote_table = CommentVote._meta.db_table
+    comment_table = BlogComment._meta.db_table
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = None
+        while existing is None:
+            if _insert_vote(cursor, comment_id, user_id, vote_type, ip_address):
+                break
+            cursor.execute(
+                f"SELECT id, vote_type FROM {vote_table} WHERE comment_id = %s AND user_id = %s FOR UPDATE",  # nosec B608
+                [comment_id, user_id],
+            )
+            # None: the conflicting vote was removed by a concurrent toggle, so ours is a new vote after all
+            existing = cursor.fetchone()
+
+        if existing is None:
+            action, user_vote = "added", vote_type
+            upvote_delta, downvote_delta = _delta(vote_type)
+        elif existing[1] == vote_type:
+            cursor.execute(f"DELETE FROM {vote_table} WHERE id = %s", [existing[0]])  # nosec B608
+            action, user_vote = "removed", None
+            upvote_delta, downvote_delta = _delta(vote_type, sign=-1)
+        else:
+            cursor.execute(
+                f"UPDATE {vote_table} SET vote_type = %s, updated_at = NOW() WHERE id = %s",  # nosec B608
+                [vote_type, existing[0]],
+            )
+            action, user_vote = "changed", vote_type
+            added_up, added_down = _delta(vote_type)
+            removed_up, removed_down = _delta(existing[1], sign=-1)
+            upvote_delta, downvote_delta = added_up + removed_up, added_down + removed_down
+
+        cursor.execute(
+            f"""
+            UPDATE {comment_table}
+            SET upvotes = upvotes + %s,
+                downvotes = downvotes + %s,
+                score = score + %s
+            WHERE id = %s
+            RETURNING upvotes, downvotes, score, blog_template_name, blog_category
+            """,  # nosec B608 - table name comes from model meta, values are parameterized
+            [upvote_delta, downvote_delta, upvote_delta - downvote_delta, comment_id],
+        )
+        upvotes, downvotes, score, template_name, category = cursor.fetchone()
+
+    comment_votes_changed.send(sender=BlogComment, template_name=template_name, category=category)
+
+    return VoteResult(action=action, user_vote=user_vote, upvotes=upvotes, downvotes=downvotes, score=score)
+
+
+def reconcile_vote_counts():
+    """
+    Recompute cached vote counts for every comment with one grouped query.
+
+    Only rows whose cached counts disagree with the CommentVote table are
+    written, so a run over consistent data touches nothing.
+
+    Returns:
+        Number of comments whose counts were corrected
+    """
+    vote_table = CommentVote._meta.db_table
+    comment_table = BlogComment._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {comment_table} AS comment
+            SET upvotes = totals.upvotes,
+                downvotes = totals.downvotes,
+                score = totals.upvotes - totals.downvotes
+            FROM (
+                SELECT c.id,
+                       COUNT(v.id) FILTER (WHERE v.vote_type = 'upvote') AS upvotes,
+                       COUNT(v.id) FILTER (WHERE v.vote_type = 'downvote') AS downvotes
+                FROM {comment_table} c
+                LEFT JOIN {vote_table} v ON v.comment_id = c.id
+                GROUP BY c.id
+            ) AS totals
+            WHERE comment.id = totals.id
+              AND (comment.upvotes <> totals.upvotes
+                   OR comment.downvotes <> totals.downvotes
+                   OR comment.score <> totals.upvotes - totals.downvotes)
+            RETURNING comment.blog_template_name, comment.blog_category
+            """  # nosec B608 - table names come from model meta
+        )
+        changed_posts = cursor.fetchall()
+
+    for template_name, category in set(changed_posts):
+        comment_votes_changed.send(sender=BlogComment, template_name=template_name, category=category)
+
+    corrected = len(changed_posts)
+    if corrected:
+        logger.warning(f"Reconciled vote counts for {corrected} comments")
+    return corrected
@@ -83,7 +83,7 @@ MIDDLEWARE = [
     "config.domain_routing.DomainRoutingMiddleware",  # Domain-based URL routing (must be first)
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # Serve static files
-    "django.middleware.gzip.GZipMiddleware",  # Compress dynamic HTML responses
+    "utils.middleware.GZipMiddleware",  # Compress dynamic HTML responses (views can opt out with gzip_exempt)
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -428,7 +428,7 @@ CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
 CELERY_WORKER_MAX_MEMORY_PER_CHILD = 200000  # 200MB in KB
 
-# Better for long-running tasks (Lighthouse, screenshots)
+# Better for long-running tasks (Lighthouse, screenshots), and lets task priorities take effect
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 
 # Result compression to save Redis memory
@@ -437,6 +437,10 @@ CELERY_RESULT_COMPRESSION = "gzip"
 # Visibility timeout (longer than longest task)
 CELERY_BROKER_TRANSPORT_OPTIONS = {
     "visibility_timeout": 43200,  # 12 hours
+    # Priority queues: a task with a lower priority number is taken first (see photos.processing)
+    "queue_order_strategy": "priority",
+    "priority_steps": list(range(10)),
+    "sep": ":",
 }
 
 # Task queue routing
@@ -445,6 +449,13 @@ CELERY_TASK_ROUTES = {
     "blog.tasks.generate_knowledge_graph_screenshot": {"queue": "heavy"},
     "utils.tasks.send_email": {"queue": "notifications"},
     "utils.tasks.send_text_message": {"queue": "notifications"},
+    # Staged photo processing, one queue per stage so each can be scaled on its own
+    "photos.tasks.process_photo_metadata": {"queue": "photo_metadata"},
+    "photos.tasks.process_photo_variants": {"queue": "photo_variants"},
+    "photos.tasks.recrop_photo_async": {"queue": "photo_variants"},
+    "photos.tasks.process_photo_saliency": {"queue": "photo_saliency"},
+    "photos.tasks.process_photo_search": {"queue": "photo_search"},
+    "photos.tasks.compute_zip_checksums": {"queue": "photo_metadata"},
 }
 CELERY_TASK_DEFAULT_QUEUE = "default"
 
@@ -457,6 +468,12 @@ MASSIVE_API_KEY = env("MASSIVE_API_KEY", default="")
 OPENAI_KEY = env("OPENAI_KEY", default="")
 ANTHROPIC_KEY = env("ANTHROPIC_KEY", default="")
 
+# Semantic search: memory-mapped embedding matrix built by `build_semantic_index`
+SEMANTIC_SEARCH_INDEX_DIR = env("SEMANTIC_SEARCH_INDEX_DIR", default=str(BASE_DIR / "semantic_index"))
+
+# Photos: processes used to encode the responsive AVIF/WebP/JPEG variant ladder
+PHOTO_VARIANT_WORKERS = env.int("PHOTO_VARIANT_WORKERS", default=4)
+
 # File Upload Configuration
 # Increase limits for bulk photo uploads through admin
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100 MB
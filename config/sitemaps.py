@@ -1,11 +1,11 @@
 import os
-from datetime import datetime
+from datetime import UTC, datetime
 
 from django.conf import settings
 from django.contrib.sitemaps import Sitemap
-from django.core.cache import cache
 from django.urls import reverse
 
+from blog.utils import get_all_blog_posts
 from photos.sitemaps import PhotoAlbumSitemap, PhotoSitemap
 
 
@@ -22,10 +22,6 @@ class StaticViewSitemap(Sitemap):
     def location(self, item):
         return reverse(item)
 
-    def lastmod(self, item):
-        # Return current time for static pages
-        return datetime.now()
-
 
 class BlogPostSitemap(Sitemap):
     """Sitemap for blog posts"""
@@ -35,60 +31,16 @@ class BlogPostSitemap(Sitemap):
     protocol = "https"
 
     def items(self):
-        """Get all blog posts from template structure with caching"""
-        cache_key = "sitemap_blog_posts_v1"
-        blog_posts = cache.get(cache_key)
-
-        if blog_posts is None:
-            blog_posts = []
-            template_dir = os.path.join(settings.BASE_DIR, "blog", "templates", "blog")
-
-            # Define categories and their paths
-            categories = {
-                "personal": "personal",
-                "projects": "projects",
-                "reviews": "reviews",
-                "tech": "tech",
-            }
-
-            for category, folder in categories.items():
-                category_path = os.path.join(template_dir, folder)
-                if os.path.exists(category_path):
-                    for filename in os.listdir(category_path):
-                        if filename.endswith(".html"):
-                            # Remove the .html extension
-                            template_name = filename[:-5]
-                            blog_posts.append(
-                                {
-                                    "category": category,
-                                    "template_name": template_name,
-                                    "filename": filename,
-                                }
-                            )
-
-            # Cache for 6 hours
-            cache.set(cache_key, blog_posts, 21600)
-
-        return blog_posts
+        """Every blog post template, in any category directory"""
+        return sorted(get_all_blog_posts(), key=lambda post: (post["category"], post["template_name"]))
 
     def location(self, item):
         """Generate URL for each blog post"""
         return f"/b/{item['category']}/{item['template_name']}/"
 
     def lastmod(self, item):
-        """Get last modification time of the template file"""
-        template_path = os.path.join(
-            settings.BASE_DIR,
-            "blog",
-            "templates",
-            "blog",
-            item["category"],
-            item["filename"],
-        )
-        if os.path.exists(template_path):
-            timestamp = os.path.getmtime(template_path)
-            return datetime.fromtimestamp(timestamp)
-        return datetime.now()
+        """Last modification time of the template file"""
+        return datetime.fromtimestamp(os.path.getmtime(item["full_path"]), tz=UTC)
 
     def priority(self, item):
         """Adjust priority based on blog post number (newer posts get higher priority)"""
@@ -166,7 +118,7 @@ class DraftsSitemap(Sitemap):
         return datetime.now()
 
 
-# Dictionary of all sitemaps
+# Dictionary of all sitemaps, built into files by pages.sitemap_files
 sitemaps = {
     "static": StaticViewSitemap,
     "blog": BlogPostSitemap,
@@ -1,6 +1,38 @@
+"""
+S3 storage backends.
+
+PublicMediaStorage picks cache headers per object in get_object_parameters()
+instead of assigning self.object_parameters before each upload, so photos
+processed on several threads can't upload with each other's headers.
+
+Uploads go through a TransferConfig that switches to concurrent multipart
+uploads for large files (originals, album ZIPs). boto3 resources are not
+thread-safe but clients are, so _save() uploads with the low-level client
+instead of a bucket resource. Every thread shares that one client, whose
+connection pool is sized for SAVE_MANY_WORKERS uploads of MAX_CONCURRENCY
+parts each. save_many() uploads a batch of files (a photo's variant set)
+concurrently.
+"""
+
 import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
 
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import ReadBytesWrapper, clean_name, is_seekable
+
+MB = 1024 * 1024
+MULTIPART_THRESHOLD = 16 * MB
+MULTIPART_CHUNKSIZE = 16 * MB
+MAX_CONCURRENCY = 8  # Parts in flight per multipart upload
+SAVE_MANY_WORKERS = 8  # Files in flight per save_many() call
+
+# Names containing one of these are derived files that are never rewritten in place
+IMMUTABLE_NAME_PARTS = ("optimized", "thumbnail", "preview", "variants")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000"  # 1 year
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"  # 1 day
 
 
 class PublicMediaStorage(S3Boto3Storage):
@@ -11,30 +43,84 @@ class PublicMediaStorage(S3Boto3Storage):
     file_overwrite = True
     querystring_auth = False
 
-    def _save(self, name, content):
+    def get_default_settings(self):
+        defaults = super().get_default_settings()
+        if defaults["transfer_config"] is None:
+            defaults["transfer_config"] = TransferConfig(
+                multipart_threshold=MULTIPART_THRESHOLD,
+                multipart_chunksize=MULTIPART_CHUNKSIZE,
+                max_concurrency=MAX_CONCURRENCY,
+            )
+        return defaults
+
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self.client_config = self.client_config.merge(Config(max_pool_connections=SAVE_MANY_WORKERS * MAX_CONCURRENCY))
+
+    def get_object_parameters(self, name):
         """
-        Override _save to set proper content type and caching headers for images.
+        Upload parameters for one object: content type and cache headers by name.
+
+        Returns a new dict on every call; nothing on the storage is modified.
         """
-        # Determine content type
+        params = super().get_object_parameters(name)
         content_type, _ = mimetypes.guess_type(name)
-        if content_type:
-            content.content_type = content_type
-
-        # Set cache control for images (1 year for optimized images)
-        if any(size in name for size in ["optimized", "thumbnail", "preview"]):
+        params["ContentType"] = content_type or "application/octet-stream"
+        if any(part in name for part in IMMUTABLE_NAME_PARTS):
             # Optimized versions can be cached longer
-            self.object_parameters = {
-                "CacheControl": "public, max-age=31536000",  # 1 year
-                "ContentType": content_type or "application/octet-stream",
-            }
+            params["CacheControl"] = IMMUTABLE_CACHE_CONTROL
         else:
             # Original images get standard cache
-            self.object_parameters = {
-                "CacheControl": "public, max-age=86400",  # 1 day
-                "ContentType": content_type or "application/octet-stream",
-            }
+            params["CacheControl"] = DEFAULT_CACHE_CONTROL
+        return params
+
+    @property
+    def client(self):
+        """The S3 client behind the storage's bucket; unlike the resource, safe to share between threads."""
+        return self.bucket.meta.client
+
+    def _save(self, name, content):
+        """S3Boto3Storage._save(), uploading through the shared client instead of a bucket Object resource."""
+        cleaned_name = clean_name(name)
+        name = self._normalize_name(cleaned_name)
+        params = self._get_write_parameters(name, content)
+
+        if is_seekable(content):
+            content.seek(0, os.SEEK_SET)
+        content = ReadBytesWrapper(content)
+
+        if self.gzip and params["ContentType"] in self.gzip_content_types and "ContentEncoding" not in params:
+            content = self._compress_content(content)
+            params["ContentEncoding"] = "gzip"
+
+        # s3transfer closes the file it uploads (https://github.com/boto/s3transfer/issues/80)
+        original_close = content.close
+        content.close = lambda: None
+        try:
+            self.client.upload_fileobj(content, self.bucket_name, name, ExtraArgs=params, Config=self.transfer_config)
+        finally:
+            content.close = original_close
+        return cleaned_name
+
+    def save_many(self, files, max_length=None):
+        """
+        Save several files concurrently.
+
+        Args:
+            files: Iterable of (name, content) pairs
+
+        Returns:
+            list: The stored names, in input order
+        """
+        files = list(files)
+        if len(files) < 2:
+            return [self.save(name, content, max_length=max_length) for name, content in files]
 
-        return super()._save(name, content)
+        # Create the shared client before the workers race to do it
+        self.client  # noqa: B018
+        with ThreadPoolExecutor(max_workers=min(SAVE_MANY_WORKERS, len(files))) as executor:
+            futures = [executor.submit(self.save, name, content, max_length=max_length) for name, content in files]
+            return [future.result() for future in futures]
 
 
 class PrivateMediaStorage(S3Boto3Storage):
@@ -1,9 +1,7 @@
 from django.contrib import admin
-from django.contrib.sitemaps.views import index, sitemap
 from django.urls import include, path
-from django.views.decorators.cache import cache_page
 
-from .sitemaps import sitemaps
+from pages.views import sitemap_file
 
 urlpatterns = [
     # Admin
@@ -11,19 +9,9 @@ urlpatterns = [
     # Authentication
     path("accounts/", include("accounts.urls")),  # Custom accounts URLs (must be before allauth)
     path("accounts/", include("allauth.urls")),
-    # Sitemaps (cached for 12 hours)
-    path(
-        "sitemap.xml",
-        cache_page(43200)(index),
-        {"sitemaps": sitemaps},
-        name="django.contrib.sitemaps.views.index",
-    ),
-    path(
-        "sitemap-<section>.xml",
-        cache_page(43200)(sitemap),
-        {"sitemaps": sitemaps},
-        name="django.contrib.sitemaps.views.sitemap",
-    ),
+    # Sitemaps (prebuilt by pages.sitemap_files)
+    path("sitemap.xml", sitemap_file, name="sitemap_index"),
+    path("sitemap-<slug:section>.xml", sitemap_file, name="sitemap_section"),
     # App URLs
     path("photos/", include("photos.urls")),
     path("feefifofunds/", include("feefifofunds.urls")),
@@ -71,6 +71,29 @@ target "celery-worker" {
   ]
 }
 
+# =============================================================================
+# Photo Workers (photo processing stages, see photos/processing.py)
+# =============================================================================
+target "celery-photos" {
+  inherits = ["_common"]
+  dockerfile = "deployment/Dockerfile.multistage"
+  target = "celery-photos"
+  tags = [
+    "${REGISTRY}/${IMAGE_PREFIX}-celery-photos:${TAG}",
+    "${REGISTRY}/${IMAGE_PREFIX}-celery-photos:latest"
+  ]
+}
+
+target "celery-saliency" {
+  inherits = ["_common"]
+  dockerfile = "deployment/Dockerfile.multistage"
+  target = "celery-saliency"
+  tags = [
+    "${REGISTRY}/${IMAGE_PREFIX}-celery-saliency:${TAG}",
+    "${REGISTRY}/${IMAGE_PREFIX}-celery-saliency:latest"
+  ]
+}
+
 # =============================================================================
 # Celery Beat Scheduler (separate process for reliable task scheduling)
 # =============================================================================
@@ -103,7 +126,7 @@ target "flower" {
 
 # All production services
 group "production" {
-  targets = ["web", "celery-worker", "celerybeat", "flower"]
+  targets = ["web", "celery-worker", "celery-photos", "celery-saliency", "celerybeat", "flower"]
 }
 
 # =============================================================================
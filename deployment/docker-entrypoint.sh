@@ -13,6 +13,17 @@ python manage.py migrate --no-input || {
 echo "Running collectstatic..."
 python manage.py collectstatic --no-input
 
+# Build the local semantic search index (memory-mapped by the web workers)
+echo "Building semantic search index..."
+python manage.py build_semantic_index || {
+    echo "Warning: Semantic index build failed, semantic search will fall back to full-text only"
+}
+
+# Build the sitemap files served at /sitemap.xml
+echo "Building sitemaps..."
+python manage.py build_sitemaps || {
+    echo "Warning: Sitemap build failed, the previous sitemap files stay in place"
+}
 
 echo "Web container initialization complete!"
 
@@ -0,0 +1,20 @@
+"""
+Django management command to build the prebuilt sitemap files.
+
+Runs on deploy; see pages.sitemap_files.
+
+Usage:
+    python manage.py build_sitemaps
+"""
+
+from django.core.management.base import BaseCommand
+
+from pages.sitemap_files import build_sitemap_files
+
+
+class Command(BaseCommand):
+    help = "Build the gzipped sitemap index and section files into storage"
+
+    def handle(self, *args, **options):
+        written = build_sitemap_files()
+        self.stdout.write(self.style.SUCCESS(f"Built {len(written)} sitemap files"))
@@ -0,0 +1,148 @@
+"""
+Prebuilt sitemap files.
+
+The sitemap views used to build every section on request: blog templates
+were walked and stat'ed, each album counted its photos, and each photo
+looked up a public album for its URL. build_sitemap_files() now does that
+work once and writes gzip-compressed files to default storage (S3 in
+production, so the web and Celery containers share them):
+
+    sitemaps/sitemap.xml.gz                 the index, written last
+    sitemaps/sitemap-<section>.xml.gz       page 1 of each section
+    sitemaps/sitemap-<section>-<n>.xml.gz   further pages (?p=<n>)
+
+The index's lastmod for each file is the newest lastmod of the URLs in it.
+sitemap_file in pages.views serves the files without any database queries.
+
+Files are rebuilt on deploy (the build_sitemaps command), daily by the
+rebuild_and_cache_sitemap task, and shortly after public album content
+changes (schedule_sitemap_build, called from photos.signals).
+"""
+
+import gzip
+import logging
+import os
+import posixpath
+
+from django.contrib.sitemaps.views import SitemapIndexItem
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_DIR = "sitemaps"
+INDEX_FILE = "sitemap.xml"
+BUILD_DELAY_SECONDS = 300
+BUILD_SCHEDULED_KEY = "sitemaps:build_scheduled"
+
+
+def sitemap_file_name(section=None, page=1):
+    """Storage name of the index (no section) or of one page of a section."""
+    if section is None:
+        name = INDEX_FILE
+    elif page == 1:
+        name = f"sitemap-{section}.xml"
+    else:
+        name = f"sitemap-{section}-{page}.xml"
+    return posixpath.join(SITEMAP_DIR, f"{name}.gz")
+
+
+def _write(name, content):
+    """Replace a sitemap file so that readers see either the old or the new file, never neither."""
+    data = gzip.compress(content.encode("utf-8"), mtime=0)
+    if getattr(default_storage, "file_overwrite", False):
+        default_storage.save(name, ContentFile(data))
+        return
+
+    # FileSystemStorage would save under a new name rather than replace the file,
+    # so the new file is saved beside it and renamed over it
+    temp_name = default_storage.save(f"{name}.tmp", ContentFile(data))
+    try:
+        os.replace(default_storage.path(temp_name), default_storage.path(name))
+    except NotImplementedError:
+        # No local paths; only the storage API is left
+        default_storage.delete(temp_name)
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(data))
+
+
+def build_sitemap_files():
+    """
+    Render every sitemap section and the index into storage.
+
+    Returns:
+        list: Storage names written, the index last
+    """
+    from config.sitemaps import sitemaps
+
+    site = Site.objects.get_current()
+    written = []
+    index_items = []
+
+    for section, sitemap_class in sitemaps.items():
+        sitemap = sitemap_class() if callable(sitemap_class) else sitemap_class
+        protocol = sitemap.get_protocol()
+        for page in sitemap.paginator.page_range:
+            urls = sitemap.get_urls(page=page, site=site, protocol=protocol)
+            name = sitemap_file_name(section, page)
+            _write(name, render_to_string("sitemap.xml", {"urlset": urls}))
+            written.append(name)
+
+            location = reverse("sitemap_section", kwargs={"section": section})
+            if page > 1:
+                location += f"?p={page}"
+            last_mod = max((url["lastmod"] for url in urls if url.get("lastmod")), default=None)
+            index_items.append(SitemapIndexItem(f"{protocol}://{site.domain}{location}", last_mod))
+
+    index_name = sitemap_file_name()
+    _write(index_name, render_to_string("sitemap_index.xml", {"sitemaps": index_items}))
+    written.append(index_name)
+
+    # Sections can shrink by a page; drop files the new index no longer lists
+    _, existing = default_storage.listdir(SITEMAP_DIR)
+    for filename in existing:
+        name = posixpath.join(SITEMAP_DIR, filename)
+        if name not in written:
+            default_storage.delete(name)
+
+    logger.info(f"Built {len(written)} sitemap files")
+    return written
+
+
+def read_sitemap_file(name):
+    """Gzipped bytes of a built sitemap file, or None if it hasn't been built."""
+    try:
+        with default_storage.open(name, "rb") as f:
+            return f.read()
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def schedule_sitemap_build():
+    """
+    Rebuild the sitemap files in BUILD_DELAY_SECONDS; further calls until then are folded into it.
+
+    Queued once the current transaction commits. Never raises: if the broker
+    is unavailable the daily rebuild picks the change up instead.
+    """
+    transaction.on_commit(_queue_sitemap_build)
+
+
+def _queue_sitemap_build():
+    from pages.tasks import rebuild_and_cache_sitemap
+
+    try:
+        if cache.add(BUILD_SCHEDULED_KEY, True, BUILD_DELAY_SECONDS):
+            try:
+                rebuild_and_cache_sitemap.apply_async(countdown=BUILD_DELAY_SECONDS)
+            except Exception:
+                # Let the next change try again instead of waiting out the debounce window
+                cache.delete(BUILD_SCHEDULED_KEY)
+                raise
+    except Exception as e:
+        logger.warning(f"Could not schedule sitemap build: {e}")
@@ -1,8 +1,12 @@
+import gzip
 from unittest.mock import mock_open, patch
 
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.test import Client, TestCase
 
+from pages.sitemap_files import build_sitemap_files
+from photos.models import PhotoAlbum
 from photos.tests.factories import PhotoFactory
 
 
@@ -68,6 +72,65 @@ class RobotsTxtViewTest(TestCase):
         self.assertIn("Disallow: /admin/", response.content.decode())
 
 
+class SitemapFileViewTest(TestCase):
+    """Test building and serving the prebuilt sitemap files."""
+
+    def setUp(self):
+        self.client = Client()
+        self.album = PhotoAlbum.objects.create(title="Public Album", is_private=False)
+        PhotoAlbum.objects.create(title="Private Album", is_private=True)
+        self.written = build_sitemap_files()
+        self.addCleanup(lambda: [default_storage.delete(name) for name in self.written])
+
+    def test_index_lists_every_section(self):
+        response = self.client.get("/sitemap.xml")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/xml")
+        content = response.content.decode()
+        for section in ("static", "blog", "photo_albums", "photos"):
+            self.assertIn(f"/sitemap-{section}.xml</loc>", content)
+
+    def test_section_is_served_gzipped(self):
+        response = self.client.get("/sitemap-photo_albums.xml", HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = gzip.decompress(response.content).decode()
+        self.assertIn(f"/photos/album/{self.album.slug}/</loc>", content)
+        self.assertNotIn("private-album", content)
+
+    def test_gzip_refused_by_quality_is_not_sent(self):
+        for accept_encoding in ("gzip;q=0, deflate", "identity", "*;q=0", "br, gzip;q=0, *;q=0.5"):
+            response = self.client.get("/sitemap-photo_albums.xml", HTTP_ACCEPT_ENCODING=accept_encoding)
+
+            self.assertFalse(response.has_header("Content-Encoding"), accept_encoding)
+            self.assertIn(f"/photos/album/{self.album.slug}/</loc>", response.content.decode())
+
+        response = self.client.get("/sitemap-photo_albums.xml", HTTP_ACCEPT_ENCODING="deflate, *;q=0.5")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_rebuild_replaces_files_in_place(self):
+        PhotoAlbum.objects.create(title="Second Album", is_private=False)
+
+        with patch("pages.sitemap_files.default_storage.delete", wraps=default_storage.delete) as mock_delete:
+            self.assertEqual(build_sitemap_files(), self.written)
+
+        # The live files are renamed over, never deleted first
+        deleted = {call.args[0] for call in mock_delete.call_args_list}
+        self.assertFalse(deleted & set(self.written))
+        self.assertEqual(
+            sorted(default_storage.listdir("sitemaps")[1]), sorted(name.split("/")[1] for name in self.written)
+        )
+        response = self.client.get("/sitemap-photo_albums.xml")
+        self.assertIn("/photos/album/second-album/</loc>", response.content.decode())
+
+    def test_unknown_section_and_page_are_not_found(self):
+        self.assertEqual(self.client.get("/sitemap-unknown.xml").status_code, 404)
+        self.assertEqual(self.client.get("/sitemap-photos.xml", {"p": "2"}).status_code, 404)
+        self.assertEqual(self.client.get("/sitemap-photos.xml", {"p": "x"}).status_code, 404)
+
+
 class ResumeViewTest(TestCase):
     """Test resume serving functionality."""
 
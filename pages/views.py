@@ -1,16 +1,18 @@
+import gzip
 import logging
 import os
 
 from django.conf import settings
 from django.core.cache import cache
 from django.db import connection
-from django.db.models import Count
 from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
 
 from blog.utils import get_all_blog_posts, get_blog_from_template_name
+from pages.sitemap_files import read_sitemap_file, sitemap_file_name
 from pages.utils import get_books, get_projects
 from photos.models import PhotoAlbum
+from utils.middleware import gzip_exempt
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +57,55 @@ def robotstxt(request):
     return HttpResponse(content, content_type="text/plain")
 
 
+def _accepts_gzip(accept_encoding):
+    """
+    Whether an Accept-Encoding header allows gzip.
+
+    "gzip;q=0" refuses it; a "*" entry covers gzip when gzip isn't listed.
+    """
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, *params = (part.strip() for part in coding.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+    quality = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return quality > 0
+
+
+@gzip_exempt
+def sitemap_file(request, section=None):
+    """
+    Serve a prebuilt sitemap (the index when no section is given) from pages.sitemap_files.
+
+    The stored gzip bytes are sent as they are to clients that accept gzip;
+    GZipMiddleware leaves the response alone so "gzip;q=0" is honoured.
+    """
+    page = request.GET.get("p", "1")
+    if not page.isdigit() or int(page) < 1:
+        raise Http404("Invalid sitemap page")
+
+    data = read_sitemap_file(sitemap_file_name(section, int(page)))
+    if data is None:
+        raise Http404("Sitemap not built")
+
+    if _accepts_gzip(request.headers.get("Accept-Encoding", "")):
+        response = HttpResponse(data, content_type="application/xml")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(gzip.decompress(data), content_type="application/xml")
+    response["Vary"] = "Accept-Encoding"
+    response["Cache-Control"] = "public, max-age=3600"
+    response["X-Robots-Tag"] = "noindex, noodp, noarchive"
+    return response
+
+
 def resume(request):
     """Serve resume PDF file if enabled in settings, otherwise show unavailable page."""
     if not getattr(settings, "RESUME_ENABLED", False):
@@ -76,6 +127,22 @@ def resume(request):
         raise Http404("Error serving resume") from None
 
 
+# Everything the home album grid renders, including what responsive_image needs from the cover
+HOME_ALBUM_FIELDS = (
+    "title",
+    "slug",
+    "photo_count",
+    "cover_photo__uuid",
+    "cover_photo__image",
+    "cover_photo__image_thumbnail",
+    "cover_photo__image_preview",
+    "cover_photo__variants",
+    "cover_photo__original_filename",
+    "cover_photo__width",
+    "cover_photo__height",
+)
+
+
 def home(request):
     """
     Display home page with blog posts, projects, books, and photo albums.
@@ -145,32 +212,19 @@ def home(request):
             # Handle errors gracefully - provide empty list as fallback
             books = []
 
-    # Photo Albums (24 hour cache)
-    albums_cache_key = "home_albums_v1"
-    album_data = cache.get(albums_cache_key)
-
-    if not album_data:
-        try:
-            albums = (
-                PhotoAlbum.objects.filter(is_private=False)
-                .annotate(photo_count=Count("photos"))
-                .order_by("-created_at")
-            )
-
-            album_data = []
-            for album in albums:
-                # Get random cover photo using database-level selection
-                cover_photo = album.photos.order_by("?").first()
-                album_data.append(
-                    {
-                        "album": album,
-                        "cover_photo": cover_photo,
-                        "photo_count": album.photo_count,
-                    }
-                )
-            cache.set(albums_cache_key, album_data, 86400)  # Cache for 24 hours
-        except Exception:
-            album_data = []
+    # Photo Albums: count and cover are precomputed on the album, so this is a single query
+    try:
+        albums = (
+            PhotoAlbum.objects.filter(is_private=False)
+            .select_related("cover_photo")
+            .only(*HOME_ALBUM_FIELDS)
+            .order_by("-created_at")
+        )
+        album_data = [
+            {"album": album, "cover_photo": album.cover_photo, "photo_count": album.photo_count} for album in albums
+        ]
+    except Exception:
+        album_data = []
 
     return render(
         request,
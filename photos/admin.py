@@ -5,8 +5,12 @@ from django.db.models import Count
 from django.urls import path, reverse
 from django.utils.html import format_html
 
+from .facets import FACET_LABELS, ordered_values
 from .forms import PhotoAlbumForm
-from .models import AlbumPhoto, Photo, PhotoAlbum
+from .hash_index import get_index
+from .models import AlbumPhoto, Photo, PhotoAlbum, PhotoFacetCount
+from .processing import DONE_STATES
+from .share_analytics import pending_share_access, share_access_totals
 
 logger = logging.getLogger(__name__)
 
@@ -57,16 +61,9 @@ class DuplicateFilter(admin.SimpleListFilter):
 
     def _get_similar_only_ids(self, queryset, exact_duplicate_ids):
         """Get IDs of photos with similar images but no exact duplicates."""
-        similar_ids = set()
-        candidates = (
-            queryset.exclude(id__in=exact_duplicate_ids)
-            .exclude(perceptual_hash="")
-            .exclude(perceptual_hash__isnull=True)
-        )
-        for photo in candidates.iterator():
-            if photo.get_similar_images(threshold=5):
-                similar_ids.add(photo.id)
-        return similar_ids
+        # One vectorized pass over all hashes instead of a similarity search per photo
+        similar_ids = get_index().ids_with_similar(threshold=5) - exact_duplicate_ids
+        return set(queryset.filter(id__in=similar_ids).values_list("id", flat=True))
 
     def queryset(self, request, queryset):
         if not self.value():
@@ -87,6 +84,30 @@ class DuplicateFilter(admin.SimpleListFilter):
             return queryset.exclude(id__in=exclude_ids)
 
 
+class FacetFilter(admin.SimpleListFilter):
+    """Filter photos by a facet value; the choices come from the precomputed library counts."""
+
+    facet = None
+
+    def lookups(self, request, model_admin):
+        counts = dict(PhotoFacetCount.objects.filter(album=None, facet=self.facet).values_list("value", "count"))
+        return [(item["value"], f"{item['value']} ({item['count']})") for item in ordered_values(self.facet, counts)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(facet_values__contains={self.facet: self.value()})
+        return queryset
+
+
+def facet_filter(facet):
+    """A FacetFilter subclass for one facet."""
+    return type(
+        f"{facet.title().replace('_', '')}FacetFilter",
+        (FacetFilter,),
+        {"facet": facet, "title": FACET_LABELS[facet].lower(), "parameter_name": facet},
+    )
+
+
 @admin.register(Photo)
 class PhotoAdmin(admin.ModelAdmin):
     list_display = (
@@ -104,8 +125,7 @@ class PhotoAdmin(admin.ModelAdmin):
         DuplicateFilter,
         "created_at",
         "updated_at",
-        "camera_make",
-        "camera_model",
+        *(facet_filter(facet) for facet in ("camera", "lens", "focal_length", "aperture", "iso")),
     )
     search_fields = (
         "original_filename",
@@ -245,6 +265,10 @@ class PhotoAdmin(admin.ModelAdmin):
             "failed": ("🔴", "Failed", "#dc3545"),
         }
         icon, text, color = status_map.get(obj.processing_status, ("⚪", "Unknown", "#6c757d"))
+        stages = obj.processing_stages or {}
+        if obj.processing_status == "processing" and stages:
+            done = sum(state in DONE_STATES for state in stages.values())
+            text = f"{text} ({done}/{len(stages)} stages)"
         return format_html('<span style="color: {};">{} {}</span>', color, icon, text)
 
     @admin.action(description="Add selected photos to album")
@@ -732,21 +756,19 @@ class PhotoAdmin(admin.ModelAdmin):
 
     @admin.action(description="Reprocess selected photos")
     def reprocess_images(self, request, queryset):
-        """Reprocess selected photos, regenerating all image versions and re-extracting metadata."""
-        from photos.tasks import process_photo_async
+        """
+        Reprocess selected photos, re-extracting metadata and regenerating image versions.
 
-        count = 0
-        skipped = 0
+        Variants whose content key is unchanged are reused rather than encoded again.
+        """
+        from photos.ingest import queue_processing
 
-        for photo in queryset:
-            if not photo.image:
-                skipped += 1
-                continue
+        photo_ids = list(queryset.exclude(image="").values_list("pk", flat=True))
+        skipped = queryset.count() - len(photo_ids)
 
-            photo.processing_status = "pending"
-            photo.save(update_fields=["processing_status"])
-            process_photo_async.delay(photo.pk, force=True)
-            count += 1
+        Photo.objects.filter(pk__in=photo_ids).update(processing_status="pending")
+        queue_processing(photo_ids, force=True)
+        count = len(photo_ids)
 
         if count > 0:
             messages.success(request, f"Queued {count} photo(s) for reprocessing")
@@ -780,7 +802,7 @@ class PhotoAdmin(admin.ModelAdmin):
             **self.admin_site.each_context(request),
             "title": "Bulk Photo Upload",
             "albums": albums,
-            "upload_api_url": reverse("photos:upload_photo_api"),
+            "upload_api_url": reverse("photos:bulk_upload_api"),
             "opts": self.model._meta,
         }
         return render(request, "admin/photos/photo/bulk_upload.html", context)
@@ -816,17 +838,17 @@ class PhotoAdmin(admin.ModelAdmin):
             photo.focal_point_override = True
             photo.save()
 
-            # Trigger async reprocess to regenerate image versions with new focal point
-            from photos.tasks import process_photo_async
+            # Only the thumbnail and cropped variants depend on the focal point
+            from photos.tasks import recrop_photo_async
 
-            process_photo_async.delay(photo.pk, force=True)
+            recrop_photo_async.delay(photo.pk)
 
             return JsonResponse(
                 {
                     "success": True,
                     "focal_x": focal_x,
                     "focal_y": focal_y,
-                    "message": "Focal point updated. Reprocessing image...",
+                    "message": "Focal point updated. Regenerating crops...",
                 }
             )
 
@@ -898,6 +920,7 @@ class PhotoAlbumAdmin(admin.ModelAdmin):
         "downloads_status",
         "allow_downloads",
         "zip_status",
+        "share_views",
         "created_at",
         "updated_at",
     )
@@ -907,6 +930,7 @@ class PhotoAlbumAdmin(admin.ModelAdmin):
     readonly_fields = (
         "created_at",
         "updated_at",
+        "photos_changed_at",
         "share_url_display",
         "share_analytics",
         "zip_status_display",
@@ -932,7 +956,7 @@ class PhotoAlbumAdmin(admin.ModelAdmin):
         album.refresh_from_db()
         hash_after = album.compute_zip_content_hash()
 
-        if hash_before != hash_after and album.allow_downloads and album.photos.exists():
+        if hash_before != hash_after and album.allow_downloads and album.zip_mode != "stream" and album.photos.exists():
             from photos.tasks import schedule_zip_generation
 
             album.zip_generation_status = "pending"
@@ -945,7 +969,7 @@ class PhotoAlbumAdmin(admin.ModelAdmin):
         (
             "Settings",
             {
-                "fields": ("is_private", "allow_downloads"),
+                "fields": ("is_private", "allow_downloads", "zip_mode"),
                 "description": "Privacy and download settings for this album",
             },
         ),
@@ -965,14 +989,10 @@ class PhotoAlbumAdmin(admin.ModelAdmin):
         ),
         (
             "Metadata",
-            {"fields": ("created_at", "updated_at"), "classes": ("collapse",)},
+            {"fields": ("created_at", "updated_at", "photos_changed_at"), "classes": ("collapse",)},
         ),
     )
 
-    @admin.display(description="Photos")
-    def photo_count(self, obj):
-        return obj.photos.count()
-
     @admin.display(
         description="Privacy",
         ordering="is_private",
@@ -1010,6 +1030,9 @@ class PhotoAlbumAdmin(admin.ModelAdmin):
         if not obj.allow_downloads:
             return "Downloads disabled for this album"
 
+        if obj.zip_mode == "stream":
+            return "Streamed on download, nothing to generate"
+
         if obj.zip_generation_status == "none":
             return "No ZIP generated yet"
         elif obj.zip_generation_status == "pending":
@@ -1039,7 +1062,7 @@ class PhotoAlbumAdmin(admin.ModelAdmin):
         from photos.tasks import generate_album_zip
 
         count = 0
-        for album in queryset.filter(allow_downloads=True):
+        for album in queryset.filter(allow_downloads=True).exclude(zip_mode="stream"):
             generate_album_zip.delay(album.id, force=True)
             count += 1
 
@@ -1063,17 +1086,34 @@ class PhotoAlbumAdmin(admin.ModelAdmin):
             url,
         )
 
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+        # Buffered share views for the whole page in one pipelined HMGET instead of one round-trip per row
+        albums = list(changelist.result_list)
+        pending = pending_share_access(album.pk for album in albums if album.is_private)
+        for album in albums:
+            album.pending_share_access = pending.get(album.pk, (0, None))
+        return changelist
+
+    @admin.display(description="Share views")
+    def share_views(self, obj):
+        if not obj.is_private:
+            return "—"
+        return share_access_totals(obj, getattr(obj, "pending_share_access", None))[0]
+
     @admin.display(description="Share Analytics")
     def share_analytics(self, obj):
         if not obj.is_private:
             return "—"
 
-        if obj.share_access_count == 0:
+        # Stored counts plus views still buffered in Redis
+        view_count, last_accessed = share_access_totals(obj)
+        if view_count == 0:
             return "No views yet"
 
-        last_accessed = obj.share_last_accessed.strftime("%Y-%m-%d %H:%M") if obj.share_last_accessed else "Never"
+        last_accessed = last_accessed.strftime("%Y-%m-%d %H:%M") if last_accessed else "Never"
         return format_html(
             "<strong>{}</strong> views<br><small>Last accessed: {}</small>",
-            obj.share_access_count,
+            view_count,
             last_accessed,
         )
@@ -0,0 +1,160 @@
+"""
+Cached album pages.
+
+Rendering album_detail means one query for the album's photos plus a
+storage URL per photo and per variant, which adds up on a large album. The
+work is cached at three levels, all tied to an album content version:
+
+version   A hash of everything the page shows: the album's own fields and,
+          in display order, each photo's id, featured flag and image,
+          thumbnail, preview and variant names. It is cached per slug and
+          deleted by photos.signals whenever the album, its photos or their
+          memberships change, so the next request computes a new one.
+grid      The rendered photo grid and lightbox data for one version, shared
+          by every viewer (anonymous, token and staff).
+page      The full page for anonymous visitors, keyed by version and host.
+          A hit costs two cache reads and no database queries; clients that
+          send the version back in If-None-Match get a 304.
+
+Only public albums are served from the version without a database lookup;
+the version entry records whether the album was public when computed.
+"""
+
+import hashlib
+import json
+import logging
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+logger = logging.getLogger(__name__)
+
+ALBUM_CACHE_TIMEOUT = 60 * 60 * 24  # 1 day; invalidation is version based
+
+# Every photo field the grid renders (and orders by)
+GRID_PHOTO_FIELDS = (
+    "photo__id",
+    "photo__uuid",
+    "photo__image",
+    "photo__image_thumbnail",
+    "photo__image_preview",
+    "photo__variants",
+    "photo__original_filename",
+    "photo__width",
+    "photo__height",
+    "photo__date_taken",
+    "photo__created_at",
+)
+GRID_ORDERING = ("display_order", "-photo__date_taken", "-photo__created_at")
+
+
+def _version_key(slug):
+    return f"photos:album:version:{slug}"
+
+
+def _grid_key(version):
+    return f"photos:album:grid:{version}"
+
+
+def _page_key(version, origin):
+    return f"photos:album:page:{version}:{hashlib.sha256(origin.encode()).hexdigest()[:16]}"
+
+
+def _grid_rows(album):
+    return album.album_photos.select_related("photo").only("is_featured", "display_order", *GRID_PHOTO_FIELDS)
+
+
+def compute_album_version(album):
+    """Hash of the album fields and photo rows the album page is rendered from."""
+    rows = (
+        album.album_photos.order_by(*GRID_ORDERING)
+        .values_list(
+            "photo_id",
+            "is_featured",
+            "photo__image",
+            "photo__image_thumbnail",
+            "photo__image_preview",
+            "photo__variants",
+            "photo__original_filename",
+        )
+        .iterator()
+    )
+    payload = {
+        "album": [
+            album.pk,
+            album.slug,
+            album.title,
+            album.description,
+            album.is_private,
+            album.allow_downloads,
+            album.zip_download_available,
+            album.created_at.isoformat(),
+        ],
+        "photos": list(rows),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def cached_album_version(slug):
+    """The cached {"version", "public"} entry for a slug, or None."""
+    return cache.get(_version_key(slug))
+
+
+def get_album_version(album):
+    """Current content version of an album, computed and cached on a miss."""
+    entry = cached_album_version(album.slug)
+    if entry is None:
+        entry = {"version": compute_album_version(album), "public": not album.is_private}
+        cache.set(_version_key(album.slug), entry, ALBUM_CACHE_TIMEOUT)
+    return entry["version"]
+
+
+def invalidate_album_pages(*slugs):
+    """Drop the cached versions of these albums; their pages and grids are rebuilt on the next request."""
+    slugs = [slug for slug in slugs if slug]
+    if slugs:
+        cache.delete_many([_version_key(slug) for slug in slugs])
+
+
+def get_album_grid(album, version):
+    """
+    Rendered grid for one album version.
+
+    Returns:
+        dict: count, photo_ids (display order), grid_html, photos_js and
+              cover_url (first featured photo, else first photo)
+    """
+    key = _grid_key(version)
+    grid = cache.get(key)
+    if grid is not None:
+        return grid
+
+    album_photos = list(_grid_rows(album).order_by(*GRID_ORDERING))
+    photos_data = [{"photo": ap.photo, "is_featured": ap.is_featured} for ap in album_photos]
+
+    cover_photo = next((ap.photo for ap in album_photos if ap.is_featured), None)
+    if cover_photo is None and album_photos:
+        cover_photo = album_photos[0].photo
+    cover_url = None
+    if cover_photo:
+        cover_url = cover_photo.get_image_url("thumbnail") or cover_photo.get_image_url("preview")
+
+    grid = {
+        "count": len(photos_data),
+        "photo_ids": [item["photo"].pk for item in photos_data],
+        "grid_html": render_to_string("photos/_album_grid.html", {"photos_data": photos_data}),
+        "photos_js": render_to_string("photos/_album_photos_js.html", {"photos_data": photos_data}),
+        "cover_url": cover_url,
+    }
+    cache.set(key, grid, ALBUM_CACHE_TIMEOUT)
+    logger.debug(f"Rendered grid for album {album.pk} ({len(photos_data)} photos)")
+    return grid
+
+
+def get_cached_page(version, origin):
+    """Rendered anonymous album page (bytes) for a version, or None."""
+    return cache.get(_page_key(version, origin))
+
+
+def store_cached_page(version, origin, html):
+    cache.set(_page_key(version, origin), html, ALBUM_CACHE_TIMEOUT)
@@ -0,0 +1,167 @@
+"""
+Metadata-only EXIF backfill.
+
+The only way to re-extract EXIF used to be a full reprocess, which downloads
+and decodes every original and encodes all of its variants again.
+backfill_exif() refreshes just the EXIF fields of a batch of photos:
+
+1. the first EXIF_HEADER_BYTES of each original are fetched with a ranged
+   read (a ranged GetObject on S3), READ_WORKERS at a time,
+2. the headers are parsed in the shared worker process pool; a file whose
+   header runs past the range is read in full and parsed again,
+3. photos whose fields changed are written with a single bulk_update(), and
+   the album pages showing them are invalidated (date_taken orders the grid),
+   as are the map clusters of albums with a photo whose location changed,
+   and the facet counts of photos whose facet values changed are adjusted
+   (bulk_update() sends no signals).
+
+Usage:
+    counts = backfill_exif(Photo.objects.filter(pk__in=ids))
+"""
+
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.utils import timezone
+
+from photos.album_cache import invalidate_album_pages
+from photos.facets import apply_facet_changes, facet_changes
+from photos.geo import invalidate_map_clusters
+from photos.image_utils import EXIF_HEADER_BYTES, _get_variant_executor, read_exif_header
+from photos.ingest import _outcome
+from photos.models import AlbumPhoto, Photo, PhotoAlbum
+from photos.zip_stream import open_read_stream
+
+logger = logging.getLogger(__name__)
+
+READ_WORKERS = 16
+
+
+def _read(photo, full=False):
+    """(data, complete): the original's first EXIF_HEADER_BYTES, or all of it."""
+    if full:
+        with open_read_stream(photo.image) as (stream, _size):
+            return stream.read(), True
+    with open_read_stream(photo.image, 0, EXIF_HEADER_BYTES) as (stream, _size):
+        data = stream.read(EXIF_HEADER_BYTES)
+    return data, len(data) < EXIF_HEADER_BYTES
+
+
+def _read_all(photos, full=False):
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as pool:
+        return list(pool.map(lambda photo: _outcome(partial(_read, photo, full)), photos))
+
+
+def _parse_all(reads):
+    """read_exif_header() for each (data, complete) in the worker pool; errors are returned, not raised."""
+    try:
+        executor = _get_variant_executor()
+        futures = [executor.submit(read_exif_header, data, complete) for data, complete in reads]
+        return [_outcome(future.result) for future in futures]
+    except BrokenProcessPool:
+        logger.warning("Worker pool broke while parsing EXIF; parsing in this process")
+        _get_variant_executor.cache_clear()
+        return [_outcome(partial(read_exif_header, data, complete)) for data, complete in reads]
+
+
+def _extract(photos, full=False):
+    """extract_exif()-style dicts (or the exception) for photos, in order."""
+    results = [None] * len(photos)
+    reads = _read_all(photos, full)
+    pending = []
+    for index, read in enumerate(reads):
+        if isinstance(read, Exception):
+            results[index] = read
+        else:
+            pending.append(index)
+
+    for index, parsed in zip(pending, _parse_all([reads[index] for index in pending]), strict=True):
+        results[index] = parsed
+    return results
+
+
+def _apply_facet_changes(photos, previous_facets):
+    """Move the facet counts of photos whose facet_values were bulk-updated."""
+    album_ids = defaultdict(list)
+    memberships = AlbumPhoto.objects.filter(photo__in=[photo.pk for photo in photos]).values_list(
+        "photo_id", "album_id"
+    )
+    for photo_id, album_id in memberships:
+        album_ids[photo_id].append(album_id)
+    apply_facet_changes(
+        change
+        for photo in photos
+        for change in facet_changes(album_ids[photo.pk], previous_facets[photo.pk], photo.facet_values)
+    )
+
+
+def backfill_exif(photos, batch_size=500):
+    """
+    Re-extract EXIF for a batch of photos and save the fields that changed.
+
+    Photos without EXIF keep their current values, as in Photo._process_image().
+
+    Args:
+        photos: Photo instances or queryset (loaded with at least image and Photo.EXIF_FIELDS)
+        batch_size: Rows per UPDATE statement
+
+    Returns:
+        dict: Counts of updated, unchanged, skipped (no image or no EXIF) and failed photos
+    """
+    photos = list(photos)
+    counts = {"updated": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    with_image = []
+    for photo in photos:
+        if photo.image:
+            with_image.append(photo)
+        else:
+            counts["skipped"] += 1
+
+    results = _extract(with_image)
+    truncated = [index for index, result in enumerate(results) if result is None]
+    if truncated:
+        logger.debug(f"Reading {len(truncated)} original(s) in full; their EXIF did not fit in the header range")
+        for index, result in zip(truncated, _extract([with_image[i] for i in truncated], full=True), strict=True):
+            results[index] = result
+
+    changed_photos, changed_fields, moved_ids, previous_facets = [], set(), [], {}
+    for photo, result in zip(with_image, results, strict=True):
+        if isinstance(result, Exception):
+            logger.warning(f"Could not read EXIF for photo {photo.pk}: {result}")
+            counts["failed"] += 1
+            continue
+        if not result:
+            counts["skipped"] += 1
+            continue
+        facet_values = photo.facet_values
+        if changed := photo.apply_exif(result):
+            photo.updated_at = timezone.now()
+            changed_photos.append(photo)
+            changed_fields.update(changed)
+            if "geohash" in changed:
+                moved_ids.append(photo.pk)
+            if "facet_values" in changed:
+                previous_facets[photo.pk] = facet_values
+        else:
+            counts["unchanged"] += 1
+
+    if changed_photos:
+        Photo.objects.bulk_update(changed_photos, [*sorted(changed_fields), "updated_at"], batch_size=batch_size)
+        counts["updated"] = len(changed_photos)
+        slugs = (
+            PhotoAlbum.objects.filter(photos__in=[photo.pk for photo in changed_photos])
+            .values_list("slug", flat=True)
+            .distinct()
+        )
+        invalidate_album_pages(*slugs)
+        if moved_ids:
+            invalidate_map_clusters(
+                PhotoAlbum.objects.filter(photos__in=moved_ids).values_list("pk", flat=True).distinct()
+            )
+        if previous_facets:
+            _apply_facet_changes([photo for photo in changed_photos if photo.pk in previous_facets], previous_facets)
+
+    return counts
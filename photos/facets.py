@@ -0,0 +1,265 @@
+"""
+Photo facets and their precomputed counts.
+
+Each photo's facet values (month taken, camera, lens and focal length,
+aperture and ISO buckets) are derived from its EXIF fields and stored on
+Photo.facet_values as {"facet": "value"}. A GIN index on that column turns a
+filter such as {"camera": "Canon EOS R5"} into an index lookup (jsonb @>).
+
+PhotoFacetCount holds how many photos have each facet value, library-wide
+(album NULL) and per album. The counts are kept current incrementally
+rather than recomputed with GROUP BY scans:
+
+- Photo.save() recomputes facet_values whenever an EXIF field is saved, and
+  photos.signals applies the difference to the library and to every album
+  the photo is in,
+- adding or removing an album photo adds or subtracts its values for that
+  album, and deleting a photo subtracts them everywhere,
+- apply_facet_changes() folds a batch of changes into one
+  INSERT ... ON CONFLICT DO UPDATE.
+
+facet_counts() answers unfiltered requests from the rollup with one indexed
+query and counts only the matching photos once filters are applied.
+rebuild_facet_counts() recomputes everything (the rebuild_photo_facets
+command) after bulk edits that send no signals.
+"""
+
+import logging
+from collections import Counter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FACETS = ("month", "camera", "lens", "focal_length", "aperture", "iso")
+FACET_LABELS = {
+    "month": "Month taken",
+    "camera": "Camera",
+    "lens": "Lens",
+    "focal_length": "Focal length",
+    "aperture": "Aperture",
+    "iso": "ISO",
+}
+
+# Photo fields facet_values is derived from
+SOURCE_FIELDS = ("date_taken", "camera_make", "camera_model", "lens_model", "focal_length", "aperture", "iso")
+
+# Bucket lower bounds; a value falls in [edge, next edge)
+FOCAL_LENGTH_EDGES = (16, 24, 35, 50, 85, 135, 200, 400)
+APERTURE_EDGES = (1.4, 2, 2.8, 4, 5.6, 8, 11, 16)
+ISO_EDGES = (100, 200, 400, 800, 1600, 3200, 6400, 12800)
+
+
+def _number(value):
+    """Leading number of a stored EXIF string such as "50mm", "f/2.8" or "400"."""
+    digits = ""
+    for char in str(value).removeprefix("f/"):
+        if not (char.isdigit() or char == "."):
+            break
+        digits += char
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
+
+def _bucket_labels(edges, prefix="", suffix=""):
+    """Labels of the buckets below, between and above edges, e.g. "<16mm", "16-24mm", ..., "400mm+"."""
+    labels = [f"<{prefix}{edges[0]:g}{suffix}"]
+    labels.extend(f"{prefix}{low:g}-{high:g}{suffix}" for low, high in zip(edges, edges[1:], strict=False))
+    labels.append(f"{prefix}{edges[-1]:g}{suffix}+")
+    return labels
+
+
+BUCKET_LABELS = {
+    "focal_length": _bucket_labels(FOCAL_LENGTH_EDGES, suffix="mm"),
+    "aperture": _bucket_labels(APERTURE_EDGES, prefix="f/"),
+    "iso": _bucket_labels(ISO_EDGES, prefix="ISO "),
+}
+BUCKET_EDGES = {"focal_length": FOCAL_LENGTH_EDGES, "aperture": APERTURE_EDGES, "iso": ISO_EDGES}
+
+
+def _bucket(facet, value):
+    number = _number(value) if value not in (None, "") else None
+    if not number:
+        return None
+    edges = BUCKET_EDGES[facet]
+    index = sum(number >= edge for edge in edges)
+    return BUCKET_LABELS[facet][index]
+
+
+def camera_name(make, model):
+    """Display name of a camera; the make is dropped when the model already starts with it."""
+    make, model = (make or "").strip(), (model or "").strip()
+    if make and model.lower().startswith(make.split()[0].lower()):
+        return model
+    return f"{make} {model}".strip()
+
+
+def facet_values_for(photo):
+    """
+    Photo.facet_values for a photo's current EXIF fields.
+
+    Returns:
+        dict: facet -> value, for the facets the photo has a value for
+    """
+    values = {
+        "month": timezone.localtime(photo.date_taken).strftime("%Y-%m") if photo.date_taken else None,
+        "camera": camera_name(photo.camera_make, photo.camera_model)[:255] or None,
+        "lens": (photo.lens_model or "").strip()[:255] or None,
+        "focal_length": _bucket("focal_length", photo.focal_length),
+        "aperture": _bucket("aperture", photo.aperture),
+        "iso": _bucket("iso", photo.iso),
+    }
+    return {facet: value for facet, value in values.items() if value}
+
+
+def facet_changes(album_ids, previous, current):
+    """
+    Count changes for a photo whose facet values went from previous to current.
+
+    Args:
+        album_ids: Albums to update besides the library (None)
+
+    Returns:
+        list: (album_id, facet, value, delta) tuples
+    """
+    changes = []
+    for facet in FACETS:
+        old, new = previous.get(facet), current.get(facet)
+        if old == new:
+            continue
+        for album_id in (None, *album_ids):
+            if old:
+                changes.append((album_id, facet, old, -1))
+            if new:
+                changes.append((album_id, facet, new, 1))
+    return changes
+
+
+def membership_changes(album_id, values, delta):
+    """Count changes for a photo with these facet values joining (delta 1) or leaving (-1) an album."""
+    return [(album_id, facet, value, delta) for facet, value in values.items()]
+
+
+def apply_facet_changes(changes):
+    """
+    Add count deltas to PhotoFacetCount with a single upsert.
+
+    Args:
+        changes: Iterable of (album_id or None, facet, value, delta)
+    """
+    from photos.models import PhotoFacetCount
+
+    totals = Counter()
+    for album_id, facet, value, delta in changes:
+        totals[(album_id, facet, value)] += delta
+    totals = {key: delta for key, delta in totals.items() if delta}
+    if not totals:
+        return
+
+    album_ids, facets, values = zip(*totals, strict=True)
+    table = PhotoFacetCount._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (album_id, facet, value, count)
+            SELECT * FROM unnest(%s::bigint[], %s::varchar[], %s::varchar[], %s::integer[])
+            ON CONFLICT ON CONSTRAINT photo_facet_count_unique
+            DO UPDATE SET count = {table}.count + EXCLUDED.count
+            """,  # nosec B608 - table name comes from model meta
+            [list(album_ids), list(facets), list(values), list(totals.values())],
+        )
+        if min(totals.values()) < 0:
+            cursor.execute(f"DELETE FROM {table} WHERE count <= 0")  # nosec B608
+
+
+def rebuild_facet_counts():
+    """
+    Recompute every photo's facet_values and all of PhotoFacetCount.
+
+    Returns:
+        int: Number of photos whose facet_values changed
+    """
+    from photos.models import AlbumPhoto, Photo, PhotoFacetCount
+
+    changed = []
+    for photo in Photo.objects.only("pk", "facet_values", *SOURCE_FIELDS).iterator(chunk_size=2000):
+        values = facet_values_for(photo)
+        if values != photo.facet_values:
+            photo.facet_values = values
+            changed.append(photo)
+    Photo.objects.bulk_update(changed, ["facet_values"], batch_size=1000)
+
+    table = PhotoFacetCount._meta.db_table
+    photos = Photo._meta.db_table
+    album_photos = AlbumPhoto._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")  # nosec B608
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (album_id, facet, value, count)
+            SELECT NULL, facet.key, facet.value, count(*)
+            FROM {photos} AS photo, jsonb_each_text(photo.facet_values) AS facet
+            GROUP BY facet.key, facet.value
+            UNION ALL
+            SELECT member.album_id, facet.key, facet.value, count(*)
+            FROM {album_photos} AS member
+            JOIN {photos} AS photo ON photo.id = member.photo_id,
+            jsonb_each_text(photo.facet_values) AS facet
+            GROUP BY member.album_id, facet.key, facet.value
+            """  # nosec B608 - table names come from model meta
+        )
+
+    logger.info(f"Rebuilt photo facet counts ({len(changed)} photo(s) had stale facet values)")
+    return len(changed)
+
+
+def ordered_values(facet, counts):
+    """Facet values in display order: months by date, buckets by size, the rest by count."""
+    if facet == "month":
+        items = sorted(counts.items())
+    elif facet in BUCKET_LABELS:
+        order = {label: index for index, label in enumerate(BUCKET_LABELS[facet])}
+        items = sorted(counts.items(), key=lambda item: order.get(item[0], len(order)))
+    else:
+        items = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return [{"value": value, "count": count} for value, count in items]
+
+
+def facet_counts(photos, album=None, filters=None):
+    """
+    Photo counts per facet value.
+
+    Args:
+        photos: The Photo queryset being browsed (the library or album.photos)
+        album: The album photos belongs to, if any; selects its rollup rows
+        filters: Optional {facet: value}; counts then cover only matching photos
+
+    Returns:
+        dict: facet -> [{"value", "count"}, ...] for every facet in FACETS
+    """
+    from photos.models import Photo, PhotoFacetCount
+
+    counts = {facet: {} for facet in FACETS}
+    if filters:
+        sql, params = photos.filter(facet_values__contains=filters).values("pk").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT facet.key, facet.value, count(*)
+                FROM {Photo._meta.db_table} AS photo, jsonb_each_text(photo.facet_values) AS facet
+                WHERE photo.id IN ({sql})
+                GROUP BY facet.key, facet.value
+                """,  # nosec B608 - the subquery is compiled by the ORM
+                params,
+            )
+            rows = cursor.fetchall()
+    else:
+        rows = PhotoFacetCount.objects.filter(album=album).values_list("facet", "value", "count")
+
+    for facet, value, count in rows:
+        if facet in counts:
+            counts[facet][value] = count
+    return {facet: ordered_values(facet, values) for facet, values in counts.items()}
@@ -62,7 +62,7 @@ class PhotoBulkUploadForm(forms.Form):
                 'errors': List of (filename, error) tuples for failed uploads
             }
         """
-        from photos.tasks import process_photo_async
+        from photos.processing import INTERACTIVE_PRIORITY, queue_photo_processing
 
         images = self.cleaned_data["images"]
         album = self.cleaned_data.get("album")
@@ -98,7 +98,7 @@ class PhotoBulkUploadForm(forms.Form):
                         file_hash=duplicates.get("file_hash", ""),
                         perceptual_hash=duplicates.get("perceptual_hash", ""),
                     )
-                    process_photo_async.delay(photo.pk)
+                    queue_photo_processing([photo.pk], priority=INTERACTIVE_PRIORITY)
                 else:
                     photo.file_hash = duplicates.get("file_hash", "")
                     photo.perceptual_hash = duplicates.get("perceptual_hash", "")
@@ -122,4 +122,4 @@ class PhotoAlbumForm(forms.ModelForm):
 
     class Meta:
         model = PhotoAlbum
-        fields = ["title", "slug", "description", "is_private", "allow_downloads"]
+        fields = ["title", "slug", "description", "is_private", "allow_downloads", "zip_mode"]
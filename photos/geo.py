@@ -0,0 +1,328 @@
+"""
+Geohash index and map clusters for photo locations.
+
+Photo.geohash is the geohash of (gps_latitude, gps_longitude), kept in step
+with the coordinates by Photo.save() and Photo.apply_exif(). It is indexed
+with varchar_pattern_ops, so a prefix match (LIKE 'dr5r%') is an index
+range scan. Every geohash prefix names a cell that contains all longer
+hashes starting with it, which gives two cheap operations:
+
+bbox      photos_in_bbox() covers a bounding box with at most MAX_COVER_CELLS
+          cells of one precision, selects photos whose geohash starts with
+          one of them and trims the result to the exact box.
+clusters  build_map_clusters() groups an album's located photos by geohash
+          prefix at every precision up to MAX_CLUSTER_PRECISION and reduces
+          each group to its mean position, photo count and first photo.
+          PhotoAlbum.map_clusters stores the result, so a map request reads
+          one row and returns the clusters of its zoom level
+          (zoom_precision()) that fall inside its viewport.
+public    Only staff see exact positions. Everyone else gets clusters no
+          finer than PUBLIC_CLUSTER_PRECISION, each placed at the centre of
+          its cell, and album bounds snapped out to cells of that size
+          (public_clusters_in_bbox(), public_bounds()).
+
+photos.signals clears an album's clusters when photos are added or removed
+or a member photo moves, and schedule_map_cluster_build() rebuilds them
+shortly afterwards. A request that arrives first computes them without
+storing them; only the task writes map_clusters.
+
+Bounding boxes are (west, south, east, north) in degrees; west > east
+means the box crosses the antimeridian.
+"""
+
+import logging
+import math
+import operator
+from functools import reduce
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12  # ~4 cm cells
+MAX_COVER_CELLS = 32
+MAX_CLUSTER_PRECISION = 8  # ~38 x 19 m cells; the finest map zoom levels use these
+PUBLIC_CLUSTER_PRECISION = 4  # ~39 x 20 km cells; the finest positions shown to non-staff
+WORLD = (-180.0, -90.0, 180.0, 90.0)
+
+BUILD_DELAY_SECONDS = 60
+BUILD_SCHEDULED_KEY_PREFIX = "photos:map_clusters:scheduled:"
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point."""
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True  # bits alternate longitude, latitude, starting with longitude
+    while len(chars) < precision:
+        bounds, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            bounds[0] = mid
+        else:
+            bits *= 2
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def geohash_for(latitude, longitude):
+    """Photo.geohash for a pair of coordinates; "" when either is missing."""
+    if latitude is None or longitude is None:
+        return ""
+    return encode(latitude, longitude)
+
+
+def _cell_bits(precision):
+    """(latitude bits, longitude bits) of a geohash of this length."""
+    return 5 * precision // 2, (5 * precision + 1) // 2
+
+
+def cell_size(precision):
+    """(latitude, longitude) span in degrees of a cell of this precision."""
+    lat_bits, lon_bits = _cell_bits(precision)
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def cell_bounds(geohash):
+    """(west, south, east, north) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lon_range if even else lat_range
+            mid = (bounds[0] + bounds[1]) / 2
+            if bits >> shift & 1:
+                bounds[0] = mid
+            else:
+                bounds[1] = mid
+            even = not even
+    return lon_range[0], lat_range[0], lon_range[1], lat_range[1]
+
+
+def parse_bbox(value):
+    """
+    Parse "west,south,east,north" (degrees).
+
+    Returns:
+        tuple: (west, south, east, north); WORLD when value is empty
+
+    Raises:
+        ValueError: If the box is malformed or out of range
+    """
+    if not value:
+        return WORLD
+    try:
+        west, south, east, north = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError("bbox must be west,south,east,north") from None
+    if not all(math.isfinite(part) for part in (west, south, east, north)):
+        raise ValueError("bbox must be west,south,east,north")
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("bbox is out of range")
+    return west, south, east, north
+
+
+def _boxes(bbox):
+    """Split a box that crosses the antimeridian in two."""
+    west, south, east, north = bbox
+    if west <= east:
+        return [bbox]
+    return [(west, south, 180.0, north), (-180.0, south, east, north)]
+
+
+def _cell_range(low, high, origin, span, count):
+    first = max(int((low - origin) // span), 0)
+    last = min(int((high - origin) // span), count - 1)
+    return range(first, last + 1)
+
+
+def covering_cells(bbox, max_cells=MAX_COVER_CELLS):
+    """
+    The finest set of at most max_cells geohash cells (of one precision) that covers a box.
+
+    Returns:
+        list: Sorted geohash prefixes
+    """
+    cells = []
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        lat_bits, lon_bits = _cell_bits(precision)
+        lat_span, lon_span = cell_size(precision)
+        grids = [
+            (
+                _cell_range(south, north, -90.0, lat_span, 2**lat_bits),
+                _cell_range(west, east, -180.0, lon_span, 2**lon_bits),
+            )
+            for west, south, east, north in _boxes(bbox)
+        ]
+        if sum(len(rows) * len(columns) for rows, columns in grids) > max_cells:
+            break
+        cells = sorted(
+            {
+                encode(-90.0 + (row + 0.5) * lat_span, -180.0 + (column + 0.5) * lon_span, precision)
+                for rows, columns in grids
+                for row in rows
+                for column in columns
+            }
+        )
+    return cells
+
+
+def photos_in_bbox(photos, bbox):
+    """Filter a Photo queryset to photos located inside a box, using the geohash index."""
+    west, south, east, north = bbox
+    cells = covering_cells(bbox)
+    photos = photos.filter(
+        reduce(operator.or_, (Q(geohash__startswith=cell) for cell in cells)),
+        gps_latitude__gte=south,
+        gps_latitude__lte=north,
+    )
+    if west <= east:
+        return photos.filter(gps_longitude__gte=west, gps_longitude__lte=east)
+    return photos.filter(Q(gps_longitude__gte=west) | Q(gps_longitude__lte=east))
+
+
+def zoom_precision(zoom):
+    """
+    Cluster precision for a web map zoom level.
+
+    A 256 px tile spans 360 / 2**zoom degrees of longitude; cells a quarter
+    of that wide leave a few cluster points per tile.
+    """
+    lon_bits = max(zoom, 0) + 2
+    return min(max(math.ceil(2 * lon_bits / 5), 1), MAX_CLUSTER_PRECISION)
+
+
+def build_map_clusters(rows):
+    """
+    Clusters of located photos at every precision up to MAX_CLUSTER_PRECISION.
+
+    Args:
+        rows: (photo_id, latitude, longitude, geohash) tuples; the first photo of each cluster represents it
+
+    Returns:
+        dict: {"count": photos, "bounds": [west, south, east, north] or None,
+               "precisions": {"<precision>": [[latitude, longitude, count, photo_id], ...]}}
+    """
+    rows = [(photo_id, float(lat), float(lon), geohash) for photo_id, lat, lon, geohash in rows if geohash]
+    precisions = {}
+    for precision in range(1, MAX_CLUSTER_PRECISION + 1):
+        groups = {}
+        for photo_id, lat, lon, geohash in rows:
+            group = groups.get(geohash[:precision])
+            if group is None:
+                groups[geohash[:precision]] = [lat, lon, 1, photo_id]
+            else:
+                group[0] += lat
+                group[1] += lon
+                group[2] += 1
+        precisions[str(precision)] = [
+            [round(lat / count, 6), round(lon / count, 6), count, photo_id]
+            for lat, lon, count, photo_id in groups.values()
+        ]
+
+    bounds = None
+    if rows:
+        latitudes = [row[1] for row in rows]
+        longitudes = [row[2] for row in rows]
+        bounds = [min(longitudes), min(latitudes), max(longitudes), max(latitudes)]
+    return {"count": len(rows), "bounds": bounds, "precisions": precisions}
+
+
+def _contains(bbox, lat, lon):
+    west, south, east, north = bbox
+    if not south <= lat <= north:
+        return False
+    return west <= lon <= east if west <= east else (lon >= west or lon <= east)
+
+
+def clusters_in_bbox(clusters, zoom, bbox=WORLD):
+    """
+    The stored clusters for a zoom level that lie inside a box.
+
+    Returns:
+        list: {"lat", "lon", "count", "photo_id"} dicts
+    """
+    points = clusters.get("precisions", {}).get(str(zoom_precision(zoom)), [])
+    return [
+        {"lat": lat, "lon": lon, "count": count, "photo_id": photo_id}
+        for lat, lon, count, photo_id in points
+        if _contains(bbox, lat, lon)
+    ]
+
+
+def public_clusters_in_bbox(clusters, zoom, bbox=WORLD):
+    """
+    clusters_in_bbox() for non-staff: no finer than PUBLIC_CLUSTER_PRECISION, each at its cell centre.
+
+    A cluster's mean position lies inside its own cell, so re-encoding it
+    gives the cluster's geohash prefix back.
+    """
+    precision = min(zoom_precision(zoom), PUBLIC_CLUSTER_PRECISION)
+    points = []
+    for lat, lon, count, photo_id in clusters.get("precisions", {}).get(str(precision), []):
+        west, south, east, north = cell_bounds(encode(lat, lon, precision))
+        centre_lat, centre_lon = (south + north) / 2, (west + east) / 2
+        if _contains(bbox, centre_lat, centre_lon):
+            points.append({"lat": centre_lat, "lon": centre_lon, "count": count, "photo_id": photo_id})
+    return points
+
+
+def public_bounds(bounds):
+    """Album bounds snapped out to PUBLIC_CLUSTER_PRECISION cells; None stays None."""
+    if bounds is None:
+        return None
+    west, south, east, north = bounds
+    west, south = cell_bounds(encode(south, west, PUBLIC_CLUSTER_PRECISION))[:2]
+    east, north = cell_bounds(encode(north, east, PUBLIC_CLUSTER_PRECISION))[2:]
+    return [west, south, east, north]
+
+
+def invalidate_map_clusters(album_ids):
+    """Drop the stored clusters of these albums and schedule a rebuild."""
+    from photos.models import PhotoAlbum
+
+    album_ids = list(album_ids)
+    if not album_ids:
+        return
+    PhotoAlbum.objects.filter(pk__in=album_ids).exclude(map_clusters={}).update(map_clusters={})
+    schedule_map_cluster_build(album_ids)
+
+
+def schedule_map_cluster_build(album_ids):
+    """
+    Rebuild these albums' clusters in BUILD_DELAY_SECONDS; further calls until then are folded into it.
+
+    Queued once the current transaction commits. Never raises: if the broker
+    is unavailable the album's next change or map request schedules it again.
+    """
+    album_ids = list(album_ids)
+    transaction.on_commit(lambda: _queue_map_cluster_builds(album_ids))
+
+
+def _queue_map_cluster_builds(album_ids):
+    from photos.tasks import build_album_map_clusters
+
+    for album_id in album_ids:
+        key = f"{BUILD_SCHEDULED_KEY_PREFIX}{album_id}"
+        try:
+            if cache.add(key, True, BUILD_DELAY_SECONDS):
+                try:
+                    build_album_map_clusters.apply_async(args=[album_id], countdown=BUILD_DELAY_SECONDS)
+                except Exception:
+                    # Let the next change try again instead of waiting out the debounce window
+                    cache.delete(key)
+                    raise
+        except Exception as e:
+            logger.warning(f"Could not schedule map cluster build for album {album_id}: {e}")
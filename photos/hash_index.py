@@ -0,0 +1,473 @@
+"""
+Hamming-space index over Photo.perceptual_hash.
+
+Similarity lookups used to parse and compare the hash of every photo in
+Python, and the admin duplicate filter did that once per photo (O(n²) per
+changelist load). This module keeps all perceptual hashes packed into a
+(n, 4) uint64 NumPy array (256-bit average hashes) and answers queries with
+vectorized XOR + popcount.
+
+Single lookups use multi-index hashing: each hash is split into 16 chunks of
+16 bits, and by the pigeonhole principle two hashes within distance 15 share
+at least one chunk exactly. Each chunk has a sorted table, so candidates are
+found with binary searches and only those are compared in full. "All similar
+pairs" is computed tile by tile, so memory stays bounded whatever the size of
+the library.
+
+The packed index is persisted in the cache as a snapshot plus a log of
+changes under a version counter. photos.signals records one small change
+entry whenever a photo is saved with a new hash or deleted; the snapshot is
+only rewritten every COMPACT_EVERY changes. Each process keeps a local copy
+and catches up by applying the change entries it hasn't seen. If the snapshot
+or a change entry is missing the index is rebuilt from the database with a
+single values_list() query.
+
+Hashes are also stored on Photo as four signed bigint segments (phash_0 ..
+phash_3), so a lookup can run entirely in Postgres: annotate_phash_distance()
+computes bit_count(segment # query) per segment, and phash_prefilter()
+narrows rows first with expression indexes on the 32-bit halves of each
+segment. Eight halves cover any threshold up to 7 (two hashes within 7 bits
+share at least one half exactly); upload duplicate checks use threshold 5.
+
+Usage:
+    index = get_index()
+    index.query(photo.perceptual_hash, threshold=5, exclude_id=photo.pk)  # [(photo_id, distance), ...]
+    index.ids_with_similar(threshold=5)  # {photo_id, ...}
+"""
+
+import io
+import logging
+import operator
+import time
+from functools import reduce
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import F, Func, IntegerField, Q, Value
+from django.db.models.lookups import Exact
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 256  # DuplicateDetector.compute_perceptual_hash uses hash_size=16
+HASH_HEX_LENGTH = HASH_BITS // 4
+WORDS = HASH_BITS // 64
+CHUNK_BITS = 16
+CHUNKS = HASH_BITS // CHUNK_BITS
+PAIR_BLOCK_SIZE = 512  # Pair distances are computed in PAIR_BLOCK_SIZE x PAIR_BLOCK_SIZE tiles
+
+SEGMENT_FIELDS = tuple(f"phash_{i}" for i in range(WORDS))
+HALF_MASK = 0xFFFFFFFF
+# Thresholds up to this can be prefiltered on exact 32-bit halves (8 halves, pigeonhole)
+MAX_PREFILTER_THRESHOLD = 2 * WORDS - 1
+
+INDEX_CACHE_KEY = "photos:phash_index"
+VERSION_CACHE_KEY = "photos:phash_index:version"
+SNAPSHOT_VERSION_CACHE_KEY = "photos:phash_index:snapshot_version"
+CHANGE_CACHE_KEY = "photos:phash_index:change:{}"
+INDEX_CACHE_TIMEOUT = 60 * 60 * 24 * 30  # 30 days; rebuilt from the database when evicted
+COMPACT_EVERY = 500  # Rewrite the snapshot after this many change entries
+LOCK_TIMEOUT = 30
+
+# Process-local copy of the index, reused while the cached version is unchanged
+_local = {"version": None, "index": None}
+
+
+def pack_hash(perceptual_hash):
+    """
+    Pack a hex perceptual hash into WORDS uint64 words.
+
+    Returns:
+        numpy array of shape (WORDS,), or None if the hash is not a 256-bit hex string
+    """
+    if not perceptual_hash or len(perceptual_hash) != HASH_HEX_LENGTH:
+        return None
+    try:
+        return np.array(
+            [int(perceptual_hash[i : i + 16], 16) for i in range(0, HASH_HEX_LENGTH, 16)],
+            dtype=np.uint64,
+        )
+    except ValueError:
+        return None
+
+
+def hash_segments(perceptual_hash):
+    """
+    A perceptual hash as WORDS signed 64-bit integers for Photo.phash_0 .. phash_3.
+
+    Returns:
+        tuple of ints, or None if the hash is not a 256-bit hex string
+    """
+    packed = pack_hash(perceptual_hash)
+    if packed is None:
+        return None
+    return tuple(int(segment) for segment in packed.view(np.int64))
+
+
+def segment_halves(field):
+    """Expressions for the high and low 32 bits of a segment; these match the expression indexes on Photo."""
+    return F(field).bitrightshift(32), F(field).bitand(HALF_MASK)
+
+
+class BitCount(Func):
+    """Postgres bit_count() of a bigint."""
+
+    function = "bit_count"
+    template = "%(function)s((%(expressions)s)::bit(64))"
+    output_field = IntegerField()
+
+
+def annotate_phash_distance(queryset, perceptual_hash, name="phash_distance"):
+    """
+    Annotate each photo with its Hamming distance to perceptual_hash, computed in SQL.
+
+    Photos without segments get NULL. Returns the queryset unchanged if the hash can't be packed.
+    """
+    segments = hash_segments(perceptual_hash)
+    if segments is None:
+        return queryset
+    distance = reduce(
+        operator.add,
+        (BitCount(F(field).bitxor(Value(segment))) for field, segment in zip(SEGMENT_FIELDS, segments, strict=True)),
+    )
+    return queryset.annotate(**{name: distance})
+
+
+def phash_prefilter(perceptual_hash, threshold):
+    """
+    Q matching photos that share at least one exact 32-bit half with perceptual_hash.
+
+    Any photo within threshold bits matches for threshold <= MAX_PREFILTER_THRESHOLD,
+    and every lookup in the Q is served by an expression index. Larger thresholds
+    return an empty Q (no prefilter).
+    """
+    segments = hash_segments(perceptual_hash)
+    if segments is None or threshold > MAX_PREFILTER_THRESHOLD:
+        return Q()
+    prefilter = Q()
+    for field, segment in zip(SEGMENT_FIELDS, segments, strict=True):
+        high, low = segment_halves(field)
+        prefilter |= Q(Exact(high, segment >> 32)) | Q(Exact(low, segment & HALF_MASK))
+    return prefilter
+
+
+class PerceptualHashIndex:
+    """
+    Packed perceptual hashes with multi-index lookup tables.
+
+    Attributes:
+        ids: int64 array of photo IDs
+        words: (n, WORDS) uint64 array of packed hashes, row i belongs to ids[i]
+    """
+
+    def __init__(self, ids=None, words=None):
+        self.ids = np.asarray(ids if ids is not None else [], dtype=np.int64)
+        self.words = np.asarray(words if words is not None else np.empty((0, WORDS)), dtype=np.uint64).reshape(
+            -1, WORDS
+        )
+        self._tables = None
+        self._similar_ids = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build an index from (photo_id, perceptual_hash) pairs, skipping hashes that can't be packed."""
+        ids, words = [], []
+        for photo_id, perceptual_hash in rows:
+            packed = pack_hash(perceptual_hash)
+            if packed is not None:
+                ids.append(photo_id)
+                words.append(packed)
+        return cls(ids, np.array(words, dtype=np.uint64).reshape(-1, WORDS))
+
+    @classmethod
+    def from_database(cls):
+        from photos.models import Photo
+
+        rows = Photo.objects.exclude(perceptual_hash__isnull=True).exclude(perceptual_hash="")
+        return cls.from_rows(rows.values_list("id", "perceptual_hash").iterator())
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez(buffer, ids=self.ids, words=self.words)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls(arrays["ids"], arrays["words"])
+
+    def _chunk_tables(self):
+        """Per chunk: (sorted chunk values, row order), built on first lookup."""
+        if self._tables is None:
+            chunks = self._chunks(self.words)
+            self._tables = []
+            for c in range(CHUNKS):
+                order = np.argsort(chunks[:, c], kind="stable")
+                self._tables.append((chunks[order, c], order))
+        return self._tables
+
+    @staticmethod
+    def _chunks(words):
+        return np.ascontiguousarray(words).view(np.uint16).reshape(-1, CHUNKS)
+
+    def get(self, photo_id):
+        """Packed hash stored for a photo, or None."""
+        rows = np.flatnonzero(self.ids == photo_id)
+        return self.words[rows[0]] if len(rows) else None
+
+    def add(self, photo_id, perceptual_hash):
+        """Insert or replace a photo's hash. Photos whose hash can't be packed are removed."""
+        self.remove(photo_id)
+        packed = pack_hash(perceptual_hash)
+        if packed is None:
+            return
+        self.ids = np.append(self.ids, np.int64(photo_id))
+        self.words = np.vstack([self.words, packed[np.newaxis, :]])
+        self._invalidate()
+
+    def add_many(self, rows):
+        """Insert or replace many (photo_id, perceptual_hash) pairs with a single copy of the arrays."""
+        added = PerceptualHashIndex.from_rows(rows)
+        if not len(added):
+            return
+        keep = ~np.isin(self.ids, added.ids)
+        self.ids = np.concatenate([self.ids[keep], added.ids])
+        self.words = np.vstack([self.words[keep], added.words])
+        self._invalidate()
+
+    def remove(self, photo_id):
+        keep = self.ids != photo_id
+        if not keep.all():
+            self.ids = self.ids[keep]
+            self.words = self.words[keep]
+            self._invalidate()
+
+    def with_changes(self, rows):
+        """
+        A new index with (photo_id, perceptual_hash) rows applied; a hash that can't be packed removes the photo.
+
+        The arrays of this index are not modified, so a copy other threads are reading stays consistent.
+        """
+        changed_ids = np.array([photo_id for photo_id, _ in rows], dtype=np.int64)
+        added = PerceptualHashIndex.from_rows(rows)
+        keep = ~np.isin(self.ids, changed_ids)
+        return PerceptualHashIndex(
+            np.concatenate([self.ids[keep], added.ids]), np.vstack([self.words[keep], added.words])
+        )
+
+    def _invalidate(self):
+        self._tables = None
+        self._similar_ids = {}
+
+    def _candidate_rows(self, packed, threshold):
+        """Rows that can be within threshold of packed: all rows sharing at least one chunk exactly."""
+        if threshold >= CHUNKS:
+            # The pigeonhole guarantee no longer holds; compare against everything
+            return np.arange(len(self.ids))
+
+        query_chunks = self._chunks(packed[np.newaxis, :])[0]
+        candidates = []
+        for c, (values, order) in enumerate(self._chunk_tables()):
+            start = np.searchsorted(values, query_chunks[c], side="left")
+            end = np.searchsorted(values, query_chunks[c], side="right")
+            if end > start:
+                candidates.append(order[start:end])
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(candidates))
+
+    def query(self, perceptual_hash, threshold=5, exclude_id=None):
+        """
+        Photos within threshold bits of a hash.
+
+        Returns:
+            list: (photo_id, distance) tuples sorted by distance, then ID
+        """
+        packed = pack_hash(perceptual_hash)
+        if packed is None or not len(self.ids):
+            return []
+
+        rows = self._candidate_rows(packed, threshold)
+        distances = np.bitwise_count(self.words[rows] ^ packed).sum(axis=1)
+        matches = distances <= threshold
+        rows, distances = rows[matches], distances[matches]
+
+        results = [
+            (int(photo_id), int(distance))
+            for photo_id, distance in zip(self.ids[rows], distances, strict=True)
+            if photo_id != exclude_id
+        ]
+        results.sort(key=lambda item: (item[1], item[0]))
+        return results
+
+    def similar_pairs(self, threshold=5):
+        """
+        Every pair of photos within threshold bits of each other.
+
+        Distances are computed for one PAIR_BLOCK_SIZE x PAIR_BLOCK_SIZE tile of
+        rows at a time (each block against itself and every later block), so the
+        work is vectorized while memory stays the same for any library size.
+
+        Returns:
+            tuple: (left_ids, right_ids, distances) arrays with left row < right row
+        """
+        lefts, rights, distances = [], [], []
+        n = len(self.ids)
+        for start in range(0, n, PAIR_BLOCK_SIZE):
+            block = self.words[start : start + PAIR_BLOCK_SIZE]
+            for other_start in range(start, n, PAIR_BLOCK_SIZE):
+                others = self.words[other_start : other_start + PAIR_BLOCK_SIZE]
+                tile = np.bitwise_count(block[:, np.newaxis, :] ^ others[np.newaxis, :, :]).sum(axis=2)
+                i, j = np.nonzero(tile <= threshold)
+                if other_start == start:
+                    upper = j > i  # Skip self-matches and mirrored pairs inside the block
+                    i, j = i[upper], j[upper]
+                lefts.append(self.ids[start + i])
+                rights.append(self.ids[other_start + j])
+                distances.append(tile[i, j])
+
+        if not lefts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        return np.concatenate(lefts), np.concatenate(rights), np.concatenate(distances).astype(np.int64)
+
+    def ids_with_similar(self, threshold=5):
+        """
+        IDs of photos that have at least one other photo within threshold bits.
+
+        Memoized per threshold until the index changes, so repeated admin
+        changelist loads reuse the result from the process-local copy.
+        """
+        if threshold not in self._similar_ids:
+            left_ids, right_ids, _ = self.similar_pairs(threshold)
+            self._similar_ids[threshold] = frozenset(left_ids.tolist()) | frozenset(right_ids.tolist())
+        return set(self._similar_ids[threshold])
+
+
+def _store_snapshot(index, version):
+    cache.set(INDEX_CACHE_KEY, (version, index.to_bytes()), INDEX_CACHE_TIMEOUT)
+    cache.set(SNAPSHOT_VERSION_CACHE_KEY, version, INDEX_CACHE_TIMEOUT)
+
+
+def _catch_up(index, at, version):
+    """
+    Apply the change entries after version at up to version to index.
+
+    Returns:
+        The updated index, or None if an entry is missing (evicted)
+    """
+    if version == at:
+        return index
+    keys = [CHANGE_CACHE_KEY.format(v) for v in range(at + 1, version + 1)]
+    entries = cache.get_many(keys)
+    if len(entries) != len(keys):
+        return None
+    rows = [row for key in keys for row in entries[key]]
+    return index.with_changes(rows)
+
+
+def get_index():
+    """
+    The current index: the process-local copy, caught up with the change log; else the cached snapshot; else rebuilt.
+    """
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        return rebuild_index()
+    if _local["version"] == version:
+        return _local["index"]
+
+    index = None
+    at = _local["version"]
+    if _local["index"] is not None and at is not None and at < version and version - at <= COMPACT_EVERY:
+        index = _catch_up(_local["index"], at, version)
+
+    if index is None:
+        stored = cache.get(INDEX_CACHE_KEY)
+        if not stored or stored[0] > version:
+            return rebuild_index()
+        index = _catch_up(PerceptualHashIndex.from_bytes(stored[1]), stored[0], version)
+        if index is None:
+            return rebuild_index()
+
+    _local["version"], _local["index"] = version, index
+    return index
+
+
+def rebuild_index():
+    """Rebuild the index from the database and persist it under a new version."""
+    index = PerceptualHashIndex.from_database()
+    # A fresh time-based version can't collide with one an older copy was stored under
+    version = time.time_ns()
+    _store_snapshot(index, version)
+    cache.set(VERSION_CACHE_KEY, version, None)
+    _local["version"], _local["index"] = version, index
+    logger.info(f"Rebuilt perceptual hash index with {len(index)} photos")
+    return index
+
+
+def _locked(func):
+    """Run func under the cache lock when the backend has one (django-redis), so concurrent updates aren't lost."""
+    lock = getattr(cache, "lock", None)
+    if lock is None:
+        return func()
+    with lock(f"{INDEX_CACHE_KEY}:lock", timeout=LOCK_TIMEOUT):
+        return func()
+
+
+def _apply(changes):
+    """
+    Record the rows returned by changes(index) as one change entry.
+
+    The entry is written before the version is bumped, so a reader never sees a
+    version whose entry is missing. Only every COMPACT_EVERY entries is the
+    whole index written again.
+    """
+
+    def update():
+        index = get_index()
+        rows = changes(index)
+        if not rows:
+            return
+        version = _local["version"] + 1
+        cache.set(CHANGE_CACHE_KEY.format(version), rows, INDEX_CACHE_TIMEOUT)
+        index = index.with_changes(rows)
+        snapshot_version = cache.get(SNAPSHOT_VERSION_CACHE_KEY)
+        if snapshot_version is None or version - snapshot_version >= COMPACT_EVERY:
+            _store_snapshot(index, version)
+        cache.set(VERSION_CACHE_KEY, version, None)
+        _local["version"], _local["index"] = version, index
+
+    try:
+        _locked(update)
+    except Exception as e:
+        # The next lookup rebuilds from the database, so a failed update only costs time
+        logger.warning(f"Could not update perceptual hash index: {e}")
+        cache.delete_many([INDEX_CACHE_KEY, VERSION_CACHE_KEY])
+        _local["version"], _local["index"] = None, None
+
+
+def update_photo(photo_id, perceptual_hash):
+    """Record a photo's current hash in the persisted index (no-op if unchanged)."""
+
+    def changes(index):
+        current, packed = index.get(photo_id), pack_hash(perceptual_hash)
+        if current is None and packed is None:
+            return []
+        if current is not None and packed is not None and np.array_equal(current, packed):
+            return []
+        return [(photo_id, perceptual_hash if packed is not None else None)]
+
+    _apply(changes)
+
+
+def update_photos(rows):
+    """Record many (photo_id, perceptual_hash) pairs as one change entry, e.g. after bulk_create()."""
+    rows = [(photo_id, perceptual_hash) for photo_id, perceptual_hash in rows if pack_hash(perceptual_hash) is not None]
+    _apply(lambda index: rows)
+
+
+def remove_photo(photo_id):
+    """Drop a deleted photo from the persisted index."""
+    _apply(lambda index: [(photo_id, None)] if index.get(photo_id) is not None else [])
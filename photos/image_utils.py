@@ -1,20 +1,37 @@
 import hashlib
 import json
 import logging
+import multiprocessing
+import operator
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from contextlib import contextmanager
 from datetime import datetime
 from decimal import Decimal
+from functools import lru_cache, reduce
 from io import BytesIO
 
 import imagehash
 import numpy as np
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db.models import Q
 from django.utils import timezone
 from PIL import Image
-from PIL.ExifTags import GPSTAGS, TAGS
+from PIL import __version__ as PIL_VERSION
+from PIL.ExifTags import GPSTAGS, IFD, TAGS
+
+from photos.hash_index import annotate_phash_distance, hash_segments, phash_prefilter
 
 logger = logging.getLogger(__name__)
 
+# EXIF lives in the file header (a JPEG's APP1 segment is at most 64 KB)
+EXIF_HEADER_BYTES = 256 * 1024
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
 
 @contextmanager
 def reset_file_pointer(file_obj):
@@ -33,24 +50,44 @@ def reset_file_pointer(file_obj):
             file_obj.seek(initial_position)
 
 
+@contextmanager
+def timed_stage(timings, stage):
+    """
+    Context manager that adds the elapsed time of a block to timings[stage].
+
+    Does nothing when timings is None, so callers can pass timings through
+    unconditionally.
+    """
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
 class ImageMetadataExtractor:
     """
     Extracts basic metadata from images without EXIF processing.
     """
 
     @staticmethod
-    def extract_basic_metadata(image_file):
+    def extract_basic_metadata(image_file, img=None):
         """
         Extract basic metadata like dimensions and file size.
 
         Args:
             image_file: Django ImageField file or file-like object
+            img: Optional already decoded PIL Image for image_file (skips opening it again)
 
         Returns:
             dict: Dictionary containing width, height, file_size, and format
         """
         with reset_file_pointer(image_file):
-            img = Image.open(image_file)
+            if img is None:
+                img = Image.open(image_file)
             metadata = {
                 "width": img.width,
                 "height": img.height,
@@ -78,76 +115,92 @@ class ExifExtractor:
             dict: JSON-serializable version of the EXIF data
         """
         serializable = {}
-        for key, value in exif_data.items():
-            # Check for specific non-serializable types
-            if isinstance(value, (tuple, bytes, bytearray)):
+        for tag, value in exif_data.items():
+            # Keys of unknown tags are ints; JSON would turn them into strings anyway
+            key = str(tag)
+            # Tuples and bytes are stored as their string form; so is anything JSON can't encode
+            if isinstance(value, (tuple, bytes, bytearray)) or not _is_json_value(value):
                 serializable[key] = str(value)
             else:
-                try:
-                    json.dumps(value)  # Test if serializable
-                    serializable[key] = value
-                except (TypeError, ValueError):
-                    serializable[key] = str(value)  # Convert non-serializable to string
+                serializable[key] = value
         return serializable
 
     @staticmethod
-    def extract_exif(image_file):
+    def extract_exif(image_file, img=None):
         """
         Extract EXIF data from an image file.
 
         Args:
             image_file: Django ImageField file or file-like object
+            img: Optional already decoded PIL Image for image_file (skips opening it again)
 
         Returns:
             dict: Dictionary containing extracted EXIF data
         """
         try:
-            image_file.seek(0)
-            img = Image.open(image_file)
-
-            exif_data = img._getexif() if hasattr(img, "_getexif") else None
-
-            if not exif_data:
-                return {}
-
-            readable_exif = {}
-            for tag_id, value in exif_data.items():
-                tag = TAGS.get(tag_id, tag_id)
-                readable_exif[tag] = value
-
-            extracted_data = {
-                "full_exif": readable_exif,
-                "camera_make": (readable_exif.get("Make", "").strip() if "Make" in readable_exif else ""),
-                "camera_model": (readable_exif.get("Model", "").strip() if "Model" in readable_exif else ""),
-                "lens_model": (readable_exif.get("LensModel", "").strip() if "LensModel" in readable_exif else ""),
-                "iso": readable_exif.get("ISOSpeedRatings") or readable_exif.get("ISO"),
-                "date_taken": ExifExtractor._parse_datetime(
-                    readable_exif.get("DateTimeOriginal") or readable_exif.get("DateTime")
-                ),
-            }
+            if img is None:
+                image_file.seek(0)
+                img = Image.open(image_file)
 
-            focal_length = readable_exif.get("FocalLength")
-            if focal_length:
-                extracted_data["focal_length"] = ExifExtractor._format_focal_length(focal_length)
+            return ExifExtractor.read_exif(img)
 
-            aperture = readable_exif.get("FNumber") or readable_exif.get("ApertureValue")
-            if aperture:
-                extracted_data["aperture"] = ExifExtractor._format_aperture(aperture)
+        except Exception as e:
+            print(f"Error extracting EXIF data: {e}")
+            return {}
 
-            shutter_speed = readable_exif.get("ExposureTime") or readable_exif.get("ShutterSpeedValue")
-            if shutter_speed:
-                extracted_data["shutter_speed"] = ExifExtractor._format_shutter_speed(shutter_speed)
-            gps_info = readable_exif.get("GPSInfo")
-            if gps_info:
-                gps_data = ExifExtractor._extract_gps(gps_info)
-                extracted_data.update(gps_data)
+    @staticmethod
+    def read_exif(img):
+        """
+        Extract EXIF data from an opened image.
 
-            return extracted_data
+        Unlike extract_exif(), errors (e.g. from a truncated file) are raised.
 
-        except Exception as e:
-            print(f"Error extracting EXIF data: {e}")
+        Returns:
+            dict: Same as extract_exif()
+        """
+        exif = img.getexif()
+        if not exif:
             return {}
 
+        # IFD0 plus the Exif sub-IFD, with GPSInfo replaced by the GPS IFD itself
+        readable_exif = {}
+        for tag_id, value in (*exif.items(), *exif.get_ifd(IFD.Exif).items()):
+            readable_exif[TAGS.get(tag_id, tag_id)] = value
+        gps_ifd = exif.get_ifd(IFD.GPSInfo)
+        if gps_ifd:
+            readable_exif["GPSInfo"] = dict(gps_ifd)
+        else:
+            readable_exif.pop("GPSInfo", None)
+
+        extracted_data = {
+            "full_exif": readable_exif,
+            "camera_make": (readable_exif.get("Make", "").strip() if "Make" in readable_exif else ""),
+            "camera_model": (readable_exif.get("Model", "").strip() if "Model" in readable_exif else ""),
+            "lens_model": (readable_exif.get("LensModel", "").strip() if "LensModel" in readable_exif else ""),
+            "iso": readable_exif.get("ISOSpeedRatings") or readable_exif.get("ISO"),
+            "date_taken": ExifExtractor._parse_datetime(
+                readable_exif.get("DateTimeOriginal") or readable_exif.get("DateTime")
+            ),
+        }
+
+        focal_length = readable_exif.get("FocalLength")
+        if focal_length:
+            extracted_data["focal_length"] = ExifExtractor._format_focal_length(focal_length)
+
+        aperture = readable_exif.get("FNumber") or readable_exif.get("ApertureValue")
+        if aperture:
+            extracted_data["aperture"] = ExifExtractor._format_aperture(aperture)
+
+        shutter_speed = readable_exif.get("ExposureTime") or readable_exif.get("ShutterSpeedValue")
+        if shutter_speed:
+            extracted_data["shutter_speed"] = ExifExtractor._format_shutter_speed(shutter_speed)
+        gps_info = readable_exif.get("GPSInfo")
+        if gps_info:
+            gps_data = ExifExtractor._extract_gps(gps_info)
+            extracted_data.update(gps_data)
+
+        return extracted_data
+
     @staticmethod
     def _parse_datetime(datetime_str):
         """Parse EXIF datetime string to Python datetime object."""
@@ -271,35 +324,140 @@ class ExifExtractor:
     def _convert_to_degrees(value):
         """Convert GPS coordinates to decimal degrees."""
         try:
-            # Format: ((degrees, 1), (minutes, 1), (seconds, divisor))
-            d = value[0][0] / value[0][1] if value[0][1] != 0 else 0
-            m = value[1][0] / value[1][1] if value[1][1] != 0 else 0
-            s = value[2][0] / value[2][1] if value[2][1] != 0 else 0
+            # Format: ((degrees, 1), (minutes, 1), (seconds, divisor)), or Pillow's IFDRational values
+            d, m, s = (
+                (part[0] / part[1] if part[1] != 0 else 0) if isinstance(part, tuple) else float(part)
+                for part in value[:3]
+            )
 
             return d + (m / 60.0) + (s / 3600.0)
         except Exception:
             return 0
 
 
+def _is_json_value(value):
+    if isinstance(value, _JSON_SCALARS):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_is_json_value(item) for item in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, _JSON_SCALARS) and _is_json_value(item) for key, item in value.items())
+    return False
+
+
+def read_exif_header(data, complete=False):
+    """
+    EXIF parsed from the first bytes of an image file (or from all of it).
+
+    Runs in the worker pool for the backfill_exif command, so full_exif is
+    returned already JSON-serializable.
+
+    Args:
+        data: Leading bytes of the file
+        complete: True when data is the whole file
+
+    Returns:
+        dict: extract_exif() output, {} when the image has no EXIF, or None when
+              data ends before the header does and complete is False
+    """
+    try:
+        with Image.open(BytesIO(data)) as img:
+            # Every format plugin parses its header on open; the pixel data starts at the tile offsets
+            if not complete and any(tile[2] > len(data) for tile in img.tile):
+                return None
+            exif = ExifExtractor.read_exif(img)
+    except Exception:
+        if complete:
+            raise
+        return None
+
+    if exif:
+        exif["full_exif"] = ExifExtractor.make_exif_serializable(exif["full_exif"])
+    return exif
+
+
 class SmartCrop:
     """
     Smart cropping functionality to find the most interesting part of an image.
     Uses ML-based saliency detection for human attention modeling.
+
+    Saliency modes:
+        full: Saliency on the full-resolution image. Seconds and hundreds of MB
+              of RAM on a 24 MP photo.
+        fast: Saliency on a copy no larger than FAST_SALIENCY_MAX_DIMENSION.
+              The focal point is normalized to 0-1, so it applies to the full
+              image unchanged. Use open_for_saliency() to also skip most of the
+              JPEG decode.
     """
 
+    SALIENCY_MODES = ("full", "fast")
+    FAST_SALIENCY_MAX_DIMENSION = 512
+
+    @staticmethod
+    def _fast_size(size, max_dimension):
+        """Size that fits within max_dimension while keeping the aspect ratio."""
+        width, height = size
+        ratio = max_dimension / max(width, height)
+        return (max(1, round(width * ratio)), max(1, round(height * ratio)))
+
+    @staticmethod
+    def open_for_saliency(image_file, max_dimension=None):
+        """
+        Open an image for fast saliency detection.
+
+        JPEGs are decoded with draft(), which lets libjpeg scale by 1/2, 1/4 or
+        1/8 during the DCT instead of decoding every pixel. A 24 MP JPEG decodes
+        at about 1/8 scale.
+
+        Args:
+            image_file: Django ImageField file or file-like object
+            max_dimension: Smallest longest side that is still needed (default FAST_SALIENCY_MAX_DIMENSION)
+
+        Returns:
+            PIL Image: Decoded image, at reduced size for JPEGs
+        """
+        max_dimension = max_dimension or SmartCrop.FAST_SALIENCY_MAX_DIMENSION
+        image_file.seek(0)
+        img = Image.open(image_file)
+        if img.format == "JPEG" and max(img.size) > max_dimension:
+            img.draft("RGB", SmartCrop._fast_size(img.size, max_dimension))
+        img.load()
+        return img
+
+    @staticmethod
+    def downsample_for_saliency(img, max_dimension=None):
+        """
+        Return a copy of img no larger than max_dimension on its longest side.
+
+        Uses reducing_gap, so large images are first shrunk with a cheap integer
+        box reduce before the final resample. Small images are returned as-is.
+        """
+        max_dimension = max_dimension or SmartCrop.FAST_SALIENCY_MAX_DIMENSION
+        if max(img.size) <= max_dimension:
+            return img
+        return img.resize(SmartCrop._fast_size(img.size, max_dimension), Image.Resampling.BILINEAR, reducing_gap=2.0)
+
     @staticmethod
-    def find_focal_point(img, return_saliency_map=False):
+    def find_focal_point(img, return_saliency_map=False, mode="full"):
         """
         Find the focal point of an image using ML-based saliency detection.
 
         Args:
             img: PIL Image object
             return_saliency_map: If True, returns (focal_point, saliency_map_bytes)
+            mode: "full" or "fast" (see class docstring). In fast mode the
+                  saliency map is returned at the reduced resolution.
 
         Returns:
             tuple: If return_saliency_map=True: ((x, y), bytes or None)
                    If return_saliency_map=False: (x, y)
         """
+        if mode not in SmartCrop.SALIENCY_MODES:
+            raise ValueError(f"Unknown saliency mode: {mode}")
+
+        if mode == "fast":
+            img = SmartCrop.downsample_for_saliency(img)
+
         if img.mode != "RGB":
             img = img.convert("RGB")
 
@@ -371,17 +529,14 @@ class SmartCrop:
 
         height, width = saliency_map.shape
 
-        total_weight = np.sum(saliency_map)
-        if total_weight == 0:
+        centroid = SmartCrop._weighted_centroid(saliency_map)
+        if centroid is None:
             focal_point = (0.5, 0.5)
             if return_map:
                 return (focal_point, None)
             return focal_point
 
-        y_coords, x_coords = np.ogrid[:height, :width]
-        x_center = np.sum(x_coords * saliency_map) / total_weight
-        y_center = np.sum(y_coords * saliency_map) / total_weight
-
+        x_center, y_center = centroid
         focal_point = (x_center / width, y_center / height)
 
         if return_map:
@@ -407,6 +562,24 @@ class SmartCrop:
 
         return focal_point
 
+    @staticmethod
+    def _weighted_centroid(weights):
+        """
+        Center of mass (x, y) in pixels of a 2D weight array, or None if all weights are zero.
+
+        Uses the row and column sums instead of multiplying coordinate grids
+        with the whole array, so no temporary arrays the size of the image are
+        allocated.
+        """
+        column_weights = weights.sum(axis=0, dtype=np.float64)
+        total_weight = column_weights.sum()
+        if total_weight == 0:
+            return None
+        row_weights = weights.sum(axis=1, dtype=np.float64)
+        x_center = column_weights @ np.arange(weights.shape[1], dtype=np.float64) / total_weight
+        y_center = row_weights @ np.arange(weights.shape[0], dtype=np.float64) / total_weight
+        return (x_center, y_center)
+
     @staticmethod
     def smart_crop(img, target_width, target_height, focal_point=None):
         """
@@ -454,6 +627,70 @@ class SmartCrop:
         return cropped
 
 
+def _encode_variant(img, options):
+    """Encode one ladder variant. Top-level so it can run in a worker process."""
+    output = BytesIO()
+    img.save(output, **options)
+    return output.getvalue()
+
+
+def hash_upload(source):
+    """
+    SHA-256, CRC-32, size and perceptual hash of an upload. Top-level so it can run in a worker process.
+
+    Args:
+        source: Path of the file, or its bytes
+
+    Returns:
+        dict: file_hash, file_crc32, file_size and perceptual_hash
+    """
+    if isinstance(source, bytes):
+        return _hash_stream(BytesIO(source))
+    with open(source, "rb") as stream:
+        return _hash_stream(stream)
+
+
+def _hash_stream(stream):
+    hasher = hashlib.sha256()
+    crc = size = 0
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        hasher.update(chunk)
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+
+    stream.seek(0)
+    with Image.open(stream) as img:
+        img.verify()
+    stream.seek(0)
+    perceptual_hash = DuplicateDetector.compute_perceptual_hash(stream)
+
+    return {
+        "file_hash": hasher.hexdigest(),
+        "file_crc32": crc,
+        "file_size": size,
+        "perceptual_hash": perceptual_hash or "",
+    }
+
+
+@lru_cache(maxsize=1)
+def _get_variant_executor():
+    """
+    Shared pool for encoding ladder variants (and hashing bulk uploads), created on first use.
+
+    Uses spawned worker processes so AVIF/WebP encodes run on all cores. Falls
+    back to threads (Pillow releases the GIL while encoding) when processes
+    can't be started, e.g. inside a daemonic worker process.
+    """
+    workers = getattr(settings, "PHOTO_VARIANT_WORKERS", 4)
+    try:
+        if multiprocessing.current_process().daemon:
+            raise RuntimeError("daemonic processes cannot have children")
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    except Exception as e:
+        logger.info(f"Encoding photo variants in threads instead of processes: {e}")
+        return ThreadPoolExecutor(max_workers=workers)
+
+
 class ImageOptimizer:
     """
     Handles image optimization and resizing for different use cases.
@@ -473,6 +710,33 @@ class ImageOptimizer:
         "original": 100,  # No compression
     }
 
+    # Default SmartCrop saliency mode; every method that detects focal points accepts a per-call override
+    SALIENCY_MODE = "fast"
+
+    # Responsive variant ladders, each encoded in every VARIANT_FORMATS entry.
+    # "aspect" ladders are smart-cropped around the focal point like the thumbnail;
+    # the others keep the full frame. Widths larger than the original are skipped.
+    # Can be overridden with the PHOTO_VARIANT_LADDERS setting.
+    VARIANT_LADDERS = {
+        "grid": {"widths": (320, 480, 640, 800), "aspect": (4, 3)},
+        "display": {"widths": (640, 1024, 1600, 2048), "aspect": None},
+    }
+
+    # Ordered by preference; <picture> sources are emitted in this order and the last one is the <img> fallback
+    VARIANT_FORMATS = {
+        "avif": {"ext": "avif", "mime": "image/avif", "options": {"format": "AVIF", "quality": 50, "speed": 6}},
+        "webp": {"ext": "webp", "mime": "image/webp", "options": {"format": "WEBP", "quality": 75, "method": 4}},
+        "jpeg": {
+            "ext": "jpg",
+            "mime": "image/jpeg",
+            "options": {"format": "JPEG", "quality": 80, "optimize": True, "progressive": True},
+        },
+    }
+
+    # Part of every variant's content key: bump it to re-encode all variants (e.g. after changing
+    # VARIANT_FORMATS options); a Pillow upgrade changes the key on its own
+    VARIANT_ENCODER_VERSION = 1
+
     @classmethod
     def optimize_image(
         cls,
@@ -481,6 +745,8 @@ class ImageOptimizer:
         maintain_aspect_ratio=True,
         use_smart_crop=True,
         focal_point=None,
+        img=None,
+        saliency_mode=None,
     ):
         """
         Optimize an image file for a specific size.
@@ -491,6 +757,9 @@ class ImageOptimizer:
             maintain_aspect_ratio: If True, maintains aspect ratio when resizing
             use_smart_crop: If True and size_name is 'thumbnail', use smart cropping
             focal_point: Optional (x, y) focal point as percentages (0-1)
+            img: Optional already decoded PIL Image for image_file. It is never
+                 modified, so one decode can be shared by every variant.
+            saliency_mode: "full" or "fast" focal point detection (default SALIENCY_MODE)
 
         Returns:
             tuple: (ContentFile: Optimized image, focal_point: (x, y) or None)
@@ -498,7 +767,9 @@ class ImageOptimizer:
         if size_name == "original":
             image_file.seek(0)
             return (ContentFile(image_file.read()), None)
-        img = Image.open(image_file)
+        shared_img = img
+        if img is None:
+            img = Image.open(image_file)
         computed_focal_point = None
 
         if img.mode in ("RGBA", "LA", "P"):
@@ -517,12 +788,14 @@ class ImageOptimizer:
 
             if use_smart_crop and size_name == "thumbnail":
                 if focal_point is None:
-                    computed_focal_point = SmartCrop.find_focal_point(img)
+                    computed_focal_point = SmartCrop.find_focal_point(img, mode=saliency_mode or cls.SALIENCY_MODE)
                 else:
                     computed_focal_point = focal_point
 
                 img = SmartCrop.smart_crop(img, target_size[0], target_size[1], computed_focal_point)
             elif maintain_aspect_ratio:
+                if img is shared_img:
+                    img = img.copy()  # thumbnail() resizes in place
                 img.thumbnail(target_size, Image.Resampling.LANCZOS)
             else:
                 img = img.resize(target_size, Image.Resampling.LANCZOS)
@@ -546,6 +819,176 @@ class ImageOptimizer:
 
         return (ContentFile(output.read()), computed_focal_point)
 
+    @classmethod
+    def variant_ladders(cls):
+        return getattr(settings, "PHOTO_VARIANT_LADDERS", cls.VARIANT_LADDERS)
+
+    @classmethod
+    def variant_path(cls, photo_uuid, ladder, width, format_name, key=None):
+        """
+        Storage path of a ladder variant.
+
+        Variants with a content key live in the shared content-addressed store;
+        older manifests without keys use the per-photo path.
+        """
+        if key:
+            return f"photos/variants/cas/{key[:2]}/{key}.{cls.VARIANT_FORMATS[format_name]['ext']}"
+        return f"photos/variants/{photo_uuid}/{cls.variant_label(ladder, width, format_name)}"
+
+    @classmethod
+    def variant_label(cls, ladder, width, format_name):
+        """Name of a variant inside a manifest, e.g. "grid_320.avif"."""
+        return f"{ladder}_{width}.{cls.VARIANT_FORMATS[format_name]['ext']}"
+
+    @classmethod
+    def variant_encoder(cls):
+        return f"{cls.VARIANT_ENCODER_VERSION}/pillow-{PIL_VERSION}"
+
+    @classmethod
+    def variant_key(cls, file_hash, spec, width, format_name, focal_point=None):
+        """
+        Content key of one variant: everything its bytes depend on.
+
+        The focal point only matters for cropped ("aspect") ladders, so moving it
+        leaves the full-frame variants' keys unchanged.
+        """
+        aspect = spec.get("aspect")
+        payload = {
+            "file": file_hash,
+            "width": width,
+            "aspect": list(aspect) if aspect else None,
+            "focal_point": [round(value, 4) for value in (focal_point or (0.5, 0.5))] if aspect else None,
+            "options": cls.VARIANT_FORMATS[format_name]["options"],
+            "encoder": cls.variant_encoder(),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:40]
+
+    @staticmethod
+    def _flatten_to_rgb(img):
+        """RGB copy of img with any transparency composited onto white."""
+        if img.mode in ("RGBA", "LA", "P"):
+            if img.mode != "RGBA":
+                img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            return background
+        if img.mode != "RGB":
+            return img.convert("RGB")
+        return img
+
+    @staticmethod
+    def _ladder_widths(size, widths, aspect):
+        """Widths a ladder produces for an image of this size, largest first."""
+        source_width, source_height = size
+        if aspect:
+            # Largest crop of the requested aspect that fits in the original
+            max_width = min(source_width, source_height * aspect[0] // aspect[1])
+        else:
+            max_width = source_width
+        return sorted({min(width, max_width) for width in widths}, reverse=True)
+
+    @classmethod
+    def _ladder_images(cls, img, focal_point, widths, aspect):
+        """Yield (width, image) for one ladder, resizing each step from the previous, larger one."""
+        source_width, source_height = img.size
+        if aspect:
+            aspect_width, aspect_height = aspect
+
+        base = None
+        for width in cls._ladder_widths(img.size, widths, aspect):
+            if aspect:
+                height = max(1, round(width * aspect_height / aspect_width))
+                if base is None:
+                    base = SmartCrop.smart_crop(img, width, height, focal_point or (0.5, 0.5))
+                else:
+                    base = base.resize((width, height), Image.Resampling.LANCZOS)
+            else:
+                height = max(1, round(width * source_height / source_width))
+                source = img if base is None else base
+                base = (
+                    source
+                    if (width, height) == source.size
+                    else source.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+                )
+            yield width, base
+
+    @classmethod
+    def generate_variant_ladder(
+        cls, img, focal_point=None, ladders=None, formats=None, timings=None, file_hash=None, reuse=()
+    ):
+        """
+        Build every responsive variant of an image.
+
+        Resizing happens here (each width is derived from the next larger one);
+        the encodes, which dominate the cost for AVIF and WebP, run in a shared
+        process pool.
+
+        With file_hash every variant gets a content key (variant_key) in the
+        manifest, and variants whose key is in reuse are neither resized nor
+        encoded: their stored copy is still valid.
+
+        Args:
+            img: Decoded PIL Image (not modified)
+            focal_point: (x, y) focal point (0-1) used to crop aspect ladders
+            ladders: Ladder definitions (default: variant_ladders())
+            formats: Format names to encode, in VARIANT_FORMATS order (default: all)
+            timings: Optional dict that receives per-stage durations in seconds
+            file_hash: SHA-256 of the original, to key the variants by content
+            reuse: Content keys whose variants are already stored
+
+        Returns:
+            tuple: (files dict of (ladder, width, format) -> bytes for the encoded variants,
+                    manifest dict for Photo.variants, e.g.
+                    {"formats": ["avif", "webp", "jpeg"], "grid": [320, 480], "display": [640],
+                     "encoder": "1/pillow-11.3.0", "keys": {"grid_320.avif": "3f9a...", ...}})
+        """
+        ladders = ladders or cls.variant_ladders()
+        formats = [name for name in cls.VARIANT_FORMATS if formats is None or name in formats]
+        reuse = set(reuse)
+
+        jobs = []
+        keys = {}
+        manifest = {"formats": formats}
+        with timed_stage(timings, "ladder_resize"):
+            rgb = None
+            for ladder, spec in ladders.items():
+                widths = cls._ladder_widths(img.size, spec["widths"], spec.get("aspect"))
+                manifest[ladder] = sorted(widths)
+                if file_hash:
+                    for width in widths:
+                        for format_name in formats:
+                            keys[cls.variant_label(ladder, width, format_name)] = cls.variant_key(
+                                file_hash, spec, width, format_name, focal_point
+                            )
+                    if all(keys[cls.variant_label(ladder, w, f)] in reuse for w in widths for f in formats):
+                        continue
+
+                if rgb is None:
+                    rgb = cls._flatten_to_rgb(img)
+                for width, resized in cls._ladder_images(rgb, focal_point, spec["widths"], spec.get("aspect")):
+                    for format_name in formats:
+                        if keys.get(cls.variant_label(ladder, width, format_name)) in reuse:
+                            continue
+                        jobs.append(
+                            ((ladder, width, format_name), resized, cls.VARIANT_FORMATS[format_name]["options"])
+                        )
+
+        if file_hash:
+            manifest["encoder"] = cls.variant_encoder()
+            manifest["keys"] = keys
+
+        with timed_stage(timings, "ladder_encode"):
+            try:
+                executor = _get_variant_executor()
+                futures = [(key, executor.submit(_encode_variant, resized, options)) for key, resized, options in jobs]
+                files = {key: future.result() for key, future in futures}
+            except BrokenProcessPool:
+                logger.warning("Variant encoder pool broke; encoding in this process")
+                _get_variant_executor.cache_clear()
+                files = {key: _encode_variant(resized, options) for key, resized, options in jobs}
+
+        return files, manifest
+
     @classmethod
     def generate_filename(cls, photo_uuid, size_name, original_ext=".jpg"):
         """
@@ -569,16 +1012,31 @@ class ImageOptimizer:
         return f"{photo_uuid}_{size_name}{ext}"
 
     @classmethod
-    def process_uploaded_image(cls, image_file, photo_uuid, original_ext=".jpg", existing_focal_point=None):
+    def process_uploaded_image(
+        cls,
+        image_file,
+        photo_uuid,
+        original_ext=".jpg",
+        existing_focal_point=None,
+        img=None,
+        timings=None,
+        saliency_mode=None,
+    ):
         """
         Process an uploaded image and create all size variants.
 
+        The image is decoded once and the decoded image is shared by saliency
+        detection and every variant.
+
         Args:
             image_file: Uploaded image file
             photo_uuid: UUID of the photo for naming (string)
             original_ext: Original file extension
             existing_focal_point: Optional (x, y) tuple for existing focal point (0-1 normalized).
                                  If provided, skips focal point detection and uses this value.
+            img: Optional already decoded PIL Image for image_file
+            timings: Optional dict that receives per-stage durations in seconds
+            saliency_mode: "full" or "fast" focal point detection (default SALIENCY_MODE)
 
         Returns:
             tuple: (variants dict, focal_point tuple or None, saliency_map_bytes or None)
@@ -587,6 +1045,12 @@ class ImageOptimizer:
         focal_point = None
         saliency_map_bytes = None
 
+        if img is None:
+            with timed_stage(timings, "decode"):
+                image_file.seek(0)
+                img = Image.open(image_file)
+                img.load()
+
         # Use existing focal point if provided (override mode), otherwise compute new one
         if existing_focal_point is not None:
             focal_point = existing_focal_point
@@ -594,15 +1058,14 @@ class ImageOptimizer:
         else:
             # Compute focal point and saliency map once before processing variants
             # This avoids recomputing saliency detection multiple times
-            image_file.seek(0)
-            img = Image.open(image_file)
-            if img.mode != "RGB":
-                img = img.convert("RGB")
-            focal_point, saliency_map_bytes = SmartCrop.find_focal_point(img, return_saliency_map=True)
+            with timed_stage(timings, "saliency"):
+                focal_point, saliency_map_bytes = SmartCrop.find_focal_point(
+                    img, return_saliency_map=True, mode=saliency_mode or cls.SALIENCY_MODE
+                )
 
         for size_name in ["preview", "thumbnail"]:
-            image_file.seek(0)
-            optimized, _ = cls.optimize_image(image_file, size_name, focal_point=focal_point)
+            with timed_stage(timings, f"variant_{size_name}"):
+                optimized, _ = cls.optimize_image(image_file, size_name, focal_point=focal_point, img=img)
 
             variant_filename = cls.generate_filename(photo_uuid, size_name, original_ext)
             optimized.name = variant_filename
@@ -611,12 +1074,15 @@ class ImageOptimizer:
         return (variants, focal_point, saliency_map_bytes)
 
     @classmethod
-    def compute_saliency_map(cls, image_file):
+    def compute_saliency_map(cls, image_file, img=None, saliency_mode=None):
         """
         Compute and return the saliency map for debugging/visualization.
 
         Args:
             image_file: Django ImageField file or file-like object
+            img: Optional already decoded PIL Image for image_file (skips opening it again)
+            saliency_mode: "full" or "fast" (default SALIENCY_MODE). In fast mode a
+                           JPEG is only decoded at reduced scale.
 
         Returns:
             bytes or None: PNG-encoded saliency map bytes, or None if computation fails
@@ -625,14 +1091,16 @@ class ImageOptimizer:
 
         logger = logging.getLogger(__name__)
 
+        saliency_mode = saliency_mode or cls.SALIENCY_MODE
         try:
-            image_file.seek(0)
-            img = Image.open(image_file)
-
-            if img.mode != "RGB":
-                img = img.convert("RGB")
+            if img is None:
+                if saliency_mode == "fast":
+                    img = SmartCrop.open_for_saliency(image_file)
+                else:
+                    image_file.seek(0)
+                    img = Image.open(image_file)
 
-            _, saliency_map_bytes = SmartCrop.find_focal_point(img, return_saliency_map=True)
+            _, saliency_map_bytes = SmartCrop.find_focal_point(img, return_saliency_map=True, mode=saliency_mode)
 
             if saliency_map_bytes is None:
                 logger.warning(
@@ -652,20 +1120,25 @@ class DuplicateDetector:
     Handles duplicate image detection using various hashing methods.
     """
 
+    # Maximum Hamming distance for flagging an upload as similar to an existing photo
+    SIMILARITY_THRESHOLD = 5
+
     @staticmethod
-    def compute_and_store_hashes(image_file):
+    def compute_and_store_hashes(image_file, img=None, file_hash=None):
         """
         Compute both file and perceptual hashes in one operation.
 
         Args:
             image_file: Django ImageField file or file-like object
+            img: Optional already decoded PIL Image for image_file
+            file_hash: Optional SHA-256 already computed while reading the file
 
         Returns:
             dict: Dictionary containing 'file_hash' and 'perceptual_hash'
         """
         return {
-            "file_hash": DuplicateDetector.compute_file_hash(image_file),
-            "perceptual_hash": DuplicateDetector.compute_perceptual_hash(image_file),
+            "file_hash": file_hash or DuplicateDetector.compute_file_hash(image_file),
+            "perceptual_hash": DuplicateDetector.compute_perceptual_hash(image_file, img=img),
         }
 
     @staticmethod
@@ -702,7 +1175,7 @@ class DuplicateDetector:
             return None
 
     @staticmethod
-    def compute_perceptual_hash(image_file, hash_size=16):
+    def compute_perceptual_hash(image_file, hash_size=16, img=None):
         """
         Compute perceptual hash for similar image detection.
         This can detect images that are visually similar even if they've been:
@@ -714,13 +1187,15 @@ class DuplicateDetector:
         Args:
             image_file: Django ImageField file or file-like object
             hash_size: Size of the hash (higher = more precise, but less tolerant to changes)
+            img: Optional already decoded PIL Image for image_file (skips opening it again)
 
         Returns:
             str: Hexadecimal perceptual hash string
         """
         try:
-            image_file.seek(0)
-            img = Image.open(image_file)
+            if img is None:
+                image_file.seek(0)
+                img = Image.open(image_file)
 
             if img.mode not in ("RGB", "L"):
                 if img.mode == "RGBA":
@@ -803,7 +1278,7 @@ class DuplicateDetector:
             return False, float("inf")
 
     @staticmethod
-    def find_duplicates(image_file, existing_photos_queryset, exact_match_only=False):
+    def find_duplicates(image_file, existing_photos_queryset, exact_match_only=False, img=None, file_hash=None):
         """
         Find duplicate or similar images in the database.
 
@@ -811,6 +1286,8 @@ class DuplicateDetector:
             image_file: Image file to check for duplicates
             existing_photos_queryset: QuerySet of Photo objects to check against
             exact_match_only: If True, only check for exact file duplicates
+            img: Optional already decoded PIL Image for image_file
+            file_hash: Optional SHA-256 already computed while reading the file
 
         Returns:
             dict: {
@@ -828,32 +1305,35 @@ class DuplicateDetector:
         }
 
         try:
-            file_hash = DuplicateDetector.compute_file_hash(image_file)
+            file_hash = file_hash or DuplicateDetector.compute_file_hash(image_file)
             result["file_hash"] = file_hash
 
             if not exact_match_only:
-                perceptual_hash = DuplicateDetector.compute_perceptual_hash(image_file)
+                perceptual_hash = DuplicateDetector.compute_perceptual_hash(image_file, img=img)
                 result["perceptual_hash"] = perceptual_hash
 
+            # Exact and similar matches come back from one indexed query; Hamming
+            # distances are computed in Postgres on the packed hash segments
+            candidates = existing_photos_queryset
+            conditions = []
             if file_hash:
-                exact_matches = existing_photos_queryset.filter(file_hash=file_hash)
-                result["exact_duplicates"] = list(exact_matches)
-
-            if not exact_match_only and perceptual_hash:
-                photos_with_hashes = existing_photos_queryset.exclude(perceptual_hash__isnull=True).exclude(
-                    perceptual_hash=""
+                conditions.append(Q(file_hash=file_hash))
+            if not exact_match_only and hash_segments(perceptual_hash) is not None:
+                candidates = annotate_phash_distance(candidates, perceptual_hash)
+                conditions.append(
+                    phash_prefilter(perceptual_hash, DuplicateDetector.SIMILARITY_THRESHOLD)
+                    & Q(phash_distance__lte=DuplicateDetector.SIMILARITY_THRESHOLD)
                 )
 
-                for photo in photos_with_hashes:
-                    is_similar, distance = DuplicateDetector.compare_hashes(
-                        perceptual_hash, photo.perceptual_hash, threshold=5
-                    )
-
-                    if is_similar and photo not in result["exact_duplicates"]:
-                        result["similar_images"].append((photo, distance))
+            if conditions:
+                for photo in candidates.filter(reduce(operator.or_, conditions)):
+                    if file_hash and photo.file_hash == file_hash:
+                        result["exact_duplicates"].append(photo)
+                    else:
+                        result["similar_images"].append((photo, photo.phash_distance))
 
                 # Sort by similarity score (lower distance = more similar)
-                result["similar_images"].sort(key=lambda x: x[1])
+                result["similar_images"].sort(key=lambda x: (x[1], x[0].pk))
 
         except Exception as e:
             print(f"Error finding duplicates: {e}")
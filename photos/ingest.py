@@ -0,0 +1,214 @@
+"""
+Bulk photo ingestion.
+
+Uploading a shoot one photo at a time costs a full save cycle per file:
+Photo.save() hashes the upload, runs a duplicate query, inserts the row, and
+a separate Celery task is queued for each photo. ingest_photos() handles a
+whole batch at once:
+
+1. every file is hashed (SHA-256, CRC-32, size, perceptual hash) in the
+   shared worker process pool,
+2. exact duplicates are dropped against the batch itself and against the
+   library with a single file_hash query,
+3. originals are uploaded to storage by a thread pool and the rows are
+   inserted with bulk_create(),
+4. staged processing (photos.processing) is queued as Celery groups of
+   TASK_GROUP_SIZE photos, at BACKFILL_PRIORITY unless the caller is serving
+   an upload.
+
+Rows are created with processing_status "pending" and their hashes already
+set, so the metadata stage only has to read dimensions and EXIF.
+
+Usage:
+    outcomes = ingest_photos([(name, path_or_uploaded_file), ...], album=album)
+    [o for o in outcomes if o["status"] == "created"]
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.core.files import File
+from django.db import transaction
+
+from photos import hash_index
+from photos.image_utils import _get_variant_executor, hash_upload
+from photos.models import AlbumPhoto, Photo
+from photos.processing import BACKFILL_PRIORITY, queue_photo_processing
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 500
+UPLOAD_WORKERS = 8
+TASK_GROUP_SIZE = 100
+
+
+def _hash_input(source):
+    """What hash_upload is given for a source: its path when it is on disk, else its bytes."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if hasattr(source, "temporary_file_path"):
+        return source.temporary_file_path()
+    source.seek(0)
+    return source.read()
+
+
+def _outcome(func):
+    try:
+        return func()
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        return e
+
+
+def hash_sources(sources):
+    """
+    Hash every source in the worker pool.
+
+    Returns:
+        list: hash_upload() dicts in input order, or the exception for files that could not be read
+    """
+    inputs = [_hash_input(source) for source in sources]
+    try:
+        executor = _get_variant_executor()
+        futures = [executor.submit(hash_upload, item) for item in inputs]
+        return [_outcome(future.result) for future in futures]
+    except BrokenProcessPool:
+        logger.warning("Worker pool broke while hashing uploads; hashing in this process")
+        _get_variant_executor.cache_clear()
+        return [_outcome(partial(hash_upload, item)) for item in inputs]
+
+
+def _store_original(item):
+    filename, source, photo = item
+    name = photo.image.field.generate_filename(photo, filename)
+    storage = photo.image.field.storage
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            photo.image = storage.save(name, File(f, name=filename))
+    else:
+        source.seek(0)
+        photo.image = storage.save(name, source)
+    return photo
+
+
+def _delete_originals(photos):
+    for photo in photos:
+        try:
+            photo.image.storage.delete(photo.image.name)
+        except Exception as e:
+            logger.warning(f"Could not delete {photo.image.name} after a failed ingest: {e}")
+
+
+def queue_processing(photo_ids, force=False, priority=BACKFILL_PRIORITY):
+    """Queue staged processing for each photo, TASK_GROUP_SIZE photos per published group; complete ones only if force."""
+    if not force:
+        complete = set(
+            Photo.objects.filter(pk__in=photo_ids, processing_status="complete").values_list("pk", flat=True)
+        )
+        photo_ids = [pk for pk in photo_ids if pk not in complete]
+    queue_photo_processing(photo_ids, priority=priority, group_size=TASK_GROUP_SIZE)
+
+
+def _schedule_album_zip(album):
+    """AlbumPhoto.bulk_create() sends no signals, so do what album_photo_changed would once."""
+    if not album.allow_downloads or album.zip_mode == "stream":
+        return
+
+    from photos.tasks import schedule_zip_generation
+
+    album.zip_generation_status = "pending"
+    album.save(update_fields=["zip_generation_status"])
+    schedule_zip_generation.delay(album.id)
+
+
+def ingest_photos(files, album=None, process=True, priority=BACKFILL_PRIORITY):
+    """
+    Create photos for a batch of files.
+
+    Args:
+        files: Iterable of (filename, source); source is a local path or a Django File/UploadedFile
+        album: Optional PhotoAlbum to add the new photos to
+        process: Queue background processing for the new photos
+        priority: Task priority of that processing (see photos.processing)
+
+    Returns:
+        list: One dict per file in input order with filename, status ("created",
+              "duplicate" or "error"), photo (for created files) and message
+    """
+    files = list(files)
+    outcomes = [{"filename": filename, "status": "error", "photo": None, "message": ""} for filename, _ in files]
+    hashes = hash_sources(source for _, source in files)
+
+    file_hashes = {hashed["file_hash"] for hashed in hashes if isinstance(hashed, dict)}
+    existing = {}
+    for photo in Photo.objects.filter(file_hash__in=file_hashes).only("id", "file_hash", "original_filename"):
+        existing.setdefault(photo.file_hash, photo)
+
+    seen = {}
+    pending = []
+    for outcome, (filename, source), hashed in zip(outcomes, files, hashes, strict=True):
+        if isinstance(hashed, Exception):
+            outcome["message"] = f"Not a readable image: {hashed}"
+            continue
+
+        duplicate = existing.get(hashed["file_hash"])
+        if duplicate is not None:
+            outcome.update(status="duplicate", message=f"Exact duplicate of '{duplicate}' (ID: {duplicate.pk})")
+            continue
+        if hashed["file_hash"] in seen:
+            outcome.update(
+                status="duplicate", message=f"Exact duplicate of '{seen[hashed['file_hash']]}' in this batch"
+            )
+            continue
+        seen[hashed["file_hash"]] = filename
+
+        photo = Photo(original_filename=os.path.basename(filename), processing_status="pending", **hashed)
+        photo._sync_hash_segments({})
+        pending.append((outcome, (filename, source, photo)))
+
+    photos = []
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        futures = [(outcome, executor.submit(_store_original, item)) for outcome, item in pending]
+        for outcome, future in futures:
+            try:
+                outcome["photo"] = future.result()
+            except Exception as e:
+                outcome["message"] = f"Upload failed: {e}"
+            else:
+                photos.append(outcome["photo"])
+
+    if not photos:
+        return outcomes
+
+    try:
+        with transaction.atomic():
+            Photo.objects.bulk_create(photos, batch_size=INSERT_BATCH_SIZE)
+            if album:
+                AlbumPhoto.objects.bulk_create(
+                    [AlbumPhoto(album=album, photo=photo) for photo in photos],
+                    batch_size=INSERT_BATCH_SIZE,
+                    ignore_conflicts=True,
+                )
+    except Exception:
+        _delete_originals(photos)
+        raise
+
+    for outcome in outcomes:
+        if outcome["photo"] is not None:
+            outcome["status"] = "created"
+
+    # bulk_create() skips post_save, so the signal handlers' work happens here once per batch
+    hash_index.update_photos((photo.pk, photo.perceptual_hash) for photo in photos)
+    if album:
+        album.refresh_summary()
+        album.record_zip_changes(("add", photo.pk, photo.file_hash) for photo in photos)
+        _schedule_album_zip(album)
+    if process:
+        queue_processing([photo.pk for photo in photos], priority=priority)
+
+    logger.info(f"Ingested {len(photos)} of {len(files)} photos")
+    return outcomes
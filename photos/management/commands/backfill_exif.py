@@ -0,0 +1,81 @@
+"""
+Management command to re-extract EXIF metadata without reprocessing photos.
+
+Reads only the header of each original, parses it in the worker pool and
+writes the EXIF fields in bulk. Variants, hashes and the focal point are not
+touched.
+
+Usage:
+    python manage.py backfill_exif
+    python manage.py backfill_exif --missing
+    python manage.py backfill_exif --ids 1,2,3
+    python manage.py backfill_exif --limit 1000 --batch-size 250
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from photos.exif_backfill import backfill_exif
+from photos.models import Photo
+
+
+class Command(BaseCommand):
+    help = "Re-extract EXIF metadata from the headers of the originals (no variant regeneration)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ids",
+            type=str,
+            help="Comma-separated list of photo IDs (e.g., '1,2,3')",
+        )
+        parser.add_argument(
+            "--missing",
+            action="store_true",
+            help="Only photos that have no EXIF data stored",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Maximum number of photos to check",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of photos read, parsed and updated per batch (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.order_by("pk")
+        if options["ids"]:
+            photos = photos.filter(pk__in=[int(pk.strip()) for pk in options["ids"].split(",")])
+        if options["missing"]:
+            photos = photos.filter(exif_data__isnull=True)
+
+        photo_ids = list(photos.values_list("pk", flat=True)[: options["limit"]])
+        if not photo_ids:
+            self.stdout.write(self.style.WARNING("No photos to check"))
+            return
+
+        batch_size = max(options["batch_size"], 1)
+        self.stdout.write(f"Checking EXIF of {len(photo_ids)} photo(s) in batches of {batch_size}...")
+
+        started = time.perf_counter()
+        counts = {"updated": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+        for start in range(0, len(photo_ids), batch_size):
+            batch = Photo.objects.filter(pk__in=photo_ids[start : start + batch_size]).only(
+                "pk", "image", *Photo.EXIF_FIELDS
+            )
+            for key, count in backfill_exif(batch, batch_size=batch_size).items():
+                counts[key] += count
+            self.stdout.write(f"  {min(start + batch_size, len(photo_ids))}/{len(photo_ids)} photos checked")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done in {elapsed:.1f}s: {counts['updated']} updated, {counts['unchanged']} unchanged, "
+                f"{counts['skipped']} without image or EXIF, {counts['failed']} failed"
+            )
+        )
@@ -0,0 +1,186 @@
+"""
+Management command to benchmark photo processing.
+
+Compares the decode-once ImagePipeline with running each processing step on
+its own (every step opening and decoding the original again, with
+full-resolution saliency), and prints a per-stage timing breakdown. The focal
+point found by the pipeline's saliency mode is compared with the
+full-resolution one to report its accuracy. Nothing is written to storage or
+the database.
+
+Usage:
+    python manage.py benchmark_image_pipeline
+    python manage.py benchmark_image_pipeline --megapixels 24 --count 3
+    python manage.py benchmark_image_pipeline --files photo1.jpg photo2.jpg
+    python manage.py benchmark_image_pipeline --saliency-mode full
+"""
+
+import math
+import time
+import uuid
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from photos.image_utils import (
+    DuplicateDetector,
+    ExifExtractor,
+    ImageMetadataExtractor,
+    ImageOptimizer,
+    SmartCrop,
+    timed_stage,
+)
+from photos.pipeline import ImagePipeline
+
+
+def synthetic_jpeg(megapixels, seed):
+    """
+    Build a photo-like JPEG (gradients, a bright subject and sensor noise) of about the given size.
+
+    Returns:
+        tuple: (JPEG bytes, (x, y) position of the subject as 0-1 fractions)
+    """
+    rng = np.random.default_rng(seed)
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = int(width * 2 / 3)
+
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    cx, cy = rng.uniform(0.2, 0.8) * width, rng.uniform(0.2, 0.8) * height
+    subject = np.exp(-(((x - cx) / (width * 0.08)) ** 2 + ((y - cy) / (height * 0.08)) ** 2))
+
+    channels = [
+        60 + 80 * (x / width) + 160 * subject,
+        70 + 60 * (y / height) + 120 * subject,
+        110 - 50 * (x / width) + 40 * subject,
+    ]
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 6, size=(height, width, 1))
+    img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+
+    output = BytesIO()
+    img.save(output, format="JPEG", quality=90)
+    return output.getvalue(), (cx / width, cy / height)
+
+
+def run_separate_decodes(data, photo_uuid, saliency_mode):
+    """Original processing order: every step opens and decodes the file itself, saliency at full resolution."""
+    timings = {}
+    image_file = BytesIO(data)
+    with timed_stage(timings, "hashes"):
+        DuplicateDetector.compute_and_store_hashes(image_file)
+    with timed_stage(timings, "metadata"):
+        ImageMetadataExtractor.extract_basic_metadata(image_file)
+    with timed_stage(timings, "exif"):
+        ExifExtractor.extract_exif(image_file)
+    with timed_stage(timings, "saliency"):
+        image_file.seek(0)
+        img = Image.open(image_file).convert("RGB")
+        focal_point, _ = SmartCrop.find_focal_point(img, return_saliency_map=True, mode="full")
+        del img
+    for size_name in ["preview", "thumbnail"]:
+        with timed_stage(timings, f"variant_{size_name}"):
+            image_file.seek(0)
+            ImageOptimizer.optimize_image(image_file, size_name, focal_point=focal_point)
+    return timings, focal_point
+
+
+def run_pipeline(data, photo_uuid, saliency_mode):
+    with ImagePipeline(BytesIO(data)) as pipeline:
+        pipeline.hashes()
+        pipeline.metadata()
+        pipeline.exif()
+        _, focal_point, _ = pipeline.variants(photo_uuid, saliency_mode=saliency_mode)
+    return pipeline.timings, focal_point
+
+
+class Command(BaseCommand):
+    help = "Benchmark the decode-once image pipeline against per-step decoding"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--files",
+            nargs="+",
+            help="Image files to benchmark (default: generate synthetic JPEGs)",
+        )
+        parser.add_argument(
+            "--megapixels",
+            type=float,
+            default=24,
+            help="Size of generated JPEGs in megapixels (default: 24)",
+        )
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=3,
+            help="Number of JPEGs to generate (default: 3)",
+        )
+        parser.add_argument(
+            "--saliency-mode",
+            choices=SmartCrop.SALIENCY_MODES,
+            default=ImageOptimizer.SALIENCY_MODE,
+            help=f"Saliency mode for the pipeline run (default: {ImageOptimizer.SALIENCY_MODE})",
+        )
+
+    def handle(self, *args, **options):
+        if options["files"]:
+            samples = []
+            for path in options["files"]:
+                file_path = Path(path)
+                if not file_path.is_file():
+                    raise CommandError(f"File not found: {path}")
+                samples.append((file_path.name, file_path.read_bytes(), None))
+        else:
+            self.stdout.write(f"Generating {options['count']} synthetic {options['megapixels']:g} MP JPEGs...")
+            samples = [
+                (f"synthetic_{i + 1}.jpg", *synthetic_jpeg(options["megapixels"], seed=i))
+                for i in range(options["count"])
+            ]
+
+        totals = {"separate": {}, "pipeline": {}}
+        focal_offsets = []
+        for name, data, subject in samples:
+            with Image.open(BytesIO(data)) as img:
+                width, height = img.size
+            self.stdout.write(f"\n{name} ({width}x{height}, {len(data) / 1024 / 1024:.1f} MB)")
+
+            photo_uuid = str(uuid.uuid4())
+            focal_points = {}
+            for label, runner in (("separate", run_separate_decodes), ("pipeline", run_pipeline)):
+                start = time.perf_counter()
+                timings, focal_points[label] = runner(data, photo_uuid, options["saliency_mode"])
+                elapsed = time.perf_counter() - start
+                stages = " ".join(f"{stage}={seconds:.3f}s" for stage, seconds in timings.items())
+                self.stdout.write(f"  {label:<9} {elapsed:7.3f}s  {stages}")
+
+                for stage, seconds in timings.items():
+                    totals[label][stage] = totals[label].get(stage, 0.0) + seconds
+                totals[label]["total"] = totals[label].get("total", 0.0) + elapsed
+
+            # Distance between the two focal points as a fraction of the image diagonal
+            (full_x, full_y), (x, y) = focal_points["separate"], focal_points["pipeline"]
+            offset = math.hypot((x - full_x) * width, (y - full_y) * height) / math.hypot(width, height)
+            focal_offsets.append(offset)
+            self.stdout.write(
+                f"  focal     full=({full_x:.3f}, {full_y:.3f}) {options['saliency_mode']}=({x:.3f}, {y:.3f}) "
+                f"offset={offset:.2%} of diagonal"
+                + (f" subject=({subject[0]:.3f}, {subject[1]:.3f})" if subject else "")
+            )
+
+        separate_total = totals["separate"]["total"]
+        pipeline_total = totals["pipeline"]["total"]
+        separate_saliency = totals["separate"].get("saliency", 0.0)
+        pipeline_saliency = totals["pipeline"].get("saliency", 0.0)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\n{'=' * 60}\n"
+                f"Images:         {len(samples)}\n"
+                f"Separate:       {separate_total:.3f}s (saliency {separate_saliency:.3f}s, full)\n"
+                f"Pipeline:       {pipeline_total:.3f}s (saliency {pipeline_saliency:.3f}s, {options['saliency_mode']})\n"
+                f"Speedup:        {separate_total / pipeline_total:.2f}x\n"
+                f"Focal offset:   mean {sum(focal_offsets) / len(focal_offsets):.2%}, "
+                f"max {max(focal_offsets):.2%} of diagonal\n"
+                f"{'=' * 60}"
+            )
+        )
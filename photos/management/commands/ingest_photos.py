@@ -0,0 +1,102 @@
+"""
+Management command to import a local directory of photos in bulk.
+
+Usage:
+    python manage.py ingest_photos /path/to/shoot
+    python manage.py ingest_photos /path/to/shoot --album california-trip-2025
+    python manage.py ingest_photos /path/to/shoot --recursive --batch-size 200
+    python manage.py ingest_photos /path/to/shoot --no-process
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from photos.ingest import ingest_photos
+from photos.models import PhotoAlbum
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".tif", ".tiff", ".bmp"}
+
+
+class Command(BaseCommand):
+    help = "Import every image in a directory: parallel hashing, batched inserts and grouped processing tasks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", type=str, help="Directory containing the photos")
+        parser.add_argument(
+            "--album",
+            type=str,
+            help="Slug of an album to add the imported photos to",
+        )
+        parser.add_argument(
+            "--recursive",
+            action="store_true",
+            help="Include photos in subdirectories",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of files hashed and inserted per batch (default: 100)",
+        )
+        parser.add_argument(
+            "--no-process",
+            action="store_true",
+            help="Create the photos without queuing background processing",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory")
+
+        album = None
+        if options["album"]:
+            try:
+                album = PhotoAlbum.objects.get(slug=options["album"])
+            except PhotoAlbum.DoesNotExist:
+                raise CommandError(f"Album '{options['album']}' not found") from None
+
+        paths = self._find_images(directory, options["recursive"])
+        if not paths:
+            self.stdout.write(self.style.WARNING("No images found"))
+            return
+
+        batch_size = max(options["batch_size"], 1)
+        self.stdout.write(f"Importing {len(paths)} photo(s) in batches of {batch_size}...")
+
+        counts = {"created": 0, "duplicate": 0, "error": 0}
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start : start + batch_size]
+            outcomes = ingest_photos(
+                ((os.path.relpath(path, directory), path) for path in batch),
+                album=album,
+                process=not options["no_process"],
+            )
+            for outcome in outcomes:
+                counts[outcome["status"]] += 1
+                if outcome["status"] != "created":
+                    self.stdout.write(f"  {outcome['filename']}: {outcome['message']}")
+            self.stdout.write(f"  {min(start + batch_size, len(paths))}/{len(paths)} files handled")
+
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done: {counts['created']} created, {counts['duplicate']} duplicate(s) skipped, "
+                f"{counts['error']} error(s)"
+            )
+        )
+
+    @staticmethod
+    def _find_images(directory, recursive):
+        paths = []
+        for root, dirs, filenames in os.walk(directory):
+            dirs.sort()
+            paths.extend(
+                os.path.join(root, filename)
+                for filename in sorted(filenames)
+                if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+            )
+            if not recursive:
+                break
+        return paths
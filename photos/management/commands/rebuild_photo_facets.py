@@ -0,0 +1,31 @@
+"""
+Management command to recompute photo facet values and their counts.
+
+Photo saves and album membership changes keep the counts current; run this
+after edits that bypass signals (queryset.update(), raw SQL, restores).
+
+Usage:
+    python manage.py rebuild_photo_facets
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from photos.facets import rebuild_facet_counts
+from photos.models import PhotoFacetCount
+
+
+class Command(BaseCommand):
+    help = "Recompute every photo's facet values and the library and album facet counts"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        changed = rebuild_facet_counts()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done in {elapsed:.1f}s: {changed} photo(s) had stale facet values, "
+                f"{PhotoFacetCount.objects.count()} facet count(s) stored"
+            )
+        )
@@ -6,12 +6,16 @@ Usage:
     python manage.py reprocess_photos --status pending
     python manage.py reprocess_photos --ids 1,2,3
     python manage.py reprocess_photos --limit 10
+    python manage.py reprocess_photos --stale-variants --async
 """
 
 import logging
 
 from django.core.management.base import BaseCommand
+from django.db.models import Q
 
+from photos.image_utils import ImageOptimizer
+from photos.ingest import queue_processing
 from photos.models import Photo
 
 logger = logging.getLogger(__name__)
@@ -37,6 +41,18 @@ class Command(BaseCommand):
             type=int,
             help="Maximum number of photos to process",
         )
+        parser.add_argument(
+            "--stale-variants",
+            action="store_true",
+            help="Only photos whose variants were encoded by a different encoder version "
+            "(resumable: finished photos drop out of the selection)",
+        )
+        parser.add_argument(
+            "--async",
+            action="store_true",
+            dest="run_async",
+            help="Queue the photos as Celery task groups instead of processing them here",
+        )
 
     def handle(self, *args, **options):
         status = options["status"]
@@ -53,6 +69,11 @@ class Command(BaseCommand):
             photos = photos.filter(processing_status=status)
             self.stdout.write(f"Filtering to photos with status: {status}")
 
+        if options["stale_variants"]:
+            encoder = ImageOptimizer.variant_encoder()
+            photos = photos.filter(~Q(variants__encoder=encoder) | Q(variants__encoder__isnull=True))
+            self.stdout.write(f"Filtering to photos whose variants predate encoder {encoder}")
+
         if limit:
             photos = photos[:limit]
             self.stdout.write(f"Limiting to {limit} photo(s)")
@@ -63,6 +84,13 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING("No photos to process"))
             return
 
+        if options["run_async"]:
+            photo_ids = [pk for pk, image in photos.values_list("pk", "image") if image]
+            Photo.objects.filter(pk__in=photo_ids).update(processing_status="pending")
+            queue_processing(photo_ids, force=True)
+            self.stdout.write(self.style.SUCCESS(f"Queued {len(photo_ids)} photo(s) for processing"))
+            return
+
         self.stdout.write(self.style.SUCCESS(f"\nStarting local photo processing for {total} photo(s)...\n"))
 
         success_count = 0
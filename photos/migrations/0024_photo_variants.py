@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0023_add_focal_point_override'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Responsive variant ladder: encoded formats and the widths generated per ladder, e.g. {"formats": ["avif", "webp", "jpeg"], "grid": [320, 640], "display": [640, 1024]}'),
+        ),
+    ]
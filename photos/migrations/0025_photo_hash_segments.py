@@ -0,0 +1,85 @@
+# Generated by Django 5.2.9 on 2026-10-18 21:07
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+def backfill_hash_segments(apps, schema_editor):
+    """Split existing 256-bit hex perceptual hashes into four signed 64-bit segments."""
+    Photo = apps.get_model('photos', 'Photo')
+    photos = []
+    for photo in Photo.objects.exclude(perceptual_hash='').only('id', 'perceptual_hash').iterator():
+        if len(photo.perceptual_hash) != 64:
+            continue
+        try:
+            words = [int(photo.perceptual_hash[i:i + 16], 16) for i in range(0, 64, 16)]
+        except ValueError:
+            continue
+        photo.phash_0, photo.phash_1, photo.phash_2, photo.phash_3 = (
+            word - (1 << 64) if word >= (1 << 63) else word for word in words
+        )
+        photos.append(photo)
+    Photo.objects.bulk_update(photos, ['phash_0', 'phash_1', 'phash_2', 'phash_3'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0024_photo_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='phash_0',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Bits 0-63 of perceptual_hash', null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='phash_1',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Bits 64-127 of perceptual_hash', null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='phash_2',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Bits 128-191 of perceptual_hash', null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='phash_3',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Bits 192-255 of perceptual_hash', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('phash_0'), '>>', models.Value(32)), name='photo_phash0_hi_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('phash_0'), '&', models.Value(4294967295)), name='photo_phash0_lo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('phash_1'), '>>', models.Value(32)), name='photo_phash1_hi_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('phash_1'), '&', models.Value(4294967295)), name='photo_phash1_lo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('phash_2'), '>>', models.Value(32)), name='photo_phash2_hi_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('phash_2'), '&', models.Value(4294967295)), name='photo_phash2_lo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('phash_3'), '>>', models.Value(32)), name='photo_phash3_hi_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('phash_3'), '&', models.Value(4294967295)), name='photo_phash3_lo_idx'),
+        ),
+        migrations.RunPython(backfill_hash_segments, reverse_code=migrations.RunPython.noop),
+    ]
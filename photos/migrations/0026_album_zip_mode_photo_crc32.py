@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 21:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0025_photo_hash_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='file_crc32',
+            field=models.PositiveBigIntegerField(blank=True, help_text='CRC-32 of the original file, used for streamed album ZIPs', null=True),
+        ),
+        migrations.AddField(
+            model_name='photoalbum',
+            name='zip_mode',
+            field=models.CharField(choices=[('prebuilt', 'Prebuilt ZIP'), ('stream', 'Streamed on the fly')], default='prebuilt', help_text='Prebuilt: a ZIP is rebuilt after photos change. Streamed: the ZIP is generated while it downloads, with no build step or stored copy.', max_length=20),
+        ),
+    ]
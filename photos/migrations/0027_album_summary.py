@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-18 21:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_album_summaries(apps, schema_editor):
+    """Fill photo_count and a cover for existing albums; rotate_album_covers takes over from there."""
+    PhotoAlbum = apps.get_model('photos', 'PhotoAlbum')
+    AlbumPhoto = apps.get_model('photos', 'AlbumPhoto')
+    for album in PhotoAlbum.objects.all():
+        photo_ids = AlbumPhoto.objects.filter(album=album).order_by('photo_id').values_list('photo_id', flat=True)
+        album.photo_count = photo_ids.count()
+        album.cover_photo_id = photo_ids.first()
+        album.save(update_fields=['photo_count', 'cover_photo'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0026_album_zip_mode_photo_crc32'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photoalbum',
+            name='cover_photo',
+            field=models.ForeignKey(blank=True, help_text='Cover shown in album listings; rotates daily', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='photos.photo'),
+        ),
+        migrations.AddField(
+            model_name='photoalbum',
+            name='photo_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of photos in the album', verbose_name='Photos'),
+        ),
+        migrations.AddField(
+            model_name='photoalbum',
+            name='photos_changed_at',
+            field=models.DateTimeField(blank=True, help_text='When photos were last added to or removed from the album', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='photoalbum',
+            index=models.Index(fields=['is_private', '-created_at'], name='album_listing_idx'),
+        ),
+        migrations.RunPython(backfill_album_summaries, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.9 on 2026-10-18 21:41
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_zip_digests(apps, schema_editor):
+    """
+    Compute zip_digest for existing albums.
+
+    Albums whose ZIP matched the old SHA-256 content hash are marked current
+    under the new digest, so the switch doesn't regenerate every archive.
+    """
+    PhotoAlbum = apps.get_model('photos', 'PhotoAlbum')
+    AlbumPhoto = apps.get_model('photos', 'AlbumPhoto')
+    for album in PhotoAlbum.objects.all():
+        photos = list(
+            AlbumPhoto.objects.filter(album=album).order_by('photo_id').values_list('photo_id', 'photo__file_hash')
+        )
+        digest = 0
+        for photo_id, file_hash in photos:
+            # Same as photos.models.photo_zip_digest
+            value = hashlib.sha256(f'{photo_id}:{file_hash or ""}'.encode()).digest()
+            digest ^= int.from_bytes(value[:8], 'big', signed=True)
+        album.zip_digest = digest
+
+        old_hash = hashlib.sha256('|'.join(f'{pid}:{fhash}' for pid, fhash in photos).encode()).hexdigest()
+        if photos and album.zip_content_hash == old_hash:
+            album.zip_content_hash = f'{digest & 0xFFFFFFFFFFFFFFFF:016x}' if digest else ''
+        album.save(update_fields=['zip_digest', 'zip_content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0027_album_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photoalbum',
+            name='zip_digest',
+            field=models.BigIntegerField(default=0, help_text="XOR of the photos' (id, file hash) digests, updated in O(1) as photos are added or removed"),
+        ),
+        migrations.AddField(
+            model_name='photoalbum',
+            name='zip_journal_position',
+            field=models.BigIntegerField(default=0, help_text='Last AlbumZipJournal entry included in the current ZIP file'),
+        ),
+        migrations.AddField(
+            model_name='photoalbum',
+            name='zip_manifest',
+            field=models.JSONField(blank=True, default=list, help_text='Entries of the current ZIP file in order: [name, photo id, file hash, size, crc32, modified]'),
+        ),
+        migrations.AlterField(
+            model_name='photoalbum',
+            name='zip_content_hash',
+            field=models.CharField(blank=True, help_text='zip_digest the current ZIP file was built from', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='AlbumZipJournal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('photo_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('add', 'Added'), ('remove', 'Removed')], max_length=10)),
+                ('file_hash', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('album', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zip_journal', to='photos.photoalbum')),
+            ],
+            options={
+                'verbose_name': 'Album ZIP Journal Entry',
+                'verbose_name_plural': 'Album ZIP Journal',
+                'indexes': [models.Index(fields=['album', 'id'], name='album_zip_journal_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_zip_digests, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-18 21:58
+
+from django.db import migrations, models
+
+from photos.geo import geohash_for
+
+
+def backfill_geohashes(apps, schema_editor):
+    Photo = apps.get_model('photos', 'Photo')
+    photos = Photo.objects.filter(gps_latitude__isnull=False, gps_longitude__isnull=False).only(
+        'gps_latitude', 'gps_longitude'
+    )
+    batch = []
+    for photo in photos.iterator(chunk_size=2000):
+        photo.geohash = geohash_for(photo.gps_latitude, photo.gps_longitude)
+        batch.append(photo)
+        if len(batch) == 2000:
+            Photo.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    Photo.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0028_album_zip_journal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='geohash',
+            field=models.CharField(blank=True, help_text='Geohash of the GPS coordinates, kept in sync on save (see photos.geo)', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='photoalbum',
+            name='map_clusters',
+            field=models.JSONField(blank=True, default=dict, help_text='Map clusters of the located photos per geohash precision; empty until built (see photos.geo)'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['geohash'], name='photo_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_geohashes, migrations.RunPython.noop),
+    ]
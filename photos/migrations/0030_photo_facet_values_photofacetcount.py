@@ -0,0 +1,83 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:03
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+from photos.facets import SOURCE_FIELDS, facet_values_for
+
+
+def backfill_facets(apps, schema_editor):
+    Photo = apps.get_model('photos', 'Photo')
+    PhotoFacetCount = apps.get_model('photos', 'PhotoFacetCount')
+    AlbumPhoto = apps.get_model('photos', 'AlbumPhoto')
+    batch = []
+    for photo in Photo.objects.only(*SOURCE_FIELDS).iterator(chunk_size=2000):
+        photo.facet_values = facet_values_for(photo)
+        batch.append(photo)
+        if len(batch) == 2000:
+            Photo.objects.bulk_update(batch, ['facet_values'])
+            batch = []
+    Photo.objects.bulk_update(batch, ['facet_values'])
+
+    # Same rollup as photos.facets.rebuild_facet_counts()
+    table = PhotoFacetCount._meta.db_table
+    photos = Photo._meta.db_table
+    album_photos = AlbumPhoto._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (album_id, facet, value, count)
+            SELECT NULL, facet.key, facet.value, count(*)
+            FROM {photos} AS photo, jsonb_each_text(photo.facet_values) AS facet
+            GROUP BY facet.key, facet.value
+            UNION ALL
+            SELECT member.album_id, facet.key, facet.value, count(*)
+            FROM {album_photos} AS member
+            JOIN {photos} AS photo ON photo.id = member.photo_id,
+            jsonb_each_text(photo.facet_values) AS facet
+            GROUP BY member.album_id, facet.key, facet.value
+            """  # nosec B608
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0029_photo_geohash_album_map_clusters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('month', 'Month taken'), ('camera', 'Camera'), ('lens', 'Lens'), ('focal_length', 'Focal length'), ('aperture', 'Aperture'), ('iso', 'ISO')], max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Photo Facet Count',
+                'verbose_name_plural': 'Photo Facet Counts',
+            },
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='facet_values',
+            field=models.JSONField(blank=True, default=dict, help_text='Browse facet values derived from the EXIF fields, kept in sync on save (see photos.facets)'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['facet_values'], name='photo_facet_values_idx', opclasses=['jsonb_path_ops']),
+        ),
+        migrations.AddField(
+            model_name='photofacetcount',
+            name='album',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='photos.photoalbum'),
+        ),
+        migrations.AddConstraint(
+            model_name='photofacetcount',
+            constraint=models.UniqueConstraint(fields=('album', 'facet', 'value'), name='photo_facet_count_unique', nulls_distinct=False),
+        ),
+        migrations.RunPython(backfill_facets, migrations.RunPython.noop),
+    ]
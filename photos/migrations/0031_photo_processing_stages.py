@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0030_photo_facet_values_photofacetcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='processing_stages',
+            field=models.JSONField(blank=True, default=dict, help_text='State of each background processing stage, e.g. {"metadata": "complete", "variants": "processing"} (see photos.processing); empty for photos processed in one pass'),
+        ),
+    ]
@@ -1,13 +1,30 @@
+import hashlib
+import logging
 import os
 import uuid
+import zlib
+from decimal import Decimal
 
 from django.contrib.postgres.indexes import GinIndex
-from django.contrib.postgres.search import SearchVectorField
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
 from django.db import models
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
 from django.utils.text import slugify
 
-from photos.image_utils import DuplicateDetector, ExifExtractor, ImageMetadataExtractor, ImageOptimizer
+from photos.album_cache import GRID_ORDERING
+from photos.facets import FACET_LABELS, SOURCE_FIELDS, facet_values_for
+from photos.geo import GEOHASH_PRECISION, build_map_clusters, geohash_for
+from photos.hash_index import SEGMENT_FIELDS, get_index, hash_segments, segment_halves
+from photos.image_utils import DuplicateDetector, ExifExtractor, ImageOptimizer
+from photos.pipeline import ImagePipeline
+from photos.processing import STAGES
+from photos.zip_stream import open_read_stream
+
+logger = logging.getLogger(__name__)
 
 
 def photo_upload_to(instance, filename):
@@ -41,6 +58,34 @@ class Photo(models.Model):
         ("failed", "Failed"),
     ]
 
+    # Fields set from an original's EXIF by apply_exif()
+    EXIF_FIELDS = (
+        "exif_data",
+        "camera_make",
+        "camera_model",
+        "lens_model",
+        "focal_length",
+        "aperture",
+        "shutter_speed",
+        "iso",
+        "date_taken",
+        "gps_latitude",
+        "gps_longitude",
+        "gps_altitude",
+        "geohash",
+        "facet_values",
+    )
+    # Fields set by _process_metadata() besides the EXIF_FIELDS
+    METADATA_FIELDS = (
+        "file_hash",
+        "perceptual_hash",
+        "original_filename",
+        "width",
+        "height",
+        "file_size",
+        "file_crc32",
+    )
+
     uuid = models.UUIDField(
         default=uuid.uuid4,
         editable=False,
@@ -57,6 +102,14 @@ class Photo(models.Model):
         db_index=True,
         help_text="Status of background image processing",
     )
+    processing_stages = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text=(
+            'State of each background processing stage, e.g. {"metadata": "complete", "variants": "processing"} '
+            "(see photos.processing); empty for photos processed in one pass"
+        ),
+    )
 
     image_thumbnail = models.ImageField(
         upload_to=thumbnail_upload_to,
@@ -80,8 +133,20 @@ class Photo(models.Model):
         help_text="Visualization of saliency detection algorithm for debugging smart crop",
     )
 
+    variants = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text=(
+            "Responsive variant ladder: encoded formats and the widths generated per ladder, "
+            'e.g. {"formats": ["avif", "webp", "jpeg"], "grid": [320, 640], "display": [640, 1024]}'
+        ),
+    )
+
     original_filename = models.CharField(max_length=255, blank=True)
     file_size = models.PositiveIntegerField(null=True, blank=True, help_text="Original file size in bytes")
+    file_crc32 = models.PositiveBigIntegerField(
+        null=True, blank=True, help_text="CRC-32 of the original file, used for streamed album ZIPs"
+    )
     width = models.PositiveIntegerField(null=True, blank=True, help_text="Original image width")
     height = models.PositiveIntegerField(null=True, blank=True, help_text="Original image height")
 
@@ -97,6 +162,11 @@ class Photo(models.Model):
         db_index=True,
         help_text="Perceptual hash for similar image detection",
     )
+    # perceptual_hash as four signed 64-bit segments, for Hamming distance filtering in SQL
+    phash_0 = models.BigIntegerField(null=True, blank=True, editable=False, help_text="Bits 0-63 of perceptual_hash")
+    phash_1 = models.BigIntegerField(null=True, blank=True, editable=False, help_text="Bits 64-127 of perceptual_hash")
+    phash_2 = models.BigIntegerField(null=True, blank=True, editable=False, help_text="Bits 128-191 of perceptual_hash")
+    phash_3 = models.BigIntegerField(null=True, blank=True, editable=False, help_text="Bits 192-255 of perceptual_hash")
 
     focal_point_x = models.FloatField(null=True, blank=True, help_text="X coordinate of focal point (0-1)")
     focal_point_y = models.FloatField(null=True, blank=True, help_text="Y coordinate of focal point (0-1)")
@@ -129,6 +199,16 @@ class Photo(models.Model):
         blank=True,
         help_text="GPS altitude in meters",
     )
+    geohash = models.CharField(
+        max_length=GEOHASH_PRECISION,
+        blank=True,
+        help_text="Geohash of the GPS coordinates, kept in sync on save (see photos.geo)",
+    )
+    facet_values = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Browse facet values derived from the EXIF fields, kept in sync on save (see photos.facets)",
+    )
 
     # PostgreSQL full-text search vector
     search_vector = SearchVectorField(null=True, blank=True)
@@ -141,6 +221,16 @@ class Photo(models.Model):
         verbose_name_plural = "Photos"
         indexes = [
             GinIndex(fields=["search_vector"], name="photo_search_idx"),
+            # Exact-match buckets on the 32-bit halves of each segment (see photos.hash_index.phash_prefilter)
+            *(
+                models.Index(expression, name=f"photo_{field.replace('_', '')}_{half}_idx")
+                for field in SEGMENT_FIELDS
+                for half, expression in zip(("hi", "lo"), segment_halves(field), strict=True)
+            ),
+            # Prefix (LIKE 'abc%') scans for bounding box queries
+            models.Index(fields=["geohash"], name="photo_geohash_idx", opclasses=["varchar_pattern_ops"]),
+            # Containment (@>) filters on facet values
+            GinIndex(fields=["facet_values"], name="photo_facet_values_idx", opclasses=["jsonb_path_ops"]),
         ]
 
     def save(self, *args, **kwargs):
@@ -158,20 +248,57 @@ class Photo(models.Model):
             if self.pk is None or (self.pk and self._image_changed()):
                 skip_duplicate_check = kwargs.pop("skip_duplicate_check", False)
 
-                if not skip_duplicate_check:
-                    self._check_for_duplicates()
+                # Duplicate check and processing share one download and decode of the upload
+                with ImagePipeline(self.image) as pipeline:
+                    if not skip_duplicate_check:
+                        self._check_for_duplicates(pipeline)
 
-                if skip_processing:
-                    self.processing_status = "pending"
-                else:
-                    self._process_image()
+                    if skip_processing:
+                        self.processing_status = "pending"
+                    else:
+                        self._process_image(pipeline)
         except ValidationError:
             raise
         except Exception as e:
             print(f"Error processing image: {e}")
 
+        self._sync_hash_segments(kwargs)
+        self._sync_geohash(kwargs)
+        self._sync_facet_values(kwargs)
         super().save(*args, **kwargs)
 
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "variants" in update_fields:
+            self._delete_stale_variants()
+        self._delete_replaced_files(update_fields)
+
+    def _sync_hash_segments(self, save_kwargs):
+        """Keep phash_0 .. phash_3 in step with perceptual_hash."""
+        segments = hash_segments(self.perceptual_hash) or (None,) * len(SEGMENT_FIELDS)
+        for field, segment in zip(SEGMENT_FIELDS, segments, strict=True):
+            setattr(self, field, segment)
+
+        update_fields = save_kwargs.get("update_fields")
+        if update_fields is not None and "perceptual_hash" in update_fields:
+            save_kwargs["update_fields"] = {*update_fields, *SEGMENT_FIELDS}
+
+    def _sync_geohash(self, save_kwargs):
+        """Keep geohash in step with gps_latitude and gps_longitude."""
+        self.geohash = geohash_for(self.gps_latitude, self.gps_longitude)
+
+        update_fields = save_kwargs.get("update_fields")
+        if update_fields is not None and {"gps_latitude", "gps_longitude"} & set(update_fields):
+            save_kwargs["update_fields"] = {*update_fields, "geohash"}
+
+    def _sync_facet_values(self, save_kwargs):
+        """Keep facet_values in step with the EXIF fields it is derived from."""
+        update_fields = save_kwargs.get("update_fields")
+        if update_fields is not None and not set(SOURCE_FIELDS) & set(update_fields):
+            return
+        self.facet_values = facet_values_for(self)
+        if update_fields is not None:
+            save_kwargs["update_fields"] = {*update_fields, "facet_values"}
+
     def save_minimal(self, file_hash="", perceptual_hash=""):
         """
         Save the photo with minimal processing for async background processing.
@@ -202,12 +329,76 @@ class Photo(models.Model):
         try:
             self._process_image()
             self.processing_status = "complete"
+            self.processing_stages = dict.fromkeys(STAGES, "complete")
             self.save()
+            self.update_search_vector()
         except Exception as e:
             self.processing_status = "failed"
             self.save(update_fields=["processing_status"])
             raise e
 
+    def process_stage(self, stage):
+        """
+        Run one stage of staged processing (see photos.processing) and save what it produced.
+
+        Each stage reads the original itself, so stages can run on different workers.
+
+        Returns:
+            str: The stage's final state, "complete" or "skipped"
+        """
+        if stage == "search":
+            self.update_search_vector()
+            return "complete"
+        if not self.image or (stage == "saliency" and self.focal_point_override):
+            return "skipped"
+
+        with ImagePipeline(self.image) as pipeline:
+            if stage == "metadata":
+                self._process_metadata(pipeline)
+                update_fields = [*self.METADATA_FIELDS, *self.EXIF_FIELDS]
+            elif stage == "variants":
+                focal_point = self._focal_point_or_none()
+                self._save_size_variant(pipeline, "preview", focal_point)
+                self._save_size_variant(pipeline, "thumbnail", focal_point)
+                self._save_variant_ladder(pipeline, focal_point)
+                update_fields = ["image_preview", "image_thumbnail", "variants"]
+            elif stage == "saliency":
+                update_fields = self._process_saliency(pipeline)
+            else:
+                raise ValueError(f"Unknown processing stage: {stage}")
+            logger.info(f"Photo {self.pk} {stage} stage: {pipeline.format_timings()}")
+
+        if update_fields:
+            self.save(update_fields=update_fields)
+        return "complete"
+
+    def _process_saliency(self, pipeline):
+        """
+        Detect the focal point and store the saliency map; re-crop if the focal point moved.
+
+        Returns:
+            list: Names of the fields to save
+        """
+        focal_point, saliency_map_bytes = pipeline.saliency()
+        update_fields = []
+        if saliency_map_bytes:
+            self._replace_file(self.saliency_map, f"{self.uuid}_saliency.png", ContentFile(saliency_map_bytes))
+            update_fields.append("saliency_map")
+        if focal_point and tuple(focal_point) != self._focal_point_or_none():
+            self.focal_point_x, self.focal_point_y = focal_point
+            # Variants were cropped around the previous focal point; full-frame ones are reused
+            self._save_size_variant(pipeline, "thumbnail", self._focal_point_or_none())
+            self._save_variant_ladder(pipeline, self._focal_point_or_none())
+            update_fields.extend(["focal_point_x", "focal_point_y", "image_thumbnail", "variants"])
+        return update_fields
+
+    def update_search_vector(self):
+        """Index the filename, camera and lens for full-text search."""
+        Photo.objects.filter(pk=self.pk).update(
+            search_vector=SearchVector("original_filename", weight="A")
+            + SearchVector("camera_make", "camera_model", "lens_model", weight="B")
+        )
+
     def _image_changed(self):
         """
         Check if the main image has changed.
@@ -221,10 +412,13 @@ class Photo(models.Model):
         except Photo.DoesNotExist:
             return True
 
-    def _check_for_duplicates(self):
+    def _check_for_duplicates(self, pipeline=None):
         """
         Check if the uploaded image is a duplicate of an existing image.
         Raises ValidationError if an exact duplicate is found.
+
+        Args:
+            pipeline: Optional ImagePipeline for self.image to reuse its download and decode.
         """
         if not self.image:
             return
@@ -233,7 +427,10 @@ class Photo(models.Model):
         if self.pk:
             existing_photos = existing_photos.exclude(pk=self.pk)
 
-        duplicates = DuplicateDetector.find_duplicates(self.image, existing_photos, exact_match_only=False)
+        if pipeline is not None:
+            duplicates = pipeline.find_duplicates(existing_photos, exact_match_only=False)
+        else:
+            duplicates = DuplicateDetector.find_duplicates(self.image, existing_photos, exact_match_only=False)
 
         # Store computed hashes for reuse
         if duplicates["file_hash"]:
@@ -248,45 +445,27 @@ class Photo(models.Model):
                 f"The duplicate image was not uploaded."
             )
 
-    def _process_image(self):
+    def _process_image(self, pipeline=None):
         """
         Process the uploaded image and create optimized versions.
+
+        The original is downloaded and decoded once by an ImagePipeline; hashes,
+        metadata, EXIF, the focal point and all variants are derived from it.
+
+        Args:
+            pipeline: Optional ImagePipeline for self.image (e.g. one already used
+                      for the duplicate check). A new one is created otherwise.
         """
         if not self.image:
             return
 
-        if not self.file_hash or not self.perceptual_hash:
-            hashes = DuplicateDetector.compute_and_store_hashes(self.image)
-            self.file_hash = hashes["file_hash"] or ""
-            self.perceptual_hash = hashes["perceptual_hash"] or ""
-
-        self.original_filename = os.path.basename(self.image.name)
-        metadata = ImageMetadataExtractor.extract_basic_metadata(self.image)
-        self.width = metadata["width"]
-        self.height = metadata["height"]
-        self.file_size = metadata["file_size"]
+        if pipeline is None:
+            with ImagePipeline(self.image) as pipeline:
+                self._process_image(pipeline)
+            return
 
-        self.image.seek(0)  # Reset file pointer before reading EXIF
-        exif_data = ExifExtractor.extract_exif(self.image)
+        self._process_metadata(pipeline)
 
-        if exif_data:
-            full_exif = exif_data.pop("full_exif", {})
-            serializable_exif = ExifExtractor.make_exif_serializable(full_exif)
-
-            self.exif_data = serializable_exif
-            self.camera_make = exif_data.get("camera_make", "")
-            self.camera_model = exif_data.get("camera_model", "")
-            self.lens_model = exif_data.get("lens_model", "")
-            self.focal_length = exif_data.get("focal_length", "")
-            self.aperture = exif_data.get("aperture", "")
-            self.shutter_speed = exif_data.get("shutter_speed", "")
-            self.iso = exif_data.get("iso")
-            self.date_taken = exif_data.get("date_taken")
-            self.gps_latitude = exif_data.get("gps_latitude")
-            self.gps_longitude = exif_data.get("gps_longitude")
-            self.gps_altitude = exif_data.get("gps_altitude")
-
-        self.image.seek(0)  # Reset file pointer before processing
         original_ext = os.path.splitext(self.original_filename)[1] or ".jpg"
 
         # If override is enabled, use existing focal point values; otherwise compute new ones
@@ -296,8 +475,8 @@ class Photo(models.Model):
             existing_focal_point = (self.focal_point_x, self.focal_point_y)
             has_existing_focal_point = True
 
-        variants, focal_point, saliency_map_bytes = ImageOptimizer.process_uploaded_image(
-            self.image, str(self.uuid), original_ext, existing_focal_point=existing_focal_point
+        variants, focal_point, saliency_map_bytes = pipeline.variants(
+            str(self.uuid), original_ext, existing_focal_point=existing_focal_point
         )
 
         # Only update focal point if we're not preserving existing values
@@ -306,27 +485,259 @@ class Photo(models.Model):
             self.focal_point_y = focal_point[1]
 
         if "thumbnail" in variants:
-            self.image_thumbnail.save(variants["thumbnail"].name, variants["thumbnail"], save=False)
+            self._replace_file(self.image_thumbnail, variants["thumbnail"].name, variants["thumbnail"])
 
         if "preview" in variants:
-            self.image_preview.save(variants["preview"].name, variants["preview"], save=False)
+            self._replace_file(self.image_preview, variants["preview"].name, variants["preview"])
+
+        self._save_variant_ladder(pipeline, self._focal_point_or_none())
 
         # Save saliency map for debugging (already computed during focal point calculation)
         if saliency_map_bytes:
-            import logging
-
-            from django.core.files.base import ContentFile
-
-            logger = logging.getLogger(__name__)
             saliency_filename = f"{self.uuid}_saliency.png"
-            self.saliency_map.save(saliency_filename, ContentFile(saliency_map_bytes), save=False)
+            self._replace_file(self.saliency_map, saliency_filename, ContentFile(saliency_map_bytes))
             logger.info(f"Saved saliency map for photo {self.pk}: {saliency_filename}")
         else:
-            import logging
-
-            logger = logging.getLogger(__name__)
             logger.warning(f"No saliency map generated for photo {self.pk} - computation returned None")
 
+        logger.info(f"Processed photo {self.pk} ({self.width}x{self.height}): {pipeline.format_timings()}")
+
+    def _process_metadata(self, pipeline):
+        """Set the METADATA_FIELDS and EXIF_FIELDS from the original (does not save)."""
+        if not self.file_hash or not self.perceptual_hash:
+            hashes = pipeline.hashes()
+            self.file_hash = hashes["file_hash"] or ""
+            self.perceptual_hash = hashes["perceptual_hash"] or ""
+
+        self.original_filename = os.path.basename(self.image.name)
+        metadata = pipeline.metadata()
+        self.width = metadata["width"]
+        self.height = metadata["height"]
+        self.file_size = metadata["file_size"]
+        self.file_crc32 = pipeline.file_crc32
+
+        exif_data = pipeline.exif()
+
+        if exif_data:
+            self.apply_exif(exif_data)
+
+    def apply_exif(self, exif_data):
+        """
+        Set the EXIF_FIELDS from ExifExtractor.extract_exif() output (does not save).
+
+        Returns:
+            list: Names of the fields whose value changed
+        """
+        values = {
+            "exif_data": ExifExtractor.make_exif_serializable(exif_data.get("full_exif", {})),
+            "camera_make": exif_data.get("camera_make", ""),
+            "camera_model": exif_data.get("camera_model", ""),
+            "lens_model": exif_data.get("lens_model", ""),
+            "focal_length": exif_data.get("focal_length", ""),
+            "aperture": exif_data.get("aperture", ""),
+            "shutter_speed": exif_data.get("shutter_speed", ""),
+            "iso": exif_data.get("iso"),
+            "date_taken": exif_data.get("date_taken"),
+            "gps_latitude": exif_data.get("gps_latitude"),
+            "gps_longitude": exif_data.get("gps_longitude"),
+            "gps_altitude": exif_data.get("gps_altitude"),
+        }
+        changed = []
+        for field, value in values.items():
+            # Compare decimals at the stored precision
+            new_value = (
+                round(value, self._meta.get_field(field).decimal_places) if isinstance(value, Decimal) else value
+            )
+            if getattr(self, field) != new_value:
+                setattr(self, field, new_value)
+                changed.append(field)
+
+        geohash = geohash_for(self.gps_latitude, self.gps_longitude)
+        if self.geohash != geohash:
+            self.geohash = geohash
+            changed.append("geohash")
+        facet_values = facet_values_for(self)
+        if self.facet_values != facet_values:
+            self.facet_values = facet_values
+            changed.append("facet_values")
+        return changed
+
+    def _focal_point_or_none(self):
+        if self.focal_point_x is None or self.focal_point_y is None:
+            return None
+        return (self.focal_point_x, self.focal_point_y)
+
+    def _save_size_variant(self, pipeline, size_name, focal_point):
+        """Encode the thumbnail or preview and attach it to its field (does not save)."""
+        original_ext = os.path.splitext(self.original_filename)[1] or ".jpg"
+        field = self.image_thumbnail if size_name == "thumbnail" else self.image_preview
+        self._replace_file(
+            field,
+            ImageOptimizer.generate_filename(self.uuid, size_name, original_ext),
+            pipeline.size_variant(size_name, focal_point),
+        )
+
+    def _replace_file(self, field, name, content):
+        """
+        Store new content in a file field (does not save).
+
+        The previous file is deleted after the next save() that writes the
+        field; storages that don't overwrite give the new file another name.
+        """
+        previous = field.name
+        field.save(name, content, save=False)
+        if previous and previous != field.name:
+            if not hasattr(self, "_replaced_file_names"):
+                self._replaced_file_names = {}
+            self._replaced_file_names.setdefault(field.field.name, set()).add(previous)
+
+    def _delete_replaced_files(self, update_fields):
+        replaced = getattr(self, "_replaced_file_names", None)
+        if not replaced:
+            return
+        for field_name in list(replaced):
+            if update_fields is not None and field_name not in update_fields:
+                continue
+            for name in replaced.pop(field_name):
+                try:
+                    self.image.storage.delete(name)
+                except Exception as e:
+                    logger.warning(f"Could not delete replaced file {name} of photo {self.pk}: {e}")
+
+    def _save_variant_ladder(self, pipeline, focal_point):
+        """
+        Encode the responsive variant ladder into the content-addressed variant store.
+
+        Variants whose content key (original, spec, focal point, encoder) is
+        already in the current manifest are reused without being encoded again.
+        Files the new manifest no longer references are deleted after the next
+        save() has stored it.
+        """
+        previous = self.variants or {}
+        files, manifest = pipeline.variant_ladder(focal_point, reuse=previous.get("keys", {}).values())
+        storage = self.image.storage
+        overwrites = getattr(storage, "file_overwrite", False)
+
+        pending = []
+        for (ladder, width, format_name), data in files.items():
+            key = manifest["keys"][ImageOptimizer.variant_label(ladder, width, format_name)]
+            name = ImageOptimizer.variant_path(self.uuid, ladder, width, format_name, key=key)
+            # A key always names the same bytes, so an existing copy is as good as a new one
+            if overwrites or not storage.exists(name):
+                pending.append((name, ContentFile(data)))
+
+        # PublicMediaStorage uploads the set concurrently
+        if hasattr(storage, "save_many"):
+            storage.save_many(pending)
+        else:
+            for name, content in pending:
+                storage.save(name, content)
+
+        self.variants = manifest
+        current = self._variant_files(manifest)
+        self._stale_variant_names = {
+            name: key for name, key in self._variant_files(previous).items() if name not in current
+        }
+        logger.info(f"Photo {self.pk}: encoded {len(files)} variant(s), reused {len(manifest['keys']) - len(files)}")
+
+    def _variant_path(self, ladder, width, format_name, manifest=None):
+        manifest = self.variants if manifest is None else manifest
+        key = (manifest or {}).get("keys", {}).get(ImageOptimizer.variant_label(ladder, width, format_name))
+        return ImageOptimizer.variant_path(self.uuid, ladder, width, format_name, key=key)
+
+    def _variant_files(self, manifest):
+        """Storage name -> content key (None for per-photo paths) of every variant a manifest references."""
+        formats = [name for name in manifest.get("formats", []) if name in ImageOptimizer.VARIANT_FORMATS]
+        keys = manifest.get("keys", {})
+        return {
+            self._variant_path(ladder, width, format_name, manifest): keys.get(
+                ImageOptimizer.variant_label(ladder, width, format_name)
+            )
+            for ladder, widths in manifest.items()
+            if ladder not in ("formats", "keys", "encoder")
+            for width in widths
+            for format_name in formats
+        }
+
+    def _variant_names(self, manifest):
+        """Storage names of every variant a manifest references."""
+        return set(self._variant_files(manifest))
+
+    def _variant_keys_in_use(self, keys):
+        """
+        Those of these content keys that another photo's manifest references.
+
+        The content-addressed store is shared: photos with the same original
+        (saved through save_minimal() or skip_duplicate_check) reuse its files.
+        """
+        keys = sorted(keys)
+        if not keys:
+            return set()
+        references_any = RawSQL(
+            f"""EXISTS (SELECT 1 FROM jsonb_each_text("{Photo._meta.db_table}"."variants" -> 'keys') """
+            "WHERE value = ANY(%s))",
+            (keys,),
+            output_field=models.BooleanField(),
+        )
+        in_use = set()
+        for manifest in Photo.objects.exclude(pk=self.pk).filter(references_any).values_list("variants", flat=True):
+            in_use.update(manifest["keys"].values())
+        return in_use.intersection(keys)
+
+    def _delete_stale_variants(self):
+        stale = getattr(self, "_stale_variant_names", None)
+        if not stale:
+            return
+        self._stale_variant_names = {}
+        in_use = self._variant_keys_in_use(key for key in stale.values() if key)
+        names = [name for name, key in stale.items() if key not in in_use]
+        for name in names:
+            try:
+                self.image.storage.delete(name)
+            except Exception as e:
+                logger.warning(f"Could not delete stale variant {name} of photo {self.pk}: {e}")
+
+    def update_crops(self):
+        """
+        Regenerate only what depends on the focal point: the thumbnail and the cropped ladders.
+
+        Full-frame variants keep their content keys and are reused, so moving the
+        focal point costs a few small encodes instead of a full reprocess.
+        """
+        if not self.image:
+            return
+
+        focal_point = self._focal_point_or_none()
+        with ImagePipeline(self.image) as pipeline:
+            self._save_size_variant(pipeline, "thumbnail", focal_point)
+            self._save_variant_ladder(pipeline, focal_point)
+            logger.info(f"Updated crops of photo {self.pk}: {pipeline.format_timings()}")
+
+        self.save(update_fields=["image_thumbnail", "variants"])
+
+    def get_variant_srcset(self, ladder, format_name):
+        """
+        srcset value for one ladder in one format, e.g. "https://.../grid_320.avif 320w, ...".
+
+        Returns an empty string if the photo has no such variants (e.g. not reprocessed yet).
+        """
+        variants = self.variants or {}
+        if format_name not in variants.get("formats", []) or not variants.get(ladder):
+            return ""
+        storage = self.image.storage
+        return ", ".join(
+            f"{storage.url(self._variant_path(ladder, width, format_name))} {width}w" for width in variants[ladder]
+        )
+
+    def get_variant_url(self, ladder, format_name="jpeg", width=None):
+        """URL of the smallest variant at least `width` wide (the largest one if none is), or None."""
+        variants = self.variants or {}
+        widths = variants.get(ladder)
+        if format_name not in variants.get("formats", []) or not widths:
+            return None
+        chosen = next((w for w in widths if w >= width), widths[-1]) if width else widths[-1]
+        return self.image.storage.url(self._variant_path(ladder, chosen, format_name))
+
     def get_image_url(self, size="thumbnail"):
         """
         Get the URL for a specific image size.
@@ -352,6 +763,23 @@ class Photo(models.Model):
         except (ValueError, AttributeError):
             return None  # File doesn't exist or can't generate URL
 
+    def ensure_zip_checksum(self):
+        """
+        Make sure file_size and file_crc32 describe the stored original, reading it once if either is missing.
+
+        Streamed album ZIPs need both before the first byte is sent.
+        """
+        if self.file_size is not None and self.file_crc32 is not None:
+            return
+
+        crc, size = 0, 0
+        with open_read_stream(self.image) as (stream, _):
+            for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+        self.file_size, self.file_crc32 = size, crc
+        Photo.objects.filter(pk=self.pk).update(file_size=size, file_crc32=crc)
+
     def get_similar_images(self, threshold=5):
         """
         Find images that are visually similar to this one.
@@ -365,20 +793,10 @@ class Photo(models.Model):
         if not self.perceptual_hash:
             return []
 
-        similar = []
-        other_photos = (
-            Photo.objects.exclude(pk=self.pk).exclude(perceptual_hash__isnull=True).exclude(perceptual_hash="")
-        )
-
-        for photo in other_photos:
-            is_similar, distance = DuplicateDetector.compare_hashes(
-                self.perceptual_hash, photo.perceptual_hash, threshold=threshold
-            )
-            if is_similar:
-                similar.append((photo, distance))
-
-        similar.sort(key=lambda x: x[1])  # Sort by distance (most similar first)
-        return similar
+        matches = get_index().query(self.perceptual_hash, threshold=threshold, exclude_id=self.pk)
+        photos = Photo.objects.in_bulk([photo_id for photo_id, _ in matches])
+        # Matches are already sorted by distance (most similar first)
+        return [(photos[photo_id], distance) for photo_id, distance in matches if photo_id in photos]
 
     def __str__(self):
         if self.original_filename:
@@ -387,6 +805,12 @@ class Photo(models.Model):
             return f"Photo {self.pk}"
 
 
+def photo_zip_digest(photo_id, file_hash):
+    """A photo's 64-bit contribution to PhotoAlbum.zip_digest (signed, to fit a bigint)."""
+    digest = hashlib.sha256(f"{photo_id}:{file_hash or ''}".encode()).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
 class PhotoAlbum(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
@@ -397,7 +821,38 @@ class PhotoAlbum(models.Model):
 
     is_private = models.BooleanField(default=False)
 
+    # Listing summary, kept current by the AlbumPhoto signals (see refresh_summary)
+    photo_count = models.PositiveIntegerField(
+        default=0, verbose_name="Photos", help_text="Number of photos in the album"
+    )
+    cover_photo = models.ForeignKey(
+        Photo,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text="Cover shown in album listings; rotates daily",
+    )
+    photos_changed_at = models.DateTimeField(
+        null=True, blank=True, help_text="When photos were last added to or removed from the album"
+    )
+    map_clusters = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Map clusters of the located photos per geohash precision; empty until built (see photos.geo)",
+    )
+
     allow_downloads = models.BooleanField(default=False)
+    zip_mode = models.CharField(
+        max_length=20,
+        choices=[
+            ("prebuilt", "Prebuilt ZIP"),
+            ("stream", "Streamed on the fly"),
+        ],
+        default="prebuilt",
+        help_text="Prebuilt: a ZIP is rebuilt after photos change. "
+        "Streamed: the ZIP is generated while it downloads, with no build step or stored copy.",
+    )
 
     # External sharing fields
     share_token = models.UUIDField(
@@ -421,7 +876,20 @@ class PhotoAlbum(models.Model):
     zip_content_hash = models.CharField(
         max_length=64,
         blank=True,
-        help_text="SHA-256 hash of photo IDs + file hashes for change detection",
+        help_text="zip_digest the current ZIP file was built from",
+    )
+    zip_digest = models.BigIntegerField(
+        default=0,
+        help_text="XOR of the photos' (id, file hash) digests, updated in O(1) as photos are added or removed",
+    )
+    zip_journal_position = models.BigIntegerField(
+        default=0,
+        help_text="Last AlbumZipJournal entry included in the current ZIP file",
+    )
+    zip_manifest = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Entries of the current ZIP file in order: [name, photo id, file hash, size, crc32, modified]",
     )
     zip_generated_at = models.DateTimeField(
         null=True,
@@ -454,6 +922,7 @@ class PhotoAlbum(models.Model):
         verbose_name_plural = "Photo Albums"
         indexes = [
             GinIndex(fields=["search_vector"], name="album_search_idx"),
+            models.Index(fields=["is_private", "-created_at"], name="album_listing_idx"),
         ]
 
     def save(self, *args, **kwargs):
@@ -466,23 +935,135 @@ class PhotoAlbum(models.Model):
                 counter += 1
         super().save(*args, **kwargs)
 
+    def pick_cover_photo_id(self, day=None, count=None):
+        """
+        Cover photo for a given day (default: today).
+
+        Deterministic: every process picks the same photo all day, and the
+        choice moves to another photo the next day.
+        """
+        if count is None:
+            count = self.album_photos.count()
+        if not count:
+            return None
+        day = day or timezone.localdate()
+        seed = hashlib.sha256(f"{self.pk}:{day.isoformat()}".encode()).digest()
+        index = int.from_bytes(seed[:8], "big") % count
+        return self.album_photos.order_by("photo_id").values_list("photo_id", flat=True)[index]
+
+    def refresh_summary(self, changed=True):
+        """
+        Recompute photo_count and cover_photo so listings need no per-album queries.
+
+        Args:
+            changed: The album's photos changed (updates photos_changed_at); False for the daily cover rotation
+        """
+        self.photo_count = self.album_photos.count()
+        self.cover_photo_id = self.pick_cover_photo_id(count=self.photo_count)
+        update_fields = ["photo_count", "cover_photo"]
+        if changed:
+            self.photos_changed_at = timezone.now()
+            update_fields.append("photos_changed_at")
+        self.save(update_fields=update_fields)
+
+    def compute_map_clusters(self):
+        """
+        Map clusters of the album's located photos (one query), without storing them.
+
+        Returns:
+            dict: See photos.geo.build_map_clusters()
+        """
+        rows = (
+            self.album_photos.exclude(photo__geohash="")
+            .order_by(*GRID_ORDERING)
+            .values_list("photo_id", "photo__gps_latitude", "photo__gps_longitude", "photo__geohash")
+        )
+        return build_map_clusters(rows.iterator())
+
+    def refresh_map_clusters(self):
+        """
+        Rebuild map_clusters from the album's located photos and store them.
+
+        Returns:
+            dict: The new map_clusters
+        """
+        self.map_clusters = self.compute_map_clusters()
+        # A queryset update: the album page and sitemap don't depend on the clusters
+        PhotoAlbum.objects.filter(pk=self.pk).update(map_clusters=self.map_clusters)
+        return self.map_clusters
+
     def compute_zip_content_hash(self) -> str:
-        import hashlib
+        """The album's current content digest as hex, "" when empty; reads no photos."""
+        return f"{self.zip_digest & 0xFFFFFFFFFFFFFFFF:016x}" if self.zip_digest else ""
 
-        photos = self.photos.order_by("id").values_list("id", "file_hash")
-        if not photos:
-            return ""
+    @property
+    def builds_zip_file(self) -> bool:
+        """Whether generate_album_zip keeps a stored ZIP file for this album (downloads on, not streamed)."""
+        return self.allow_downloads and self.zip_mode != "stream"
 
-        content_string = "|".join(f"{pid}:{fhash}" for pid, fhash in photos)
-        return hashlib.sha256(content_string.encode()).hexdigest()
+    def record_zip_changes(self, changes):
+        """
+        Fold photo membership changes into zip_digest and append them to the ZIP journal.
 
-    def needs_zip_regeneration(self) -> bool:
+        XOR is its own inverse and order-independent, so adding and removing
+        a photo are the same O(1) update, applied atomically in the database.
+        Only albums that build a stored ZIP keep a journal: generate_album_zip
+        is what prunes it, and it never runs for the others.
+
+        Args:
+            changes: Iterable of (action, photo_id, file_hash); action is "add" or "remove"
+        """
+        changes = list(changes)
+        if not changes:
+            return
+
+        delta = 0
+        for _, photo_id, file_hash in changes:
+            delta ^= photo_zip_digest(photo_id, file_hash)
+        if self.builds_zip_file:
+            AlbumZipJournal.objects.bulk_create(
+                [
+                    AlbumZipJournal(album=self, action=action, photo_id=photo_id, file_hash=file_hash or "")
+                    for action, photo_id, file_hash in changes
+                ]
+            )
+        PhotoAlbum.objects.filter(pk=self.pk).update(zip_digest=F("zip_digest").bitxor(delta))
+        self.refresh_from_db(fields=["zip_digest"])
+
+    def recompute_zip_digest(self):
+        """Rebuild zip_digest from every photo (O(n)); for repairs, the journal keeps it current otherwise."""
+        digest = 0
+        for photo_id, file_hash in self.photos.values_list("id", "file_hash").iterator():
+            digest ^= photo_zip_digest(photo_id, file_hash)
+        self.zip_digest = digest
+        self.save(update_fields=["zip_digest"])
+        return digest
+
+    def pending_zip_changes(self):
+        """Journal entries recorded since the current ZIP file was built, oldest first."""
+        return self.zip_journal.filter(pk__gt=self.zip_journal_position).order_by("pk")
+
+    def zip_entries(self):
+        """(archive name, photo) for every photo in download order; shared by prebuilt and streamed ZIPs."""
+        photos = self.photos.all().order_by("date_taken", "created_at")
+        for idx, photo in enumerate(photos.iterator(), 1):
+            if photo.image:
+                yield f"{idx:03d}_{photo.original_filename or f'photo_{photo.id}.jpg'}", photo
+
+    @property
+    def zip_download_available(self) -> bool:
         if not self.allow_downloads:
             return False
+        if self.zip_mode == "stream":
+            return True
+        return bool(self.zip_file) and self.zip_generation_status == "ready"
+
+    def needs_zip_regeneration(self) -> bool:
+        if not self.builds_zip_file:
+            return False
         if not self.photos.exists():
             return False
-        current_hash = self.compute_zip_content_hash()
-        return current_hash != self.zip_content_hash
+        return self.compute_zip_content_hash() != self.zip_content_hash
 
     def get_photos_with_featured(self):
         return self.album_photos.select_related("photo").order_by(
@@ -525,3 +1106,62 @@ class AlbumPhoto(models.Model):
     def __str__(self):
         featured = " (Featured)" if self.is_featured else ""
         return f"{self.photo} in {self.album}{featured}"
+
+
+class PhotoFacetCount(models.Model):
+    """
+    Number of photos with a facet value, library-wide (album NULL) or in an album.
+
+    Maintained incrementally by photos.signals; see photos.facets.
+    """
+
+    album = models.ForeignKey(
+        PhotoAlbum,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="facet_counts",
+    )
+    facet = models.CharField(max_length=20, choices=list(FACET_LABELS.items()))
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Photo Facet Count"
+        verbose_name_plural = "Photo Facet Counts"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["album", "facet", "value"],
+                name="photo_facet_count_unique",
+                nulls_distinct=False,
+            )
+        ]
+
+    def __str__(self):
+        scope = f"album {self.album_id}" if self.album_id else "library"
+        return f"{self.facet}={self.value}: {self.count} in {scope}"
+
+
+class AlbumZipJournal(models.Model):
+    """
+    Append-only log of photos added to and removed from an album.
+
+    Entries after PhotoAlbum.zip_journal_position are the changes the album's
+    ZIP file does not contain yet; generate_album_zip prunes the rest. Albums
+    that don't build a stored ZIP (downloads off or streamed) keep no entries.
+    """
+
+    album = models.ForeignKey(PhotoAlbum, on_delete=models.CASCADE, related_name="zip_journal")
+    # Not a foreign key: removals must outlive the photo
+    photo_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=[("add", "Added"), ("remove", "Removed")])
+    file_hash = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Album ZIP Journal Entry"
+        verbose_name_plural = "Album ZIP Journal"
+        indexes = [models.Index(fields=["album", "id"], name="album_zip_journal_idx")]
+
+    def __str__(self):
+        return f"{self.get_action_display()} photo {self.photo_id} in album {self.album_id}"
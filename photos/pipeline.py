@@ -0,0 +1,240 @@
+"""
+Decode-once processing pipeline for uploaded photos.
+
+Photo processing used to open and decode the original separately for the file
+hash, perceptual hash, dimensions, EXIF, saliency and each variant, and every
+step re-read the file from storage. ImagePipeline reads the original once into
+a spooled temporary file (hashing it with SHA-256 and CRC-32 while copying),
+decodes it once, and hands the same decoded image to every step in
+photos.image_utils.
+
+The download and decode happen lazily on first use, so a pipeline can be
+created up front and passed around without cost when nothing needs the pixels.
+
+Usage:
+    with ImagePipeline(photo.image) as pipeline:
+        hashes = pipeline.hashes()
+        metadata = pipeline.metadata()
+        exif = pipeline.exif()
+        variants, focal_point, saliency_map_bytes = pipeline.variants(str(photo.uuid), ".jpg")
+    logger.info(pipeline.format_timings())
+"""
+
+import hashlib
+import logging
+import tempfile
+import zlib
+
+from PIL import Image
+
+from photos.image_utils import (
+    DuplicateDetector,
+    ExifExtractor,
+    ImageMetadataExtractor,
+    ImageOptimizer,
+    SmartCrop,
+    timed_stage,
+)
+
+logger = logging.getLogger(__name__)
+
+# Originals up to this size stay in memory; larger ones spill to a temp file on disk
+SPOOL_MAX_MEMORY = 32 * 1024 * 1024  # 32MB
+READ_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class ImagePipeline:
+    """
+    Shares one download and one decode of an original image between all processing steps.
+
+    Attributes:
+        timings: Dict of stage name -> seconds spent, filled in as stages run
+    """
+
+    def __init__(self, image_file):
+        self.image_file = image_file
+        self.timings = {}
+        self._file = None
+        self._image = None
+        self._file_hash = None
+        self._file_crc32 = None
+        self._file_size = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the decoded image and the spooled copy of the original."""
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def file(self):
+        """Local, seekable copy of the original."""
+        if self._file is None:
+            self._download()
+        return self._file
+
+    @property
+    def file_hash(self):
+        """SHA-256 of the original, computed while it was downloaded."""
+        if self._file is None:
+            self._download()
+        return self._file_hash
+
+    @property
+    def file_crc32(self):
+        """CRC-32 of the original (as stored in ZIP entries), computed while it was downloaded."""
+        if self._file is None:
+            self._download()
+        return self._file_crc32
+
+    @property
+    def file_size(self):
+        """Size of the original in bytes."""
+        if self._file is None:
+            self._download()
+        return self._file_size
+
+    @property
+    def image(self):
+        """The decoded original. Steps must not modify it in place."""
+        if self._image is None:
+            with timed_stage(self.timings, "decode"):
+                self.file.seek(0)
+                image = Image.open(self.file)
+                image.load()
+            self._image = image
+        return self._image
+
+    def _download(self):
+        with timed_stage(self.timings, "download"):
+            hasher = hashlib.sha256()
+            crc = 0
+            size = 0
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+
+            source = self.image_file
+            if hasattr(source, "open") and getattr(source, "closed", False):
+                source.open("rb")
+            source.seek(0)
+            for chunk in iter(lambda: source.read(READ_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+                crc = zlib.crc32(chunk, crc)
+                spool.write(chunk)
+                size += len(chunk)
+            source.seek(0)
+
+            spool.seek(0)
+            self._file = spool
+            self._file_hash = hasher.hexdigest()
+            self._file_crc32 = crc
+            self._file_size = size
+
+    def hashes(self):
+        """File and perceptual hashes, without re-reading or re-decoding the original."""
+        img = self.image  # Decode outside the stage timer so it is only counted once
+        with timed_stage(self.timings, "hashes"):
+            return DuplicateDetector.compute_and_store_hashes(self.file, img=img, file_hash=self.file_hash)
+
+    def find_duplicates(self, existing_photos_queryset, exact_match_only=False):
+        """DuplicateDetector.find_duplicates() using the shared download and decode."""
+        img = self.image
+        with timed_stage(self.timings, "duplicates"):
+            return DuplicateDetector.find_duplicates(
+                self.file,
+                existing_photos_queryset,
+                exact_match_only=exact_match_only,
+                img=img,
+                file_hash=self.file_hash,
+            )
+
+    def metadata(self):
+        """Dimensions, format and file size of the original."""
+        img = self.image
+        with timed_stage(self.timings, "metadata"):
+            metadata = ImageMetadataExtractor.extract_basic_metadata(self.file, img=img)
+            if metadata.get("file_size") is None:
+                metadata["file_size"] = self.file_size
+            return metadata
+
+    def exif(self):
+        """EXIF data read from the already decoded image."""
+        img = self.image
+        with timed_stage(self.timings, "exif"):
+            return ExifExtractor.extract_exif(self.file, img=img)
+
+    def variants(self, photo_uuid, original_ext=".jpg", existing_focal_point=None, saliency_mode=None):
+        """
+        Focal point, saliency map and all size variants from the shared decode.
+
+        saliency_mode is passed to ImageOptimizer.process_uploaded_image().
+
+        Returns:
+            tuple: (variants dict, focal_point tuple or None, saliency_map_bytes or None)
+        """
+        return ImageOptimizer.process_uploaded_image(
+            self.file,
+            photo_uuid,
+            original_ext,
+            existing_focal_point=existing_focal_point,
+            img=self.image,
+            timings=self.timings,
+            saliency_mode=saliency_mode,
+        )
+
+    def saliency(self, saliency_mode=None):
+        """
+        Focal point and saliency map from the shared decode.
+
+        Returns:
+            tuple: (focal_point tuple or None, saliency_map_bytes or None)
+        """
+        img = self.image
+        with timed_stage(self.timings, "saliency"):
+            return SmartCrop.find_focal_point(
+                img, return_saliency_map=True, mode=saliency_mode or ImageOptimizer.SALIENCY_MODE
+            )
+
+    def size_variant(self, size_name, focal_point=None):
+        """One named size (thumbnail or preview) from the shared decode, as a file."""
+        img = self.image
+        with timed_stage(self.timings, f"variant_{size_name}"):
+            optimized, _ = ImageOptimizer.optimize_image(self.file, size_name, focal_point=focal_point, img=img)
+        return optimized
+
+    def variant_ladder(self, focal_point=None, ladders=None, formats=None, reuse=()):
+        """
+        Responsive AVIF/WebP/JPEG width ladder from the shared decode, keyed by content.
+
+        Variants whose content key is in reuse are skipped; see
+        ImageOptimizer.generate_variant_ladder().
+
+        Returns:
+            tuple: (files dict of (ladder, width, format) -> bytes, manifest dict)
+        """
+        return ImageOptimizer.generate_variant_ladder(
+            self.image,
+            focal_point,
+            ladders=ladders,
+            formats=formats,
+            timings=self.timings,
+            file_hash=self.file_hash,
+            reuse=reuse,
+        )
+
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+
+    def format_timings(self):
+        """One-line per-stage breakdown, e.g. 'download=0.120s decode=0.480s ... total=1.900s'."""
+        stages = " ".join(f"{stage}={seconds:.3f}s" for stage, seconds in self.timings.items())
+        return f"{stages} total={self.total_time:.3f}s"
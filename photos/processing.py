@@ -0,0 +1,102 @@
+"""
+Staged photo processing.
+
+A photo is processed by one Celery task per stage, each on its own queue, so
+every stage can get its own workers (concurrency, memory limit) and a burst
+of slow saliency work never holds up thumbnails:
+
+metadata  photo_metadata queue: hashes, dimensions and EXIF
+variants  photo_variants queue: thumbnail, preview and the responsive ladder,
+          cropped around the current (or overridden) focal point
+saliency  photo_saliency queue: focal point detection and the saliency map;
+          if the focal point moved, the crops are re-encoded (full-frame
+          variants are reused, see Photo.update_crops())
+search    photo_search queue: the full-text search vector
+
+metadata runs first; then variants -> saliency and search run side by side.
+Photo.processing_stages records each stage's state ("pending", "processing",
+"complete", "skipped" or "failed") and processing_status summarises them.
+
+Every task carries a priority. Uploads use INTERACTIVE_PRIORITY and bulk
+work (ingest, reprocessing) BACKFILL_PRIORITY; with the Redis broker's
+priority queues (CELERY_BROKER_TRANSPORT_OPTIONS) a new upload is taken
+ahead of a backfill that is already queued.
+
+Usage:
+    queue_photo_processing([photo.pk], priority=INTERACTIVE_PRIORITY)
+"""
+
+import logging
+
+from celery import chain, group
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("metadata", "variants", "saliency", "search")
+STAGE_QUEUES = {stage: f"photo_{stage}" for stage in STAGES}
+DONE_STATES = ("complete", "skipped")
+
+# Redis priorities: lower numbers are taken first
+INTERACTIVE_PRIORITY = 0
+BACKFILL_PRIORITY = 6
+
+
+def overall_status(stages):
+    """processing_status for a processing_stages dict."""
+    states = set(stages.values())
+    if "failed" in states:
+        return "failed"
+    if states and states <= set(DONE_STATES):
+        return "complete"
+    if states & {"processing", *DONE_STATES}:
+        return "processing"
+    return "pending"
+
+
+def set_stage_state(photo_id, stage, state):
+    """
+    Record one stage's state and the resulting processing_status.
+
+    The row is locked so stages finishing at the same time do not overwrite each other's state.
+    """
+    from photos.models import Photo
+
+    with transaction.atomic():
+        stages = (
+            Photo.objects.select_for_update().filter(pk=photo_id).values_list("processing_stages", flat=True).first()
+        )
+        if stages is None:
+            return
+        stages = {**stages, stage: state}
+        Photo.objects.filter(pk=photo_id).update(processing_stages=stages, processing_status=overall_status(stages))
+
+
+def processing_signature(photo_id, priority=BACKFILL_PRIORITY):
+    """The stage tasks of one photo as a Celery canvas."""
+    from photos import tasks
+
+    def stage(task):
+        return task.si(photo_id).set(priority=priority)
+
+    return chain(
+        stage(tasks.process_photo_metadata),
+        group(
+            chain(stage(tasks.process_photo_variants), stage(tasks.process_photo_saliency)),
+            stage(tasks.process_photo_search),
+        ),
+    )
+
+
+def queue_photo_processing(photo_ids, priority=BACKFILL_PRIORITY, group_size=100):
+    """Mark every stage of these photos pending and queue their stage tasks, group_size photos per published group."""
+    from photos.models import Photo
+
+    photo_ids = list(photo_ids)
+    Photo.objects.filter(pk__in=photo_ids).update(
+        processing_status="pending", processing_stages=dict.fromkeys(STAGES, "pending")
+    )
+    for start in range(0, len(photo_ids), group_size):
+        batch = photo_ids[start : start + group_size]
+        group(processing_signature(photo_id, priority) for photo_id in batch).apply_async()
+    logger.info(f"Queued staged processing of {len(photo_ids)} photo(s) at priority {priority}")
@@ -0,0 +1,219 @@
+"""
+Buffered share-link analytics.
+
+Every view of a private album through its share link used to save the
+album row, so a popular link turned each page view into a row-locking
+UPDATE. Views are now counted in Redis instead: one HINCRBY into a
+counts hash and one HSET of the last-seen time, both keyed by album id.
+
+flush_share_access() (run every few minutes by the
+flush_share_access_counts task) holds a Redis lock, so flushes never
+overlap, and atomically renames both hashes to "flushing" keys. New views
+start fresh hashes while the renamed ones are added to PhotoAlbum with a
+single UPDATE ... FROM unnest() and then deleted. If the UPDATE fails the
+renamed counts are merged back into the buffer. Once the UPDATE has
+committed nothing is ever applied twice: flushing keys left behind by an
+interrupted flush are discarded with an error rather than re-applied.
+
+The admin reads pending_share_access() for a whole changelist page with
+one pipelined HMGET and adds it to the stored values, so its numbers are
+live. If Redis is unavailable a view falls back to a direct F() update
+rather than being lost.
+"""
+
+import logging
+from datetime import UTC, datetime
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+
+from photos.models import PhotoAlbum
+
+logger = logging.getLogger(__name__)
+
+COUNTS_KEY = "photos:share_access:counts"
+LAST_SEEN_KEY = "photos:share_access:last_seen"
+
+FLUSH_LOCK_KEY = "photos:share_access:flush_lock"
+FLUSH_LOCK_TIMEOUT = 5 * 60
+
+# Move the buffer aside in one step; returns 0 if there is nothing to flush
+SWAP_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[3])
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('RENAME', KEYS[2], KEYS[4])
+end
+return 1
+"""
+
+# Merge counts that could not be written back into the live buffer, keeping the later last-seen time
+RESTORE_SCRIPT = """
+local counts = redis.call('HGETALL', KEYS[3])
+for i = 1, #counts, 2 do
+    redis.call('HINCRBY', KEYS[1], counts[i], counts[i + 1])
+end
+local seen = redis.call('HGETALL', KEYS[4])
+for i = 1, #seen, 2 do
+    local current = redis.call('HGET', KEYS[2], seen[i])
+    if not current or tonumber(current) < tonumber(seen[i + 1]) then
+        redis.call('HSET', KEYS[2], seen[i], seen[i + 1])
+    end
+end
+redis.call('DEL', KEYS[3], KEYS[4])
+return #counts / 2
+"""
+
+
+def _keys():
+    # The raw client bypasses the cache's KEY_PREFIX, so apply it here
+    return cache.make_key(COUNTS_KEY), cache.make_key(LAST_SEEN_KEY)
+
+
+def _flushing_keys():
+    counts_key, last_seen_key = _keys()
+    return f"{counts_key}:flushing", f"{last_seen_key}:flushing"
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(float(value), tz=UTC)
+
+
+def record_share_access(album):
+    """Count one view of an album's share link."""
+    now = timezone.now()
+    counts_key, last_seen_key = _keys()
+    try:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        pipe.hincrby(counts_key, album.pk, 1)
+        pipe.hset(last_seen_key, album.pk, repr(now.timestamp()))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not buffer share access for album {album.pk}, writing it directly: {e}")
+        PhotoAlbum.objects.filter(pk=album.pk).update(
+            share_access_count=F("share_access_count") + 1,
+            share_last_accessed=Greatest("share_last_accessed", now),
+        )
+
+
+def pending_share_access(album_ids):
+    """
+    Views buffered in Redis and not yet flushed.
+
+    Returns:
+        dict: album id -> (count, last accessed datetime); empty if Redis is unavailable
+    """
+    album_ids = list(album_ids)
+    if not album_ids:
+        return {}
+
+    counts_key, last_seen_key = _keys()
+    try:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        pipe.hmget(counts_key, album_ids)
+        pipe.hmget(last_seen_key, album_ids)
+        counts, last_seen = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not read buffered share access counts: {e}")
+        return {}
+
+    return {
+        album_id: (int(count), _timestamp(seen) if seen else None)
+        for album_id, count, seen in zip(album_ids, counts, last_seen, strict=True)
+        if count
+    }
+
+
+def share_access_totals(album, pending=None):
+    """
+    (view count, last accessed) for an album, including views not flushed yet.
+
+    pending is the album's entry from pending_share_access(), when the caller has
+    already read a whole page of albums; otherwise Redis is asked for this album.
+    """
+    if pending is None:
+        pending = pending_share_access([album.pk]).get(album.pk, (0, None))
+    count, last_seen = pending
+    last_accessed = max(filter(None, (album.share_last_accessed, last_seen)), default=None)
+    return album.share_access_count + count, last_accessed
+
+
+def flush_share_access():
+    """
+    Move buffered share views into PhotoAlbum.
+
+    Returns:
+        int: Number of albums whose counters were updated (0 if another flush holds the lock)
+    """
+    redis = get_redis_connection("default")
+    lock = redis.lock(cache.make_key(FLUSH_LOCK_KEY), timeout=FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        logger.info("Share access flush already running, skipping")
+        return 0
+    try:
+        return _flush(redis)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("Share access flush lock expired before the flush finished")
+
+
+def _flush(redis):
+    keys = [*_keys(), *_flushing_keys()]
+    flushing_counts_key, flushing_last_seen_key = keys[2:]
+
+    if redis.exists(flushing_counts_key):
+        # An earlier flush stopped after the rename; its UPDATE may have committed, so never re-apply it
+        logger.error("Discarding share views left by an interrupted flush; they may already be counted")
+        redis.delete(flushing_counts_key, flushing_last_seen_key)
+
+    if not redis.register_script(SWAP_SCRIPT)(keys=keys):
+        return 0
+
+    pipe = redis.pipeline(transaction=False)
+    pipe.hgetall(flushing_counts_key)
+    pipe.hgetall(flushing_last_seen_key)
+    counts, last_seen = pipe.execute()
+
+    ids, hits, seen_at = [], [], []
+    for album_id, count in counts.items():
+        seen = last_seen.get(album_id)
+        ids.append(int(album_id))
+        hits.append(int(count))
+        seen_at.append(_timestamp(seen) if seen else None)
+
+    table = PhotoAlbum._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} AS album
+                SET share_access_count = album.share_access_count + pending.hits,
+                    share_last_accessed = GREATEST(album.share_last_accessed, pending.last_seen)
+                FROM unnest(%s::bigint[], %s::integer[], %s::timestamptz[]) AS pending(id, hits, last_seen)
+                WHERE album.id = pending.id
+                """,  # nosec B608 - table name comes from model meta
+                [ids, hits, seen_at],
+            )
+            updated = cursor.rowcount
+    except Exception:
+        # Nothing was written, so the next flush can safely count these views
+        redis.register_script(RESTORE_SCRIPT)(keys=keys)
+        raise
+
+    # The UPDATE has committed: failing to delete the flushing keys must not lead to a retry
+    try:
+        redis.delete(flushing_counts_key, flushing_last_seen_key)
+    except Exception as e:
+        logger.error(f"Could not clear flushed share views; the next flush will discard them: {e}")
+
+    logger.info(f"Flushed {sum(hits)} share view(s) for {updated} album(s)")
+    return updated
@@ -1,18 +1,48 @@
 import logging
 
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from photos.models import AlbumPhoto, PhotoAlbum
+from pages.sitemap_files import schedule_sitemap_build
+from photos import hash_index
+from photos.album_cache import invalidate_album_pages
+from photos.facets import apply_facet_changes, facet_changes, membership_changes
+from photos.geo import invalidate_map_clusters
+from photos.models import AlbumPhoto, AlbumZipJournal, Photo, PhotoAlbum
 
 logger = logging.getLogger(__name__)
 
 
+def _member_values(album_photo, origin=None):
+    """(file_hash, facet_values) of an album photo's photo."""
+    # When a photo's deletion cascades here, the photo is the origin and needs no query
+    if isinstance(origin, Photo):
+        return origin.file_hash, origin.facet_values
+    values = Photo.objects.filter(pk=album_photo.photo_id).values_list("file_hash", "facet_values").first()
+    return values or ("", {})
+
+
 @receiver(post_save, sender=AlbumPhoto)
 @receiver(post_delete, sender=AlbumPhoto)
 def album_photo_changed(sender, instance, **kwargs):
+    origin = kwargs.get("origin")
+    if isinstance(origin, PhotoAlbum):
+        # The whole album is being deleted, journal included
+        return
+
     album = instance.album
-    if not album.allow_downloads:
+    invalidate_album_pages(album.slug)
+
+    # post_delete has no "created"; saves of existing rows only reorder or feature photos
+    if kwargs.get("created", True):
+        album.refresh_summary()
+        action, delta = ("add", 1) if kwargs.get("created") else ("remove", -1)
+        file_hash, facet_values = _member_values(instance, origin)
+        album.record_zip_changes([(action, instance.photo_id, file_hash)])
+        apply_facet_changes(membership_changes(album.pk, facet_values, delta))
+        invalidate_map_clusters([album.pk])
+
+    if not album.builds_zip_file:
         return
 
     from photos.tasks import schedule_zip_generation
@@ -25,6 +55,69 @@ def album_photo_changed(sender, instance, **kwargs):
     schedule_zip_generation.delay(album.id)
 
 
+@receiver(m2m_changed, sender=AlbumPhoto)
+def album_photos_added(sender, instance, action, reverse, pk_set, **kwargs):
+    """photos.add() bulk-creates AlbumPhoto rows without post_save; remove() and clear() do send post_delete."""
+    if action != "post_add" or not pk_set:
+        return
+    if reverse:
+        albums = PhotoAlbum.objects.filter(pk__in=pk_set)
+        photos = [(instance.pk, instance.file_hash, instance.facet_values)]
+    else:
+        albums = [instance]
+        photos = list(Photo.objects.filter(pk__in=pk_set).values_list("id", "file_hash", "facet_values"))
+    changes = []
+    for album in albums:
+        album.refresh_summary()
+        album.record_zip_changes(("add", photo_id, file_hash) for photo_id, file_hash, _values in photos)
+        for _photo_id, _file_hash, facet_values in photos:
+            changes.extend(membership_changes(album.pk, facet_values, 1))
+    apply_facet_changes(changes)
+    invalidate_map_clusters(album.pk for album in albums)
+
+
+@receiver(pre_save, sender=PhotoAlbum)
+def album_slug_changing(sender, instance, update_fields=None, **kwargs):
+    """A renamed album must stop being served from its old slug's cached page."""
+    if instance.pk is None or (update_fields is not None and "slug" not in update_fields):
+        return
+    old_slug = PhotoAlbum.objects.filter(pk=instance.pk).values_list("slug", flat=True).first()
+    if old_slug != instance.slug:
+        invalidate_album_pages(old_slug)
+
+
+@receiver(post_save, sender=PhotoAlbum)
+@receiver(post_delete, sender=PhotoAlbum)
+def album_page_changed(sender, instance, **kwargs):
+    invalidate_album_pages(instance.slug)
+
+
+# Album fields the sitemap files are built from (photo_count and photos_changed_at change with membership)
+SITEMAP_FIELDS = {"slug", "is_private", "updated_at", "photo_count", "photos_changed_at"}
+
+
+@receiver(pre_save, sender=PhotoAlbum)
+def album_privacy_changing(sender, instance, update_fields=None, **kwargs):
+    """Remember whether a private album was public before this save, so the sitemap drops it."""
+    instance._was_public = False
+    if instance.pk is None or not instance.is_private:
+        return
+    if update_fields is not None and "is_private" not in update_fields:
+        return
+    instance._was_public = PhotoAlbum.objects.filter(pk=instance.pk, is_private=False).exists()
+
+
+@receiver(post_save, sender=PhotoAlbum)
+@receiver(post_delete, sender=PhotoAlbum)
+def album_sitemap_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SITEMAP_FIELDS & set(update_fields):
+        return
+    # Private albums aren't in the sitemap; one only matters when it just stopped being public
+    if instance.is_private and not getattr(instance, "_was_public", False):
+        return
+    schedule_sitemap_build()
+
+
 @receiver(post_save, sender=PhotoAlbum)
 def album_downloads_setting_changed(sender, instance, **kwargs):
     if not kwargs.get("update_fields"):
@@ -36,7 +129,7 @@ def album_downloads_setting_changed(sender, instance, **kwargs):
     from photos.tasks import schedule_zip_generation
 
     if instance.allow_downloads:
-        if instance.photos.exists():
+        if instance.zip_mode != "stream" and instance.photos.exists():
             logger.info(f"Album {instance.id} downloads enabled, scheduling ZIP generation")
             instance.zip_generation_status = "pending"
             instance.save(update_fields=["zip_generation_status"])
@@ -50,6 +143,7 @@ def album_downloads_setting_changed(sender, instance, **kwargs):
                 pass
             instance.zip_file = None
             instance.zip_content_hash = ""
+            instance.zip_manifest = []
             instance.zip_generation_status = "none"
             instance.zip_generated_at = None
             instance.zip_file_size = None
@@ -57,8 +151,89 @@ def album_downloads_setting_changed(sender, instance, **kwargs):
                 update_fields=[
                     "zip_file",
                     "zip_content_hash",
+                    "zip_manifest",
                     "zip_generation_status",
                     "zip_generated_at",
                     "zip_file_size",
                 ]
             )
+
+
+@receiver(post_save, sender=PhotoAlbum)
+def album_zip_journal_unused(sender, instance, update_fields=None, **kwargs):
+    """An album that stops building a stored ZIP has nothing left to prune its journal, so drop it now."""
+    if update_fields is not None and not {"allow_downloads", "zip_mode"} & set(update_fields):
+        return
+    if not instance.builds_zip_file:
+        AlbumZipJournal.objects.filter(album=instance).delete()
+
+
+# Stored values that photo_file_hash_changed, photo_location_changed and photo_facets_changed compare against
+TRACKED_PHOTO_FIELDS = ("file_hash", "geohash", "facet_values")
+
+
+@receiver(pre_save, sender=Photo)
+def photo_tracked_fields_changing(sender, instance, update_fields=None, **kwargs):
+    instance._previous_file_hash = instance._previous_geohash = instance._previous_facet_values = None
+    fields = [field for field in TRACKED_PHOTO_FIELDS if update_fields is None or field in update_fields]
+    if instance.pk is None or not fields:
+        return
+    previous = Photo.objects.filter(pk=instance.pk).values(*fields).first() or {}
+    instance._previous_file_hash = previous.get("file_hash")
+    instance._previous_geohash = previous.get("geohash")
+    instance._previous_facet_values = previous.get("facet_values")
+
+
+@receiver(post_save, sender=Photo)
+def photo_file_hash_changed(sender, instance, created=False, **kwargs):
+    """A replaced image changes the photo's share of every album's ZIP digest."""
+    previous = getattr(instance, "_previous_file_hash", None)
+    if created or previous is None or previous == instance.file_hash:
+        return
+    for album in PhotoAlbum.objects.filter(photos=instance):
+        album.record_zip_changes([("remove", instance.pk, previous), ("add", instance.pk, instance.file_hash)])
+
+
+@receiver(post_save, sender=Photo)
+def photo_location_changed(sender, instance, created=False, **kwargs):
+    """A photo that gains, loses or changes its location moves between map clusters."""
+    previous = getattr(instance, "_previous_geohash", None)
+    if created or previous is None or previous == instance.geohash:
+        return
+    invalidate_map_clusters(PhotoAlbum.objects.filter(photos=instance).values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Photo)
+def photo_facets_changed(sender, instance, created=False, **kwargs):
+    """Move the photo's counts to its new facet values, library-wide and in each of its albums."""
+    if created:
+        # A new photo is in no album yet; its AlbumPhoto rows count it there
+        apply_facet_changes(facet_changes([], {}, instance.facet_values))
+        return
+    previous = getattr(instance, "_previous_facet_values", None)
+    if previous is None or previous == instance.facet_values:
+        return
+    album_ids = list(PhotoAlbum.objects.filter(photos=instance).values_list("pk", flat=True))
+    apply_facet_changes(facet_changes(album_ids, previous, instance.facet_values))
+
+
+@receiver(post_save, sender=Photo)
+def photo_hash_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and "perceptual_hash" not in update_fields:
+        return
+    hash_index.update_photo(instance.pk, instance.perceptual_hash)
+
+
+@receiver(post_save, sender=Photo)
+def photo_album_pages_changed(sender, instance, created=False, **kwargs):
+    # A new photo is in no album yet; its AlbumPhoto rows invalidate the pages
+    if created:
+        return
+    invalidate_album_pages(*PhotoAlbum.objects.filter(photos=instance).values_list("slug", flat=True))
+
+
+@receiver(post_delete, sender=Photo)
+def photo_deleted(sender, instance, **kwargs):
+    hash_index.remove_photo(instance.pk)
+    # Album counts were already decremented by the cascaded AlbumPhoto deletes
+    apply_facet_changes(membership_changes(None, instance.facet_values, -1))
@@ -1,12 +1,16 @@
 """
-Sitemaps for the photos app with caching support.
+Sitemaps for the photos app.
+
+They are only evaluated by pages.sitemap_files when the sitemap files are
+built, so each section is a single query: album priorities come from the
+stored photo_count and each photo carries its album's slug.
 """
 
 from django.contrib.sitemaps import Sitemap
-from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
 from django.urls import reverse
 
-from photos.models import Photo, PhotoAlbum
+from photos.models import AlbumPhoto, Photo, PhotoAlbum
 
 
 class PhotoAlbumSitemap(Sitemap):
@@ -17,33 +21,29 @@ class PhotoAlbumSitemap(Sitemap):
     protocol = "https"
 
     def items(self):
-        """Return all public photo albums with caching"""
-        cache_key = "sitemap_photo_albums_v1"
-        albums = cache.get(cache_key)
-
-        if albums is None:
-            albums = list(PhotoAlbum.objects.filter(is_private=False).order_by("-created_at"))
-            cache.set(cache_key, albums, 43200)  # Cache for 12 hours
-
-        return albums
+        """Return all public photo albums"""
+        return (
+            PhotoAlbum.objects.filter(is_private=False)
+            .only("slug", "updated_at", "photos_changed_at", "photo_count")
+            .order_by("-created_at")
+        )
 
     def location(self, obj):
         """Get the URL for each album"""
         return reverse("photos:album_detail", kwargs={"slug": obj.slug})
 
     def lastmod(self, obj):
-        """Return the last modification date"""
-        return obj.updated_at
+        """Last edit of the album or of its photo list"""
+        return max(filter(None, (obj.updated_at, obj.photos_changed_at)))
 
     def priority(self, obj):
-        """Adjust priority based on photo count and recency"""
+        """Adjust priority based on photo count"""
         # Albums with more photos get slightly higher priority
-        photo_count = obj.photos.count()
-        if photo_count >= 20:
+        if obj.photo_count >= 20:
             return 0.8
-        elif photo_count >= 10:
+        elif obj.photo_count >= 10:
             return 0.7
-        elif photo_count >= 5:
+        elif obj.photo_count >= 5:
             return 0.6
         else:
             return 0.5
@@ -53,43 +53,29 @@ class PhotoSitemap(Sitemap):
     """Sitemap for individual photos (if you have individual photo pages)"""
 
     changefreq = "monthly"
-    # priority is defined as a method below
+    priority = 0.4
     protocol = "https"
-    limit = 1000  # Limit number of URLs per sitemap
 
     def items(self):
-        """Return all photos from public albums with caching"""
-        cache_key = "sitemap_photos_v1"
-        photos = cache.get(cache_key)
-
-        if photos is None:
-            public_albums = PhotoAlbum.objects.filter(is_private=False).values_list("id", flat=True)
-            photos = list(
-                Photo.objects.filter(albums__in=public_albums)
-                .distinct()
-                .select_related()
-                .prefetch_related("albums")
-                .order_by("-created_at")
-            )
-            cache.set(cache_key, photos, 43200)  # Cache for 12 hours
-
-        return photos
+        """Return all photos from public albums, each with the slug of its first public album"""
+        album_slug = (
+            AlbumPhoto.objects.filter(photo=OuterRef("pk"), album__is_private=False)
+            .order_by("album_id")
+            .values("album__slug")[:1]
+        )
+        return (
+            Photo.objects.filter(albums__is_private=False)
+            .distinct()
+            .annotate(album_slug=Subquery(album_slug))
+            .only("id", "updated_at")
+            .order_by("-created_at", "-id")
+        )
 
     def location(self, obj):
         """Get the URL for each photo"""
         # Link to album with photo anchor (no individual photo pages yet)
-        album = obj.albums.filter(is_private=False).first()
-        if album:
-            return f"{reverse('photos:album_detail', kwargs={'slug': album.slug})}#photo-{obj.id}"
-        return None
+        return f"{reverse('photos:album_detail', kwargs={'slug': obj.album_slug})}#photo-{obj.id}"
 
     def lastmod(self, obj):
         """Return the last modification date"""
         return obj.updated_at
-
-    def priority(self, obj):
-        """Set priority for photos"""
-        # You can adjust this based on photo properties
-        if obj.title:
-            return 0.6
-        return 0.4
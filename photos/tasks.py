@@ -1,28 +1,23 @@
 import logging
-import os
-import shutil
-import tempfile
-import zipfile
 from datetime import timedelta
 
 from celery import shared_task
 from django.core.cache import cache
-from django.core.files import File
+from django.db.models import Max
 from django.utils import timezone
 
+from photos.zip_stream import StorageWriter, StreamedZip
+
 logger = logging.getLogger(__name__)
 
 
-@shared_task(
-    bind=True,
-    autoretry_for=(Exception,),
-    retry_backoff=True,
-    retry_backoff_max=300,
-    max_retries=3,
-)
+@shared_task(bind=True)
 def process_photo_async(self, photo_id: int, force: bool = False):
     """
-    Process a photo in the background: extract metadata, create optimized versions.
+    Queue the staged processing of a photo (see photos.processing) at interactive priority.
+
+    Photos are queued with photos.processing.queue_photo_processing(); this task
+    remains for messages published before processing was split into stages.
 
     Args:
         photo_id: The ID of the Photo to process.
@@ -32,57 +27,152 @@ def process_photo_async(self, photo_id: int, force: bool = False):
         dict: Result containing status and photo_id.
     """
     from photos.models import Photo
+    from photos.processing import INTERACTIVE_PRIORITY, queue_photo_processing
 
-    try:
-        photo = Photo.objects.get(pk=photo_id)
-    except Photo.DoesNotExist:
+    status = Photo.objects.filter(pk=photo_id).values_list("processing_status", flat=True).first()
+    if status is None:
         logger.warning(f"Photo {photo_id} not found for processing")
         return {"status": "error", "message": "Photo not found", "photo_id": photo_id}
 
-    if not force and photo.processing_status == "complete":
+    if not force and status == "complete":
         logger.info(f"Photo {photo_id} already processed, skipping")
         return {"status": "skipped", "message": "Already processed", "photo_id": photo_id}
 
+    queue_photo_processing([photo_id], priority=INTERACTIVE_PRIORITY)
+    return {"status": "queued", "photo_id": photo_id}
+
+
+def _run_processing_stage(task, photo_id, stage):
+    """Run one processing stage, recording its state on the photo; the last failed attempt marks it failed."""
+    from photos.models import Photo
+    from photos.processing import set_stage_state
+
+    try:
+        photo = Photo.objects.get(pk=photo_id)
+    except Photo.DoesNotExist:
+        logger.warning(f"Photo {photo_id} not found for the {stage} stage")
+        return {"status": "error", "message": "Photo not found", "photo_id": photo_id}
+
+    set_stage_state(photo_id, stage, "processing")
     try:
-        photo.process_image_async()
-        logger.info(f"Successfully processed photo {photo_id}")
-        return {"status": "success", "photo_id": photo_id}
+        state = photo.process_stage(stage)
     except Exception as e:
-        logger.error(f"Failed to process photo {photo_id}: {e}", exc_info=True)
+        final = task.request.retries >= task.max_retries
+        set_stage_state(photo_id, stage, "failed" if final else "pending")
+        logger.error(f"{stage} stage of photo {photo_id} failed: {e}", exc_info=final)
         raise
 
+    set_stage_state(photo_id, stage, state)
+    return {"status": state, "photo_id": photo_id, "stage": stage}
 
-DEBOUNCE_KEY_PREFIX = "album_zip_debounce:"
-DEBOUNCE_DELAY_SECONDS = 30
-STREAM_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB chunks
 
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=3,
+)
+def process_photo_metadata(self, photo_id: int):
+    """Hashes, dimensions and EXIF of a photo."""
+    return _run_processing_stage(self, photo_id, "metadata")
 
-def _stream_file_to_zip(zf: zipfile.ZipFile, file_field, zip_path: str, photo_id: int) -> bool:
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=3,
+)
+def process_photo_variants(self, photo_id: int):
+    """Thumbnail, preview and responsive variants of a photo, cropped around its current focal point."""
+    return _run_processing_stage(self, photo_id, "variants")
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=3,
+)
+def process_photo_saliency(self, photo_id: int):
+    """Focal point and saliency map of a photo; re-crops its variants if the focal point moved."""
+    return _run_processing_stage(self, photo_id, "saliency")
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=3,
+)
+def process_photo_search(self, photo_id: int):
+    """Full-text search vector of a photo."""
+    return _run_processing_stage(self, photo_id, "search")
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=3,
+)
+def recrop_photo_async(self, photo_id: int):
     """
-    Stream a file from storage directly into a ZIP archive.
+    Regenerate a photo's focal-point-dependent versions after its focal point changed.
+
+    Args:
+        photo_id: The ID of the Photo to re-crop.
 
-    Uses a temporary file to avoid loading the entire image into memory.
-    Returns True if successful, False otherwise.
+    Returns:
+        dict: Result containing status and photo_id.
     """
-    temp_path = None
+    from photos.models import Photo
+
     try:
-        with file_field.open("rb") as src:
-            fd, temp_path = tempfile.mkstemp()
-            try:
-                with os.fdopen(fd, "wb") as dst:
-                    shutil.copyfileobj(src, dst, length=STREAM_CHUNK_SIZE)
-            except Exception:
-                os.close(fd)
-                raise
-
-        zf.write(temp_path, zip_path)
-        return True
-    except Exception as e:
-        logger.warning(f"Failed to add photo {photo_id} to ZIP at {zip_path}: {e}")
-        return False
-    finally:
-        if temp_path and os.path.exists(temp_path):
-            os.unlink(temp_path)
+        photo = Photo.objects.get(pk=photo_id)
+    except Photo.DoesNotExist:
+        logger.warning(f"Photo {photo_id} not found for re-cropping")
+        return {"status": "error", "message": "Photo not found", "photo_id": photo_id}
+
+    photo.update_crops()
+    logger.info(f"Updated crops of photo {photo_id}")
+    return {"status": "success", "photo_id": photo_id}
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=3,
+)
+def compute_zip_checksums(self, photo_ids: list[int]):
+    """
+    Read the originals that have no file_size or file_crc32 yet, so album downloads can stream with Range support.
+
+    Processing records both for new photos; this catches photos processed before they were stored.
+    """
+    from django.db.models import Q
+
+    from photos.models import Photo
+
+    photos = Photo.objects.filter(Q(file_size__isnull=True) | Q(file_crc32__isnull=True), pk__in=photo_ids)
+    computed = 0
+    for photo in photos.only("id", "image", "file_size", "file_crc32").iterator():
+        photo.ensure_zip_checksum()
+        computed += 1
+    logger.info(f"Computed ZIP checksums of {computed} photo(s)")
+    return {"status": "success", "computed": computed}
+
+
+DEBOUNCE_KEY_PREFIX = "album_zip_debounce:"
+DEBOUNCE_DELAY_SECONDS = 30
+ZIP_CACHE_CONTROL = "public, max-age=86400"  # 1 day, like originals
 
 
 @shared_task(
@@ -149,10 +239,13 @@ def generate_album_zip(self, album_id: int, force: bool = False):
         logger.info(f"Album {album_id} has downloads disabled, skipping ZIP")
         return {"status": "skipped", "message": "Downloads disabled"}
 
+    if album.zip_mode == "stream":
+        logger.info(f"Album {album_id} streams its ZIP on download, skipping")
+        return {"status": "skipped", "message": "Streamed downloads"}
+
     album.zip_generation_status = "generating"
     album.save(update_fields=["zip_generation_status"])
 
-    temp_zip_path = None
     try:
         photos = album.photos.all().order_by("date_taken", "created_at")
 
@@ -161,34 +254,54 @@ def generate_album_zip(self, album_id: int, force: bool = False):
             album.save(update_fields=["zip_generation_status"])
             return {"status": "skipped", "message": "No photos in album"}
 
-        fd, temp_zip_path = tempfile.mkstemp(suffix=".zip")
-        os.close(fd)
-
-        photo_count = 0
-        with zipfile.ZipFile(temp_zip_path, "w", zipfile.ZIP_STORED) as zf:
-            for idx, photo in enumerate(photos, 1):
-                if not photo.image:
-                    continue
-
-                original_name = photo.original_filename or f"photo_{photo.id}.jpg"
-                base_filename = f"{idx:03d}_{original_name}"
-
-                if _stream_file_to_zip(zf, photo.image, base_filename, photo.id):
-                    photo_count += 1
+        # Everything journalled up to here is covered by album.zip_digest as loaded above
+        journal_position = album.zip_journal.aggregate(position=Max("pk"))["position"] or 0
+        changes = list(album.pending_zip_changes().filter(pk__lte=journal_position).values_list("action", flat=True))
 
-        if album.zip_file:
+        entries, manifest = [], []
+        for arcname, photo in album.zip_entries():
+            try:
+                photo.ensure_zip_checksum()
+            except Exception as e:
+                logger.warning(f"Failed to add {photo.image.name} to ZIP at {arcname}: {e}")
+                continue
+            entries.append((arcname, photo.image, photo.file_size, photo.file_crc32, photo.created_at))
+            manifest.append(
+                [arcname, photo.pk, photo.file_hash, photo.file_size, photo.file_crc32, photo.created_at.isoformat()]
+            )
+        archive = StreamedZip(entries)
+        photo_count = len(entries)
+
+        # Entries matching the previous archive's leading entries have the same bytes there
+        previous = album.zip_manifest if album.zip_file and album.zip_file.storage.exists(album.zip_file.name) else []
+        reused = 0
+        while reused < min(len(previous), len(manifest)) and previous[reused] == manifest[reused]:
+            reused += 1
+        reused_bytes = 0
+        if reused:
+            reused_bytes = archive.entry_offsets[reused] if reused < len(entries) else archive.directory_offset
+
+        # The archive is streamed into storage (an S3 multipart upload) as it is built
+        zip_filename = f"{album.slug}_{timezone.now().strftime('%Y%m%d')}.zip"
+        storage = album.zip_file.storage
+        zip_name = storage.get_available_name(album.zip_file.field.generate_filename(album, zip_filename))
+        with StorageWriter(storage, zip_name, content_type="application/zip", cache_control=ZIP_CACHE_CONTROL) as out:
+            if reused_bytes:
+                out.copy_from(album.zip_file, 0, reused_bytes)
+            archive.write_to(out, reused_bytes)
+        zip_size = out.bytes_written
+
+        # Delete the previous archive only once the new one is in place (and isn't the same object)
+        if album.zip_file and album.zip_file.name != zip_name:
             try:
                 album.zip_file.delete(save=False)
             except Exception as e:
                 logger.warning(f"Failed to delete old ZIP for album {album_id}: {e}")
-
-        zip_size = os.path.getsize(temp_zip_path)
-        zip_filename = f"{album.slug}_{timezone.now().strftime('%Y%m%d')}.zip"
-
-        with open(temp_zip_path, "rb") as f:
-            album.zip_file.save(zip_filename, File(f), save=False)
+        album.zip_file.name = zip_name
 
         album.zip_content_hash = album.compute_zip_content_hash()
+        album.zip_manifest = manifest
+        album.zip_journal_position = journal_position
         album.zip_generated_at = timezone.now()
         album.zip_generation_status = "ready"
         album.zip_file_size = zip_size
@@ -196,15 +309,22 @@ def generate_album_zip(self, album_id: int, force: bool = False):
             update_fields=[
                 "zip_file",
                 "zip_content_hash",
+                "zip_manifest",
+                "zip_journal_position",
                 "zip_generated_at",
                 "zip_generation_status",
                 "zip_file_size",
             ]
         )
+        album.zip_journal.filter(pk__lte=journal_position).delete()
 
         cache.delete(debounce_key)
 
-        logger.info(f"Generated ZIP for album {album_id}: {zip_filename} ({zip_size} bytes, {photo_count} photos)")
+        logger.info(
+            f"Generated ZIP for album {album_id}: {zip_filename} ({zip_size} bytes, {photo_count} photos; "
+            f"{changes.count('add')} added, {changes.count('remove')} removed since the last build; "
+            f"{reused} entries / {reused_bytes} bytes reused)"
+        )
 
         return {
             "status": "success",
@@ -212,6 +332,7 @@ def generate_album_zip(self, album_id: int, force: bool = False):
             "filename": zip_filename,
             "size": zip_size,
             "photo_count": photo_count,
+            "reused_bytes": reused_bytes,
         }
 
     except Exception as e:
@@ -219,6 +340,71 @@ def generate_album_zip(self, album_id: int, force: bool = False):
         album.zip_generation_status = "failed"
         album.save(update_fields=["zip_generation_status"])
         raise
-    finally:
-        if temp_zip_path and os.path.exists(temp_zip_path):
-            os.unlink(temp_zip_path)
+
+
+@shared_task
+def rotate_album_covers():
+    """
+    Move every album to the day's cover photo and re-sync its photo count.
+
+    Runs daily just after midnight; also repairs summaries of albums changed
+    through bulk operations that send no signals.
+
+    New covers are written with one bulk_update: no album listing or page
+    cache depends on cover_photo, so nothing needs post_save. Only albums
+    whose photo_count was wrong are saved through refresh_summary(), so
+    their pages and the sitemap catch up.
+    """
+    from photos.models import PhotoAlbum
+
+    rotated, repaired = [], 0
+    for album in PhotoAlbum.objects.only("pk", "slug", "cover_photo_id", "photo_count").iterator():
+        count = album.album_photos.count()
+        if count != album.photo_count:
+            album.refresh_summary(changed=False)
+            repaired += 1
+            continue
+        cover_photo_id = album.pick_cover_photo_id(count=count)
+        if cover_photo_id != album.cover_photo_id:
+            album.cover_photo_id = cover_photo_id
+            rotated.append(album)
+
+    PhotoAlbum.objects.bulk_update(rotated, ["cover_photo"], batch_size=500)
+    logger.info(f"Rotated album covers: {len(rotated)} rotated, {repaired} repaired")
+    return {"status": "success", "changed": len(rotated) + repaired}
+
+
+@shared_task
+def flush_share_access_counts():
+    """
+    Write share-link views buffered in Redis to PhotoAlbum (see photos.share_analytics).
+
+    Not retried: a failed UPDATE puts the views back in the buffer, and the next scheduled run flushes them.
+    """
+    from photos.share_analytics import flush_share_access
+
+    updated = flush_share_access()
+    return {"status": "success", "albums": updated}
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=3,
+)
+def build_album_map_clusters(self, album_id: int):
+    """Rebuild an album's stored map clusters (scheduled by photos.geo.schedule_map_cluster_build)."""
+    from photos.geo import BUILD_SCHEDULED_KEY_PREFIX
+    from photos.models import PhotoAlbum
+
+    # Changes from here on schedule another build
+    cache.delete(f"{BUILD_SCHEDULED_KEY_PREFIX}{album_id}")
+    try:
+        album = PhotoAlbum.objects.only("pk").get(pk=album_id)
+    except PhotoAlbum.DoesNotExist:
+        return {"status": "skipped", "reason": "album not found"}
+
+    clusters = album.refresh_map_clusters()
+    return {"status": "success", "photos": clusters["count"]}
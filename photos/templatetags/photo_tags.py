@@ -6,15 +6,80 @@ from django import template
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
+from photos.image_utils import ImageOptimizer
+
 register = template.Library()
 
 
+# Grid columns in album-detail.css: 4 columns, 3 below 1200px, 2 below 768px, 1 below 480px
+GRID_SIZES = "(max-width: 480px) 100vw, (max-width: 768px) 50vw, (max-width: 1200px) 33vw, 25vw"
+DISPLAY_SIZES = "100vw"
+
+
+def _first_field_url(photo):
+    """URL of the thumbnail, falling back to the preview, for photos without a variant ladder."""
+    for field in [photo.image_thumbnail, photo.image_preview]:
+        if field and field.name:
+            try:
+                return field.url
+            except (ValueError, AttributeError):
+                continue
+    return None
+
+
+def _variant_dimensions(photo, ladder):
+    """Intrinsic width/height of the largest variant, used for the img aspect ratio."""
+    width = photo.variants[ladder][-1]
+    aspect = ImageOptimizer.variant_ladders().get(ladder, {}).get("aspect")
+    if aspect:
+        return width, round(width * aspect[1] / aspect[0])
+    if photo.width and photo.height:
+        return width, round(width * photo.height / photo.width)
+    return None, None
+
+
+def _variant_picture(photo, ladder, sizes, fallback_width, img_attrs):
+    """
+    <picture> with one <source> per modern format and a JPEG <img> fallback, or None without variants.
+
+    Every element carries the full width ladder as srcset plus sizes, so the
+    browser downloads the smallest file that covers the rendered width.
+    """
+    variants = photo.variants or {}
+    formats = [name for name in ImageOptimizer.VARIANT_FORMATS if name in variants.get("formats", [])]
+    if not variants.get(ladder) or not formats:
+        return None
+
+    *modern_formats, fallback_format = formats
+    sizes = escape(sizes)
+    sources = "".join(
+        f'<source type="{ImageOptimizer.VARIANT_FORMATS[name]["mime"]}" '
+        f'srcset="{escape(photo.get_variant_srcset(ladder, name))}" sizes="{sizes}">'
+        for name in modern_formats
+    )
+
+    width, height = _variant_dimensions(photo, ladder)
+    dimensions = f' width="{width}" height="{height}"' if width and height else ""
+    fallback_src = photo.get_variant_url(ladder, fallback_format, width=fallback_width)
+
+    return (
+        f"<picture>{sources}"
+        f'<img src="{escape(fallback_src)}" '
+        f'srcset="{escape(photo.get_variant_srcset(ladder, fallback_format))}" sizes="{sizes}" '
+        f"{img_attrs}{dimensions}>"
+        f"</picture>"
+    )
+
+
 @register.simple_tag
-def responsive_image(photo, css_class="", alt_text="", loading="lazy", fetchpriority=""):
+def responsive_image(photo, css_class="", alt_text="", loading="lazy", fetchpriority="", sizes=GRID_SIZES):
     """
-    Generate a responsive image tag optimized for grid display.
+    Generate a responsive image optimized for grid display.
 
-    Uses the thumbnail (400x300) for fast loading.
+    Photos with a variant ladder get a <picture> with AVIF and WebP sources and
+    a JPEG fallback, each listing every grid width (smart-cropped 4:3) in
+    srcset, so phones download a small file. Photos processed before the
+    ladder existed fall back to the 400x300 thumbnail.
 
     Args:
         photo: Photo model instance.
@@ -22,6 +87,7 @@ def responsive_image(photo, css_class="", alt_text="", loading="lazy", fetchprio
         alt_text: Alt text for the image.
         loading: Loading strategy ('lazy' or 'eager').
         fetchpriority: Fetch priority hint ('high', 'low', 'auto', or empty).
+        sizes: sizes attribute describing the rendered width (default matches the album grid).
 
     Usage:
         {% load photo_tags %}
@@ -33,36 +99,29 @@ def responsive_image(photo, css_class="", alt_text="", loading="lazy", fetchprio
 
     # Use the title as alt text if not provided
     if not alt_text:
-        alt_text = photo.title
+        alt_text = getattr(photo, "title", "") or photo.original_filename
 
     # Escape user-controlled data to prevent XSS
     alt_text = escape(alt_text)
     css_class = escape(css_class)
 
-    # Use thumbnail as the source (optimized 400x300 for grid display)
-    default_src = None
-    for field in [photo.image_thumbnail, photo.image_preview]:
-        if field and field.name:
-            try:
-                default_src = field.url
-                break
-            except (ValueError, AttributeError):
-                continue
+    # Build optional attributes
+    fetchpriority_attr = f' fetchpriority="{escape(fetchpriority)}"' if fetchpriority else ""
+    img_attrs = f'class="{css_class}" alt="{alt_text}" loading="{escape(loading)}" decoding="async"{fetchpriority_attr}'
+
+    picture = _variant_picture(photo, "grid", sizes, fallback_width=400, img_attrs=img_attrs)
+    if picture:
+        return mark_safe(picture)  # nosec B703 B308 - All user data escaped above
 
+    # Use thumbnail as the source (optimized 400x300 for grid display)
+    default_src = _first_field_url(photo)
     if not default_src:
         return ""  # No valid image found
 
-    # Build optional attributes
-    fetchpriority_attr = f'fetchpriority="{escape(fetchpriority)}"' if fetchpriority else ""
-
     # Build a simple img tag - thumbnail is already optimized for grid display
     img_tag = f"""
     <img src="{escape(default_src)}"
-         class="{css_class}"
-         alt="{alt_text}"
-         loading="{loading}"
-         decoding="async"
-         {fetchpriority_attr}
+         {img_attrs}
          width="400"
          height="300">
     """
@@ -71,24 +130,33 @@ def responsive_image(photo, css_class="", alt_text="", loading="lazy", fetchprio
 
 
 @register.simple_tag
-def picture_element(photo, css_class="", alt_text="", loading="lazy"):
+def picture_element(photo, css_class="", alt_text="", loading="lazy", sizes=DISPLAY_SIZES):
     """
     Generate a <picture> element with responsive sources.
 
+    Uses the full-frame display ladder (AVIF, WebP, JPEG fallback) with srcset
+    and sizes. Falls back to the thumbnail for photos without variants.
+
     Usage:
         {% load photo_tags %}
         {% picture_element photo css_class="img-fluid" %}
+        {% picture_element photo sizes="(max-width: 768px) 100vw, 50vw" %}
     """
     if not photo or not photo.image:
         return ""
 
     # Use the title as alt text if not provided
     if not alt_text:
-        alt_text = photo.title
+        alt_text = getattr(photo, "title", "") or photo.original_filename
 
     # Escape user-controlled data to prevent XSS
     alt_text = escape(alt_text)
     css_class = escape(css_class)
+    img_attrs = f'class="{css_class}" alt="{alt_text}" loading="{escape(loading)}" decoding="async"'
+
+    picture = _variant_picture(photo, "display", sizes, fallback_width=1024, img_attrs=img_attrs)
+    if picture:
+        return mark_safe(picture)  # nosec B703 B308 - All user data escaped above
 
     # Build the picture element
     picture_html = "<picture>"
@@ -103,23 +171,13 @@ def picture_element(photo, css_class="", alt_text="", loading="lazy"):
             pass
 
     # Fallback img element (use thumbnail, fallback to preview)
-    fallback_src = None
-    for field in [photo.image_thumbnail, photo.image_preview]:
-        if field and field.name:
-            try:
-                fallback_src = field.url
-                break
-            except (ValueError, AttributeError):
-                continue
-
+    fallback_src = _first_field_url(photo)
     if not fallback_src:
         return ""  # No valid image found
 
     picture_html += f"""
     <img src="{escape(fallback_src)}"
-         class="{css_class}"
-         alt="{alt_text}"
-         loading="{loading}">
+         {img_attrs}>
     </picture>
     """
 
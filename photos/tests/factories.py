@@ -10,7 +10,8 @@ from io import BytesIO
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
-from PIL import Image
+from PIL import ExifTags, Image
+from PIL.TiffImagePlugin import IFDRational
 
 
 class PhotoFactory:
@@ -25,6 +26,45 @@ class PhotoFactory:
         img_io.seek(0)
         return SimpleUploadedFile(name="test.jpg", content=img_io.getvalue(), content_type="image/jpeg")
 
+    @staticmethod
+    def create_exif_image(size=(100, 100), color=(255, 0, 0), padding=0):
+        """
+        Create a JPEG with camera, exposure and GPS EXIF (Canon EOS R5, 50mm f/2.8 1/250s ISO 400, New York).
+
+        padding adds that many bytes of APP2 data before the EXIF block, pushing it further into the file.
+        """
+        img = Image.new("RGB", size, color)
+        exif = Image.Exif()
+        exif[ExifTags.Base.Make] = "Canon"
+        exif[ExifTags.Base.Model] = "EOS R5"
+        exif[ExifTags.Base.DateTime] = "2024:01:15 14:30:00"
+        exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+        exif_ifd[ExifTags.Base.LensModel] = "RF 24-70mm F2.8L IS USM"
+        exif_ifd[ExifTags.Base.FNumber] = IFDRational(28, 10)
+        exif_ifd[ExifTags.Base.ExposureTime] = IFDRational(1, 250)
+        exif_ifd[ExifTags.Base.FocalLength] = IFDRational(50, 1)
+        exif_ifd[ExifTags.Base.ISOSpeedRatings] = 400
+        exif_ifd[ExifTags.Base.DateTimeOriginal] = "2024:01:15 14:30:00"
+        gps_ifd = exif.get_ifd(ExifTags.IFD.GPSInfo)
+        gps_ifd[ExifTags.GPS.GPSLatitudeRef] = "N"
+        gps_ifd[ExifTags.GPS.GPSLatitude] = (IFDRational(40), IFDRational(42), IFDRational(46))
+        gps_ifd[ExifTags.GPS.GPSLongitudeRef] = "W"
+        gps_ifd[ExifTags.GPS.GPSLongitude] = (IFDRational(74), IFDRational(0), IFDRational(23))
+        gps_ifd[ExifTags.GPS.GPSAltitude] = IFDRational(100)
+
+        img_io = BytesIO()
+        img.save(img_io, format="JPEG", exif=exif)
+        data = img_io.getvalue()
+        if padding:
+            # APP2 segments of at most 64 KB right after SOI
+            segments = b""
+            while padding > 0:
+                chunk = min(padding, 65000)
+                segments += b"\xff\xe2" + (chunk + 2).to_bytes(2, "big") + bytes(chunk)
+                padding -= chunk
+            data = data[:2] + segments + data[2:]
+        return SimpleUploadedFile(name="exif.jpg", content=data, content_type="image/jpeg")
+
     @staticmethod
     def create_photo(
         image=None,
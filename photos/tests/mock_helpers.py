@@ -91,10 +91,10 @@ class PhotoTestMixin:
 
         # Mock all heavy operations
         with (
-            patch("photos.models.ImageOptimizer.process_uploaded_image") as mock_process,
+            patch("photos.image_utils.ImageOptimizer.process_uploaded_image") as mock_process,
             patch("photos.models.DuplicateDetector.compute_and_store_hashes") as mock_hashes,
             patch("photos.models.ExifExtractor.extract_exif") as mock_exif,
-            patch("photos.models.ImageMetadataExtractor.extract_basic_metadata") as mock_metadata,
+            patch("photos.image_utils.ImageMetadataExtractor.extract_basic_metadata") as mock_metadata,
         ):
             mock_process.return_value = mock_image_optimizer_process()
             mock_hashes.return_value = mock_duplicate_detector_hashes(filename)
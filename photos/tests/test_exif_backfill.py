@@ -0,0 +1,79 @@
+"""
+Tests for the metadata-only EXIF backfill.
+"""
+
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from photos.exif_backfill import backfill_exif
+from photos.image_utils import EXIF_HEADER_BYTES
+from photos.models import Photo
+from photos.tests.factories import PhotoFactory
+from photos.zip_stream import open_read_stream
+
+
+class BackfillExifTestCase(TestCase):
+    """Test that EXIF is re-read from the originals' headers and written in bulk."""
+
+    def setUp(self):
+        self.photo = PhotoFactory.create_photo(image=PhotoFactory.create_exif_image())
+        self.padded = PhotoFactory.create_photo(
+            image=PhotoFactory.create_exif_image(color=(0, 0, 255), padding=2 * EXIF_HEADER_BYTES)
+        )
+        self.plain = PhotoFactory.create_photo(image=PhotoFactory.create_test_image(color=(0, 255, 0)))
+        # As if the photos had been processed before EXIF extraction existed
+        Photo.objects.update(exif_data=None, camera_make="", camera_model="", aperture="", gps_latitude=None)
+
+    def test_backfill_updates_changed_fields(self):
+        counts = backfill_exif(Photo.objects.order_by("pk"))
+
+        self.assertEqual(counts, {"updated": 2, "unchanged": 0, "skipped": 1, "failed": 0})
+        for photo in (self.photo, self.padded):
+            photo.refresh_from_db()
+            self.assertEqual(photo.camera_make, "Canon")
+            self.assertEqual(photo.aperture, "f/2.8")
+            self.assertAlmostEqual(float(photo.gps_latitude), 40.712778, places=5)
+            self.assertEqual(photo.exif_data["Model"], "EOS R5")
+
+        # A second run finds nothing to write
+        with self.assertNumQueries(1):
+            counts = backfill_exif(Photo.objects.order_by("pk"))
+        self.assertEqual(counts, {"updated": 0, "unchanged": 2, "skipped": 1, "failed": 0})
+
+    def test_only_the_header_is_read_unless_it_is_too_short(self):
+        with patch("photos.exif_backfill.open_read_stream", wraps=open_read_stream) as mock_open:
+            backfill_exif(Photo.objects.filter(pk__in=[self.photo.pk, self.padded.pk]).order_by("pk"))
+
+        ranges = sorted((call.args[0].name, call.args[1:]) for call in mock_open.call_args_list)
+        self.assertEqual(
+            ranges,
+            sorted(
+                [
+                    (self.photo.image.name, (0, EXIF_HEADER_BYTES)),
+                    (self.padded.image.name, (0, EXIF_HEADER_BYTES)),
+                    (self.padded.image.name, ()),
+                ]
+            ),
+        )
+
+    def test_unreadable_originals_are_counted_as_failed(self):
+        self.photo.image.storage.delete(self.photo.image.name)
+
+        counts = backfill_exif(Photo.objects.filter(pk__in=[self.photo.pk, self.padded.pk]))
+
+        self.assertEqual(counts["failed"], 1)
+        self.assertEqual(counts["updated"], 1)
+
+    def test_command_filters_missing(self):
+        Photo.objects.filter(pk=self.photo.pk).update(exif_data={"Make": "Canon"})
+        out = StringIO()
+
+        call_command("backfill_exif", "--missing", stdout=out)
+
+        self.assertIn("Checking EXIF of 2 photo(s)", out.getvalue())
+        self.assertIn("1 updated", out.getvalue())
+        self.padded.refresh_from_db()
+        self.assertEqual(self.padded.camera_model, "EOS R5")
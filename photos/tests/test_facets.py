@@ -0,0 +1,166 @@
+"""
+Tests for photo facet values, their precomputed counts and the facet browse API.
+"""
+
+from datetime import datetime
+from io import StringIO
+from types import SimpleNamespace
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.tests.factories import UserFactory
+from photos.facets import camera_name, facet_changes, facet_counts, facet_values_for, membership_changes
+from photos.models import Photo, PhotoFacetCount
+from photos.tests.factories import PhotoFactory
+
+
+def _photo(**fields):
+    values = {
+        "date_taken": None,
+        "camera_make": "",
+        "camera_model": "",
+        "lens_model": "",
+        "focal_length": "",
+        "aperture": "",
+        "iso": None,
+    }
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+class FacetValuesTestCase(SimpleTestCase):
+    """Test how facet values are derived from the EXIF fields."""
+
+    def test_facet_values_for(self):
+        photo = _photo(
+            date_taken=timezone.make_aware(datetime(2024, 6, 15, 12, 0)),
+            camera_make="Canon",
+            camera_model="EOS R5",
+            lens_model="RF 24-70mm F2.8L IS USM",
+            focal_length="50mm",
+            aperture="f/2.8",
+            iso=400,
+        )
+
+        self.assertEqual(
+            facet_values_for(photo),
+            {
+                "month": "2024-06",
+                "camera": "Canon EOS R5",
+                "lens": "RF 24-70mm F2.8L IS USM",
+                "focal_length": "50-85mm",
+                "aperture": "f/2.8-4",
+                "iso": "ISO 400-800",
+            },
+        )
+
+    def test_missing_and_unparseable_values_are_left_out(self):
+        self.assertEqual(facet_values_for(_photo()), {})
+        self.assertEqual(facet_values_for(_photo(focal_length="unknown", aperture="f/0", iso=0)), {})
+
+    def test_bucket_edges(self):
+        self.assertEqual(facet_values_for(_photo(focal_length="8mm"))["focal_length"], "<16mm")
+        self.assertEqual(facet_values_for(_photo(focal_length="16mm"))["focal_length"], "16-24mm")
+        self.assertEqual(facet_values_for(_photo(focal_length="600mm"))["focal_length"], "400mm+")
+        self.assertEqual(facet_values_for(_photo(aperture="f/1.2"))["aperture"], "<f/1.4")
+        self.assertEqual(facet_values_for(_photo(iso=25600))["iso"], "ISO 12800+")
+
+    def test_camera_name(self):
+        self.assertEqual(camera_name("Canon", "EOS R5"), "Canon EOS R5")
+        self.assertEqual(camera_name("NIKON CORPORATION", "NIKON Z 6"), "NIKON Z 6")
+        self.assertEqual(camera_name("", "iPhone 15 Pro"), "iPhone 15 Pro")
+        self.assertEqual(camera_name("", ""), "")
+
+    def test_facet_changes(self):
+        changes = facet_changes([7], {"camera": "A", "iso": "ISO 400-800"}, {"camera": "B", "iso": "ISO 400-800"})
+
+        self.assertEqual(
+            changes,
+            [(None, "camera", "A", -1), (None, "camera", "B", 1), (7, "camera", "A", -1), (7, "camera", "B", 1)],
+        )
+        self.assertEqual(membership_changes(7, {"camera": "A"}, -1), [(7, "camera", "A", -1)])
+
+
+class FacetCountsTestCase(TestCase):
+    """Test that the facet counts follow photo edits, album membership and deletes."""
+
+    def setUp(self):
+        self.album = PhotoFactory.create_photo_album(title="Trip", slug="trip")
+        self.r5 = PhotoFactory.create_photo(image=PhotoFactory.create_exif_image())
+        self.r6 = PhotoFactory.create_photo(image=PhotoFactory.create_exif_image(color=(0, 0, 255)))
+        self.r6.camera_model = "EOS R6"
+        self.r6.save(update_fields=["camera_model"])
+        self.plain = PhotoFactory.create_photo(image=PhotoFactory.create_test_image(color=(0, 255, 0)))
+
+    def counts(self, facet, album=None):
+        return dict(PhotoFacetCount.objects.filter(album=album, facet=facet).values_list("value", "count"))
+
+    def test_saving_photos_counts_them_in_the_library(self):
+        self.assertEqual(self.r6.facet_values["camera"], "Canon EOS R6")
+        self.assertEqual(self.counts("camera"), {"Canon EOS R5": 1, "Canon EOS R6": 1})
+        self.assertEqual(self.counts("month"), {"2024-01": 2})
+        self.assertEqual(self.counts("aperture"), {"f/2.8-4": 2})
+
+    def test_album_membership_and_edits(self):
+        self.album.photos.add(self.r5, self.r6, self.plain)
+        self.assertEqual(self.counts("camera", self.album), {"Canon EOS R5": 1, "Canon EOS R6": 1})
+
+        self.r5.iso = 3200
+        self.r5.save(update_fields=["iso"])
+        self.assertEqual(self.counts("iso"), {"ISO 400-800": 1, "ISO 3200-6400": 1})
+        self.assertEqual(self.counts("iso", self.album), {"ISO 400-800": 1, "ISO 3200-6400": 1})
+
+        self.album.photos.remove(self.r6)
+        self.assertEqual(self.counts("camera", self.album), {"Canon EOS R5": 1})
+        self.assertEqual(self.counts("camera"), {"Canon EOS R5": 1, "Canon EOS R6": 1})
+
+        self.r5.delete()
+        self.assertEqual(self.counts("camera", self.album), {})
+        self.assertEqual(self.counts("camera"), {"Canon EOS R6": 1})
+
+    def test_rebuild_matches_the_incremental_counts(self):
+        self.album.photos.add(self.r5, self.plain)
+        expected = sorted(PhotoFacetCount.objects.values_list("album_id", "facet", "value", "count"))
+        Photo.objects.filter(pk=self.r5.pk).update(facet_values={})
+        PhotoFacetCount.objects.all().delete()
+
+        call_command("rebuild_photo_facets", stdout=StringIO())
+
+        self.assertEqual(sorted(PhotoFacetCount.objects.values_list("album_id", "facet", "value", "count")), expected)
+        self.r5.refresh_from_db()
+        self.assertEqual(self.r5.facet_values["camera"], "Canon EOS R5")
+
+    def test_filtered_counts(self):
+        counts = facet_counts(Photo.objects.all(), filters={"camera": "Canon EOS R6"})
+
+        self.assertEqual(counts["camera"], [{"value": "Canon EOS R6", "count": 1}])
+        self.assertEqual(counts["month"], [{"value": "2024-01", "count": 1}])
+
+    def test_album_facets_api(self):
+        self.album.photos.add(self.r5, self.r6, self.plain)
+        url = reverse("photos:album_facets_api", args=[self.album.slug])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], 3)
+        self.assertEqual(
+            response.json()["facets"]["camera"],
+            [{"value": "Canon EOS R5", "count": 1}, {"value": "Canon EOS R6", "count": 1}],
+        )
+
+        response = self.client.get(url, {"camera": "Canon EOS R6", "month": "2024-01"})
+        self.assertEqual(response.json()["total"], 1)
+        self.assertEqual(response.json()["photo_ids"], [self.r6.pk])
+
+    def test_library_facets_api_is_staff_only(self):
+        url = reverse("photos:photo_facets_api")
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(UserFactory.create_staff_user())
+        response = self.client.get(url, {"iso": "ISO 400-800"})
+
+        self.assertEqual(response.json()["total"], 2)
+        self.assertEqual(sorted(response.json()["photo_ids"]), sorted([self.r5.pk, self.r6.pk]))
@@ -18,6 +18,7 @@ from PIL import Image
 
 from photos.forms import MultipleFileField, MultipleFileInput, PhotoBulkUploadForm
 from photos.models import Photo
+from photos.processing import INTERACTIVE_PRIORITY
 from photos.tests.factories import PhotoFactory
 
 
@@ -140,7 +141,7 @@ class PhotoBulkUploadFormTestCase(TestCase):
         self.assertTrue(form.is_valid())
         self.assertEqual(form.cleaned_data["album"], self.album1)
 
-    @patch("photos.tasks.process_photo_async")
+    @patch("photos.processing.queue_photo_processing")
     @patch("photos.forms.DuplicateDetector.find_duplicates")
     def test_save_single_image_async(self, mock_find_duplicates, mock_task):
         """Test saving a single uploaded image with async processing (default)."""
@@ -175,7 +176,7 @@ class PhotoBulkUploadFormTestCase(TestCase):
         self.assertEqual(photo.processing_status, "pending")
 
         # Verify async task was queued
-        mock_task.delay.assert_called_once_with(photo.pk)
+        mock_task.assert_called_once_with([photo.pk], priority=INTERACTIVE_PRIORITY)
 
     @patch("photos.forms.DuplicateDetector.find_duplicates")
     def test_save_single_image_sync(self, mock_find_duplicates):
@@ -203,7 +204,7 @@ class PhotoBulkUploadFormTestCase(TestCase):
         self.assertEqual(photo.perceptual_hash, "phash456")
         self.assertEqual(photo.processing_status, "pending")
 
-    @patch("photos.tasks.process_photo_async")
+    @patch("photos.processing.queue_photo_processing")
     @patch("photos.forms.DuplicateDetector.find_duplicates")
     def test_save_multiple_images_async(self, mock_find_duplicates, mock_task):
         """Test saving multiple uploaded images with async processing."""
@@ -228,9 +229,9 @@ class PhotoBulkUploadFormTestCase(TestCase):
         self.assertEqual(len(result["errors"]), 0)
 
         # Verify async tasks were queued for each photo
-        self.assertEqual(mock_task.delay.call_count, 2)
+        self.assertEqual(mock_task.call_count, 2)
 
-    @patch("photos.tasks.process_photo_async")
+    @patch("photos.processing.queue_photo_processing")
     @patch("photos.forms.DuplicateDetector.find_duplicates")
     def test_save_with_album_assignment(self, mock_find_duplicates, mock_task):
         """Test saving images with album assignment."""
@@ -425,7 +426,7 @@ class PhotoBulkUploadFormTestCase(TestCase):
             "Optional: Add all uploaded photos to this album",
         )
 
-    @patch("photos.tasks.process_photo_async")
+    @patch("photos.processing.queue_photo_processing")
     @patch("photos.forms.DuplicateDetector.find_duplicates")
     def test_save_preserves_hashes_async(self, mock_find_duplicates, mock_task):
         """Test that computed hashes are preserved when using async processing."""
@@ -0,0 +1,243 @@
+"""
+Tests for the geohash index and album map clusters.
+"""
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.tests.factories import UserFactory
+from photos.geo import (
+    BUILD_SCHEDULED_KEY_PREFIX,
+    MAX_COVER_CELLS,
+    PUBLIC_CLUSTER_PRECISION,
+    WORLD,
+    build_map_clusters,
+    cell_bounds,
+    cell_size,
+    clusters_in_bbox,
+    covering_cells,
+    encode,
+    geohash_for,
+    parse_bbox,
+    photos_in_bbox,
+    public_bounds,
+    public_clusters_in_bbox,
+    schedule_map_cluster_build,
+    zoom_precision,
+)
+from photos.models import Photo, PhotoAlbum
+from photos.tests.factories import PhotoFactory
+
+NEW_YORK = (40.7128, -74.0060)
+BROOKLYN = (40.6782, -73.9442)
+PARIS = (48.8566, 2.3522)
+
+
+class GeohashTestCase(SimpleTestCase):
+    """Test geohash encoding, box covers and clustering."""
+
+    def test_encode(self):
+        self.assertEqual(encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(encode(*NEW_YORK, 5), "dr5re")
+        self.assertEqual(geohash_for(Decimal("40.7128"), Decimal("-74.0060")), encode(*NEW_YORK))
+        self.assertEqual(geohash_for(None, Decimal("-74.0060")), "")
+        self.assertEqual(cell_size(1), (45.0, 45.0))
+
+    def test_parse_bbox(self):
+        self.assertEqual(parse_bbox(""), WORLD)
+        self.assertEqual(parse_bbox("-74.1,40.6,-73.9,40.8"), (-74.1, 40.6, -73.9, 40.8))
+        for value in ("1,2,3", "a,b,c,d", "-74,41,-73,40", "0,0,200,10", "nan,0,1,1"):
+            with self.assertRaises(ValueError):
+                parse_bbox(value)
+
+    def test_covering_cells_contain_every_point_in_the_box(self):
+        bbox = (-74.05, 40.60, -73.90, 40.80)
+        cells = covering_cells(bbox)
+
+        self.assertLessEqual(len(cells), MAX_COVER_CELLS)
+        self.assertEqual(len({len(cell) for cell in cells}), 1)
+        for point in (NEW_YORK, BROOKLYN, (40.60, -74.05), (40.80, -73.90)):
+            self.assertTrue(any(encode(*point).startswith(cell) for cell in cells), point)
+        self.assertFalse(any(encode(*PARIS).startswith(cell) for cell in cells))
+
+    def test_covering_cells_across_the_antimeridian(self):
+        cells = covering_cells((179.5, -1, -179.5, 1))
+
+        for point in ((0, 179.9), (0, -179.9), (0.5, 180)):
+            self.assertTrue(any(encode(*point).startswith(cell) for cell in cells), point)
+        self.assertFalse(any(encode(0, 0).startswith(cell) for cell in cells))
+
+    def test_zoom_precision(self):
+        self.assertEqual(zoom_precision(0), 1)
+        self.assertEqual(zoom_precision(10), 5)
+        self.assertEqual(zoom_precision(25), zoom_precision(18))
+        # Finer zoom levels never use coarser cells
+        precisions = [zoom_precision(zoom) for zoom in range(22)]
+        self.assertEqual(precisions, sorted(precisions))
+
+    def test_build_map_clusters(self):
+        rows = [
+            (1, *NEW_YORK, encode(*NEW_YORK)),
+            (2, *BROOKLYN, encode(*BROOKLYN)),
+            (3, *PARIS, encode(*PARIS)),
+        ]
+
+        clusters = build_map_clusters(rows)
+
+        self.assertEqual(clusters["count"], 3)
+        self.assertEqual(clusters["bounds"], [NEW_YORK[1], BROOKLYN[0], PARIS[1], PARIS[0]])
+        world = clusters_in_bbox(clusters, zoom=3)
+        self.assertEqual(sorted(cluster["count"] for cluster in world), [1, 2])
+        new_york = next(cluster for cluster in world if cluster["count"] == 2)
+        self.assertEqual(new_york["photo_id"], 1)
+        self.assertAlmostEqual(new_york["lat"], (NEW_YORK[0] + BROOKLYN[0]) / 2, places=5)
+
+        # Zoomed in on the city, the two photos separate and Paris is out of view
+        street = clusters_in_bbox(clusters, zoom=14, bbox=(-74.1, 40.6, -73.9, 40.8))
+        self.assertEqual(sorted(cluster["photo_id"] for cluster in street), [1, 2])
+
+    def test_build_map_clusters_of_nothing(self):
+        self.assertEqual(build_map_clusters([])["bounds"], None)
+        self.assertEqual(clusters_in_bbox(build_map_clusters([]), zoom=5), [])
+        self.assertIsNone(public_bounds(None))
+
+    def test_cell_bounds(self):
+        west, south, east, north = cell_bounds(encode(*NEW_YORK, 5))
+
+        self.assertTrue(west <= NEW_YORK[1] <= east and south <= NEW_YORK[0] <= north)
+        self.assertEqual((north - south, east - west), cell_size(5))
+        self.assertEqual(cell_bounds(""), WORLD)
+
+    def test_public_clusters_are_coarse(self):
+        rows = [(1, *NEW_YORK, encode(*NEW_YORK)), (2, *BROOKLYN, encode(*BROOKLYN))]
+        clusters = build_map_clusters(rows)
+
+        street = public_clusters_in_bbox(clusters, zoom=14)
+
+        # At street zoom both photos stay in one cluster at the centre of its cell
+        self.assertEqual(len(street), 1)
+        cell = encode(*NEW_YORK, PUBLIC_CLUSTER_PRECISION)
+        west, south, east, north = cell_bounds(cell)
+        self.assertEqual((street[0]["lat"], street[0]["lon"]), ((south + north) / 2, (west + east) / 2))
+        self.assertEqual(street[0]["count"], 2)
+        # Bounds cover whole cells
+        self.assertEqual(public_bounds(clusters["bounds"]), [west, south, east, north])
+
+
+@patch("photos.views.schedule_map_cluster_build")
+@patch("photos.geo.schedule_map_cluster_build")
+class AlbumMapTestCase(TestCase):
+    """Test the geohash column, cluster invalidation and the map API."""
+
+    def setUp(self):
+        self.album = PhotoFactory.create_photo_album(title="Trip", slug="trip")
+        self.photos = []
+        for color, (lat, lon) in zip([(255, 0, 0), (0, 255, 0), (0, 0, 255)], [NEW_YORK, BROOKLYN, PARIS], strict=True):
+            photo = PhotoFactory.create_photo(image=PhotoFactory.create_test_image(color=color))
+            photo.gps_latitude, photo.gps_longitude = Decimal(str(lat)), Decimal(str(lon))
+            photo.save(update_fields=["gps_latitude", "gps_longitude"])
+            self.photos.append(photo)
+        self.album.photos.add(*self.photos)
+        PhotoFactory.create_photo(image=PhotoFactory.create_test_image(color=(9, 9, 9)))
+
+    def test_geohash_follows_the_coordinates(self, mock_schedule, mock_view_schedule):
+        photo = self.photos[0]
+        self.assertEqual(Photo.objects.get(pk=photo.pk).geohash, encode(*NEW_YORK))
+
+        photo.gps_latitude = photo.gps_longitude = None
+        photo.save(update_fields=["gps_latitude", "gps_longitude"])
+        self.assertEqual(Photo.objects.get(pk=photo.pk).geohash, "")
+
+    def test_photos_in_bbox(self, mock_schedule, mock_view_schedule):
+        found = photos_in_bbox(Photo.objects.all(), (-74.1, 40.6, -73.9, 40.8))
+
+        self.assertEqual(sorted(found.values_list("pk", flat=True)), [self.photos[0].pk, self.photos[1].pk])
+
+    def test_clusters_are_stored_and_invalidated(self, mock_schedule, mock_view_schedule):
+        url = reverse("photos:album_map_api", args=[self.album.slug])
+        self.client.force_login(UserFactory.create_staff_user())
+
+        # Before the build task runs the request computes the clusters without storing them
+        response = self.client.get(url, {"zoom": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 3)
+        self.assertEqual(sorted(cluster["count"] for cluster in response.json()["clusters"]), [1, 2])
+        mock_view_schedule.assert_called_once_with([self.album.pk])
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.map_clusters, {})
+
+        self.album.refresh_map_clusters()
+        with patch.object(PhotoAlbum, "compute_map_clusters") as mock_compute:
+            response = self.client.get(url, {"zoom": 14, "bbox": "-74.1,40.6,-73.9,40.8"})
+        mock_compute.assert_not_called()
+        self.assertEqual(len(response.json()["clusters"]), 2)
+
+        # Moving a photo clears the stored clusters and schedules a rebuild
+        paris = self.photos[2]
+        paris.gps_latitude, paris.gps_longitude = Decimal("40.7"), Decimal("-74.0")
+        paris.save(update_fields=["gps_latitude", "gps_longitude"])
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.map_clusters, {})
+        mock_schedule.assert_called()
+
+        response = self.client.get(url, {"zoom": 3})
+        self.assertEqual([cluster["count"] for cluster in response.json()["clusters"]], [3])
+
+    def test_anonymous_map_is_coarse(self, mock_schedule, mock_view_schedule):
+        self.album.refresh_map_clusters()
+        url = reverse("photos:album_map_api", args=[self.album.slug])
+
+        response = self.client.get(url, {"zoom": 14, "bbox": "-74.1,40.6,-73.9,40.8"})
+
+        self.assertEqual(response.status_code, 200)
+        (cluster,) = response.json()["clusters"]
+        self.assertEqual(cluster["count"], 2)
+        west, south, east, north = cell_bounds(encode(*NEW_YORK, PUBLIC_CLUSTER_PRECISION))
+        self.assertEqual((cluster["lat"], cluster["lon"]), ((south + north) / 2, (west + east) / 2))
+        self.assertEqual(response.json()["bounds"], public_bounds(self.album.map_clusters["bounds"]))
+
+    def test_map_photos_api(self, mock_schedule, mock_view_schedule):
+        url = reverse("photos:album_map_photos_api", args=[self.album.slug])
+        self.assertEqual(self.client.get(url, {"bbox": "-74.1,40.6,-73.9,40.8"}).status_code, 302)
+        self.client.force_login(UserFactory.create_staff_user())
+
+        response = self.client.get(url, {"bbox": "-74.1,40.6,-73.9,40.8"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([photo["id"] for photo in response.json()["photos"]], [self.photos[0].pk, self.photos[1].pk])
+        self.assertFalse(response.json()["truncated"])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {"bbox": "1,2,3"}).status_code, 400)
+
+    def test_private_albums_need_the_share_token(self, mock_schedule, mock_view_schedule):
+        self.album.is_private = True
+        self.album.save()
+        url = reverse("photos:album_map_api", args=[self.album.slug])
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, {"token": self.album.share_token}).status_code, 200)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ScheduleMapClusterBuildTestCase(TestCase):
+    """Test that cluster rebuilds are queued after commit and never break the caller."""
+
+    def setUp(self):
+        cache.clear()
+
+    @patch("photos.tasks.build_album_map_clusters.apply_async", side_effect=ConnectionError("broker down"))
+    def test_broker_errors_are_logged_and_retried(self, mock_apply):
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_map_cluster_build([1, 2])
+            mock_apply.assert_not_called()
+
+        self.assertEqual(mock_apply.call_count, 2)
+        self.assertIsNone(cache.get(f"{BUILD_SCHEDULED_KEY_PREFIX}1"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_map_cluster_build([1])
+        self.assertEqual(mock_apply.call_count, 3)
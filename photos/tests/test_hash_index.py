@@ -0,0 +1,268 @@
+"""
+Tests for the perceptual hash index.
+"""
+
+import random
+from io import BytesIO
+from unittest.mock import patch
+
+import imagehash
+from django.core.cache import cache
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from photos import hash_index
+from photos.hash_index import (
+    PerceptualHashIndex,
+    annotate_phash_distance,
+    get_index,
+    hash_segments,
+    pack_hash,
+    phash_prefilter,
+)
+from photos.image_utils import DuplicateDetector
+from photos.models import Photo
+from photos.tests.factories import PhotoFactory
+
+
+def random_hash(rng):
+    return f"{rng.getrandbits(256):064x}"
+
+
+def flip_bits(perceptual_hash, bits):
+    value = int(perceptual_hash, 16)
+    for bit in bits:
+        value ^= 1 << bit
+    return f"{value:064x}"
+
+
+def brute_force(hashes, query, threshold):
+    """Reference result computed the old way, with imagehash."""
+    target = imagehash.hex_to_hash(query)
+    results = [(photo_id, target - imagehash.hex_to_hash(h)) for photo_id, h in hashes]
+    return sorted(((photo_id, d) for photo_id, d in results if d <= threshold), key=lambda item: (item[1], item[0]))
+
+
+class PerceptualHashIndexTestCase(SimpleTestCase):
+    """Test lookups against a brute-force comparison."""
+
+    def setUp(self):
+        rng = random.Random(42)
+        base = random_hash(rng)
+        self.hashes = [(i, random_hash(rng)) for i in range(1, 201)]
+        # Near duplicates of one base hash at known distances
+        self.hashes += [(1000 + d, flip_bits(base, rng.sample(range(256), d))) for d in range(0, 21, 2)]
+        self.base = base
+        self.index = PerceptualHashIndex.from_rows(self.hashes)
+
+    def test_pack_hash(self):
+        self.assertEqual(pack_hash("f" * 64).tolist(), [2**64 - 1] * 4)
+        self.assertIsNone(pack_hash("phash_1"))
+        self.assertIsNone(pack_hash("ab" * 8))  # 64-bit hash from a different hash_size
+        self.assertIsNone(pack_hash(""))
+
+    def test_hash_segments(self):
+        segments = hash_segments("ff" * 8 + "00" * 8 + "7f" + "ff" * 7 + "80" + "00" * 7)
+        self.assertEqual(segments, (-1, 0, 2**63 - 1, -(2**63)))
+        self.assertIsNone(hash_segments("phash_1"))
+
+    def test_query_matches_brute_force(self):
+        for threshold in (0, 5, 10, 15, 20):
+            self.assertEqual(self.index.query(self.base, threshold), brute_force(self.hashes, self.base, threshold))
+
+    def test_query_exclude_id(self):
+        results = self.index.query(self.base, threshold=4, exclude_id=1000)
+        self.assertEqual(results, [(1002, 2), (1004, 4)])
+
+    def test_invalid_hashes_are_skipped(self):
+        index = PerceptualHashIndex.from_rows([(1, "phash_1"), (2, None), (3, self.base)])
+        self.assertEqual(index.ids.tolist(), [3])
+        self.assertEqual(index.query("not a hash"), [])
+
+    def test_add_and_remove(self):
+        near = flip_bits(self.base, [1])
+        self.index.add(5000, near)
+        self.assertIn((5000, 1), self.index.query(self.base, threshold=1))
+
+        self.index.add(5000, flip_bits(near, range(100, 140)))
+        self.assertNotIn(5000, dict(self.index.query(self.base, threshold=5)))
+
+        self.index.remove(1000)
+        self.assertNotIn(1000, dict(self.index.query(self.base, threshold=5)))
+
+    def test_add_many(self):
+        self.index.add_many([(1000, flip_bits(self.base, range(100, 140))), (6000, self.base), (6001, "phash_1")])
+
+        self.assertEqual(self.index.query(self.base, threshold=0), [(6000, 0)])
+        self.assertEqual(len(self.index), len(self.hashes) + 1)
+
+    def test_similar_pairs(self):
+        left, right, distances = self.index.similar_pairs(threshold=6)
+        pairs = set(zip(left.tolist(), right.tolist(), distances.tolist(), strict=True))
+
+        expected = set()
+        for i, (id_a, hash_a) in enumerate(self.hashes):
+            for id_b, hash_b in self.hashes[i + 1 :]:
+                distance = imagehash.hex_to_hash(hash_a) - imagehash.hex_to_hash(hash_b)
+                if distance <= 6:
+                    expected.add((id_a, id_b, distance))
+        self.assertEqual(pairs, expected)
+        self.assertEqual(
+            self.index.ids_with_similar(threshold=6), {a for a, _, _ in expected} | {b for _, b, _ in expected}
+        )
+
+    def test_with_changes(self):
+        updated = self.index.with_changes([(1000, None), (6000, self.base), (1002, flip_bits(self.base, range(50)))])
+
+        self.assertEqual(updated.query(self.base, threshold=4), [(6000, 0), (1004, 4)])
+        self.assertEqual(len(updated), len(self.hashes))
+        # The original index is left as it was
+        self.assertEqual(self.index.query(self.base, threshold=2), [(1000, 0), (1002, 2)])
+
+    def test_similar_pairs_across_tiles(self):
+        expected = self.index.similar_pairs(threshold=6)
+
+        with patch.object(hash_index, "PAIR_BLOCK_SIZE", 16):
+            tiled = self.index.similar_pairs(threshold=6)
+
+        def as_pairs(result):
+            return set(zip(*(array.tolist() for array in result), strict=True))
+
+        self.assertEqual(as_pairs(tiled), as_pairs(expected))
+
+    def test_serialization_round_trip(self):
+        restored = PerceptualHashIndex.from_bytes(self.index.to_bytes())
+        self.assertEqual(restored.ids.tolist(), self.index.ids.tolist())
+        self.assertEqual(restored.query(self.base, 10), self.index.query(self.base, 10))
+
+
+class PersistedHashIndexTestCase(TestCase):
+    """Test that the persisted index follows photo saves and deletes."""
+
+    def setUp(self):
+        cache.clear()
+        hash_index._local.update(version=None, index=None)
+        self.base = random_hash(random.Random(7))
+
+    def create_photo(self, perceptual_hash):
+        # Skip processing so the pipeline doesn't replace the hash under test
+        photo = Photo(image=PhotoFactory.create_test_image(), perceptual_hash=perceptual_hash)
+        photo.save(skip_duplicate_check=True, skip_processing=True)
+        return photo
+
+    def test_index_follows_saves_and_deletes(self):
+        original = self.create_photo(self.base)
+        similar = self.create_photo(flip_bits(self.base, [3, 9]))
+
+        self.assertEqual(original.get_similar_images(threshold=5), [(similar, 2)])
+
+        similar.perceptual_hash = flip_bits(self.base, range(0, 64))
+        similar.save()
+        self.assertEqual(original.get_similar_images(threshold=5), [])
+
+        similar.perceptual_hash = self.base
+        similar.save()
+        self.assertEqual(original.get_similar_images(threshold=5), [(similar, 0)])
+
+        similar.delete()
+        self.assertEqual(original.get_similar_images(threshold=5), [])
+        self.assertEqual(len(get_index()), 1)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ChangeLogTestCase(SimpleTestCase):
+    """Test that updates are recorded as change entries and replayed by other processes."""
+
+    def setUp(self):
+        cache.clear()
+        hash_index._local.update(version=None, index=None)
+        self.base = random_hash(random.Random(5))
+        rows = [(1, self.base), (2, flip_bits(self.base, range(100)))]
+        patcher = patch.object(PerceptualHashIndex, "from_database", return_value=PerceptualHashIndex.from_rows(rows))
+        self.from_database = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_updates_do_not_rewrite_the_snapshot(self):
+        get_index()
+        snapshot = cache.get(hash_index.INDEX_CACHE_KEY)
+
+        with patch.object(hash_index, "_store_snapshot") as store_snapshot:
+            hash_index.update_photo(3, flip_bits(self.base, [1]))
+            hash_index.remove_photo(1)
+        store_snapshot.assert_not_called()
+
+        # A process that only has the snapshot replays the change entries
+        hash_index._local.update(version=None, index=None)
+        self.assertEqual(cache.get(hash_index.INDEX_CACHE_KEY), snapshot)
+        self.assertEqual(get_index().query(self.base, threshold=5), [(3, 1)])
+        self.from_database.assert_called_once()
+
+    def test_snapshot_is_compacted(self):
+        get_index()
+        with patch.object(hash_index, "COMPACT_EVERY", 2):
+            hash_index.update_photo(3, flip_bits(self.base, [1]))
+            hash_index.update_photo(4, flip_bits(self.base, [2]))
+
+        version, _ = cache.get(hash_index.INDEX_CACHE_KEY)
+        self.assertEqual(version, cache.get(hash_index.VERSION_CACHE_KEY))
+
+    def test_missing_change_entry_rebuilds(self):
+        get_index()
+        hash_index.update_photo(3, flip_bits(self.base, [1]))
+        cache.delete(hash_index.CHANGE_CACHE_KEY.format(cache.get(hash_index.VERSION_CACHE_KEY)))
+        hash_index._local.update(version=None, index=None)
+
+        get_index()
+
+        self.assertEqual(self.from_database.call_count, 2)
+
+
+class SqlHammingDistanceTestCase(TestCase):
+    """Test Hamming distance filtering on the packed segments in SQL."""
+
+    def setUp(self):
+        rng = random.Random(11)
+        self.base = random_hash(rng)
+        self.photos = {
+            distance: Photo.objects.create(
+                file_hash=f"file_{distance}", perceptual_hash=flip_bits(self.base, rng.sample(range(256), distance))
+            )
+            for distance in (0, 3, 7, 20)
+        }
+
+    def test_segments_are_saved(self):
+        photo = self.photos[0]
+        photo.refresh_from_db()
+        self.assertEqual((photo.phash_0, photo.phash_1, photo.phash_2, photo.phash_3), hash_segments(self.base))
+
+        photo.perceptual_hash = ""
+        photo.save(update_fields=["perceptual_hash"])
+        photo.refresh_from_db()
+        self.assertIsNone(photo.phash_0)
+
+    def test_distance_is_computed_in_sql(self):
+        distances = dict(
+            annotate_phash_distance(Photo.objects.all(), self.base).values_list("file_hash", "phash_distance")
+        )
+        self.assertEqual(distances, {f"file_{d}": d for d in (0, 3, 7, 20)})
+
+    def test_prefilter_keeps_every_match(self):
+        for threshold in (0, 3, 5, 7):
+            matches = annotate_phash_distance(Photo.objects.all(), self.base).filter(
+                phash_prefilter(self.base, threshold), phash_distance__lte=threshold
+            )
+            expected = {photo.pk for distance, photo in self.photos.items() if distance <= threshold}
+            self.assertEqual(set(matches.values_list("pk", flat=True)), expected)
+
+        # Too large for the exact-half pigeonhole bound: no prefilter
+        self.assertEqual(phash_prefilter(self.base, 8), Q())
+
+    @patch("photos.image_utils.DuplicateDetector.compute_perceptual_hash")
+    def test_find_duplicates_is_one_query(self, mock_perceptual_hash):
+        mock_perceptual_hash.return_value = self.base
+
+        with self.assertNumQueries(1):
+            result = DuplicateDetector.find_duplicates(BytesIO(b"image"), Photo.objects.all(), file_hash="file_7")
+
+        self.assertEqual(result["exact_duplicates"], [self.photos[7]])
+        self.assertEqual(result["similar_images"], [(self.photos[0], 0), (self.photos[3], 3)])
@@ -3,31 +3,37 @@ Tests for image utility classes.
 
 Tests cover:
 - ImageMetadataExtractor.extract_basic_metadata()
-- ExifExtractor methods (extract_exif, GPS extraction, datetime parsing)
+- ExifExtractor methods (extract_exif, GPS extraction, datetime parsing) and read_exif_header()
 - SmartCrop (focal point detection, smart cropping)
 - ImageOptimizer (optimize_image for different sizes, process_uploaded_image)
 - DuplicateDetector (hash computation, duplicate finding, hash comparison)
 """
 
 import gc
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 from io import BytesIO
 from unittest.mock import Mock, patch
 
+import numpy as np
 from django.core.files.base import ContentFile
 from django.test import TestCase
 from django.utils import timezone
 from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
 
 from photos.image_utils import (
+    EXIF_HEADER_BYTES,
     DuplicateDetector,
     ExifExtractor,
     ImageMetadataExtractor,
     ImageOptimizer,
     SmartCrop,
+    read_exif_header,
     reset_file_pointer,
 )
+from photos.tests.factories import PhotoFactory
 
 
 class TestUtilityFunctions(TestCase):
@@ -137,45 +143,27 @@ class ExifExtractorTestCase(TestCase):
         self.assertIsInstance(serializable["FNumber"], str)
         self.assertIsInstance(serializable["Binary"], str)
 
-    @patch("PIL.Image.open")
-    def test_extract_exif_full_data(self, mock_open):
-        """Test full EXIF extraction with all fields."""
-        # Create mock image with EXIF data
-        mock_img = Mock()
-        mock_exif_data = {
-            271: "Canon",  # Make
-            272: "EOS R5",  # Model
-            42036: "RF 24-70mm F2.8L IS USM",  # LensModel
-            33437: (28, 10),  # FNumber
-            33434: (1, 250),  # ExposureTime
-            37377: (8, 1),  # ShutterSpeedValue
-            37378: (28, 10),  # ApertureValue
-            37386: (50, 1),  # FocalLength
-            34855: 400,  # ISOSpeedRatings
-            36867: "2024:01:15 14:30:00",  # DateTimeOriginal
-            36868: "2024:01:15 14:30:00",  # DateTimeDigitized
-            306: "2024:01:15 14:30:00",  # DateTime
-            # GPS Info
-            34853: {
-                1: "N",  # GPSLatitudeRef
-                2: ((40, 1), (42, 1), (46, 1)),  # GPSLatitude
-                3: "W",  # GPSLongitudeRef
-                4: ((74, 1), (0, 1), (23, 1)),  # GPSLongitude
-                5: 0,  # GPSAltitudeRef (above sea level)
-                6: (100, 1),  # GPSAltitude
-            },
-        }
-        mock_img._getexif.return_value = mock_exif_data
-        mock_open.return_value = mock_img
+    def test_make_exif_serializable_nested_and_rational_values(self):
+        serializable = ExifExtractor.make_exif_serializable(
+            {
+                "FNumber": IFDRational(28, 10),
+                "Nested": {"a": [1, "b", None]},
+                "NestedRational": {"a": IFDRational(1, 2)},
+                37500: "maker note",
+            }
+        )
+
+        self.assertEqual(serializable["FNumber"], "2.8")
+        self.assertEqual(serializable["Nested"], {"a": [1, "b", None]})
+        self.assertIsInstance(serializable["NestedRational"], str)
+        self.assertEqual(serializable["37500"], "maker note")
 
-        # Create a mock file object
-        mock_file = Mock()
-        mock_file.seek = Mock()
+    def test_extract_exif_full_data(self):
+        """Test full EXIF extraction with all fields."""
+        image_file = PhotoFactory.create_exif_image()
 
-        # Extract EXIF
-        result = ExifExtractor.extract_exif(mock_file)
+        result = ExifExtractor.extract_exif(image_file)
 
-        # Verify extraction
         self.assertEqual(result["camera_make"], "Canon")
         self.assertEqual(result["camera_model"], "EOS R5")
         self.assertEqual(result["lens_model"], "RF 24-70mm F2.8L IS USM")
@@ -183,10 +171,29 @@ class ExifExtractorTestCase(TestCase):
         self.assertEqual(result["shutter_speed"], "1/250")
         self.assertEqual(result["focal_length"], "50mm")
         self.assertEqual(result["iso"], 400)
-        self.assertIsNotNone(result["date_taken"])
-        self.assertIsNotNone(result["gps_latitude"])
-        self.assertIsNotNone(result["gps_longitude"])
-        self.assertIsNotNone(result["gps_altitude"])
+        self.assertEqual(result["date_taken"], timezone.make_aware(datetime(2024, 1, 15, 14, 30, 0)))
+        self.assertAlmostEqual(float(result["gps_latitude"]), 40.712778, places=5)
+        self.assertAlmostEqual(float(result["gps_longitude"]), -74.006389, places=5)
+        self.assertEqual(result["gps_altitude"], Decimal("100"))
+        # Tags from the Exif sub-IFD are merged with IFD0
+        self.assertEqual(result["full_exif"]["Make"], "Canon")
+        self.assertEqual(result["full_exif"]["ISOSpeedRatings"], 400)
+
+    def test_extract_exif_without_exif(self):
+        self.assertEqual(ExifExtractor.extract_exif(PhotoFactory.create_test_image()), {})
+
+    def test_read_exif_header(self):
+        """EXIF is parsed from leading bytes only when they cover the whole header."""
+        data = PhotoFactory.create_exif_image(padding=2 * EXIF_HEADER_BYTES).read()
+
+        self.assertIsNone(read_exif_header(data[:EXIF_HEADER_BYTES]))
+        result = read_exif_header(data, complete=True)
+        self.assertEqual(result["camera_make"], "Canon")
+        self.assertEqual(result["full_exif"]["FNumber"], "2.8")
+
+        small = PhotoFactory.create_exif_image().read()
+        self.assertEqual(read_exif_header(small[:EXIF_HEADER_BYTES]), result)
+        self.assertEqual(read_exif_header(PhotoFactory.create_test_image().read()), {})
 
     def test_parse_datetime(self):
         """Test EXIF datetime parsing."""
@@ -270,6 +277,11 @@ class ExifExtractorTestCase(TestCase):
         degrees = ExifExtractor._convert_to_degrees(gps_data)
         self.assertAlmostEqual(degrees, 45.51, places=2)
 
+        # Pillow's rational values
+        gps_data = (IFDRational(40), IFDRational(42), IFDRational(46))
+        degrees = ExifExtractor._convert_to_degrees(gps_data)
+        self.assertAlmostEqual(degrees, 40.712778, places=5)
+
     def test_extract_gps(self):
         """Test GPS data extraction."""
         gps_info = {
@@ -407,6 +419,72 @@ class SmartCropTestCase(TestCase):
         self.assertEqual(cropped1.size, (100, 100))
         self.assertEqual(cropped2.size, (100, 100))
 
+    def _create_subject_image(self, size=(1200, 800), center=(0.7, 0.3)):
+        """Create an image with a single bright subject on a plain background."""
+        img = Image.new("RGB", size, color=(200, 200, 200))
+        cx, cy = int(center[0] * size[0]), int(center[1] * size[1])
+        radius = size[0] // 12
+        img.paste((220, 20, 20), (cx - radius, cy - radius, cx + radius, cy + radius))
+        return img
+
+    def test_open_for_saliency_uses_draft_decode(self):
+        """JPEGs are decoded at reduced scale, never below the requested size."""
+        img_io = BytesIO()
+        Image.new("RGB", (2400, 1600), color="blue").save(img_io, format="JPEG")
+
+        img = SmartCrop.open_for_saliency(img_io, max_dimension=300)
+
+        self.assertEqual(img.size, (300, 200))  # 1/8 scale
+
+    def test_downsample_for_saliency(self):
+        img = Image.new("RGB", (1200, 800), color="blue")
+
+        small = SmartCrop.downsample_for_saliency(img, max_dimension=300)
+
+        self.assertEqual(small.size, (300, 200))
+        self.assertEqual(img.size, (1200, 800))
+        self.assertIs(SmartCrop.downsample_for_saliency(small, max_dimension=300), small)
+
+    def test_weighted_centroid(self):
+        """Row/column-sum centroid matches the coordinate-grid formula."""
+        weights = np.zeros((40, 60), dtype=np.uint8)
+        weights[10:20, 30:50] = 255
+        weights[5, 5] = 100
+
+        y_coords, x_coords = np.ogrid[:40, :60]
+        total = weights.sum(dtype=np.float64)
+        expected = ((x_coords * weights).sum() / total, (y_coords * weights).sum() / total)
+
+        centroid = SmartCrop._weighted_centroid(weights)
+
+        self.assertAlmostEqual(centroid[0], expected[0])
+        self.assertAlmostEqual(centroid[1], expected[1])
+        self.assertIsNone(SmartCrop._weighted_centroid(np.zeros((4, 4), dtype=np.uint8)))
+
+    def test_fast_mode_matches_full_mode(self):
+        """Reduced-resolution saliency lands close to the full-resolution focal point."""
+        img = self._create_subject_image()
+
+        full = SmartCrop.find_focal_point(img, mode="full")
+        fast = SmartCrop.find_focal_point(img, mode="fast")
+
+        self.assertAlmostEqual(fast[0], full[0], delta=0.1)
+        self.assertAlmostEqual(fast[1], full[1], delta=0.1)
+
+    def test_fast_mode_saliency_map_is_reduced(self):
+        img = self._create_subject_image()
+
+        _, saliency_map_bytes = SmartCrop.find_focal_point(img, return_saliency_map=True, mode="fast")
+
+        self.assertIsNotNone(saliency_map_bytes)
+        saliency_map = Image.open(BytesIO(saliency_map_bytes))
+        self.assertLessEqual(max(saliency_map.size), SmartCrop.FAST_SALIENCY_MAX_DIMENSION)
+        self.assertLess(max(saliency_map.size), max(img.size))
+
+    def test_unknown_saliency_mode(self):
+        with self.assertRaises(ValueError):
+            SmartCrop.find_focal_point(Image.new("RGB", (10, 10)), mode="approximate")
+
 
 class ImageOptimizerTestCase(TestCase):
     """Test cases for ImageOptimizer."""
@@ -529,6 +607,90 @@ class ImageOptimizerTestCase(TestCase):
         # Verify optimize was called for each size
         self.assertEqual(mock_optimize.call_count, 2)
 
+    @patch("photos.image_utils.SmartCrop.find_focal_point")
+    def test_process_uploaded_image_saliency_mode(self, mock_find_focal):
+        """The saliency mode can be chosen per call and defaults to SALIENCY_MODE."""
+        mock_find_focal.return_value = ((0.5, 0.5), None)
+
+        ImageOptimizer.process_uploaded_image(self._create_test_image_file(), "test-uuid")
+        self.assertEqual(mock_find_focal.call_args.kwargs["mode"], ImageOptimizer.SALIENCY_MODE)
+
+        ImageOptimizer.process_uploaded_image(self._create_test_image_file(), "test-uuid", saliency_mode="full")
+        self.assertEqual(mock_find_focal.call_args.kwargs["mode"], "full")
+
+    @patch("photos.image_utils._get_variant_executor")
+    def test_generate_variant_ladder(self, mock_executor):
+        """Every ladder width is encoded in every format and listed in the manifest."""
+        mock_executor.return_value = ThreadPoolExecutor(max_workers=2)
+        img = Image.new("RGBA", (900, 600), color=(10, 120, 200, 255))
+        ladders = {"grid": {"widths": (320, 480), "aspect": (4, 3)}, "display": {"widths": (640, 2048), "aspect": None}}
+        timings = {}
+
+        files, manifest = ImageOptimizer.generate_variant_ladder(
+            img, (0.5, 0.5), ladders=ladders, formats=["jpeg", "webp"], timings=timings
+        )
+
+        # Formats keep VARIANT_FORMATS order; widths larger than the source are capped to it
+        self.assertEqual(manifest, {"formats": ["webp", "jpeg"], "grid": [320, 480], "display": [640, 900]})
+        self.assertEqual(len(files), 8)
+        self.assertIn("ladder_resize", timings)
+        self.assertIn("ladder_encode", timings)
+
+        grid = Image.open(BytesIO(files[("grid", 480, "webp")]))
+        self.assertEqual((grid.format, grid.size), ("WEBP", (480, 360)))
+        display = Image.open(BytesIO(files[("display", 640, "jpeg")]))
+        self.assertEqual((display.format, display.size, display.mode), ("JPEG", (640, 427), "RGB"))
+
+        # The source image is not modified
+        self.assertEqual((img.mode, img.size), ("RGBA", (900, 600)))
+
+    @patch("photos.image_utils._get_variant_executor")
+    def test_variant_ladder_reuses_unchanged_keys(self, mock_executor):
+        """Only variants whose content key changed are encoded again."""
+        mock_executor.return_value = ThreadPoolExecutor(max_workers=2)
+        img = Image.new("RGB", (900, 600), color=(10, 120, 200))
+        ladders = {"grid": {"widths": (320, 480), "aspect": (4, 3)}, "display": {"widths": (640,), "aspect": None}}
+
+        files, manifest = ImageOptimizer.generate_variant_ladder(
+            img, (0.5, 0.5), ladders=ladders, formats=["jpeg", "webp"], file_hash="a" * 64
+        )
+        self.assertEqual(len(files), 6)
+        self.assertEqual(len(manifest["keys"]), 6)
+        self.assertEqual(manifest["encoder"], ImageOptimizer.variant_encoder())
+        reuse = manifest["keys"].values()
+
+        # Same inputs: nothing to encode, identical manifest
+        files, same = ImageOptimizer.generate_variant_ladder(
+            img, (0.5, 0.5), ladders=ladders, formats=["jpeg", "webp"], file_hash="a" * 64, reuse=reuse
+        )
+        self.assertEqual((files, same), ({}, manifest))
+
+        # A new focal point only changes the cropped ladder
+        files, moved = ImageOptimizer.generate_variant_ladder(
+            img, (0.2, 0.5), ladders=ladders, formats=["jpeg", "webp"], file_hash="a" * 64, reuse=reuse
+        )
+        self.assertEqual({key[0] for key in files}, {"grid"})
+        self.assertEqual(len(files), 4)
+        self.assertEqual(moved["keys"]["display_640.jpg"], manifest["keys"]["display_640.jpg"])
+        self.assertNotEqual(moved["keys"]["grid_320.jpg"], manifest["keys"]["grid_320.jpg"])
+
+        # A different encoder version changes every key
+        with patch.object(ImageOptimizer, "VARIANT_ENCODER_VERSION", 2):
+            files, _ = ImageOptimizer.generate_variant_ladder(
+                img, (0.5, 0.5), ladders=ladders, formats=["jpeg", "webp"], file_hash="a" * 64, reuse=reuse
+            )
+        self.assertEqual(len(files), 6)
+
+    def test_variant_path(self):
+        self.assertEqual(
+            ImageOptimizer.variant_path("abc", "grid", 320, "jpeg"),
+            "photos/variants/abc/grid_320.jpg",
+        )
+        self.assertEqual(
+            ImageOptimizer.variant_path("abc", "grid", 320, "avif", key="3f9a" + "0" * 36),
+            f"photos/variants/cas/3f/3f9a{'0' * 36}.avif",
+        )
+
 
 class DuplicateDetectorTestCase(TestCase):
     """Test cases for DuplicateDetector."""
@@ -693,30 +855,20 @@ class DuplicateDetectorTestCase(TestCase):
         self.assertEqual(result["exact_duplicates"][0], existing1)
         self.assertEqual(result["file_hash"], "hash123")
 
-    @patch("photos.image_utils.DuplicateDetector.compare_hashes")
     @patch("photos.image_utils.DuplicateDetector.compute_perceptual_hash")
     @patch("photos.image_utils.DuplicateDetector.compute_file_hash")
-    def test_find_duplicates_similar_images(self, mock_file_hash, mock_perceptual_hash, mock_compare):
+    def test_find_duplicates_similar_images(self, mock_file_hash, mock_perceptual_hash):
         """Test finding similar (but not exact) images."""
         from photos.models import Photo
 
-        # Create existing photos
-        existing1 = Photo.objects.create(file_hash="hash1", perceptual_hash="phash1")
-        Photo.objects.create(file_hash="hash2", perceptual_hash="phash2")
+        new_phash = "0f" * 32
+        # Create existing photos: 3 bits away from the new hash, and 8 bits away
+        existing1 = Photo.objects.create(file_hash="hash1", perceptual_hash="0e0e0e" + "0f" * 29)
+        Photo.objects.create(file_hash="hash2", perceptual_hash="00000f" + "0f" * 29)
 
         # Setup mocks
         mock_file_hash.return_value = "hash_new"  # No exact match
-        mock_perceptual_hash.return_value = "phash_new"
-
-        # Mock comparison results
-        def compare_side_effect(hash1, hash2, threshold):
-            if hash2 == "phash1":
-                return True, 3  # Similar to existing1
-            elif hash2 == "phash2":
-                return False, 10  # Not similar to existing2
-            return False, 100
-
-        mock_compare.side_effect = compare_side_effect
+        mock_perceptual_hash.return_value = new_phash
 
         test_file = BytesIO(b"test_image")
         result = DuplicateDetector.find_duplicates(test_file, Photo.objects.all(), exact_match_only=False)
@@ -0,0 +1,103 @@
+"""
+Tests for bulk photo ingestion.
+"""
+
+import os
+import tempfile
+import zlib
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from PIL import UnidentifiedImageError
+
+from photos import hash_index
+from photos.image_utils import DuplicateDetector, hash_upload
+from photos.ingest import ingest_photos
+from photos.models import AlbumPhoto, Photo
+from photos.processing import BACKFILL_PRIORITY
+from photos.tests.factories import PhotoFactory
+
+
+def image_bytes(color):
+    return PhotoFactory.create_test_image(color=color).read()
+
+
+class HashUploadTestCase(SimpleTestCase):
+    """Test the worker-side hashing of an upload."""
+
+    def test_hashes_bytes_and_paths_alike(self):
+        data = image_bytes((10, 200, 30))
+        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+            f.write(data)
+        self.addCleanup(os.unlink, f.name)
+
+        hashed = hash_upload(data)
+
+        self.assertEqual(hash_upload(f.name), hashed)
+        self.assertEqual(hashed["file_size"], len(data))
+        self.assertEqual(hashed["file_crc32"], zlib.crc32(data))
+        self.assertEqual(
+            hashed["file_hash"],
+            DuplicateDetector.compute_file_hash(PhotoFactory.create_test_image(color=(10, 200, 30))),
+        )
+        self.assertEqual(len(hashed["perceptual_hash"]), 64)
+
+    def test_rejects_non_images(self):
+        with self.assertRaises(UnidentifiedImageError):
+            hash_upload(b"not an image")
+
+
+@patch("photos.ingest.queue_processing")
+class IngestPhotosTestCase(TestCase):
+    """Test batch deduplication, inserts and task fan-out."""
+
+    def setUp(self):
+        cache.clear()
+        hash_index._local.update(version=None, index=None)
+
+    def test_batch_is_deduplicated_and_inserted(self, mock_queue):
+        existing = PhotoFactory.create_photo(image=PhotoFactory.create_test_image(color=(0, 0, 255)))
+        album = PhotoFactory.create_photo_album(title="Shoot", slug="shoot")
+        files = [
+            ("red.jpg", PhotoFactory.create_test_image(color=(255, 0, 0))),
+            ("green.jpg", PhotoFactory.create_test_image(color=(0, 255, 0))),
+            ("red-again.jpg", PhotoFactory.create_test_image(color=(255, 0, 0))),
+            ("blue.jpg", PhotoFactory.create_test_image(color=(0, 0, 255))),
+            ("notes.jpg", SimpleUploadedFile("notes.jpg", b"not an image")),
+        ]
+
+        outcomes = ingest_photos(files, album=album)
+
+        self.assertEqual(
+            [outcome["status"] for outcome in outcomes], ["created", "created", "duplicate", "duplicate", "error"]
+        )
+        self.assertIn("in this batch", outcomes[2]["message"])
+        self.assertIn(f"(ID: {existing.pk})", outcomes[3]["message"])
+
+        created = [outcome["photo"] for outcome in outcomes[:2]]
+        for photo in created:
+            photo.refresh_from_db()
+            self.assertEqual(photo.processing_status, "pending")
+            self.assertTrue(photo.image.storage.exists(photo.image.name))
+            self.assertEqual(photo.phash_0, hash_index.hash_segments(photo.perceptual_hash)[0])
+        self.assertEqual(Photo.objects.count(), 3)
+        self.assertEqual(AlbumPhoto.objects.filter(album=album).count(), 2)
+        mock_queue.assert_called_once_with([photo.pk for photo in created], priority=BACKFILL_PRIORITY)
+        self.assertIsNotNone(hash_index.get_index().get(created[0].pk))
+
+    def test_ingest_photos_command(self, mock_queue):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, color in (("a.jpg", (1, 2, 3)), ("b.png", (200, 100, 0)), ("readme.txt", None)):
+                with open(os.path.join(directory, name), "wb") as f:
+                    f.write(image_bytes(color) if color else b"notes")
+
+            out = StringIO()
+            call_command("ingest_photos", directory, "--no-process", stdout=out)
+
+        self.assertIn("2 created", out.getvalue())
+        self.assertEqual(set(Photo.objects.values_list("original_filename", flat=True)), {"a.jpg", "b.png"})
+        mock_queue.assert_not_called()
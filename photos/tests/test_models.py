@@ -4,12 +4,13 @@ Tests for Photo and PhotoAlbum models.
 Tests cover:
 - Photo save() with image processing and duplicate detection
 - PhotoAlbum slug generation
+- PhotoAlbum listing summary (photo count, daily cover)
 - get_similar_images() functionality
 - Model field validations
 """
 
 import gc
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from io import BytesIO
 from unittest.mock import Mock, patch
@@ -20,7 +21,7 @@ from django.test import TestCase
 from django.utils import timezone
 from PIL import Image
 
-from photos.models import Photo, PhotoAlbum
+from photos.models import AlbumPhoto, AlbumZipJournal, Photo, PhotoAlbum, photo_zip_digest
 
 
 class PhotoModelTestCase(TestCase):
@@ -53,9 +54,9 @@ class PhotoModelTestCase(TestCase):
         self.assertIsNotNone(photo.image)
         self.assertIsNotNone(photo.pk)
 
-    @patch("photos.models.ImageOptimizer.process_uploaded_image")
+    @patch("photos.image_utils.ImageOptimizer.process_uploaded_image")
     @patch("photos.models.ExifExtractor.extract_exif")
-    @patch("photos.models.ImageMetadataExtractor.extract_basic_metadata")
+    @patch("photos.image_utils.ImageMetadataExtractor.extract_basic_metadata")
     @patch("photos.models.DuplicateDetector.compute_and_store_hashes")
     def test_photo_save_processes_image(self, mock_hashes, mock_metadata, mock_exif, mock_process):
         """Test that save() triggers image processing."""
@@ -168,42 +169,27 @@ class PhotoModelTestCase(TestCase):
         photo2 = Photo(pk=2)
         self.assertEqual(str(photo2), "Photo 2")
 
+    @patch("photos.models.get_index")
     @patch("photos.models.Photo.objects")
-    def test_get_similar_images(self, mock_objects):
-        """Test finding similar images."""
-        # Create test photos
-        photo1 = Photo(pk=1, perceptual_hash="hash1")
-        photo2 = Photo(pk=2, perceptual_hash="hash2")
-        photo3 = Photo(pk=3, perceptual_hash="hash3")
-
-        # Mock the queryset to return only our test photos
-        mock_qs = Mock()
-        mock_qs.exclude.return_value = mock_qs
-        mock_qs.__iter__ = Mock(return_value=iter([photo2, photo3]))
-
-        mock_objects.exclude.return_value = mock_qs
-
-        # Mock the DuplicateDetector.compare_hashes
-        with patch("photos.models.DuplicateDetector.compare_hashes") as mock_compare:
-            # Setup mock comparisons
-            def compare_side_effect(hash1, hash2, threshold=5):
-                if hash1 == "hash1" and hash2 == "hash2":
-                    return True, 3  # Similar with distance 3
-                elif hash1 == "hash1" and hash2 == "hash3":
-                    return True, 4  # Similar with distance 4
-                return False, 10
-
-            mock_compare.side_effect = compare_side_effect
-
-            # Get similar images
-            similar = photo1.get_similar_images(threshold=5)
-
-            # Verify results are sorted by distance
-            self.assertEqual(len(similar), 2)
-            self.assertEqual(similar[0][0], photo2)
-            self.assertEqual(similar[0][1], 3)
-            self.assertEqual(similar[1][0], photo3)
-            self.assertEqual(similar[1][1], 4)
+    def test_get_similar_images(self, mock_objects, mock_get_index):
+        """Test finding similar images through the perceptual hash index."""
+        photo1 = Photo(pk=1, perceptual_hash="a" * 64)
+        photo2 = Photo(pk=2, perceptual_hash="b" * 64)
+        photo3 = Photo(pk=3, perceptual_hash="c" * 64)
+
+        # The index returns matches sorted by distance; photo 4 was deleted since it was indexed
+        mock_get_index.return_value.query.return_value = [(2, 3), (3, 4), (4, 5)]
+        mock_objects.in_bulk.return_value = {2: photo2, 3: photo3}
+
+        similar = photo1.get_similar_images(threshold=5)
+
+        mock_get_index.return_value.query.assert_called_once_with("a" * 64, threshold=5, exclude_id=1)
+        mock_objects.in_bulk.assert_called_once_with([2, 3, 4])
+        self.assertEqual(similar, [(photo2, 3), (photo3, 4)])
+
+    def test_get_similar_images_without_hash(self):
+        """Test that a photo without a perceptual hash has no similar images."""
+        self.assertEqual(Photo(pk=1).get_similar_images(), [])
 
     def test_get_image_url_different_sizes(self):
         """Test getting URLs for different image sizes."""
@@ -337,6 +323,47 @@ class PhotoModelTestCase(TestCase):
         self.assertEqual(photo.focal_point_x, 0.5)
         self.assertEqual(photo.focal_point_y, 0.5)
 
+    def test_update_crops_reuses_full_frame_variants(self):
+        """Moving the focal point replaces only the cropped ladder's variants."""
+        photo = Photo.objects.create(image=self._create_test_image(size=(400, 200)))
+        storage = photo.image.storage
+        before = photo.variants
+        old_thumbnail = photo.image_thumbnail.name
+
+        photo.focal_point_x, photo.focal_point_y = 0.9, 0.1
+        photo.update_crops()
+
+        # FileSystemStorage doesn't overwrite, so the new thumbnail has another name
+        self.assertNotEqual(photo.image_thumbnail.name, old_thumbnail)
+        self.assertTrue(storage.exists(photo.image_thumbnail.name))
+        self.assertFalse(storage.exists(old_thumbnail))
+
+        after = photo.variants
+        for label, key in after["keys"].items():
+            if label.startswith("display_"):
+                self.assertEqual(key, before["keys"][label])
+            else:
+                self.assertNotEqual(key, before["keys"][label])
+
+        for name in photo._variant_names(after):
+            self.assertTrue(storage.exists(name), name)
+        for name in photo._variant_names(before) - photo._variant_names(after):
+            self.assertFalse(storage.exists(name), name)
+
+    def test_update_crops_keeps_variants_another_photo_uses(self):
+        """Files in the shared variant store outlive a photo that stops using them."""
+        photo = Photo.objects.create(image=self._create_test_image(size=(400, 200)))
+        copy = Photo(image=self._create_test_image(size=(400, 200)))
+        copy.save(skip_duplicate_check=True)
+        self.assertEqual(copy.variants["keys"], photo.variants["keys"])
+        shared = photo._variant_names(photo.variants)
+
+        photo.focal_point_x, photo.focal_point_y = 0.9, 0.1
+        photo.update_crops()
+
+        for name in shared:
+            self.assertTrue(photo.image.storage.exists(name), name)
+
 
 class PhotoAlbumModelTestCase(TestCase):
     """Test cases for the PhotoAlbum model."""
@@ -448,3 +475,143 @@ class PhotoAlbumModelTestCase(TestCase):
         # Downloads enabled
         album2 = PhotoAlbum.objects.create(title="Album 2", allow_downloads=True)
         self.assertTrue(album2.allow_downloads)
+
+    def test_album_summary_follows_photo_changes(self):
+        """photo_count and cover_photo are kept current by add(), AlbumPhoto saves and deletes."""
+        album = PhotoAlbum.objects.create(title="Summary Album")
+        photos = []
+        for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255)):
+            photo = Photo(image=self._create_test_image(color=color))
+            photo.save(skip_duplicate_check=True)
+            photos.append(photo)
+
+        album.photos.add(photos[0], photos[1])
+        AlbumPhoto.objects.create(album=album, photo=photos[2])
+        album.refresh_from_db()
+        self.assertEqual(album.photo_count, 3)
+        self.assertIn(album.cover_photo_id, [photo.pk for photo in photos])
+        self.assertIsNotNone(album.photos_changed_at)
+
+        album.photos.remove(album.cover_photo)
+        album.refresh_from_db()
+        self.assertEqual(album.photo_count, 2)
+        self.assertIn(album.cover_photo_id, [photo.pk for photo in photos])
+
+        album.photos.clear()
+        album.refresh_from_db()
+        self.assertEqual(album.photo_count, 0)
+        self.assertIsNone(album.cover_photo_id)
+
+    def test_cover_photo_rotates_deterministically_per_day(self):
+        """The same day always picks the same cover; different days spread over the album."""
+        album = PhotoAlbum.objects.create(title="Rotating Album")
+        for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)):
+            photo = Photo(image=self._create_test_image(color=color))
+            photo.save(skip_duplicate_check=True)
+            album.photos.add(photo)
+
+        days = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(14)]
+        picks = [album.pick_cover_photo_id(day) for day in days]
+
+        self.assertEqual(picks, [album.pick_cover_photo_id(day) for day in days])
+        self.assertGreater(len(set(picks)), 1)
+        self.assertTrue(set(picks) <= set(album.photos.values_list("pk", flat=True)))
+
+    @patch("photos.signals.schedule_sitemap_build")
+    def test_rotate_album_covers_writes_covers_without_saving_albums(self, mock_sitemap):
+        """Rotation is one bulk update; only albums with a drifted count are saved (and rebuild the sitemap)."""
+        from photos.tasks import rotate_album_covers
+
+        album = PhotoAlbum.objects.create(title="Rotating Album")
+        for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)):
+            photo = Photo(image=self._create_test_image(color=color))
+            photo.save(skip_duplicate_check=True)
+            album.photos.add(photo)
+        album.refresh_from_db()
+        day = next(
+            date(2025, 1, 1) + timedelta(days=offset)
+            for offset in range(30)
+            if album.pick_cover_photo_id(date(2025, 1, 1) + timedelta(days=offset)) != album.cover_photo_id
+        )
+        mock_sitemap.reset_mock()
+
+        with (
+            patch("photos.models.timezone.localdate", return_value=day),
+            patch("photos.signals.invalidate_album_pages") as mock_pages,
+        ):
+            self.assertEqual(rotate_album_covers()["changed"], 1)
+
+        album.refresh_from_db()
+        self.assertEqual(album.cover_photo_id, album.pick_cover_photo_id(day))
+        mock_pages.assert_not_called()
+        mock_sitemap.assert_not_called()
+
+        PhotoAlbum.objects.filter(pk=album.pk).update(photo_count=1)
+        with patch("photos.models.timezone.localdate", return_value=day):
+            self.assertEqual(rotate_album_covers()["changed"], 1)
+
+        album.refresh_from_db()
+        self.assertEqual(album.photo_count, 4)
+        mock_sitemap.assert_called_once()
+
+    @patch("photos.tasks.schedule_zip_generation")
+    def test_zip_digest_is_maintained_incrementally(self, mock_schedule):
+        """Adding and removing photos updates zip_digest and the journal without rereading the album."""
+        album = PhotoAlbum.objects.create(title="Digest Album", allow_downloads=True)
+        photos = []
+        for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255)):
+            photo = Photo(image=self._create_test_image(color=color))
+            photo.save(skip_duplicate_check=True)
+            photos.append(photo)
+
+        album.photos.add(photos[0], photos[1])
+        AlbumPhoto.objects.create(album=album, photo=photos[2])
+        album.refresh_from_db()
+        expected = photo_zip_digest(photos[0].pk, photos[0].file_hash)
+        expected ^= photo_zip_digest(photos[1].pk, photos[1].file_hash)
+        expected ^= photo_zip_digest(photos[2].pk, photos[2].file_hash)
+        self.assertEqual(album.zip_digest, expected)
+        self.assertEqual(album.compute_zip_content_hash(), f"{expected & 0xFFFFFFFFFFFFFFFF:016x}")
+
+        album.photos.remove(photos[1])
+        album.refresh_from_db()
+        digest = album.zip_digest
+        self.assertEqual(digest, expected ^ photo_zip_digest(photos[1].pk, photos[1].file_hash))
+        self.assertEqual(album.recompute_zip_digest(), digest)
+        self.assertCountEqual(
+            album.pending_zip_changes().values_list("action", "photo_id"),
+            [("add", photos[0].pk), ("add", photos[1].pk), ("add", photos[2].pk), ("remove", photos[1].pk)],
+        )
+
+        album.photos.clear()
+        album.refresh_from_db()
+        self.assertEqual(album.zip_digest, 0)
+        self.assertEqual(album.compute_zip_content_hash(), "")
+
+    def test_zip_journal_is_only_kept_for_stored_zips(self):
+        """Albums without a stored ZIP update zip_digest but keep no journal for generate_album_zip to prune."""
+        streamed = PhotoAlbum.objects.create(title="Streamed", slug="streamed", allow_downloads=True, zip_mode="stream")
+        no_downloads = PhotoAlbum.objects.create(title="No downloads", slug="no-downloads")
+        photo = Photo(image=self._create_test_image())
+        photo.save(skip_duplicate_check=True)
+
+        streamed.photos.add(photo)
+        no_downloads.photos.add(photo)
+
+        self.assertFalse(AlbumZipJournal.objects.exists())
+        no_downloads.refresh_from_db()
+        self.assertEqual(no_downloads.zip_digest, photo_zip_digest(photo.pk, photo.file_hash))
+
+    @patch("photos.tasks.schedule_zip_generation")
+    def test_zip_journal_is_dropped_when_downloads_stop(self, mock_schedule):
+        """Switching an album to streamed downloads clears its journal."""
+        album = PhotoAlbum.objects.create(title="Switching", slug="switching", allow_downloads=True)
+        photo = Photo(image=self._create_test_image())
+        photo.save(skip_duplicate_check=True)
+        album.photos.add(photo)
+        self.assertEqual(album.zip_journal.count(), 1)
+
+        album.zip_mode = "stream"
+        album.save(update_fields=["zip_mode"])
+
+        self.assertEqual(album.zip_journal.count(), 0)
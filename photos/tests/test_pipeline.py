@@ -0,0 +1,79 @@
+"""
+Tests for the decode-once ImagePipeline.
+"""
+
+import hashlib
+from io import BytesIO
+from unittest.mock import patch
+
+from django.test import TestCase
+from PIL import Image
+
+from photos.image_utils import DuplicateDetector, ImageMetadataExtractor
+from photos.pipeline import ImagePipeline
+
+
+class ImagePipelineTestCase(TestCase):
+    """Test cases for ImagePipeline."""
+
+    def _create_test_image_bytes(self, size=(120, 80), color=(200, 40, 40), format="JPEG"):
+        img = Image.new("RGB", size, color)
+        img_io = BytesIO()
+        img.save(img_io, format=format, quality=80)
+        return img_io.getvalue()
+
+    def test_original_is_decoded_once(self):
+        """Hashes, metadata, EXIF and all variants share a single decode."""
+        data = self._create_test_image_bytes()
+
+        with patch("PIL.Image.open", wraps=Image.open) as mock_open:
+            with ImagePipeline(BytesIO(data)) as pipeline:
+                pipeline.hashes()
+                pipeline.metadata()
+                pipeline.exif()
+                variants, focal_point, _ = pipeline.variants("test-uuid")
+
+        self.assertEqual(mock_open.call_count, 1)
+        self.assertEqual(set(variants), {"preview", "thumbnail"})
+        self.assertIsNotNone(focal_point)
+
+    def test_results_match_separate_steps(self):
+        """The shared decode produces the same hashes and metadata as the individual helpers."""
+        data = self._create_test_image_bytes()
+
+        with ImagePipeline(BytesIO(data)) as pipeline:
+            hashes = pipeline.hashes()
+            metadata = pipeline.metadata()
+
+        self.assertEqual(hashes["file_hash"], hashlib.sha256(data).hexdigest())
+        self.assertEqual(hashes["perceptual_hash"], DuplicateDetector.compute_perceptual_hash(BytesIO(data)))
+        expected = ImageMetadataExtractor.extract_basic_metadata(BytesIO(data))
+        self.assertEqual((metadata["width"], metadata["height"]), (expected["width"], expected["height"]))
+        self.assertEqual(metadata["file_size"], len(data))
+
+    def test_variants_do_not_modify_shared_image(self):
+        data = self._create_test_image_bytes(size=(800, 600))
+
+        with ImagePipeline(BytesIO(data)) as pipeline:
+            pipeline.variants("test-uuid", existing_focal_point=(0.5, 0.5))
+            self.assertEqual(pipeline.image.size, (800, 600))
+
+    def test_nothing_is_read_until_needed(self):
+        source = BytesIO(self._create_test_image_bytes())
+
+        with patch.object(source, "read", wraps=source.read) as mock_read:
+            with ImagePipeline(source):
+                pass
+
+        mock_read.assert_not_called()
+
+    def test_timings(self):
+        data = self._create_test_image_bytes()
+
+        with ImagePipeline(BytesIO(data)) as pipeline:
+            pipeline.hashes()
+            pipeline.variants("test-uuid")
+
+        for stage in ("download", "decode", "hashes", "saliency", "variant_preview", "variant_thumbnail"):
+            self.assertIn(stage, pipeline.timings)
+        self.assertIn("total=", pipeline.format_timings())
@@ -0,0 +1,115 @@
+"""
+Tests for staged photo processing.
+"""
+
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase
+
+from photos.models import Photo
+from photos.processing import (
+    BACKFILL_PRIORITY,
+    INTERACTIVE_PRIORITY,
+    STAGES,
+    overall_status,
+    processing_signature,
+    queue_photo_processing,
+)
+from photos.tasks import (
+    process_photo_metadata,
+    process_photo_saliency,
+    process_photo_search,
+    process_photo_variants,
+)
+from photos.tests.factories import PhotoFactory
+
+
+class ProcessingStatusTestCase(SimpleTestCase):
+    """Test how stage states add up to processing_status, and the task canvas."""
+
+    def test_overall_status(self):
+        self.assertEqual(overall_status(dict.fromkeys(STAGES, "pending")), "pending")
+        self.assertEqual(overall_status({"metadata": "processing", "variants": "pending"}), "processing")
+        self.assertEqual(overall_status({"metadata": "complete", "variants": "pending"}), "processing")
+        self.assertEqual(overall_status({"metadata": "complete", "saliency": "skipped"}), "complete")
+        self.assertEqual(overall_status({"metadata": "complete", "variants": "failed"}), "failed")
+
+    def test_every_stage_carries_the_priority(self):
+        canvas = processing_signature(7, priority=INTERACTIVE_PRIORITY)
+
+        first, rest = canvas.tasks
+        self.assertEqual(first.task, process_photo_metadata.name)
+        variants_then_saliency, search = rest.tasks
+        self.assertEqual(
+            [task.task for task in variants_then_saliency.tasks],
+            [process_photo_variants.name, process_photo_saliency.name],
+        )
+        self.assertEqual(search.task, process_photo_search.name)
+        for signature in (first, *variants_then_saliency.tasks, search):
+            self.assertEqual(signature.args, (7,))
+            self.assertEqual(signature.options["priority"], INTERACTIVE_PRIORITY)
+
+
+class StagedProcessingTestCase(TestCase):
+    """Test the stage tasks against a photo saved for background processing."""
+
+    def setUp(self):
+        self.photo = Photo(image=PhotoFactory.create_exif_image(size=(400, 300)))
+        self.photo.save(skip_duplicate_check=True, skip_processing=True)
+
+    def run_stage(self, task, **options):
+        return task.apply(args=[self.photo.pk], **options)
+
+    def test_queueing_marks_every_stage_pending(self):
+        with patch("photos.processing.group") as mock_group:
+            queue_photo_processing([self.photo.pk])
+
+        mock_group.return_value.apply_async.assert_called_once()
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.processing_stages, dict.fromkeys(STAGES, "pending"))
+        self.assertEqual(self.photo.processing_status, "pending")
+        canvas = next(iter(mock_group.call_args.args[0]))
+        self.assertEqual(canvas.tasks[0].options["priority"], BACKFILL_PRIORITY)
+
+    def test_stages_report_progress(self):
+        with patch("photos.processing.group"):
+            queue_photo_processing([self.photo.pk])
+
+        self.run_stage(process_photo_metadata)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.processing_status, "processing")
+        self.assertEqual(self.photo.processing_stages["metadata"], "complete")
+        self.assertEqual(self.photo.width, 400)
+        self.assertEqual(self.photo.camera_make, "Canon")
+
+        # Thumbnails are ready before the focal point is known
+        self.run_stage(process_photo_variants)
+        self.photo.refresh_from_db()
+        self.assertTrue(self.photo.image_thumbnail)
+        self.assertTrue(self.photo.variants)
+        self.assertIsNone(self.photo.focal_point_x)
+
+        self.run_stage(process_photo_saliency)
+        self.run_stage(process_photo_search)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.processing_stages, dict.fromkeys(STAGES, "complete"))
+        self.assertEqual(self.photo.processing_status, "complete")
+        self.assertIsNotNone(self.photo.focal_point_x)
+        self.assertIsNotNone(self.photo.search_vector)
+
+    def test_saliency_is_skipped_with_a_manual_focal_point(self):
+        Photo.objects.filter(pk=self.photo.pk).update(focal_point_override=True, focal_point_x=0.25, focal_point_y=0.75)
+
+        self.run_stage(process_photo_saliency)
+
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.processing_stages["saliency"], "skipped")
+        self.assertEqual((self.photo.focal_point_x, self.photo.focal_point_y), (0.25, 0.75))
+
+    def test_last_failed_attempt_marks_the_stage_failed(self):
+        with patch.object(Photo, "process_stage", side_effect=OSError("storage unavailable")):
+            self.run_stage(process_photo_variants, retries=process_photo_variants.max_retries, throw=False)
+
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.processing_stages["variants"], "failed")
+        self.assertEqual(self.photo.processing_status, "failed")
@@ -0,0 +1,124 @@
+"""
+Tests for buffered share-link analytics.
+"""
+
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TestCase
+from django.urls import reverse
+from django_redis import get_redis_connection
+
+from accounts.tests.factories import UserFactory
+from photos import share_analytics
+from photos.models import PhotoAlbum
+from photos.share_analytics import (
+    _flushing_keys,
+    _keys,
+    flush_share_access,
+    pending_share_access,
+    record_share_access,
+    share_access_totals,
+)
+
+
+class ShareAnalyticsTestCase(TestCase):
+    """Test that share views are buffered in Redis and flushed in bulk."""
+
+    def setUp(self):
+        get_redis_connection("default").delete(*_keys(), *_flushing_keys())
+        self.album = PhotoAlbum.objects.create(title="Shared", slug="shared", is_private=True)
+
+    def test_views_are_buffered_until_flushed(self):
+        url = reverse("photos:album_detail", args=[self.album.slug])
+        for _ in range(3):
+            self.assertEqual(self.client.get(url, {"token": self.album.share_token}).status_code, 200)
+
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.share_access_count, 0)
+        self.assertIsNone(self.album.share_last_accessed)
+        count, last_accessed = share_access_totals(self.album)
+        self.assertEqual(count, 3)
+        self.assertIsNotNone(last_accessed)
+
+        self.assertEqual(flush_share_access(), 1)
+
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.share_access_count, 3)
+        self.assertEqual(self.album.share_last_accessed, last_accessed)
+        self.assertEqual(pending_share_access([self.album.pk]), {})
+        self.assertEqual(share_access_totals(self.album), (3, last_accessed))
+
+    def test_views_during_a_flush_are_kept(self):
+        record_share_access(self.album)
+        original_timestamp = share_analytics._timestamp
+
+        def record_during_flush(value):
+            # A view that lands after the buffer was moved aside and before the UPDATE
+            record_share_access(self.album)
+            return original_timestamp(value)
+
+        with patch.object(share_analytics, "_timestamp", side_effect=record_during_flush):
+            flush_share_access()
+
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.share_access_count, 1)
+        self.assertEqual(pending_share_access([self.album.pk])[self.album.pk][0], 1)
+
+    def test_overlapping_flush_is_skipped(self):
+        record_share_access(self.album)
+        redis = get_redis_connection("default")
+        lock = redis.lock(cache.make_key(share_analytics.FLUSH_LOCK_KEY), timeout=60)
+        lock.acquire()
+        self.addCleanup(lock.release)
+
+        self.assertEqual(flush_share_access(), 0)
+        self.assertEqual(pending_share_access([self.album.pk])[self.album.pk][0], 1)
+
+    def test_failed_update_puts_views_back(self):
+        record_share_access(self.album)
+
+        with patch("photos.share_analytics.connection") as mock_connection:
+            mock_connection.cursor.side_effect = DatabaseError("connection lost")
+            with self.assertRaises(DatabaseError):
+                flush_share_access()
+
+        record_share_access(self.album)
+        self.assertEqual(pending_share_access([self.album.pk])[self.album.pk][0], 2)
+        flush_share_access()
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.share_access_count, 2)
+
+    def test_interrupted_flush_is_not_applied_twice(self):
+        # Views moved aside by a flush that stopped after its UPDATE committed
+        redis = get_redis_connection("default")
+        redis.hset(_flushing_keys()[0], self.album.pk, 5)
+        record_share_access(self.album)
+
+        flush_share_access()
+
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.share_access_count, 1)
+        self.assertFalse(redis.exists(*_flushing_keys()))
+
+    def test_admin_changelist_reads_buffer_once(self):
+        PhotoAlbum.objects.create(title="Also shared", slug="also-shared", is_private=True)
+        record_share_access(self.album)
+        self.client.force_login(UserFactory.create_staff_user())
+
+        with patch("photos.admin.pending_share_access", wraps=pending_share_access) as mock_pending:
+            response = self.client.get(reverse("admin:photos_photoalbum_changelist"))
+
+        self.assertEqual(response.status_code, 200)
+        mock_pending.assert_called_once()
+        self.assertContains(response, '<td class="field-share_views">1</td>', html=True)
+
+    @patch("photos.share_analytics.get_redis_connection", side_effect=ConnectionError("redis down"))
+    def test_falls_back_to_a_direct_update_without_redis(self, mock_connection):
+        record_share_access(self.album)
+
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.share_access_count, 1)
+        self.assertIsNotNone(self.album.share_last_accessed)
+        self.assertEqual(share_access_totals(self.album)[0], 1)
@@ -0,0 +1,86 @@
+"""
+Tests for the public media S3 storage backend.
+"""
+
+import threading
+from unittest.mock import patch
+
+from botocore.stub import Stubber
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from config.storage_backends import (
+    DEFAULT_CACHE_CONTROL,
+    IMMUTABLE_CACHE_CONTROL,
+    MAX_CONCURRENCY,
+    MULTIPART_THRESHOLD,
+    SAVE_MANY_WORKERS,
+    PublicMediaStorage,
+)
+
+
+class PublicMediaStorageTestCase(SimpleTestCase):
+    """Test per-object upload parameters and batch saves against a stubbed S3 client."""
+
+    def setUp(self):
+        self.storage = PublicMediaStorage(
+            bucket_name="test-bucket",
+            access_key="test",
+            secret_key="test",
+            region_name="us-east-1",
+        )
+        self.client = self.storage.bucket.meta.client
+        self.stubber = Stubber(self.client)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+        def record(params, **kwargs):
+            with self.lock:
+                self.uploads[params["Key"]] = params
+
+        self.client.meta.events.register("provide-client-params.s3.PutObject", record)
+
+    def test_object_parameters_depend_only_on_the_name(self):
+        original = self.storage.get_object_parameters("photos/originals/a.jpg")
+        variant = self.storage.get_object_parameters("photos/variants/grid_320_abc.avif")
+
+        self.assertEqual(original["CacheControl"], DEFAULT_CACHE_CONTROL)
+        self.assertEqual(original["ContentType"], "image/jpeg")
+        self.assertEqual(variant["CacheControl"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(variant["ContentType"], "image/avif")
+        # Nothing is left behind on the shared storage for the next upload
+        self.assertEqual(self.storage.object_parameters, PublicMediaStorage().object_parameters)
+
+    def test_save_many_uploads_each_file_with_its_own_parameters(self):
+        names = [f"photos/variants/v{i}.webp" for i in range(6)] + [f"photos/originals/o{i}.jpg" for i in range(6)]
+        for _ in names:
+            self.stubber.add_response("put_object", {"ETag": '"etag"'})
+
+        saved = self.storage.save_many((name, ContentFile(name.encode())) for name in names)
+
+        self.assertEqual(saved, names)
+        self.stubber.assert_no_pending_responses()
+        for name in names:
+            params = self.uploads[f"public/media/{name}"]
+            expected = IMMUTABLE_CACHE_CONTROL if "variants" in name else DEFAULT_CACHE_CONTROL
+            self.assertEqual(params["CacheControl"], expected)
+            self.assertEqual(params["ACL"], "public-read")
+
+    def test_uploads_do_not_use_the_bucket_resource(self):
+        names = ["photos/variants/a.webp", "photos/variants/b.webp"]
+        for _ in names:
+            self.stubber.add_response("put_object", {"ETag": '"etag"'})
+
+        # The resource isn't thread-safe, so worker threads must never upload through it
+        with patch.object(type(self.storage.bucket), "Object", side_effect=AssertionError("resource used")):
+            self.storage.save_many((name, ContentFile(name.encode())) for name in names)
+
+        self.stubber.assert_no_pending_responses()
+
+    def test_transfer_and_pool_settings(self):
+        self.assertEqual(self.storage.transfer_config.multipart_threshold, MULTIPART_THRESHOLD)
+        self.assertEqual(self.storage.transfer_config.max_request_concurrency, MAX_CONCURRENCY)
+        self.assertEqual(self.client.meta.config.max_pool_connections, SAVE_MANY_WORKERS * MAX_CONCURRENCY)
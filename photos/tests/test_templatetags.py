@@ -0,0 +1,75 @@
+"""
+Tests for the responsive image template tags.
+"""
+
+import uuid
+
+from django.test import SimpleTestCase
+
+from photos.models import Photo
+from photos.templatetags.photo_tags import GRID_SIZES, picture_element, responsive_image
+
+MANIFEST = {"formats": ["avif", "webp", "jpeg"], "grid": [320, 480, 640, 800], "display": [640, 1024, 1600]}
+
+
+class ResponsiveImageTagTestCase(SimpleTestCase):
+    """Test srcset/sizes output for photos with and without a variant ladder."""
+
+    def _photo(self, variants=None):
+        photo = Photo(
+            uuid=uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            image="photos/originals/test.jpg",
+            image_thumbnail="photos/optimized/test_thumbnail.jpg",
+            original_filename="test.jpg",
+            width=3000,
+            height=2000,
+            variants=variants or {},
+        )
+        return photo
+
+    def test_grid_picture_with_variants(self):
+        html = responsive_image(self._photo(MANIFEST), css_class="photo-grid-image", alt_text="<Sunset>")
+
+        self.assertIn('<source type="image/avif"', html)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertLess(html.index("image/avif"), html.index("image/webp"))
+        self.assertIn("grid_320.avif 320w", html)
+        self.assertIn("grid_800.webp 800w", html)
+        self.assertIn(f'sizes="{GRID_SIZES}"', html)
+        # JPEG fallback: smallest width covering the 400px grid cell, plus its own srcset
+        self.assertIn('<img src="/media/photos/variants/12345678-1234-5678-1234-567812345678/grid_480.jpg"', html)
+        self.assertIn("grid_640.jpg 640w", html)
+        self.assertIn('width="800" height="600"', html)
+        self.assertIn('alt="&lt;Sunset&gt;"', html)
+
+    def test_display_picture_uses_photo_aspect_ratio(self):
+        html = picture_element(self._photo(MANIFEST), sizes="(max-width: 768px) 100vw, 50vw")
+
+        self.assertIn("display_1600.avif 1600w", html)
+        self.assertIn('sizes="(max-width: 768px) 100vw, 50vw"', html)
+        self.assertIn("display_1024.jpg", html)
+        self.assertIn('width="1600" height="1067"', html)
+
+    def test_content_keyed_variants_use_store_paths(self):
+        manifest = {**MANIFEST, "keys": {"grid_480.jpg": "ab" + "1" * 38, "grid_320.avif": "cd" + "2" * 38}}
+        html = responsive_image(self._photo(manifest))
+
+        self.assertIn(f'<img src="/media/photos/variants/cas/ab/ab{"1" * 38}.jpg"', html)
+        self.assertIn(f"/media/photos/variants/cas/cd/cd{'2' * 38}.avif 320w", html)
+        # Variants without a key keep their per-photo path
+        self.assertIn("12345678-1234-5678-1234-567812345678/grid_800.webp 800w", html)
+
+    def test_falls_back_to_thumbnail_without_variants(self):
+        html = responsive_image(self._photo(), alt_text="Sunset")
+
+        self.assertNotIn("<picture>", html)
+        self.assertNotIn("srcset", html)
+        self.assertIn('src="/media/photos/optimized/test_thumbnail.jpg"', html)
+        self.assertIn('width="400"', html)
+
+    def test_jpeg_only_manifest_has_no_sources(self):
+        html = responsive_image(self._photo({"formats": ["jpeg"], "grid": [320, 480]}))
+
+        self.assertNotIn("<source", html)
+        self.assertIn("grid_480.jpg 480w", html)
+        self.assertIn('alt="test.jpg"', html)
@@ -2,13 +2,14 @@
 Tests for photo views.
 
 Tests cover:
-- album_detail (public/private albums, authentication)
+- album_detail (public/private albums, authentication, anonymous page cache)
 - download_photo functionality
 """
 
 import gc
+import zipfile
 from io import BytesIO
-from unittest.mock import Mock, patch
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase
@@ -17,7 +18,7 @@ from django.utils import timezone
 from PIL import Image
 
 from accounts.tests.factories import UserFactory
-from photos.models import Photo, PhotoAlbum
+from photos.models import AlbumPhoto, Photo, PhotoAlbum
 from photos.tests.factories import PhotoFactory
 
 User = get_user_model()
@@ -94,7 +95,7 @@ class AlbumDetailViewTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Public Album")
         self.assertEqual(response.context["album"], self.public_album)
-        self.assertEqual(len(response.context["photos_data"]), 2)
+        self.assertEqual(response.context["album_grid"]["count"], 2)
 
     def test_public_album_authenticated_access(self):
         """Test authenticated users can access public albums."""
@@ -147,10 +148,8 @@ class AlbumDetailViewTestCase(TestCase):
 
         response = self.client.get(reverse("photos:album_detail", kwargs={"slug": "public-album"}))
 
-        photos_data = response.context["photos_data"]
         # Photos should be ordered newest first
-        self.assertEqual(photos_data[0]["photo"], self.photo2)
-        self.assertEqual(photos_data[1]["photo"], self.photo1)
+        self.assertEqual(response.context["album_grid"]["photo_ids"], [self.photo2.pk, self.photo1.pk])
 
     def test_download_permissions_context(self):
         """Test download permissions are passed to template."""
@@ -169,6 +168,80 @@ class AlbumDetailViewTestCase(TestCase):
 
         self.assertFalse(response.context["allow_downloads"])
 
+    def test_anonymous_page_is_cached_until_the_album_changes(self):
+        """Repeat anonymous views are served from the cache and revalidate with the ETag."""
+        url = reverse("photos:album_detail", kwargs={"slug": "public-album"})
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        # Neither the album nor its photos are loaded for a cached page or a 304
+        with patch("photos.views.get_object_or_404") as mock_get_album:
+            cached = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        mock_get_album.assert_not_called()
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached["ETag"], etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+        album_photo = AlbumPhoto.objects.get(album=self.public_album, photo=self.photo1)
+        album_photo.is_featured = True
+        album_photo.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertContains(response, "photo-item featured")
+
+    def test_staff_and_token_views_are_not_page_cached(self):
+        """Only anonymous views of public albums get an ETag."""
+        response = self.client.get(
+            reverse("photos:album_detail", kwargs={"slug": "private-album"}),
+            {"token": self.private_album.share_token},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+        self.client.login(username="staff", password="testpass123")
+        response = self.client.get(reverse("photos:album_detail", kwargs={"slug": "public-album"}))
+        self.assertNotIn("ETag", response)
+        self.assertEqual(response.context["album_grid"]["count"], 2)
+
+
+class StreamedAlbumZipViewTestCase(TestCase):
+    """Test album ZIPs streamed on download."""
+
+    def setUp(self):
+        self.album = PhotoFactory.create_photo_album(
+            title="Streamed", slug="streamed", is_private=False, allow_downloads=True, zip_mode="stream"
+        )
+        self.photo = PhotoFactory.create_photo()
+        self.album.photos.add(self.photo)
+        self.url = reverse("photos:download_album_zip", kwargs={"slug": "streamed"})
+
+    def test_ranges_are_served_once_checksums_are_known(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(len(b"".join(response.streaming_content)), 10)
+
+    @patch("photos.views.compute_zip_checksums")
+    def test_missing_checksums_are_computed_in_the_background(self, mock_compute):
+        Photo.objects.filter(pk=self.photo.pk).update(file_crc32=None)
+
+        with patch.object(Photo, "ensure_zip_checksum") as mock_ensure:
+            response = self.client.get(self.url, HTTP_RANGE="bytes=0-9")
+            data = b"".join(response.streaming_content)
+
+        mock_ensure.assert_not_called()
+        mock_compute.delay.assert_called_once_with([self.photo.pk])
+        # The whole archive, with data descriptors, since offsets aren't known yet
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Accept-Ranges", response)
+        with zipfile.ZipFile(BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(len(zf.namelist()), 1)
+
 
 class DownloadPhotoViewTestCase(TestCase):
     """Test cases for download_photo view."""
@@ -195,29 +268,38 @@ class DownloadPhotoViewTestCase(TestCase):
         """Helper to create a test photo."""
         return PhotoFactory.create_photo(original_filename=filename)
 
-    @patch("requests.get")
-    def test_download_photo_success(self, mock_get):
-        """Test successful photo download."""
-        # Mock S3 response
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.content = b"image_content"
-        mock_response.headers = {"content-type": "image/jpeg"}
-        mock_get.return_value = mock_response
-
-        # Mock image URL
-        with patch.object(self.photo, "get_image_url", return_value="http://s3.example.com/photo.jpg"):
-            response = self.client.get(
-                reverse(
-                    "photos:download_photo",
-                    kwargs={"slug": "test-album", "photo_id": self.photo.id},
-                )
+    def test_download_photo_success(self):
+        """Test the original is streamed as an attachment from local storage."""
+        response = self.client.get(
+            reverse(
+                "photos:download_photo",
+                kwargs={"slug": "test-album", "photo_id": self.photo.id},
             )
+        )
 
         self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
         self.assertEqual(response["Content-Type"], "image/jpeg")
-        self.assertIn("attachment", response["Content-Disposition"])
-        self.assertIn(".jpg", response["Content-Disposition"])  # Should contain some jpg filename
+        # Processing replaces original_filename with the name the upload was stored under
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="{self.photo.original_filename}"')
+        self.photo.image.open("rb")
+        self.addCleanup(self.photo.image.close)
+        self.assertEqual(b"".join(response.streaming_content), self.photo.image.read())
+
+    @patch("photos.views.signed_download_url")
+    def test_download_photo_redirects_to_signed_url(self, mock_signed_url):
+        """Test S3 originals are handed off with a pre-signed URL instead of proxied."""
+        mock_signed_url.return_value = "https://bucket.s3.amazonaws.com/photo.jpg?X-Amz-Signature=abc"
+
+        response = self.client.get(
+            reverse(
+                "photos:download_photo",
+                kwargs={"slug": "test-album", "photo_id": self.photo.id},
+            )
+        )
+
+        self.assertRedirects(response, mock_signed_url.return_value, fetch_redirect_response=False)
+        self.assertEqual(mock_signed_url.call_args.args[1], self.photo.original_filename)
 
     def test_download_photo_album_not_found(self):
         """Test download from non-existent album."""
@@ -277,58 +359,24 @@ class DownloadPhotoViewTestCase(TestCase):
         self.album.save()
         self.client.login(username="staff", password="testpass123")
 
-        with patch("requests.get") as mock_get:
-            mock_response = Mock()
-            mock_response.status_code = 200
-            mock_response.content = b"image_content"
-            mock_response.headers = {"content-type": "image/jpeg"}
-            mock_get.return_value = mock_response
-
-            with patch.object(
-                self.photo,
-                "get_image_url",
-                return_value="http://s3.example.com/photo.jpg",
-            ):
-                response = self.client.get(
-                    reverse(
-                        "photos:download_photo",
-                        kwargs={"slug": "test-album", "photo_id": self.photo.id},
-                    )
-                )
-
-        self.assertEqual(response.status_code, 200)
-
-    @patch("requests.get")
-    def test_download_photo_s3_error(self, mock_get):
-        """Test handling S3 download errors."""
-        # Mock S3 error response
-        mock_response = Mock()
-        mock_response.status_code = 403
-        mock_get.return_value = mock_response
-
-        with patch.object(self.photo, "get_image_url", return_value="http://s3.example.com/photo.jpg"):
-            response = self.client.get(
-                reverse(
-                    "photos:download_photo",
-                    kwargs={"slug": "test-album", "photo_id": self.photo.id},
-                )
+        response = self.client.get(
+            reverse(
+                "photos:download_photo",
+                kwargs={"slug": "test-album", "photo_id": self.photo.id},
             )
+        )
 
-        self.assertEqual(response.status_code, 404)
-
-    @patch("requests.get")
-    def test_download_photo_network_error(self, mock_get):
-        """Test handling network errors during download."""
-        import requests
+        self.assertEqual(response.status_code, 200)
 
-        mock_get.side_effect = requests.RequestException("Network error")
+    def test_download_photo_missing_file(self):
+        """Test a missing original returns 404."""
+        self.photo.image.storage.delete(self.photo.image.name)
 
-        with patch.object(self.photo, "get_image_url", return_value="http://s3.example.com/photo.jpg"):
-            response = self.client.get(
-                reverse(
-                    "photos:download_photo",
-                    kwargs={"slug": "test-album", "photo_id": self.photo.id},
-                )
+        response = self.client.get(
+            reverse(
+                "photos:download_photo",
+                kwargs={"slug": "test-album", "photo_id": self.photo.id},
             )
+        )
 
         self.assertEqual(response.status_code, 404)
@@ -0,0 +1,284 @@
+"""
+Tests for streaming album ZIP generation.
+"""
+
+import io
+import tempfile
+import zipfile
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase
+
+from photos import zip_stream
+from photos.views import _parse_byte_range
+from photos.zip_stream import StorageWriter, StreamedZip, iter_zip, signed_download_url, write_zip
+
+
+class WriteZipTestCase(SimpleTestCase):
+    """Test writing archives from stored files through a StorageWriter."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.storage = FileSystemStorage(location=self.tmpdir.name)
+
+    def _stored(self, name, data):
+        return SimpleNamespace(storage=self.storage, name=self.storage.save(name, ContentFile(data)))
+
+    @patch.object(zip_stream, "READ_CHUNK_SIZE", 1000)
+    @patch.object(zip_stream, "PREFETCH_BUFFER_CHUNKS", 2)
+    def test_archive_contents(self):
+        files = {f"{i:03d}_photo.jpg": bytes([i]) * (5000 + i) for i in range(1, 8)}
+        entries = [
+            (name, self._stored(f"originals/{name}", data), datetime(2024, 5, 1, 12, 0)) for name, data in files.items()
+        ]
+
+        with StorageWriter(self.storage, "albums/zips/test.zip") as out:
+            added = write_zip(out, entries)
+
+        self.assertEqual(added, 7)
+        self.assertEqual(out.bytes_written, self.storage.size("albums/zips/test.zip"))
+        with zipfile.ZipFile(self.storage.path("albums/zips/test.zip")) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), list(files))
+            for name, data in files.items():
+                self.assertEqual(zf.read(name), data)
+            self.assertEqual(zf.getinfo("001_photo.jpg").date_time, (2024, 5, 1, 12, 0, 0))
+
+    def test_missing_files_are_skipped(self):
+        entries = [
+            ("001_a.jpg", self._stored("a.jpg", b"a" * 100), None),
+            ("002_missing.jpg", SimpleNamespace(storage=self.storage, name="missing.jpg"), None),
+            ("003_b.jpg", self._stored("b.jpg", b"b" * 100), None),
+        ]
+
+        with StorageWriter(self.storage, "out.zip") as out:
+            added = write_zip(out, entries)
+
+        self.assertEqual(added, 2)
+        with zipfile.ZipFile(self.storage.path("out.zip")) as zf:
+            self.assertEqual(zf.namelist(), ["001_a.jpg", "003_b.jpg"])
+
+    def test_failed_write_removes_partial_file(self):
+        with self.assertRaises(RuntimeError), StorageWriter(self.storage, "out.zip") as out:
+            out.write(b"partial")
+            raise RuntimeError("boom")
+
+        self.assertFalse(self.storage.exists("out.zip"))
+
+
+class IterZipTestCase(SimpleTestCase):
+    """Test streaming an archive whose sizes and CRCs aren't known up front."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.storage = FileSystemStorage(location=self.tmpdir.name)
+
+    @patch.object(zip_stream, "READ_CHUNK_SIZE", 100)
+    def test_archive_is_readable(self):
+        files = {"001_a.jpg": b"a" * 450, "002_b.jpg": b"b" * 30}
+        entries = [
+            (name, SimpleNamespace(storage=self.storage, name=self.storage.save(name, ContentFile(data))), None)
+            for name, data in files.items()
+        ]
+        entries.insert(1, ("002_missing.jpg", SimpleNamespace(storage=self.storage, name="missing.jpg"), None))
+
+        chunks = list(iter_zip(entries))
+
+        self.assertGreater(len(chunks), 2)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), list(files))
+            # Sizes and CRCs follow the data in descriptors
+            self.assertTrue(zf.getinfo("001_a.jpg").flag_bits & 0x08)
+            for name, data in files.items():
+                self.assertEqual(zf.read(name), data)
+
+
+class MultipartStorageWriterTestCase(SimpleTestCase):
+    """Test the S3 multipart path against a mocked boto3 bucket."""
+
+    def setUp(self):
+        self.upload = MagicMock()
+        self.upload.Part.return_value.upload.side_effect = lambda Body: {"ETag": f'"{len(Body)}"'}
+        self.bucket = MagicMock()
+        self.bucket.Object.return_value.initiate_multipart_upload.return_value = self.upload
+        self.storage = SimpleNamespace(
+            bucket=self.bucket,
+            default_acl="public-read",
+            _normalize_name=lambda name: f"public/media/{name}",
+        )
+
+    @patch.object(zip_stream, "UPLOAD_PART_SIZE", 10)
+    def test_parts_are_uploaded_as_they_fill(self):
+        with StorageWriter(self.storage, "albums/zips/a.zip", content_type="application/zip") as out:
+            out.write(b"x" * 7)
+            self.upload.Part.assert_not_called()
+            out.write(b"x" * 16)
+            self.assertEqual(self.upload.Part.call_count, 2)
+
+        self.bucket.Object.assert_called_once_with("public/media/albums/zips/a.zip")
+        self.bucket.Object.return_value.initiate_multipart_upload.assert_called_once_with(
+            ContentType="application/zip", ACL="public-read"
+        )
+        self.upload.complete.assert_called_once_with(
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": '"10"', "PartNumber": 1},
+                    {"ETag": '"10"', "PartNumber": 2},
+                    {"ETag": '"3"', "PartNumber": 3},
+                ]
+            }
+        )
+        self.assertEqual(out.bytes_written, 23)
+
+    @patch.object(zip_stream, "UPLOAD_PART_SIZE", 10)
+    @patch.object(zip_stream, "MIN_PART_SIZE", 5)
+    def test_copy_from_copies_parts_server_side(self):
+        self.upload.Part.return_value.copy_from.side_effect = lambda **kwargs: {
+            "CopyPartResult": {"ETag": f'"{kwargs["CopySourceRange"]}"'}
+        }
+        previous = SimpleNamespace(storage=self.storage, name="albums/zips/old.zip")
+
+        with StorageWriter(self.storage, "albums/zips/a.zip") as out:
+            out.copy_from(previous, 0, 25)
+            out.write(b"x" * 3)
+
+        copy_calls = self.upload.Part.return_value.copy_from.call_args_list
+        self.assertCountEqual([call.kwargs["CopySourceRange"] for call in copy_calls], ["bytes=0-11", "bytes=12-24"])
+        self.upload.complete.assert_called_once_with(
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": '"bytes=0-11"', "PartNumber": 1},
+                    {"ETag": '"bytes=12-24"', "PartNumber": 2},
+                    {"ETag": '"3"', "PartNumber": 3},
+                ]
+            }
+        )
+        self.assertEqual(out.bytes_written, 28)
+
+    @patch.object(zip_stream, "UPLOAD_PART_SIZE", 10)
+    def test_failed_background_part_aborts_the_upload(self):
+        self.upload.Part.return_value.upload.side_effect = RuntimeError("part failed")
+
+        with self.assertRaises(RuntimeError), StorageWriter(self.storage, "a.zip") as out:
+            out.write(b"x" * 25)
+
+        self.upload.abort.assert_called_once()
+        self.upload.complete.assert_not_called()
+
+    def test_upload_is_aborted_on_error(self):
+        with self.assertRaises(RuntimeError), StorageWriter(self.storage, "a.zip"):
+            raise RuntimeError("boom")
+
+        self.upload.abort.assert_called_once()
+        self.upload.complete.assert_not_called()
+
+
+class StreamedZipTestCase(SimpleTestCase):
+    """Test the deterministic on-the-fly archive and its byte ranges."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.storage = FileSystemStorage(location=self.tmpdir.name)
+        self.files = {f"{i:03d}_caf\u00e9.jpg": bytes(range(256)) * (i * 10) for i in range(1, 5)}
+        self.entries = [
+            (
+                name,
+                SimpleNamespace(storage=self.storage, name=self.storage.save(name, ContentFile(data))),
+                len(data),
+                zlib.crc32(data),
+                datetime(2024, 5, 1, 12, 0, 30),
+            )
+            for name, data in self.files.items()
+        ]
+
+    def test_archive_is_readable(self):
+        archive = StreamedZip(self.entries)
+        data = b"".join(archive.iter_range())
+
+        self.assertEqual(len(data), archive.size)
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), list(self.files))
+            for name, content in self.files.items():
+                self.assertEqual(zf.read(name), content)
+            self.assertEqual(zf.getinfo("001_caf\u00e9.jpg").date_time, (2024, 5, 1, 12, 0, 30))
+
+    @patch.object(zip_stream, "READ_CHUNK_SIZE", 100)
+    def test_ranges_match_full_archive(self):
+        archive = StreamedZip(self.entries)
+        data = b"".join(archive.iter_range())
+
+        for start, stop in [(0, 10), (5, 3000), (2999, 7000), (archive.size - 22, archive.size), (100, 100)]:
+            self.assertEqual(b"".join(archive.iter_range(start, stop)), data[start:stop])
+
+    @patch.object(zip_stream, "READ_CHUNK_SIZE", 100)
+    def test_appended_entries_reuse_previous_archive_bytes(self):
+        previous = StreamedZip(self.entries[:3])
+        with StorageWriter(self.storage, "previous.zip") as out:
+            previous.write_to(out)
+        archive = StreamedZip(self.entries)
+        self.assertEqual(archive.entry_offsets[:3], previous.entry_offsets)
+
+        reused = archive.entry_offsets[3]
+        with StorageWriter(self.storage, "current.zip") as out:
+            out.copy_from(SimpleNamespace(storage=self.storage, name="previous.zip"), 0, reused)
+            archive.write_to(out, reused)
+
+        with self.storage.open("current.zip", "rb") as f:
+            data = f.read()
+        self.assertEqual(data, b"".join(archive.iter_range()))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), list(self.files))
+
+    def test_etag_is_deterministic(self):
+        self.assertEqual(StreamedZip(self.entries).etag, StreamedZip(self.entries).etag)
+        self.assertNotEqual(StreamedZip(self.entries).etag, StreamedZip(self.entries[:-1]).etag)
+
+    def test_empty_archive(self):
+        archive = StreamedZip([])
+        with zipfile.ZipFile(io.BytesIO(b"".join(archive.iter_range()))) as zf:
+            self.assertEqual(zf.namelist(), [])
+
+    def test_parse_byte_range(self):
+        self.assertEqual(_parse_byte_range("bytes=0-99", 1000), (0, 100))
+        self.assertEqual(_parse_byte_range("bytes=500-", 1000), (500, 1000))
+        self.assertEqual(_parse_byte_range("bytes=-100", 1000), (900, 1000))
+        self.assertEqual(_parse_byte_range("bytes=900-5000", 1000), (900, 1000))
+        self.assertEqual(_parse_byte_range("bytes=1000-", 1000), "unsatisfiable")
+        self.assertIsNone(_parse_byte_range("bytes=0-1,5-6", 1000))
+        self.assertIsNone(_parse_byte_range("items=0-1", 1000))
+        self.assertIsNone(_parse_byte_range(None, 1000))
+
+
+class SignedDownloadUrlTestCase(SimpleTestCase):
+    """Test pre-signed download URLs for single photos."""
+
+    def test_s3_url_sets_attachment_filename(self):
+        bucket = boto3.resource(
+            "s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test"
+        ).Bucket("test-bucket")
+        storage = SimpleNamespace(bucket=bucket, _normalize_name=lambda name: f"public/media/{name}")
+        file_field = SimpleNamespace(storage=storage, name="photos/originals/a.jpg")
+
+        url = urlparse(signed_download_url(file_field, "caf\u00e9.jpg", expires=300))
+        query = parse_qs(url.query)
+
+        self.assertTrue(url.path.endswith("/public/media/photos/originals/a.jpg"))
+        self.assertEqual(query["response-content-disposition"], ["attachment; filename*=utf-8''caf%C3%A9.jpg"])
+        self.assertIn("Expires", query)
+
+    def test_other_storages_return_none(self):
+        file_field = SimpleNamespace(storage=FileSystemStorage(), name="a.jpg")
+        self.assertIsNone(signed_download_url(file_field, "a.jpg", expires=300))
@@ -21,7 +21,12 @@ urlpatterns = [
         views.photo_exif_api,
         name="photo_exif_api",
     ),
+    path("album/<slug:slug>/map/", views.album_map_api, name="album_map_api"),
+    path("album/<slug:slug>/map/photos/", views.album_map_photos_api, name="album_map_photos_api"),
+    path("album/<slug:slug>/facets/", views.album_facets_api, name="album_facets_api"),
     # Bulk upload API (UI is in admin)
     path("api/upload/", views.upload_photo_api, name="upload_photo_api"),
+    path("api/upload/bulk/", views.bulk_upload_api, name="bulk_upload_api"),
     path("api/photo/<int:photo_id>/status/", views.photo_status_api, name="photo_status_api"),
+    path("api/facets/", views.photo_facets_api, name="photo_facets_api"),
 ]
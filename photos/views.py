@@ -1,78 +1,88 @@
+from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import Http404, HttpResponse, JsonResponse
+from django.core.cache import cache
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.safestring import mark_safe
 from django.views.decorators.http import require_http_methods
 
-from .models import Photo, PhotoAlbum
+from .album_cache import cached_album_version, get_album_grid, get_album_version, get_cached_page, store_cached_page
+from .facets import FACETS, facet_counts
+from .geo import (
+    clusters_in_bbox,
+    parse_bbox,
+    photos_in_bbox,
+    public_bounds,
+    public_clusters_in_bbox,
+    schedule_map_cluster_build,
+)
+from .models import AlbumPhoto, Photo, PhotoAlbum
+from .share_analytics import record_share_access
+from .tasks import compute_zip_checksums
+from .zip_stream import StreamedZip, iter_zip, signed_download_url
+
+# Lifetime of the pre-signed S3 URLs handed out for photo downloads
+DOWNLOAD_URL_EXPIRY_SECONDS = 300
+# An album's missing ZIP checksums are queued for computing at most once per this many seconds
+ZIP_CHECKSUMS_SCHEDULED_KEY_PREFIX = "album_zip_checksums_scheduled:"
+ZIP_CHECKSUMS_SCHEDULE_SECONDS = 10 * 60
+# Most photos album_map_photos_api returns for one bounding box
+MAX_MAP_PHOTOS = 500
+# Most photo ids a facet browse request returns
+MAX_FACET_PHOTOS = 500
 
 
 def album_detail(request, slug):
     token = request.GET.get("token")
 
+    # Anonymous visitors get the cached page (or a 304) without touching the database
+    cacheable = not request.GET and not request.user.is_authenticated and not messages.get_messages(request)
+    origin = f"{request.scheme}://{request.get_host()}"
+    if cacheable:
+        entry = cached_album_version(slug)
+        if entry and entry["public"]:
+            etag = quote_etag(entry["version"])
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+            html = get_cached_page(entry["version"], origin)
+            if html is not None:
+                return _album_page_response(HttpResponse(html), etag)
+
     if token:
         album = get_object_or_404(PhotoAlbum, slug=slug, share_token=token, is_private=True)
-        album.share_access_count += 1
-        album.share_last_accessed = timezone.now()
-        album.save(update_fields=["share_access_count", "share_last_accessed"])
+        record_share_access(album)
     elif request.user.is_authenticated and request.user.is_staff:
         album = get_object_or_404(PhotoAlbum, slug=slug)
     else:
         album = get_object_or_404(PhotoAlbum, slug=slug, is_private=False)
 
-    album_photos = (
-        album.album_photos.select_related("photo")
-        .only(
-            "is_featured",
-            "display_order",
-            "added_at",
-            "photo__id",
-            "photo__image",
-            "photo__image_thumbnail",
-            "photo__image_preview",
-            "photo__original_filename",
-            "photo__date_taken",
-            "photo__created_at",
-        )
-        .order_by(
-            "display_order",
-            "-photo__date_taken",
-            "-photo__created_at",
-        )
-    )
+    version = get_album_version(album)
+    if cacheable:
+        not_modified = get_conditional_response(request, etag=quote_etag(version))
+        if not_modified is not None:
+            return not_modified
 
-    photos_data = [
-        {
-            "photo": ap.photo,
-            "is_featured": ap.is_featured,
-        }
-        for ap in album_photos
-    ]
-
-    # Determine cover photo for OG image (first featured photo or first photo)
-    cover_photo = None
-    for ap in album_photos:
-        if ap.is_featured:
-            cover_photo = ap.photo
-            break
-    if not cover_photo and album_photos:
-        cover_photo = album_photos[0].photo
-
-    # Build absolute URL for OG image
-    page_og_image = None
-    if cover_photo:
-        image_url = cover_photo.get_image_url("thumbnail") or cover_photo.get_image_url("preview")
-        if image_url:
-            page_og_image = request.build_absolute_uri(image_url)
+    album_grid = get_album_grid(album, version)
+
+    # Build absolute URL for OG image (first featured photo or first photo)
+    page_og_image = request.build_absolute_uri(album_grid["cover_url"]) if album_grid["cover_url"] else None
 
     og_description = album.description or "View photos from this album"
 
-    return render(
+    response = render(
         request,
         "photos/album_detail.html",
         {
             "album": album,
-            "photos_data": photos_data,
+            "album_grid": {
+                "count": album_grid["count"],
+                "photo_ids": album_grid["photo_ids"],
+                # Rendered (and escaped) by the template engine in get_album_grid()
+                "grid_html": mark_safe(album_grid["grid_html"]),  # nosec B703 B308
+                "photos_js": mark_safe(album_grid["photos_js"]),  # nosec B703 B308
+            },
             "allow_downloads": album.allow_downloads,
             "share_token": token if token else None,
             "page_og_title": f"{album.title} - Photo Album",
@@ -81,6 +91,18 @@ def album_detail(request, slug):
             "page_meta_description": og_description,
         },
     )
+    if not cacheable or album.is_private:
+        return response
+
+    store_cached_page(version, origin, response.content)
+    return _album_page_response(response, quote_etag(version))
+
+
+def _album_page_response(response, etag):
+    """Mark an anonymous album page as revalidatable by ETag."""
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
 
 
 def download_album_zip(request, slug):
@@ -96,12 +118,91 @@ def download_album_zip(request, slug):
     if not album.allow_downloads:
         raise Http404("Downloads are not allowed for this album")
 
-    if not album.zip_file or album.zip_generation_status != "ready":
+    if album.zip_mode == "stream":
+        return _stream_album_zip(request, album)
+
+    if not album.zip_download_available:
         raise Http404("ZIP file is not available. Please try again later.")
 
     return redirect(album.zip_file.url)
 
 
+def _parse_byte_range(header, size):
+    """
+    Parse a single-range Range header into (start, stop), stop exclusive.
+
+    Returns None when the header is absent, malformed or asks for several
+    ranges (served as the full archive), and "unsatisfiable" for a range that
+    lies past the end.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(size - length, 0), size
+        start = int(first)
+        stop = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    if stop <= start:
+        return None
+    return start, min(stop, size)
+
+
+def _stream_album_zip(request, album):
+    """
+    Stream the album as a ZIP built on the fly, honouring Range requests.
+
+    The archive layout is fully determined by the photos' names, sizes and
+    CRCs, so an interrupted download can resume from any offset. Photos
+    missing either are never read here: they are checksummed in the
+    background, and until then the archive is streamed with data
+    descriptors and without Range support.
+    """
+    photos = list(album.zip_entries())
+    missing = [photo.pk for _, photo in photos if photo.file_size is None or photo.file_crc32 is None]
+    if missing:
+        if cache.add(f"{ZIP_CHECKSUMS_SCHEDULED_KEY_PREFIX}{album.pk}", True, ZIP_CHECKSUMS_SCHEDULE_SECONDS):
+            compute_zip_checksums.delay(missing)
+        response = StreamingHttpResponse(
+            iter_zip((arcname, photo.image, photo.created_at) for arcname, photo in photos),
+            content_type="application/zip",
+        )
+        response["Content-Disposition"] = f'attachment; filename="{album.slug}.zip"'
+        return response
+
+    archive = StreamedZip(
+        (arcname, photo.image, photo.file_size, photo.file_crc32, photo.created_at) for arcname, photo in photos
+    )
+
+    byte_range = _parse_byte_range(request.headers.get("Range"), archive.size)
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != archive.etag:
+        byte_range = None
+
+    if byte_range == "unsatisfiable":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{archive.size}"
+        return response
+
+    start, stop = byte_range or (0, archive.size)
+    response = StreamingHttpResponse(archive.iter_range(start, stop), content_type="application/zip")
+    if byte_range:
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{stop - 1}/{archive.size}"
+    response["Content-Length"] = str(stop - start)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = archive.etag
+    response["Content-Disposition"] = f'attachment; filename="{album.slug}.zip"'
+    return response
+
+
 def download_photo(request, slug, photo_id):
     """Download a single photo from an album."""
     # Check for share token in query params
@@ -119,34 +220,25 @@ def download_photo(request, slug, photo_id):
     if not album.allow_downloads:
         raise Http404("Downloads are not allowed for this album")
 
-    photo = get_object_or_404(Photo, id=photo_id)
-
-    if album not in photo.albums.all():
+    if not AlbumPhoto.objects.filter(album=album, photo_id=photo_id).exists():
         raise Http404("Photo not found in this album")
 
-    if photo.image and hasattr(photo.image, "url"):
-        try:
-            import requests
-
-            url = photo.image.url
+    photo = get_object_or_404(Photo.objects.only("id", "image", "original_filename"), id=photo_id)
+    if not photo.image:
+        raise Http404("Photo has no image file")
 
-            response = requests.get(url)
-            if response.status_code == 200:
-                http_response = HttpResponse(
-                    response.content,
-                    content_type=response.headers.get("content-type", "image/jpeg"),
-                )
-                filename = photo.original_filename or f"photo_{photo.id}.jpg"
-                http_response["Content-Disposition"] = f'attachment; filename="{filename}"'
-                return http_response
-            else:
-                raise Http404(f"Could not download photo from S3 (status: {response.status_code})")
+    filename = photo.original_filename or f"photo_{photo.id}.jpg"
 
-        except requests.RequestException as e:
-            print(f"Error downloading photo from S3: {e}")
-            raise Http404("Error accessing photo file from S3") from None
+    # On S3 the browser downloads the original directly; otherwise stream it in fixed-size blocks
+    url = signed_download_url(photo.image, filename, DOWNLOAD_URL_EXPIRY_SECONDS)
+    if url:
+        return redirect(url)
 
-    raise Http404("Photo has no image file")
+    try:
+        stream = photo.image.storage.open(photo.image.name, "rb")
+    except OSError:
+        raise Http404("Error accessing photo file") from None
+    return FileResponse(stream, as_attachment=True, filename=filename)
 
 
 @staff_member_required
@@ -189,10 +281,10 @@ def upload_photo_api(request):
                 )
             raise
 
-        # Queue async processing
-        from photos.tasks import process_photo_async
+        # Queue async processing ahead of any backfill
+        from photos.processing import INTERACTIVE_PRIORITY, queue_photo_processing
 
-        process_photo_async.delay(photo.id)
+        queue_photo_processing([photo.id], priority=INTERACTIVE_PRIORITY)
 
         # Add to album if specified
         if album:
@@ -211,17 +303,73 @@ def upload_photo_api(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+@staff_member_required
+@require_http_methods(["POST"])
+def bulk_upload_api(request):
+    """
+    API endpoint for uploading many photos in one request.
+
+    Files are hashed in parallel, deduplicated, inserted together and queued
+    for processing as groups (see photos.ingest). Returns one result per file
+    in upload order.
+    """
+    from photos.ingest import ingest_photos
+    from photos.processing import INTERACTIVE_PRIORITY
+
+    uploads = request.FILES.getlist("photos")
+    if not uploads:
+        return JsonResponse({"error": "No photo files provided"}, status=400)
+
+    album = None
+    album_id = request.POST.get("album_id")
+    if album_id:
+        try:
+            album = PhotoAlbum.objects.get(id=album_id)
+        except PhotoAlbum.DoesNotExist:
+            return JsonResponse({"error": f"Album with ID {album_id} not found"}, status=400)
+
+    try:
+        outcomes = ingest_photos(
+            ((upload.name, upload) for upload in uploads), album=album, priority=INTERACTIVE_PRIORITY
+        )
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    return JsonResponse(
+        {
+            "results": [
+                {
+                    "filename": outcome["filename"],
+                    "status": outcome["status"],
+                    "photo_id": outcome["photo"].id if outcome["photo"] else None,
+                    "message": outcome["message"],
+                }
+                for outcome in outcomes
+            ]
+        }
+    )
+
+
 @staff_member_required
 @require_http_methods(["GET"])
 def photo_status_api(request, photo_id):
-    """API endpoint to check the processing status of a photo."""
+    """
+    API endpoint to check the processing status of a photo.
+
+    "stages" holds the state of each processing stage; the thumbnail is
+    available once the variants stage is done, before saliency finishes.
+    """
     try:
         photo = Photo.objects.get(id=photo_id)
+        variants_done = photo.processing_stages.get("variants") == "complete"
         return JsonResponse(
             {
                 "photo_id": photo.id,
                 "status": photo.processing_status,
-                "thumbnail_url": photo.get_image_url("preview") if photo.processing_status == "complete" else None,
+                "stages": photo.processing_stages,
+                "thumbnail_url": (
+                    photo.get_image_url("preview") if photo.processing_status == "complete" or variants_done else None
+                ),
             }
         )
     except Photo.DoesNotExist:
@@ -280,3 +428,122 @@ def photo_exif_api(request, slug, photo_id):
             },
         }
     )
+
+
+def _accessible_album(request, slug, queryset=PhotoAlbum.objects):
+    """The album if the request may view it (public, staff, or share token), else 404."""
+    token = request.GET.get("token")
+    if token:
+        return get_object_or_404(queryset, slug=slug, share_token=token, is_private=True)
+    if request.user.is_authenticated and request.user.is_staff:
+        return get_object_or_404(queryset, slug=slug)
+    return get_object_or_404(queryset, slug=slug, is_private=False)
+
+
+@require_http_methods(["GET"])
+def album_map_api(request, slug):
+    """
+    Map clusters of an album's located photos for one zoom level.
+
+    Query parameters: zoom (web map zoom level, default 0) and bbox
+    (west,south,east,north, default the whole world). Clusters are read
+    from PhotoAlbum.map_clusters; while a rebuild is pending they are
+    computed for this response only. Only staff get exact positions.
+    """
+    album = _accessible_album(request, slug, PhotoAlbum.objects.only("pk", "slug", "is_private", "map_clusters"))
+    try:
+        zoom = int(request.GET.get("zoom", 0))
+        bbox = parse_bbox(request.GET.get("bbox"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    clusters = album.map_clusters
+    if not clusters:
+        schedule_map_cluster_build([album.pk])
+        clusters = album.compute_map_clusters()
+    if request.user.is_staff:
+        bounds, points = clusters["bounds"], clusters_in_bbox(clusters, zoom, bbox)
+    else:
+        bounds, points = public_bounds(clusters["bounds"]), public_clusters_in_bbox(clusters, zoom, bbox)
+    return JsonResponse({"zoom": zoom, "count": clusters["count"], "bounds": bounds, "clusters": points})
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def album_map_photos_api(request, slug):
+    """
+    Located photos of an album inside a bounding box (bbox=west,south,east,north, required).
+
+    Staff only, as it returns exact positions. Returns at most
+    MAX_MAP_PHOTOS photos; "truncated" tells the map to zoom in further.
+    """
+    album = _accessible_album(request, slug, PhotoAlbum.objects.only("pk", "slug", "is_private"))
+    if not request.GET.get("bbox"):
+        return JsonResponse({"error": "bbox is required"}, status=400)
+    try:
+        bbox = parse_bbox(request.GET["bbox"])
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    photos = list(
+        photos_in_bbox(album.photos.all(), bbox)
+        .only("id", "gps_latitude", "gps_longitude", "image", "image_thumbnail")
+        .order_by("id")[: MAX_MAP_PHOTOS + 1]
+    )
+    return JsonResponse(
+        {
+            "photos": [
+                {
+                    "id": photo.id,
+                    "lat": float(photo.gps_latitude),
+                    "lon": float(photo.gps_longitude),
+                    "thumbnail": photo.get_image_url("thumbnail"),
+                }
+                for photo in photos[:MAX_MAP_PHOTOS]
+            ],
+            "truncated": len(photos) > MAX_MAP_PHOTOS,
+        }
+    )
+
+
+def _facet_browse(request, photos, album=None):
+    """
+    Facet counts and matching photo ids for the facet filters in the query string.
+
+    Each facet in photos.facets.FACETS is a query parameter, e.g.
+    ?camera=Canon+EOS+R5&month=2024-06. Without filters the counts come from
+    the precomputed rollup; photo ids are newest first, at most MAX_FACET_PHOTOS.
+    """
+    filters = {facet: request.GET[facet] for facet in FACETS if request.GET.get(facet)}
+    counts = facet_counts(photos, album=album, filters=filters)
+    matching = photos.filter(facet_values__contains=filters) if filters else photos
+    if filters:
+        # Every matching photo has the filtered value, so its count is the total
+        facet, value = next(iter(filters.items()))
+        total = next((item["count"] for item in counts[facet] if item["value"] == value), 0)
+    else:
+        total = matching.count()
+    photo_ids = list(matching.order_by("-date_taken", "-pk").values_list("pk", flat=True)[:MAX_FACET_PHOTOS])
+    return JsonResponse(
+        {
+            "filters": filters,
+            "total": total,
+            "facets": counts,
+            "photo_ids": photo_ids,
+            "truncated": total > len(photo_ids),
+        }
+    )
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def photo_facets_api(request):
+    """Browse the whole photo library by facet (see _facet_browse)."""
+    return _facet_browse(request, Photo.objects.all())
+
+
+@require_http_methods(["GET"])
+def album_facets_api(request, slug):
+    """Browse an album's photos by facet (see _facet_browse)."""
+    album = _accessible_album(request, slug, PhotoAlbum.objects.only("pk", "slug", "is_private"))
+    return _facet_browse(request, album.photos.all(), album=album)
@@ -0,0 +1,642 @@
+"""
+Streaming album ZIP generation.
+
+Album ZIPs used to copy every original from S3 into a temp file, re-read it
+into a ZIP in another temp file, and then upload that file, so every byte hit
+local disk three times and photos were fetched one after another.
+
+Here the archive is written straight into an S3 multipart upload
+(StorageWriter), and entries are filled from S3 object streams
+(open_read_stream) that a small thread pool prefetches ahead of the writer.
+Memory stays bounded regardless of album size:
+
+    PREFETCH_WORKERS photos in flight x PREFETCH_BUFFER_CHUNKS x READ_CHUNK_SIZE
+    + one UPLOAD_PART_SIZE part buffer and UPLOAD_CONCURRENCY parts being uploaded
+
+Storages without an S3 bucket (local development, tests) are read with
+storage.open() and written to storage.path() directly.
+
+StreamedZip lays out the same kind of archive for albums that are zipped while
+they download, and signed_download_url hands single originals to the browser
+as pre-signed S3 URLs. StreamedZip needs every photo's size and CRC-32 up
+front; while some are still being computed in the background, iter_zip
+streams the album with data descriptors instead (no Range support).
+
+Prebuilt album ZIPs use the StreamedZip layout too, because its entry offsets
+depend only on the entries before them: when an album only gains photos at
+the end (or loses them there), the unchanged leading bytes of the previous
+archive are copied into the new one with StorageWriter.copy_from (a
+server-side UploadPartCopy on S3) and only the rest is written with
+StreamedZip.write_to.
+
+Usage:
+    entries = [(f"{i:03d}_{photo.original_filename}", photo.image, photo.created_at) for ...]
+    with StorageWriter(storage, name, content_type="application/zip") as out:
+        added = write_zip(out, entries)
+    out.bytes_written
+"""
+
+import bisect
+import hashlib
+import io
+import logging
+import os
+import queue
+import struct
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+from django.utils.http import content_disposition_header
+from storages.utils import clean_name
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1024 * 1024  # 1MB
+UPLOAD_PART_SIZE = 8 * 1024 * 1024  # 8MB
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 requires at least 5MB for all but the last part
+UPLOAD_CONCURRENCY = 4  # Parts uploaded at once while the next one fills
+PREFETCH_WORKERS = 4
+PREFETCH_BUFFER_CHUNKS = 8
+QUEUE_POLL_SECONDS = 0.5
+
+_END = object()
+
+
+def _s3_object(storage, name):
+    """boto3 Object for a name in an S3Boto3Storage, or None for other storages."""
+    bucket = getattr(storage, "bucket", None)
+    if bucket is None:
+        return None
+    return bucket.Object(storage._normalize_name(clean_name(name)))
+
+
+def signed_download_url(file_field, filename, expires):
+    """
+    Pre-signed S3 URL that downloads the file as an attachment named filename.
+
+    The browser fetches the object straight from S3, so the web worker never
+    touches the bytes. Returns None for storages other than S3.
+    """
+    s3_object = _s3_object(file_field.storage, file_field.name)
+    if s3_object is None:
+        return None
+    return s3_object.meta.client.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": s3_object.bucket_name,
+            "Key": s3_object.key,
+            "ResponseContentDisposition": content_disposition_header(True, filename),
+        },
+        ExpiresIn=expires,
+    )
+
+
+@contextmanager
+def open_read_stream(file_field, start=0, stop=None):
+    """
+    Readable stream of a stored file (or of bytes start..stop-1) and the file's size in bytes.
+
+    On S3 this is the GetObject body, read as it arrives. storage.open() would
+    first download the whole object into a temporary file. With a range the
+    stream may continue past stop on local storage; callers read only what
+    they asked for.
+
+    Yields:
+        tuple: (stream, size), size is None for ranged S3 reads
+    """
+    s3_object = _s3_object(file_field.storage, file_field.name)
+    if s3_object is not None:
+        if start or stop is not None:
+            response = s3_object.get(Range=f"bytes={start}-{'' if stop is None else stop - 1}")
+            size = None
+        else:
+            response = s3_object.get()
+            size = response["ContentLength"]
+        body = response["Body"]
+        try:
+            yield body, size
+        finally:
+            body.close()
+    else:
+        with file_field.storage.open(file_field.name, "rb") as stream:
+            if start:
+                stream.seek(start)
+            yield stream, file_field.storage.size(file_field.name)
+
+
+class StorageWriter:
+    """
+    Write-only, non-seekable file object that streams into storage.
+
+    On S3 every UPLOAD_PART_SIZE bytes become one part of a multipart upload,
+    which is completed on a clean exit and aborted if the block raises. Up to
+    UPLOAD_CONCURRENCY parts are uploaded in the background while the writer
+    fills the next one.
+    zipfile detects that the object can't seek and writes data descriptors
+    instead of going back to patch local headers.
+    """
+
+    def __init__(self, storage, name, content_type="application/octet-stream", cache_control=None):
+        self.storage = storage
+        self.name = name
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload = None
+        self._part_count = 0
+        self._parts = []
+        self._in_flight = deque()
+        self._executor = None
+        self._file = None
+
+    def __enter__(self):
+        s3_object = _s3_object(self.storage, self.name)
+        if s3_object is not None:
+            params = {"ContentType": self.content_type}
+            if self.cache_control:
+                params["CacheControl"] = self.cache_control
+            if getattr(self.storage, "default_acl", None):
+                params["ACL"] = self.storage.default_acl
+            self._upload = s3_object.initiate_multipart_upload(**params)
+        else:
+            path = self.storage.path(self.name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._file = open(path, "wb")  # Closed in __exit__
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._abort()
+            return
+        try:
+            self._finish()
+        except BaseException:
+            self._abort()
+            raise
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self._file is not None:
+            return self._file.write(data)
+
+        self._buffer += data
+        while len(self._buffer) >= UPLOAD_PART_SIZE:
+            self._upload_part(bytes(self._buffer[:UPLOAD_PART_SIZE]))
+            del self._buffer[:UPLOAD_PART_SIZE]
+        return len(data)
+
+    def copy_from(self, file_field, start, stop):
+        """
+        Append bytes start..stop-1 of another stored file.
+
+        On S3, a range copied before anything else is written becomes
+        UploadPartCopy parts, so the bytes never leave S3. Otherwise they are
+        read and written like any other data.
+        """
+        source = _s3_object(file_field.storage, file_field.name)
+        if source is None or self._upload is None or self.bytes_written or stop - start < MIN_PART_SIZE:
+            for chunk in _read_file_range(file_field, start, stop):
+                self.write(chunk)
+            return
+
+        # Equal parts of at least UPLOAD_PART_SIZE (or one part of at least MIN_PART_SIZE)
+        part_count = max((stop - start) // UPLOAD_PART_SIZE, 1)
+        bounds = [start + (stop - start) * i // part_count for i in range(part_count + 1)]
+        for part_start, part_stop in zip(bounds, bounds[1:], strict=False):
+            self._submit_part(
+                _copied_etag,
+                CopySource={"Bucket": source.bucket_name, "Key": source.key},
+                CopySourceRange=f"bytes={part_start}-{part_stop - 1}",
+            )
+        self.bytes_written += stop - start
+
+    def tell(self):
+        return self.bytes_written
+
+    def flush(self):
+        # Parts are uploaded as soon as they are full; a partial part can't be sent early
+        pass
+
+    def _upload_part(self, data):
+        self._submit_part(_uploaded_etag, Body=data)
+
+    def _submit_part(self, send, **kwargs):
+        """Send the next part on the upload pool, first waiting for the oldest if the pool is full."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY)
+        while len(self._in_flight) >= UPLOAD_CONCURRENCY:
+            self._collect_part()
+        self._part_count += 1
+        part = self._upload.Part(self._part_count)
+        self._in_flight.append((self._part_count, self._executor.submit(send, part, **kwargs)))
+
+    def _collect_part(self):
+        number, future = self._in_flight.popleft()
+        self._parts.append({"ETag": future.result(), "PartNumber": number})
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _finish(self):
+        if self._file is not None:
+            self._file.close()
+            return
+        if self._buffer or not self._part_count:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        while self._in_flight:
+            self._collect_part()
+        self._shutdown()
+        self._upload.complete(MultipartUpload={"Parts": self._parts})
+
+    def _abort(self):
+        if self._file is not None:
+            self._file.close()
+            self.storage.delete(self.name)
+            return
+        self._in_flight.clear()
+        self._shutdown()
+        try:
+            self._upload.abort()
+        except Exception as e:
+            logger.warning(f"Failed to abort multipart upload for {self.name}: {e}")
+
+
+def _uploaded_etag(part, **kwargs):
+    return part.upload(**kwargs)["ETag"]
+
+
+def _copied_etag(part, **kwargs):
+    return part.copy_from(**kwargs)["CopyPartResult"]["ETag"]
+
+
+class _Prefetch:
+    """Reads one stored file into a bounded queue of chunks on a worker thread."""
+
+    def __init__(self, file_field):
+        self.file_field = file_field
+        self.chunks = queue.Queue(maxsize=PREFETCH_BUFFER_CHUNKS)
+        self.cancelled = threading.Event()
+        self.size = None
+
+    def run(self):
+        try:
+            with open_read_stream(self.file_field) as (stream, size):
+                self.size = size
+                for chunk in iter(lambda: stream.read(READ_CHUNK_SIZE), b""):
+                    if not self._put(chunk):
+                        return
+            self._put(_END)
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        """Blocks while the buffer is full; gives up once the consumer has cancelled."""
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=QUEUE_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        item = self.chunks.get()
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+def write_zip(out, entries):
+    """
+    Write a stored (uncompressed) ZIP of entries to a writable stream.
+
+    Args:
+        out: Writable file object, need not be seekable (e.g. a StorageWriter)
+        entries: Iterable of (archive name, file field, datetime) tuples
+
+    Returns:
+        int: Number of entries added. Files that can't be opened are skipped
+             with a warning; a failure partway through a file raises, because
+             its bytes are already in the archive.
+    """
+    entries = iter(entries)
+    queued = deque()
+    added = 0
+
+    with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+
+        def prefetch_next():
+            entry = next(entries, None)
+            if entry is not None:
+                prefetch = _Prefetch(entry[1])
+                executor.submit(prefetch.run)
+                queued.append((entry, prefetch))
+
+        try:
+            with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf:
+                for _ in range(PREFETCH_WORKERS):
+                    prefetch_next()
+                while queued:
+                    (arcname, file_field, modified), prefetch = queued.popleft()
+                    prefetch_next()
+                    if _write_entry(zf, arcname, file_field, modified, prefetch):
+                        added += 1
+        finally:
+            for _, prefetch in queued:
+                prefetch.cancel()
+
+    return added
+
+
+def _write_entry(zf, arcname, file_field, modified, prefetch):
+    try:
+        first = prefetch.get()
+    except Exception as e:
+        logger.warning(f"Failed to add {file_field.name} to ZIP at {arcname}: {e}")
+        return False
+
+    info = zipfile.ZipInfo(arcname, date_time=_zip_date_time(modified))
+    info.compress_type = zipfile.ZIP_STORED
+    # The size decides whether the entry needs ZIP64 fields; force them if it is unknown
+    if prefetch.size is not None:
+        info.file_size = prefetch.size
+
+    try:
+        with zf.open(info, "w", force_zip64=prefetch.size is None) as entry:
+            chunk = first
+            while chunk is not _END:
+                entry.write(chunk)
+                chunk = prefetch.get()
+    except BaseException:
+        prefetch.cancel()
+        raise
+    return True
+
+
+class _Sink(io.RawIOBase):
+    """Unseekable write target that iter_zip empties after every write, so zipfile adds data descriptors."""
+
+    def __init__(self):
+        super().__init__()
+        self._data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._data += data
+        return len(data)
+
+    def take(self):
+        data = bytes(self._data)
+        self._data.clear()
+        return data
+
+
+def iter_zip(entries):
+    """
+    Yield a stored (uncompressed) ZIP of entries as it is produced, one file at a time.
+
+    Sizes and CRCs don't need to be known: each entry's data is followed by a
+    data descriptor. Byte offsets are only known once the bytes are produced,
+    so the archive can't be served in ranges.
+
+    Args:
+        entries: Iterable of (archive name, file field, datetime) tuples; files
+                 that can't be opened are skipped with a warning
+    """
+    return (chunk for chunk in _zip_chunks(entries) if chunk)
+
+
+def _zip_chunks(entries):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+        for arcname, file_field, modified in entries:
+            with ExitStack() as stack:
+                try:
+                    stream, _ = stack.enter_context(open_read_stream(file_field))
+                except Exception as e:
+                    logger.warning(f"Failed to add {file_field.name} to ZIP at {arcname}: {e}")
+                    continue
+                info = zipfile.ZipInfo(arcname, date_time=_zip_date_time(modified))
+                with zf.open(info, "w", force_zip64=True) as entry:
+                    for chunk in iter(lambda stream=stream: stream.read(READ_CHUNK_SIZE), b""):
+                        entry.write(chunk)
+                        yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+def _zip_date_time(value):
+    """ZIP timestamps can't predate 1980."""
+    if value is None:
+        return (1980, 1, 1, 0, 0, 0)
+    return max(value.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+
+ZIP64_VERSION = 45
+UTF8_FLAG = 0x0800
+MAX_UINT16 = 0xFFFF
+MAX_UINT32 = 0xFFFFFFFF
+
+
+def _dos_date_time(value):
+    year, month, day, hour, minute, second = _zip_date_time(value)
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+class StreamedZip:
+    """
+    A ZIP64 archive of stored files whose every byte offset is known up front.
+
+    Entries are stored (not compressed) with their CRC-32 and size written in
+    the local headers, so no data descriptors are needed and the archive is a
+    fixed sequence of segments: generated header bytes and byte ranges of the
+    stored originals. Any byte range can be produced without building the
+    rest, which is what HTTP Range requests and resumed downloads need. The
+    same entries always give the same bytes, and etag identifies them.
+
+    Args:
+        entries: Iterable of (archive name, file field, size, crc32, datetime)
+    """
+
+    def __init__(self, entries):
+        self._offsets = []
+        self._segments = []
+        self.size = 0
+        # Where each entry's local header starts; the bytes before it depend only on earlier entries
+        self.entry_offsets = []
+        central = []
+
+        for arcname, file_field, size, crc, modified in entries:
+            name = arcname.encode("utf-8")
+            dos_time, dos_date = _dos_date_time(modified)
+            header_offset = self.size
+            self.entry_offsets.append(header_offset)
+
+            self._add(
+                struct.pack(
+                    "<IHHHHHIIIHH",
+                    0x04034B50,
+                    ZIP64_VERSION,
+                    UTF8_FLAG,
+                    zipfile.ZIP_STORED,
+                    dos_time,
+                    dos_date,
+                    crc,
+                    MAX_UINT32,
+                    MAX_UINT32,
+                    len(name),
+                    20,
+                )
+                + name
+                + struct.pack("<HHQQ", 1, 16, size, size)
+            )
+            self._add(file_field, size)
+
+            central.append(
+                struct.pack(
+                    "<IHHHHHHIIIHHHHHII",
+                    0x02014B50,
+                    ZIP64_VERSION,
+                    ZIP64_VERSION,
+                    UTF8_FLAG,
+                    zipfile.ZIP_STORED,
+                    dos_time,
+                    dos_date,
+                    crc,
+                    MAX_UINT32,
+                    MAX_UINT32,
+                    len(name),
+                    28,
+                    0,
+                    0,
+                    0,
+                    0,
+                    MAX_UINT32,
+                )
+                + name
+                + struct.pack("<HHQQQ", 1, 24, size, size, header_offset)
+            )
+
+        directory = b"".join(central)
+        directory_offset = self.directory_offset = self.size
+        zip64_end_offset = directory_offset + len(directory)
+        count = len(central)
+        self._add(
+            directory
+            + struct.pack(
+                "<IQHHIIQQQQ",
+                0x06064B50,
+                44,
+                ZIP64_VERSION,
+                ZIP64_VERSION,
+                0,
+                0,
+                count,
+                count,
+                len(directory),
+                directory_offset,
+            )
+            + struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+            + struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, MAX_UINT16, MAX_UINT16, MAX_UINT32, MAX_UINT32, 0)
+        )
+        # The central directory covers every name, size, CRC and offset
+        self.etag = f'"{hashlib.sha256(directory).hexdigest()[:32]}"'
+
+    def _add(self, payload, length=None):
+        self._offsets.append(self.size)
+        self._segments.append(payload)
+        self.size += len(payload) if length is None else length
+
+    def iter_range(self, start=0, stop=None):
+        """Yield the archive bytes start..stop-1 (the whole archive by default)."""
+        stop = self.size if stop is None else min(stop, self.size)
+        index = max(bisect.bisect_right(self._offsets, start) - 1, 0)
+
+        while start < stop and index < len(self._segments):
+            offset, segment = self._offsets[index], self._segments[index]
+            segment_stop = self._offsets[index + 1] if index + 1 < len(self._offsets) else self.size
+            begin, end = start - offset, min(stop, segment_stop) - offset
+
+            if isinstance(segment, bytes):
+                yield segment[begin:end]
+            else:
+                yield from _read_file_range(segment, begin, end)
+
+            start = offset + end
+            index += 1
+
+    def write_to(self, out, start=0):
+        """
+        Write the archive from byte start to the end into out.
+
+        Unlike iter_range, stored files are read ahead by a thread pool the
+        way write_zip reads them, for writing whole archives into storage.
+        """
+        index = bisect.bisect_right(self._offsets, start) - 1
+        if index >= 0 and self._offsets[index] != start:
+            # Finish a partly skipped segment so the rest start on boundaries
+            stop = self._offsets[index + 1] if index + 1 < len(self._offsets) else self.size
+            for chunk in self.iter_range(start, stop):
+                out.write(chunk)
+            index += 1
+
+        segments = iter(range(index, len(self._segments)))
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+
+            def prefetch_next():
+                # Queue header bytes up to and including the next stored file
+                for i in segments:
+                    segment = self._segments[i]
+                    if isinstance(segment, bytes):
+                        pending.append((segment, None, 0))
+                        continue
+                    prefetch = _Prefetch(segment)
+                    executor.submit(prefetch.run)
+                    length = (self._offsets[i + 1] if i + 1 < len(self._offsets) else self.size) - self._offsets[i]
+                    pending.append((segment, prefetch, length))
+                    return
+
+            try:
+                for _ in range(PREFETCH_WORKERS):
+                    prefetch_next()
+                while pending:
+                    segment, prefetch, length = pending.popleft()
+                    if prefetch is None:
+                        out.write(segment)
+                        continue
+                    prefetch_next()
+                    written = 0
+                    for chunk in iter(prefetch.get, _END):
+                        out.write(chunk)
+                        written += len(chunk)
+                    if written != length:
+                        raise OSError(f"{segment.name} is {written} bytes, the archive expects {length}")
+            finally:
+                for _, prefetch, _ in pending:
+                    if prefetch is not None:
+                        prefetch.cancel()
+
+
+def _read_file_range(file_field, start, stop):
+    remaining = stop - start
+    with open_read_stream(file_field, start, stop) as (stream, _):
+        while remaining > 0:
+            chunk = stream.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise OSError(f"{file_field.name} is shorter than its recorded size")
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,42 @@
+"""
+Management command to build the local semantic search index.
+
+Embeds every SearchableContent row with the hashing vectorizer in
+utils.semantic_search and writes the matrix to SEMANTIC_SEARCH_INDEX_DIR.
+Runs entirely on CPU with no network access.
+
+Usage:
+    python manage.py build_semantic_index
+    python manage.py build_semantic_index --output-dir /tmp/semantic_index
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from utils.models import SearchableContent
+from utils.semantic_search import EMBEDDING_DIMENSIONS, build_index, get_index_dir
+
+
+class Command(BaseCommand):
+    help = "Build the memory-mapped embedding index used by semantic search and related posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir",
+            type=str,
+            default=None,
+            help="Directory to write the index to (default: SEMANTIC_SEARCH_INDEX_DIR)",
+        )
+
+    def handle(self, *args, **options):
+        index_dir = options["output_dir"] or get_index_dir()
+
+        self.stdout.write(f"Embedding searchable content into {index_dir}...")
+        start = time.perf_counter()
+        count = build_index(SearchableContent.objects.all(), index_dir=index_dir)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            self.style.SUCCESS(f"✓ Indexed {count} items ({EMBEDDING_DIMENSIONS} dimensions) in {elapsed:.2f}s")
+        )
@@ -14,6 +14,12 @@ PERIODIC_TASKS = [
         "Geolocates IP addresses without geo data twice daily at midnight and noon",
     ),
     # Daily tasks
+    (
+        "Rotate photo album covers",
+        "photos.tasks.rotate_album_covers",
+        {"minute": "5", "hour": "0"},
+        "Picks each album's cover photo for the day and re-syncs photo counts every day at 12:05 AM",
+    ),
     (
         "Run daily Lighthouse audit",
         "utils.tasks.run_lighthouse_audit",
@@ -24,7 +30,7 @@ PERIODIC_TASKS = [
         "Rebuild and cache sitemap daily",
         "pages.tasks.rebuild_and_cache_sitemap",
         {"minute": "0", "hour": "3"},
-        "Rebuilds and caches the sitemap every day at 3 AM",
+        "Rebuilds the gzipped sitemap files every day at 3 AM",
     ),
     (
         "Generate knowledge graph screenshot",
@@ -32,6 +38,12 @@ PERIODIC_TASKS = [
         {"minute": "0", "hour": "4"},
         "Generates a fresh knowledge graph screenshot every day at 4 AM",
     ),
+    (
+        "Reconcile comment vote counts",
+        "blog.tasks.reconcile_comment_vote_counts",
+        {"minute": "30", "hour": "4"},
+        "Recomputes cached comment vote counts from individual votes every day at 4:30 AM",
+    ),
     # Recurring tasks
     (
         "Rebuild knowledge graph cache",
@@ -39,6 +51,18 @@ PERIODIC_TASKS = [
         {"minute": "0", "hour": "*/6"},
         "Rebuilds the knowledge graph cache every 6 hours",
     ),
+    (
+        "Flush album share-link views",
+        "photos.tasks.flush_share_access_counts",
+        {"minute": "*/5"},
+        "Writes share-link views buffered in Redis to the album rows every 5 minutes",
+    ),
+    (
+        "Score pending comments for spam",
+        "blog.tasks.score_pending_comments",
+        {"minute": "*/10"},
+        "Scores pending blog comments for spam every 10 minutes (backstop for the post-submit run)",
+    ),
 ]
 
 
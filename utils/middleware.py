@@ -1,19 +1,48 @@
 """
-Request fingerprinting and ban enforcement middleware for security and analytics.
+Request fingerprinting and ban enforcement middleware for security and analytics,
+and response compression that views can opt out of.
 """
 
 import logging
 import re
+from functools import wraps
 
 from django.conf import settings
 from django.core.exceptions import MiddlewareNotUsed
 from django.http import HttpResponseForbidden
+from django.middleware.gzip import GZipMiddleware as DjangoGZipMiddleware
 from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
 logger = logging.getLogger(__name__)
 
 
+def gzip_exempt(view_func):
+    """Mark a view's responses to be left alone by GZipMiddleware (the view negotiates encoding itself)."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        response.gzip_exempt = True
+        return response
+
+    return wrapper
+
+
+class GZipMiddleware(DjangoGZipMiddleware):
+    """
+    Django's GZipMiddleware, skipping responses of views decorated with gzip_exempt.
+
+    Django's version compresses whenever "gzip" appears in Accept-Encoding,
+    even for "gzip;q=0", so views that honour q-values opt out.
+    """
+
+    def process_response(self, request, response):
+        if getattr(response, "gzip_exempt", False):
+            return response
+        return super().process_response(request, response)
+
+
 class RequestFingerprintMiddleware(MiddlewareMixin):
     """
     Middleware to track request fingerprints, enforce bans, and detect suspicious activity.
@@ -9,15 +9,18 @@ from django.db.models.functions import Greatest
 
 from photos.models import Photo, PhotoAlbum
 from utils.models import SearchableContent
+from utils.semantic_search import LEXICAL_WEIGHT, SEMANTIC_WEIGHT, semantic_scores
 
 
-def search_blog_posts(query=None, category=None):
+def search_blog_posts(query=None, category=None, semantic=False):
     """
     Search blog posts using PostgreSQL full-text search with trigram similarity.
 
     Args:
         query: Search query string (searches titles and content)
         category: Blog category to filter by
+        semantic: Blend in cosine similarity from the local embedding index,
+            which also surfaces posts that share no words with the query
 
     Returns:
         List of blog post dicts with metadata and relevance scores
@@ -61,12 +64,22 @@ def search_blog_posts(query=None, category=None):
         combined_score=F("rank") * Value(0.7) + F("similarity") * Value(0.3),
     )
 
-    queryset = queryset.filter(Q(rank__gt=0.01) | Q(similarity__gt=0.2))
+    matches = Q(rank__gt=0.01) | Q(similarity__gt=0.2)
+
+    # Semantic hits are let through even when they share no terms with the query
+    semantic = semantic_scores(query, content_type="blog_post") if semantic else {}
+    if semantic:
+        matches |= Q(id__in=list(semantic))
+
+    queryset = queryset.filter(matches)
     queryset = queryset.order_by("-combined_score", "-created_at")
 
     # Convert to dict format
     results = []
     for obj in queryset:
+        score = float(obj.combined_score) if obj.combined_score is not None else 0.0
+        if semantic:
+            score = score * LEXICAL_WEIGHT + semantic.get(obj.id, 0.0) * SEMANTIC_WEIGHT
         results.append(
             {
                 "template_name": obj.template_name,
@@ -74,12 +87,14 @@ def search_blog_posts(query=None, category=None):
                 "blog_content": obj.content[:500] if obj.content else "",  # Truncate for preview
                 "category": obj.category,
                 "entry_number": obj.template_name.split("_")[0] if obj.template_name else "0000",
-                "relevance_score": float(obj.combined_score)
-                if hasattr(obj, "combined_score") and obj.combined_score is not None
-                else 0.0,
+                "relevance_score": score,
             }
         )
 
+    if semantic:
+        # Stable sort keeps the FTS/created_at order for ties
+        results.sort(key=lambda result: result["relevance_score"], reverse=True)
+
     return results
 
 
@@ -206,17 +221,20 @@ def search_books(query=None):
     return results
 
 
-def search_photos(query=None):
+def search_photos(query=None, facets=None):
     """
     Search photos using PostgreSQL full-text search with trigram similarity.
 
     Args:
         query: Search query string (searches title and description)
+        facets: Optional {facet: value} filters (see photos.facets), e.g. {"camera": "Canon EOS R5"}
 
     Returns:
         QuerySet of Photo objects ordered by relevance
     """
     queryset = Photo.objects.all()
+    if facets:
+        queryset = queryset.filter(facet_values__contains=facets)
 
     if not query:
         return queryset.order_by("-created_at")
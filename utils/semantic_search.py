@@ -0,0 +1,307 @@
+"""
+Local semantic search over SearchableContent.
+
+Embeddings are produced by a signed hashing vectorizer (word unigrams and
+bigrams, sublinear term frequency, IDF weighting, L2 normalisation), so they
+can be computed on CPU without downloading a model or calling an API.
+
+The embedding matrix is written to ``settings.SEMANTIC_SEARCH_INDEX_DIR`` as a
+``.npy`` file and opened with ``mmap_mode="r"``, so every worker process shares
+the same page-cached copy instead of holding its own. A small JSON sidecar maps
+matrix rows back to SearchableContent rows.
+
+Build the index with ``python manage.py build_semantic_index``.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils.html import strip_tags
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIMENSIONS = 1024
+MATRIX_FILENAME = "embeddings.npy"
+IDF_FILENAME = "idf.npy"
+METADATA_FILENAME = "metadata.json"
+
+# Blend weights used when semantic scores are combined with the FTS score
+SEMANTIC_WEIGHT = 0.4
+LEXICAL_WEIGHT = 0.6
+MIN_SEMANTIC_SCORE = 0.15
+# Whole posts overlap less than a short query does with a post, so related posts use a lower floor
+MIN_RELATED_SCORE = 0.05
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOP_WORDS = frozenset(
+    """
+    a about above after again all am an and any are as at be because been before being below between both but by
+    can could did do does doing down during each few for from further had has have having he her here hers him his
+    how i if in into is it its itself just me more most my no nor not now of off on once only or other our ours out
+    over own same she should so some such than that the their theirs them then there these they this those through
+    to too under until up very was we were what when where which while who whom why will with would you your yours
+    """.split()
+)
+
+
+def tokenize(text):
+    """Lowercase, strip HTML, and split text into content-bearing tokens."""
+    text = strip_tags(text or "").lower()
+    return [token for token in TOKEN_RE.findall(text) if token not in STOP_WORDS and len(token) > 1]
+
+
+def _features(text):
+    """Return a Counter of unigram and bigram features for a piece of text."""
+    tokens = tokenize(text)
+    features = Counter(tokens)
+    features.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:], strict=False))
+    return features
+
+
+def _hash_feature(feature):
+    """
+    Map a feature to a (column, sign) pair.
+
+    crc32 is used instead of hash() because Python string hashing is salted
+    per process and the index has to match across builds and workers.
+    """
+    digest = zlib.crc32(feature.encode("utf-8"))
+    return digest % EMBEDDING_DIMENSIONS, 1.0 if digest & 0x80000000 else -1.0
+
+
+def _term_matrix(texts):
+    """Build the raw sublinear term-frequency matrix for a list of texts."""
+    matrix = np.zeros((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature, count in _features(text).items():
+            column, sign = _hash_feature(feature)
+            matrix[row, column] += sign * (1.0 + math.log(count))
+    return matrix
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def compute_idf(term_matrix):
+    """Smoothed inverse document frequency per hashed column."""
+    document_count = term_matrix.shape[0]
+    document_frequency = np.count_nonzero(term_matrix, axis=0)
+    return (np.log((1 + document_count) / (1 + document_frequency)) + 1.0).astype(np.float32)
+
+
+def embed_texts(texts, idf=None):
+    """
+    Embed a list of texts into L2-normalised float32 vectors.
+
+    Args:
+        texts: Iterable of strings (HTML is stripped)
+        idf: Optional IDF vector from a built index
+
+    Returns:
+        ndarray of shape (len(texts), EMBEDDING_DIMENSIONS)
+    """
+    matrix = _term_matrix(list(texts))
+    if idf is not None:
+        matrix *= idf
+    return _normalize(matrix)
+
+
+def document_text(obj):
+    """Text used to embed a SearchableContent row; titles are repeated to weight them higher."""
+    return " ".join([obj.title, obj.title, obj.description or "", obj.content or ""])
+
+
+def get_index_dir():
+    return Path(settings.SEMANTIC_SEARCH_INDEX_DIR)
+
+
+def build_index(queryset, index_dir=None):
+    """
+    Compute embeddings for a SearchableContent queryset and write them to disk.
+
+    Files are written next to the target and moved into place with os.replace,
+    so readers never see a half-written matrix.
+
+    Returns:
+        Number of rows in the index
+    """
+    index_dir = Path(index_dir or get_index_dir())
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    rows = list(queryset.order_by("id"))
+    term_matrix = _term_matrix([document_text(obj) for obj in rows])
+    idf = compute_idf(term_matrix) if rows else np.ones(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    embeddings = _normalize(term_matrix * idf).astype(np.float32)
+
+    metadata = {
+        "dimensions": EMBEDDING_DIMENSIONS,
+        "items": [
+            {
+                "id": obj.id,
+                "content_type": obj.content_type,
+                "title": obj.title,
+                "category": obj.category,
+                "template_name": obj.template_name,
+            }
+            for obj in rows
+        ],
+    }
+
+    for filename, array in ((MATRIX_FILENAME, embeddings), (IDF_FILENAME, idf)):
+        tmp_path = index_dir / f".{filename}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, index_dir / filename)
+
+    tmp_path = index_dir / f".{METADATA_FILENAME}.tmp"
+    tmp_path.write_text(json.dumps(metadata))
+    os.replace(tmp_path, index_dir / METADATA_FILENAME)
+
+    _index_cache.clear()
+    return len(rows)
+
+
+class SemanticIndex:
+    """A loaded, memory-mapped embedding index."""
+
+    def __init__(self, embeddings, idf, items):
+        self.embeddings = embeddings
+        self.idf = idf
+        self.items = items
+        self.ids = np.array([item["id"] for item in items], dtype=np.int64)
+        self.content_types = np.array([item["content_type"] for item in items])
+        self._row_by_key = {
+            (item["category"], item["template_name"]): row
+            for row, item in enumerate(items)
+            if item["content_type"] == "blog_post"
+        }
+
+    @classmethod
+    def load(cls, index_dir=None):
+        index_dir = Path(index_dir or get_index_dir())
+        metadata = json.loads((index_dir / METADATA_FILENAME).read_text())
+        if metadata.get("dimensions") != EMBEDDING_DIMENSIONS:
+            raise ValueError("Semantic index was built with different dimensions; rebuild it")
+        embeddings = np.load(index_dir / MATRIX_FILENAME, mmap_mode="r")
+        idf = np.load(index_dir / IDF_FILENAME)
+        if embeddings.shape[0] != len(metadata["items"]):
+            # A rebuild is mid-way through replacing files; the next call will retry
+            raise ValueError("Semantic index files are out of sync")
+        return cls(embeddings, idf, metadata["items"])
+
+    def __len__(self):
+        return len(self.items)
+
+    def embed_query(self, query):
+        return embed_texts([query], idf=self.idf)[0]
+
+    def top_k(self, vector, k=10, content_type=None, exclude_row=None, min_score=MIN_SEMANTIC_SCORE):
+        """
+        Vectorised cosine top-k against the whole matrix.
+
+        Rows are unit length, so a single matrix-vector product gives cosine
+        similarity; argpartition avoids sorting the full score array.
+
+        Returns:
+            List of (row, score) tuples, best first
+        """
+        if not len(self) or k <= 0:
+            return []
+
+        scores = np.asarray(self.embeddings @ vector, dtype=np.float32)
+        if content_type is not None:
+            scores = np.where(self.content_types == content_type, scores, -np.inf)
+        if exclude_row is not None:
+            scores[exclude_row] = -np.inf
+
+        k = min(k, len(scores))
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(int(row), float(scores[row])) for row in candidates if scores[row] >= min_score]
+
+    def search(self, query, k=50, content_type=None):
+        """Return {SearchableContent id: cosine score} for the best matches to a query."""
+        vector = self.embed_query(query)
+        if not vector.any():
+            return {}
+        return {int(self.ids[row]): score for row, score in self.top_k(vector, k=k, content_type=content_type)}
+
+    def related_posts(self, template_name, category, limit=3):
+        """Return the blog posts closest to the given post, using its stored embedding."""
+        row = self._row_by_key.get((category, template_name))
+        if row is None:
+            return []
+
+        vector = np.asarray(self.embeddings[row])
+        related = []
+        for other_row, score in self.top_k(
+            vector, k=limit, content_type="blog_post", exclude_row=row, min_score=MIN_RELATED_SCORE
+        ):
+            item = self.items[other_row]
+            related.append(
+                {
+                    "template_name": item["template_name"],
+                    "blog_title": item["title"],
+                    "category": item["category"],
+                    "similarity": score,
+                }
+            )
+        return related
+
+
+# Loaded indexes keyed by directory, invalidated when the matrix file changes
+_index_cache = {}
+
+
+def get_index(index_dir=None):
+    """
+    Return the loaded SemanticIndex, or None if it has not been built.
+
+    The index is re-opened when the matrix file's mtime changes, so a rebuild
+    is picked up by running workers without a restart.
+    """
+    index_dir = Path(index_dir or get_index_dir())
+    try:
+        mtime = (index_dir / MATRIX_FILENAME).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _index_cache.get(index_dir)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        index = SemanticIndex.load(index_dir)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load semantic search index from {index_dir}: {e}")
+        return None
+
+    _index_cache[index_dir] = (mtime, index)
+    return index
+
+
+def semantic_scores(query, content_type=None, k=50):
+    """Semantic scores for a query, or an empty dict when no index is available."""
+    index = get_index()
+    if index is None or not query:
+        return {}
+    return index.search(query, k=k, content_type=content_type)
+
+
+def get_related_posts(template_name, category, limit=3):
+    """Related blog posts for the given post, or an empty list when no index is available."""
+    index = get_index()
+    if index is None:
+        return []
+    return index.related_posts(template_name, category, limit=limit)
@@ -0,0 +1,145 @@
+"""
+Tests for the local semantic search index.
+
+Tests cover:
+- Hashing vectorizer embeddings
+- Index build, memory-mapped load and top-k search
+- Blending semantic scores into search_blog_posts
+- Related posts
+- build_semantic_index management command
+"""
+
+import shutil
+import tempfile
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from utils.models import SearchableContent
+from utils.search import search_blog_posts
+from utils.semantic_search import EMBEDDING_DIMENSIONS, build_index, embed_texts, get_index, get_related_posts
+
+
+class EmbeddingTest(TestCase):
+    """Test the hashing vectorizer."""
+
+    def test_embeddings_are_unit_length(self):
+        vectors = embed_texts(["Postgres query planning", "Training a neural network"])
+        self.assertEqual(vectors.shape, (2, EMBEDDING_DIMENSIONS))
+        self.assertTrue(np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5))
+
+    def test_embeddings_are_deterministic(self):
+        first = embed_texts(["Deterministic hashing across processes"])
+        second = embed_texts(["Deterministic hashing across processes"])
+        self.assertTrue(np.array_equal(first, second))
+
+    def test_html_and_stop_words_are_ignored(self):
+        plain = embed_texts(["database indexes"])
+        html = embed_texts(["<p>The <b>database</b> indexes</p>"])
+        self.assertTrue(np.allclose(plain, html))
+
+    def test_empty_text_embeds_to_zero_vector(self):
+        vector = embed_texts([""])[0]
+        self.assertFalse(vector.any())
+
+
+class SemanticIndexTest(TestCase):
+    """Test building, loading and querying the memory-mapped index."""
+
+    def setUp(self):
+        self.index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.index_dir)
+        override = override_settings(SEMANTIC_SEARCH_INDEX_DIR=self.index_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.postgres = SearchableContent.objects.create(
+            content_type="blog_post",
+            title="Postgres Indexing",
+            content="How GIN and btree indexes speed up postgres queries and query planning.",
+            category="tech",
+            template_name="0001_postgres_indexing",
+        )
+        self.planner = SearchableContent.objects.create(
+            content_type="blog_post",
+            title="Reading Query Plans",
+            content="Explain analyze output, postgres query planning and choosing indexes.",
+            category="tech",
+            template_name="0002_reading_query_plans",
+        )
+        self.hiking = SearchableContent.objects.create(
+            content_type="blog_post",
+            title="Hiking The Rockies",
+            content="Trail notes from a week of hiking mountain passes.",
+            category="personal",
+            template_name="0003_hiking_the_rockies",
+        )
+        self.book = SearchableContent.objects.create(
+            content_type="book",
+            title="Designing Data-Intensive Applications",
+            description="by Martin Kleppmann",
+            content="Postgres query planning and indexes in depth.",
+        )
+
+    def test_build_and_load_index(self):
+        count = build_index(SearchableContent.objects.all())
+        self.assertEqual(count, 4)
+
+        index = get_index()
+        self.assertIsNotNone(index)
+        self.assertEqual(len(index), 4)
+        self.assertIsInstance(index.embeddings, np.memmap)
+
+    def test_missing_index_returns_none(self):
+        self.assertIsNone(get_index())
+        self.assertEqual(get_related_posts("0001_postgres_indexing", "tech"), [])
+
+    def test_search_ranks_closest_content_first(self):
+        build_index(SearchableContent.objects.all())
+        scores = get_index().search("postgres query planning", content_type="blog_post")
+
+        self.assertIn(self.postgres.id, scores)
+        self.assertNotIn(self.book.id, scores)
+        self.assertNotIn(self.hiking.id, scores)
+
+    def test_related_posts(self):
+        build_index(SearchableContent.objects.all())
+
+        with self.assertNumQueries(0):
+            related = get_related_posts("0001_postgres_indexing", "tech", limit=2)
+
+        self.assertEqual(related[0]["template_name"], "0002_reading_query_plans")
+        self.assertNotIn("0001_postgres_indexing", [post["template_name"] for post in related])
+        self.assertTrue(all(post["category"] != "" for post in related))
+
+    def test_search_blog_posts_semantic_blend(self):
+        build_index(SearchableContent.objects.all())
+
+        lexical = search_blog_posts(query="query planning")
+        blended = search_blog_posts(query="query planning", semantic=True)
+
+        self.assertEqual({post["template_name"] for post in lexical}, {post["template_name"] for post in blended})
+        self.assertEqual(blended[0]["template_name"], "0002_reading_query_plans")
+        scores = [post["relevance_score"] for post in blended]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_semantic_search_without_index_falls_back_to_lexical(self):
+        lexical = search_blog_posts(query="hiking")
+        semantic = search_blog_posts(query="hiking", semantic=True)
+        self.assertEqual(lexical, semantic)
+
+    def test_rebuild_is_picked_up(self):
+        build_index(SearchableContent.objects.filter(content_type="blog_post"))
+        self.assertEqual(len(get_index()), 3)
+
+        build_index(SearchableContent.objects.all())
+        self.assertEqual(len(get_index()), 4)
+
+    def test_build_semantic_index_command(self):
+        out = StringIO()
+        call_command("build_semantic_index", stdout=out)
+
+        self.assertIn("Indexed 4 items", out.getvalue())
+        self.assertIsNotNone(get_index())
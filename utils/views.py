@@ -207,17 +207,22 @@ from utils.search import search_blog_posts, search_books, search_projects
 def search_view(request):
     """
     Unified search view for blog posts, projects, and books.
-    Supports full-text search.
+    Supports full-text search, optionally blended with semantic search (mode=semantic).
     """
     query = request.GET.get("q", "").strip()
     category = request.GET.get("category", "").strip() or None
     content_type = request.GET.get("type", "all")  # all, blog, projects, books
+    mode = request.GET.get("mode", "lexical")  # lexical, semantic
 
     results = {"blog_posts": [], "projects": [], "books": []}
 
     # Search blog posts
     if content_type in ["all", "blog"]:
-        results["blog_posts"] = search_blog_posts(query=query if query else None, category=category)
+        results["blog_posts"] = search_blog_posts(
+            query=query if query else None,
+            category=category,
+            semantic=mode == "semantic",
+        )
 
     # Search projects
     if content_type in ["all", "projects"]:
@@ -231,6 +236,7 @@ def search_view(request):
         "query": query,
         "category": category,
         "content_type": content_type,
+        "mode": mode,
         "results": results,
         "total_results": len(results["blog_posts"]) + len(results["projects"]) + len(results["books"]),
     }